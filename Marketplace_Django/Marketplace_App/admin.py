@@ -1,16 +1,31 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.http import urlencode
 from django.utils.html import format_html
-from .models import Categoria, Anuncio, PerfilUsuario, Comentario, Reporte
+from .models import Categoria, Anuncio, PerfilUsuario, Comentario, Reporte, ResumenReportes, Tarea, TareaFallida
+from .forms import ImportarAnunciosForm
+from . import busqueda, cola, importacion, moderacion, tareas
+from .paginacion import PaginadorEstimado
 
 # --- 1. ADMINISTRACIÓN DE CATEGORÍAS ---
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'slug', 'cantidad_anuncios')
     prepopulated_fields = {"slug": ("nombre",)}
 
+    def get_queryset(self, request):
+        # Cuenta los anuncios de todas las categorías en la misma consulta del listado
+        return super().get_queryset(request).annotate(total_anuncios=Count('anuncios_categoria'))
+
     def cantidad_anuncios(self, obj):
-        # Cuenta cuántos anuncios hay en esta categoría
-        return obj.anuncios_categoria.count()
+        return obj.total_anuncios
     cantidad_anuncios.short_description = 'Nº Anuncios'
+    cantidad_anuncios.admin_order_field = 'total_anuncios'
 
 # --- 2. ADMINISTRACIÓN DE ANUNCIOS (Con fotos y filtros) ---
 class AnuncioAdmin(admin.ModelAdmin):
@@ -20,36 +35,101 @@ class AnuncioAdmin(admin.ModelAdmin):
     # Filtros laterales
     list_filter = ('activo', 'estado', 'categoria', 'fecha_publicacion')
     
-    # Barra de búsqueda (busca por título, descripción o nombre del usuario)
+    # Barra de búsqueda: título y descripción con el índice full-text, o el usuario exacto (ver get_search_results)
     search_fields = ('titulo', 'descripcion', 'usuario__username', 'usuario__email')
+    search_help_text = 'Palabras del título o la descripción, o el nombre de usuario / correo completo del vendedor.'
+
+    # Usuario y categoría en la misma consulta; sin COUNT(*) de toda la tabla
+    list_select_related = ('usuario', 'categoria')
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     # Acciones masivas (para activar/desactivar varios a la vez)
-    actions = ['marcar_como_inactivo', 'marcar_como_activo']
+    actions = ['marcar_como_inactivo', 'marcar_como_activo', 'exportar_csv', 'exportar_jsonl']
 
     # --- Función para mostrar miniatura de la imagen ---
     def mostrar_imagen(self, obj):
         if obj.imagen_principal:
             # Renderiza HTML seguro para ver la imagen pequeña
-            return format_html('<img src="{}" width="50" height="50" style="object-fit:cover; border-radius:5px;" />', obj.imagen_principal.url)
+            # Miniatura de 160px (o la original si todavía no se generó)
+            return format_html('<img src="{}" width="50" height="50" style="object-fit:cover; border-radius:5px;" />', obj.miniaturas.chica)
         return "Sin imagen"
     mostrar_imagen.short_description = "Imagen"
 
+    def get_search_results(self, request, queryset, search_term):
+        # En lugar de icontains sobre la descripción (recorre toda la tabla), el índice full-text
+        termino = search_term.strip()
+        if not termino:
+            return queryset, False
+        coinciden = busqueda.filtrar_por_texto(Anuncio.objects.using(queryset.db), termino).values('pk')
+        vendedores = User.objects.using(queryset.db).filter(Q(username__iexact=termino) | Q(email__iexact=termino)).values('pk')
+        return queryset.filter(Q(pk__in=coinciden) | Q(usuario_id__in=vendedores)), False
+
     # --- Acciones personalizadas ---
+    # cambiar_activo (en vez de update) avisa a las facetas y demás tablas derivadas
     def marcar_como_inactivo(self, request, queryset):
-        queryset.update(activo=False)
+        queryset.cambiar_activo(False)
         self.message_user(request, "Los anuncios seleccionados ahora están INACTIVOS.")
     marcar_como_inactivo.short_description = "Pausar/Ocultar anuncios seleccionados"
 
     def marcar_como_activo(self, request, queryset):
-        queryset.update(activo=True)
+        queryset.cambiar_activo(True)
         self.message_user(request, "Los anuncios seleccionados ahora están ACTIVOS.")
     marcar_como_activo.short_description = "Activar anuncios seleccionados"
 
+    # --- Exportación (en streaming, mismo formato que la importación) ---
+    def _exportar(self, queryset, formato):
+        tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+        respuesta = StreamingHttpResponse(importacion.exportar_anuncios(queryset, formato), content_type=f'{tipo}; charset=utf-8')
+        respuesta['Content-Disposition'] = f'attachment; filename="anuncios.{formato}"'
+        return respuesta
+
+    def exportar_csv(self, request, queryset):
+        return self._exportar(queryset, 'csv')
+    exportar_csv.short_description = "Exportar seleccionados a CSV"
+
+    def exportar_jsonl(self, request, queryset):
+        return self._exportar(queryset, 'jsonl')
+    exportar_jsonl.short_description = "Exportar seleccionados a JSONL"
+
+    # --- Importación masiva (se procesa en la cola de tareas) ---
+    def get_urls(self):
+        propias = [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='Marketplace_App_anuncio_importar'),
+        ]
+        return propias + super().get_urls()
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            form = ImportarAnunciosForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = form.cleaned_data['archivo']
+                nombre = importacion.almacenamiento().save(archivo.name, archivo)
+                tareas.importar_anuncios.encolar(
+                    nombre, importacion.formato_por_nombre(nombre), form.cleaned_data['usuario'].pk,
+                    form.cleaned_data['tamano_lote'], request.user.pk,
+                )
+                self.message_user(request, "El archivo se está importando en segundo plano. Te avisaremos por correo al terminar.")
+                return redirect('admin:Marketplace_App_anuncio_changelist')
+        else:
+            form = ImportarAnunciosForm()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar anuncios',
+            'form': form,
+            'columnas': importacion.COLUMNAS,
+        }
+        return TemplateResponse(request, 'admin/Marketplace_App/anuncio/importar.html', context)
+
 # --- 3. ADMINISTRACIÓN DE PERFILES DE USUARIO ---
 class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'mostrar_telefono', 'rol', 'telefono_verificado', 'fecha_registro')
     list_filter = ('telefono_verificado', 'rol', 'fecha_registro')
     search_fields = ('usuario__username', 'usuario__email', 'telefono_contacto')
+    list_select_related = ('usuario',)
     
     def mostrar_telefono(self, obj):
         return obj.telefono_contacto if obj.telefono_contacto else "-"
@@ -60,14 +140,110 @@ class ReporteAdmin(admin.ModelAdmin):
     list_display = ('motivo', 'usuario_reportador', 'tipo_entidad_reportada', 'id_entidad', 'fecha_reporte')
     list_filter = ('tipo_entidad_reportada', 'fecha_reporte')
     search_fields = ('motivo', 'descripcion_reporte')
+    list_select_related = ('usuario_reportador',)
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     def id_entidad(self, obj):
         return f"{obj.tipo_entidad_reportada} #{obj.identificador_entidad_reportada}"
     id_entidad.short_description = "Entidad Reportada"
 
+# --- 4.1 COLA DE MODERACIÓN (reportes agregados por entidad) ---
+class EstadoColaFilter(admin.SimpleListFilter):
+    """Por defecto muestra sólo lo pendiente (la cola); "Todos" muestra también lo revisado."""
+    title = 'estado'
+    parameter_name = 'estado'
+
+    def lookups(self, request, model_admin):
+        return ResumenReportes.ESTADOS + [('TODOS', 'Todos')]
+
+    def value(self):
+        return super().value() or ResumenReportes.PENDIENTE
+
+    def choices(self, changelist):
+        for valor, titulo in self.lookup_choices:
+            yield {
+                'selected': self.value() == valor,
+                'query_string': changelist.get_query_string({self.parameter_name: valor}),
+                'display': titulo,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() == 'TODOS':
+            return queryset
+        return queryset.filter(estado=self.value())
+
+class ResumenReportesAdmin(admin.ModelAdmin):
+    # Ordenada por el índice de la cola: los reportados por más usuarios arriba
+    list_display = ('entidad', 'reportadores', 'reportadores_nuevos', 'cantidad', 'ultimo_reporte', 'estado', 'desactivado_automaticamente', 'ver_reportes')
+    list_filter = (EstadoColaFilter, 'tipo_entidad', 'desactivado_automaticamente')
+    actions = ['desactivar', 'descartar']
+    readonly_fields = [campo.name for campo in ResumenReportes._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def entidad(self, obj):
+        if obj.tipo_entidad == moderacion.ANUNCIO:
+            url = reverse('admin:Marketplace_App_anuncio_change', args=[obj.identificador_entidad])
+        else:
+            url = reverse('admin:auth_user_change', args=[obj.identificador_entidad])
+        return format_html('<a href="{}">{} #{}</a>', url, obj.get_tipo_entidad_display(), obj.identificador_entidad)
+    entidad.short_description = "Entidad"
+
+    def reportadores_nuevos(self, obj):
+        return obj.reportadores_nuevos
+    reportadores_nuevos.short_description = "Nuevos desde la revisión"
+
+    def ver_reportes(self, obj):
+        url = reverse('admin:Marketplace_App_reporte_changelist') + '?' + urlencode({
+            'tipo_entidad_reportada__exact': obj.tipo_entidad,
+            'identificador_entidad_reportada': obj.identificador_entidad,
+        })
+        return format_html('<a href="{}">Ver reportes</a>', url)
+    ver_reportes.short_description = "Reportes"
+
+    def desactivar(self, request, queryset):
+        for resumen in queryset:
+            moderacion.desactivar(resumen)
+        self.message_user(request, "Los anuncios seleccionados se ocultaron.")
+    desactivar.short_description = "Ocultar los anuncios reportados"
+
+    def descartar(self, request, queryset):
+        for resumen in queryset:
+            moderacion.descartar(resumen)
+        self.message_user(request, "Reportes descartados: los anuncios ocultos por reportes volvieron a publicarse.")
+    descartar.short_description = "Descartar reportes (y volver a publicar)"
+
+# --- 5. COLA DE TAREAS EN SEGUNDO PLANO ---
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'intentos', 'max_intentos', 'disponible_desde', 'trabajador', 'fecha_creacion')
+    list_filter = ('estado', 'nombre')
+    readonly_fields = [campo.name for campo in Tarea._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+class TareaFallidaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'intentos', 'fecha_creacion', 'fecha_fallo')
+    list_filter = ('nombre', 'fecha_fallo')
+    readonly_fields = [campo.name for campo in TareaFallida._meta.fields]
+    actions = ['reintentar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def reintentar(self, request, queryset):
+        cantidad = cola.reencolar(queryset)
+        self.message_user(request, f"{cantidad} tareas volvieron a la cola.")
+    reintentar.short_description = "Volver a encolar las tareas seleccionadas"
+
 # --- REGISTRO DE MODELOS ---
 admin.site.register(Categoria, CategoriaAdmin)
 admin.site.register(Anuncio, AnuncioAdmin)
 admin.site.register(PerfilUsuario, PerfilUsuarioAdmin)
 admin.site.register(Reporte, ReporteAdmin)
+admin.site.register(ResumenReportes, ResumenReportesAdmin)
+admin.site.register(Tarea, TareaAdmin)
+admin.site.register(TareaFallida, TareaFallidaAdmin)
 # admin.site.register(Comentario) # Descomenta si quieres moderar comentarios también
\ No newline at end of file
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class MarketplaceAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Marketplace_App'
+
+    def ready(self):
+        # Registra los receptores de señales (índice de búsqueda, etc.) y, a través
+        # de ellas, las tareas de la cola en segundo plano (tareas.py)
+        from Marketplace_App import signals  # noqa: F401
+        # Comprobaciones de `manage.py check --deploy` (ver checks.py)
+        from Marketplace_App import checks  # noqa: F401
+        # Las consultas SQL de cada request se cuentan para las métricas (ver metricas.py)
+        from Marketplace_App.metricas import instalar_medicion_consultas
+        instalar_medicion_consultas()
@@ -0,0 +1,211 @@
+"""
+Índice de búsqueda full-text para Anuncio.
+
+En SQLite se usa una tabla virtual FTS5 y en PostgreSQL una tabla con una
+columna tsvector e índice GIN. En ambos casos el texto se normaliza aquí
+(minúsculas, sin tildes y con un stemming liviano en español), así que el
+comportamiento es el mismo sin importar el motor. Si el índice no existe
+(otro motor o migración sin aplicar) se vuelve al filtro con icontains.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db import connections, router
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from Marketplace_App.models import Anuncio
+
+TABLA_INDICE = 'Marketplace_App_anuncio_busqueda'
+
+# Caché (por alias de base de datos) de si la tabla del índice existe
+_indice_disponible = {}
+
+# Sufijos que se recortan al hacer stemming, del más largo al más corto
+SUFIJOS = (
+    'amientos', 'imientos', 'aciones', 'uciones', 'amiento', 'imiento',
+    'idades', 'mente', 'acion', 'ucion', 'istas', 'ismos', 'ables', 'ibles',
+    'idad', 'ista', 'ismo', 'able', 'ible', 'osos', 'osas', 'oso', 'osa',
+    'es', 'os', 'as', 's', 'o', 'a', 'e',
+)
+LARGO_MINIMO_RAIZ = 3
+
+
+# --- 1. NORMALIZACIÓN DEL TEXTO ---
+def quitar_tildes(texto):
+    """Pasa a minúsculas y elimina tildes/diéresis (la ñ queda como n)."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=20000)
+def raiz(palabra):
+    """Stemming liviano en español: recorta el primer sufijo que deje una raíz válida."""
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def terminos(texto):
+    """Devuelve la lista de raíces normalizadas de ``texto``."""
+    return [raiz(palabra) for palabra in re.findall(r'[a-z0-9]+', quitar_tildes(texto or ''))]
+
+
+def texto_indexable(texto):
+    return ' '.join(terminos(texto))
+
+
+# --- 2. ESTRUCTURA DEL ÍNDICE ---
+def _soportado(connection):
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def indice_disponible(connection):
+    """Indica si la tabla del índice existe en ``connection`` (se consulta una sola vez)."""
+    if connection.alias not in _indice_disponible:
+        disponible = False
+        if _soportado(connection):
+            with connection.cursor() as cursor:
+                disponible = TABLA_INDICE in connection.introspection.table_names(cursor)
+        _indice_disponible[connection.alias] = disponible
+    return _indice_disponible[connection.alias]
+
+
+def crear_indice(connection):
+    """Crea la tabla del índice si el motor lo soporta. No la llena."""
+    if not _soportado(connection):
+        return False
+    tabla = connection.ops.quote_name(TABLA_INDICE)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabla} USING fts5("
+                f"titulo, descripcion, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        else:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabla} ("
+                f"anuncio_id bigint PRIMARY KEY, documento tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {connection.ops.quote_name(TABLA_INDICE + '_gin')} "
+                f"ON {tabla} USING gin (documento)"
+            )
+    _indice_disponible[connection.alias] = True
+    return True
+
+
+def eliminar_indice(connection):
+    if _soportado(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(TABLA_INDICE)}")
+    _indice_disponible[connection.alias] = False
+
+
+# --- 3. MANTENIMIENTO (altas, cambios y bajas) ---
+def _insertar(cursor, connection, filas):
+    """Inserta filas ``(id, titulo, descripcion)`` ya existentes en el índice (upsert)."""
+    tabla = connection.ops.quote_name(TABLA_INDICE)
+    if connection.vendor == 'sqlite':
+        ids = [(pk,) for pk, _, _ in filas]
+        cursor.executemany(f"DELETE FROM {tabla} WHERE rowid = %s", ids)
+        cursor.executemany(
+            f"INSERT INTO {tabla} (rowid, titulo, descripcion) VALUES (%s, %s, %s)",
+            [(pk, texto_indexable(titulo), texto_indexable(descripcion)) for pk, titulo, descripcion in filas],
+        )
+    else:
+        cursor.executemany(
+            f"INSERT INTO {tabla} (anuncio_id, documento) VALUES (%s, "
+            f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+            f"ON CONFLICT (anuncio_id) DO UPDATE SET documento = EXCLUDED.documento",
+            [(pk, texto_indexable(titulo), texto_indexable(descripcion)) for pk, titulo, descripcion in filas],
+        )
+
+
+def indexar_filas(filas, using='default'):
+    """Indexa (o reindexa) varias filas ``(id, titulo, descripcion)`` de una vez."""
+    connection = connections[using]
+    filas = list(filas)
+    if not filas or not indice_disponible(connection):
+        return
+    with connection.cursor() as cursor:
+        _insertar(cursor, connection, filas)
+
+
+def indexar_anuncio(anuncio, using=None):
+    using = using or router.db_for_write(type(anuncio), instance=anuncio)
+    indexar_filas([(anuncio.pk, anuncio.titulo, anuncio.descripcion)], using=using)
+
+
+def desindexar_anuncio(pk, using='default'):
+    connection = connections[using]
+    if not indice_disponible(connection):
+        return
+    tabla = connection.ops.quote_name(TABLA_INDICE)
+    columna = 'rowid' if connection.vendor == 'sqlite' else 'anuncio_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla} WHERE {columna} = %s", [pk])
+
+
+def reconstruir_indice(queryset, tamano_lote=1000):
+    """Borra el índice y lo vuelve a llenar desde ``queryset`` (en lotes). Devuelve cuántos indexó."""
+    connection = connections[queryset.db]
+    eliminar_indice(connection)
+    if not crear_indice(connection):
+        return 0
+    total = 0
+    lote = []
+    filas = queryset.order_by().values_list('pk', 'titulo', 'descripcion').iterator(chunk_size=tamano_lote)
+    with connection.cursor() as cursor:
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= tamano_lote:
+                _insertar(cursor, connection, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            _insertar(cursor, connection, lote)
+            total += len(lote)
+    return total
+
+
+# --- 4. CONSULTA ---
+def _consulta(connection, raices):
+    # Cada término se busca como prefijo (sirve para la búsqueda mientras se escribe)
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{r}"*' for r in raices)
+    return ' & '.join(f'{r}:*' for r in raices)
+
+
+def filtrar_por_texto(queryset, texto):
+    """
+    Filtra ``queryset`` de anuncios (o de tarjetas, que usan el mismo id) por
+    ``texto`` y lo anota con ``relevancia`` (menor es mejor, para ordenar de
+    forma ascendente). Sin índice disponible se usa el filtro icontains de
+    siempre y la relevancia es constante.
+    """
+    connection = connections[queryset.db]
+    raices = terminos(texto)
+    if not raices or not indice_disponible(connection):
+        coincide = Q(titulo__icontains=texto) | Q(descripcion__icontains=texto)
+        if queryset.model is not Anuncio:
+            # Tablas derivadas con el mismo id (TarjetaAnuncio): la descripción está en Anuncio
+            coincide = Q(pk__in=Anuncio.objects.filter(coincide).values('pk'))
+        return queryset.filter(coincide).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    consulta = _consulta(connection, raices)
+    tabla = connection.ops.quote_name(TABLA_INDICE)
+    tabla_anuncio = f"{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name('id')}"
+    if connection.vendor == 'sqlite':
+        coincidencias = f"SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s"
+        # El título pesa más que la descripción; bm25 es más negativo cuanto mejor
+        rango = f"SELECT bm25({tabla}, 10.0, 1.0) FROM {tabla} WHERE {tabla} MATCH %s AND rowid = {tabla_anuncio}"
+    else:
+        coincidencias = f"SELECT anuncio_id FROM {tabla} WHERE documento @@ to_tsquery('simple', %s)"
+        rango = f"SELECT -ts_rank(documento, to_tsquery('simple', %s)) FROM {tabla} WHERE anuncio_id = {tabla_anuncio}"
+
+    return queryset.filter(pk__in=RawSQL(coincidencias, [consulta])).annotate(
+        relevancia=RawSQL(rango, [consulta], output_field=FloatField())
+    )
@@ -0,0 +1,160 @@
+"""
+Caché de fragmentos renderizados (grilla del listado y cuerpo del detalle).
+
+La invalidación es por versiones: cada dependencia ("listado", "anuncio:5",
+"usuario:3", ...) tiene un número de versión en la caché que las señales
+incrementan al guardar/borrar. Las claves de la grilla incluyen la versión
+de su alcance; las entradas del detalle guardan las versiones con las que se
+generaron y se descartan si alguna cambió. Así un cambio sólo invalida lo
+que realmente depende de él. Las señales invalidan recién al confirmar la
+transacción: antes, otro request podría leer los datos viejos y cachearlos
+con la versión nueva. Las versiones las incrementan también otros
+procesos (el trabajador de la cola, al terminar las miniaturas), así que
+CACHE_VISTAS_ALIAS tiene que ser una caché compartida.
+
+Las funciones que empiezan con "a" son las versiones async de lectura (para
+las vistas async); usan la API async de la caché y no bloquean el event loop.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.safestring import mark_safe
+
+# Parámetros del GET que cambian el contenido de la grilla
+PARAMETROS_GRILLA = ('q', 'ubicacion', 'orden', 'tiempo', 'precio_min', 'precio_max', 'page', 'cursor')
+
+
+def _cache():
+    return caches[settings.CACHE_VISTAS_ALIAS]
+
+
+def _clave_version(nombre):
+    return f'version:{nombre}'
+
+
+def _version_inicial():
+    # Nunca se repite una versión ya usada aunque la clave haya sido desalojada
+    return time.time_ns()
+
+
+# --- 1. VERSIONES ---
+def versiones(*nombres):
+    """Devuelve ``{nombre: version}``, inicializando las que no existan."""
+    cache = _cache()
+    claves = {_clave_version(nombre): nombre for nombre in nombres}
+    encontradas = cache.get_many(list(claves))
+    faltantes = {clave: _version_inicial() for clave in claves if clave not in encontradas}
+    if faltantes:
+        cache.set_many(faltantes, timeout=None)
+        encontradas.update(faltantes)
+    return {claves[clave]: version for clave, version in encontradas.items()}
+
+
+async def aversiones(*nombres):
+    cache = _cache()
+    claves = {_clave_version(nombre): nombre for nombre in nombres}
+    encontradas = await cache.aget_many(list(claves))
+    faltantes = {clave: _version_inicial() for clave in claves if clave not in encontradas}
+    if faltantes:
+        await cache.aset_many(faltantes, timeout=None)
+        encontradas.update(faltantes)
+    return {claves[clave]: version for clave, version in encontradas.items()}
+
+
+def invalidar(*nombres):
+    """Incrementa la versión de cada dependencia (lo cacheado con la anterior deja de usarse)."""
+    cache = _cache()
+    for nombre in set(nombres):
+        try:
+            cache.incr(_clave_version(nombre))
+        except ValueError:
+            cache.set(_clave_version(nombre), _version_inicial(), timeout=None)
+
+
+def invalidar_al_confirmar(*nombres, using=None):
+    """invalidar() cuando se confirme la transacción en curso de ``using`` (o ya, si no hay ninguna)."""
+    transaction.on_commit(lambda: invalidar(*nombres), using=using)
+
+
+# --- 2. GRILLA DEL LISTADO ---
+def alcance_grilla(categoria_id=None):
+    return f'listado:categoria:{categoria_id}' if categoria_id else 'listado'
+
+
+def _clave_grilla(alcance, version, parametros, paginacion_cursor):
+    valores = [f'{nombre}={parametros.get(nombre, "")}' for nombre in PARAMETROS_GRILLA]
+    resumen = hashlib.md5('&'.join(valores).encode()).hexdigest()
+    return f'grilla:{alcance}:{version}:{int(paginacion_cursor)}:{resumen}'
+
+
+def clave_grilla(categoria, parametros, paginacion_cursor):
+    alcance = alcance_grilla(categoria.pk if categoria else None)
+    return _clave_grilla(alcance, versiones(alcance)[alcance], parametros, paginacion_cursor)
+
+
+async def aclave_grilla(categoria, parametros, paginacion_cursor):
+    alcance = alcance_grilla(categoria.pk if categoria else None)
+    return _clave_grilla(alcance, (await aversiones(alcance))[alcance], parametros, paginacion_cursor)
+
+
+def obtener_grilla(clave):
+    html = _cache().get(clave)
+    return mark_safe(html) if html is not None else None
+
+
+async def aobtener_grilla(clave):
+    html = await _cache().aget(clave)
+    return mark_safe(html) if html is not None else None
+
+
+def guardar_grilla(clave, html):
+    _cache().set(clave, str(html), timeout=settings.CACHE_VISTAS_TIMEOUT)
+
+
+async def aguardar_grilla(clave, html):
+    await _cache().aset(clave, str(html), timeout=settings.CACHE_VISTAS_TIMEOUT)
+
+
+# --- 3. DETALLE DE ANUNCIO ---
+def dependencias_detalle(anuncio):
+    return (f'anuncio:{anuncio.pk}', f'categoria:{anuncio.categoria_id}', f'usuario:{anuncio.usuario_id}')
+
+
+def obtener_detalle(pk):
+    """Devuelve ``(titulo, html, cantidad_comentarios)`` si hay una entrada vigente para el anuncio ``pk``."""
+    entrada = _cache().get(f'detalle:{pk}')
+    if entrada is None:
+        return None
+    if versiones(*entrada['dependencias']) != entrada['dependencias']:
+        return None
+    return entrada['titulo'], mark_safe(entrada['html']), entrada['comentarios']
+
+
+async def aobtener_detalle(pk):
+    entrada = await _cache().aget(f'detalle:{pk}')
+    if entrada is None:
+        return None
+    if await aversiones(*entrada['dependencias']) != entrada['dependencias']:
+        return None
+    return entrada['titulo'], mark_safe(entrada['html']), entrada['comentarios']
+
+
+def _entrada_detalle(anuncio, html, dependencias):
+    # La cantidad de comentarios evita leer el hilo cuando no hay ninguno
+    return {
+        'dependencias': dependencias, 'titulo': anuncio.titulo, 'html': str(html),
+        'comentarios': anuncio.cantidad_comentarios,
+    }
+
+
+def guardar_detalle(anuncio, html):
+    entrada = _entrada_detalle(anuncio, html, versiones(*dependencias_detalle(anuncio)))
+    _cache().set(f'detalle:{anuncio.pk}', entrada, timeout=settings.CACHE_VISTAS_TIMEOUT)
+
+
+async def aguardar_detalle(anuncio, html):
+    entrada = _entrada_detalle(anuncio, html, await aversiones(*dependencias_detalle(anuncio)))
+    await _cache().aset(f'detalle:{anuncio.pk}', entrada, timeout=settings.CACHE_VISTAS_TIMEOUT)
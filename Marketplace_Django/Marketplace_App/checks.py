@@ -0,0 +1,48 @@
+"""
+Comprobaciones de configuración para producción (``manage.py check --deploy``).
+
+Con LocMemCache cada proceso tiene su propia caché: en desarrollo, con un
+solo runserver, no se nota, pero con varios trabajadores lo que uno guarda
+los otros no lo ven.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Motores de sesión que leen de la caché SESSION_CACHE_ALIAS
+SESIONES_EN_CACHE = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def _es_local(alias):
+    return alias is not None and settings.CACHES.get(alias, {}).get('BACKEND') in settings.CACHES_LOCALES
+
+
+def _usos_de_cache():
+    """``(id, setting, alias, qué se rompe)`` de cada parte que guarda estado compartido en una caché."""
+    sesion = settings.SESSION_CACHE_ALIAS if settings.SESSION_ENGINE in SESIONES_EN_CACHE else None
+    return [
+        ('E001', 'SESSION_ENGINE', sesion, 'un proceso no ve el login, el segundo paso ni el logout de otro'),
+        ('E002', 'CODIGOS_CACHE', settings.CODIGOS_CACHE,
+         'un código creado en un proceso no existe en otro y cada uno cuenta sus propios intentos'),
+        ('E003', 'LIMITES_CACHE', settings.LIMITES_CACHE,
+         'cada proceso cuenta sus propios intentos y los límites se multiplican por la cantidad de procesos'),
+        ('E004', 'CACHE_VISTAS_ALIAS', settings.CACHE_VISTAS_ALIAS,
+         'las invalidaciones de otro proceso (como las del trabajador de la cola al generar miniaturas) no '
+         'llegan y las páginas quedan viejas hasta CACHE_VISTAS_TIMEOUT'),
+    ]
+
+
+@register(Tags.caches, deploy=True)
+def cache_compartida(app_configs, **kwargs):
+    errores = []
+    for codigo, nombre, alias, efecto in _usos_de_cache():
+        if _es_local(alias):
+            errores.append(Error(
+                f'{nombre} usa la caché "{alias}", que es local a cada proceso: {efecto}.',
+                hint='Configurar CACHE_BACKEND con una caché compartida (Redis, Memcached o, en un solo '
+                     'servidor, FileBasedCache).',
+                id=f'Marketplace_App.{codigo}',
+            ))
+    return errores
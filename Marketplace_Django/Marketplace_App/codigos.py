@@ -0,0 +1,184 @@
+"""
+Códigos de verificación de un solo uso, fuera de la sesión.
+
+Los usan el alta de cuenta (código por correo), la verificación del teléfono
+(por SMS) y el segundo paso al iniciar sesión (ver dos_pasos.py). Antes
+vivían en la sesión, así que pedir un código o equivocarse al escribirlo
+reescribía la fila de django_session.
+
+Cada código se identifica por propósito y dueño (el id del usuario) y se
+guarda sólo su HMAC, con vencimiento y un contador de intentos fallidos
+aparte (``incr`` de la caché, atómico). Se compara en tiempo constante y se
+borra al usarlo. Va a la caché CODIGOS_CACHE, que tiene que ser compartida
+entre procesos: en el camino normal no toca la base. Con una caché local a
+cada proceso (LocMemCache) un código creado en un proceso no existiría en
+otro y cada uno contaría sus propios intentos, así que ahí CODIGOS_CACHE es
+None y se usa siempre la tabla.
+
+Si la caché falla se usa la tabla CodigoVerificacion (una fila por propósito
+y dueño, con índice por vencimiento). Igual que en limites.py, cada operación
+usa la caché o, si no responde, la tabla: un código creado durante una caída
+no se encuentra cuando la caché vuelve, y hay que pedir otro. Las filas
+vencidas las borra el comando purgar_sesiones.
+"""
+import hashlib
+import logging
+import secrets
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from Marketplace_App.models import CodigoVerificacion
+
+logger = logging.getLogger(__name__)
+
+# Propósitos (claves de settings.CODIGOS)
+REGISTRO = 'registro'
+TELEFONO = 'telefono'
+DOS_PASOS = '2fa'
+
+# Resultados de validar()
+VALIDO = 'valido'
+INCORRECTO = 'incorrecto'
+VENCIDO = 'vencido'
+AGOTADO = 'agotado'
+
+
+def _reglas(proposito):
+    """``(segundos de vigencia, intentos fallidos permitidos)`` del propósito."""
+    return settings.CODIGOS[proposito]
+
+
+def _dueno(dueno):
+    # Sin ids de usuario en claro en las claves ni en la tabla
+    return hashlib.sha256(str(dueno).encode()).hexdigest()[:32]
+
+
+def _digesto(proposito, dueno, codigo):
+    return salted_hmac('Marketplace_App.codigos', f'{proposito}:{dueno}:{codigo}').hexdigest()
+
+
+# --- 1. ALMACENAMIENTO ---
+class _EnCache:
+    def __init__(self, cache):
+        self.cache = cache
+
+    @staticmethod
+    def _claves(proposito, dueno):
+        clave = f'codigo:{proposito}:{dueno}'
+        return clave, f'{clave}:intentos'
+
+    def guardar(self, proposito, dueno, digesto, vigencia):
+        clave, intentos = self._claves(proposito, dueno)
+        self.cache.set_many({clave: digesto, intentos: 0}, vigencia)
+
+    def leer(self, proposito, dueno):
+        """``(digesto, intentos)`` del código vigente, o ``None``."""
+        clave, intentos = self._claves(proposito, dueno)
+        valores = self.cache.get_many([clave, intentos])
+        if clave not in valores:
+            return None
+        return valores[clave], valores.get(intentos, 0)
+
+    def sumar_intento(self, proposito, dueno):
+        try:
+            return self.cache.incr(self._claves(proposito, dueno)[1])
+        except ValueError: # Venció entre la lectura y el incr
+            return None
+
+    def borrar(self, proposito, dueno):
+        self.cache.delete_many(self._claves(proposito, dueno))
+
+
+class _EnBase:
+    @staticmethod
+    def _fila(proposito, dueno):
+        return CodigoVerificacion.objects.filter(proposito=proposito, dueno=dueno)
+
+    def guardar(self, proposito, dueno, digesto, vigencia):
+        CodigoVerificacion.objects.update_or_create(proposito=proposito, dueno=dueno, defaults={
+            'digesto': digesto, 'expira': timezone.now() + timedelta(seconds=vigencia), 'intentos': 0,
+        })
+
+    def leer(self, proposito, dueno):
+        return self._fila(proposito, dueno).filter(expira__gt=timezone.now()).values_list('digesto', 'intentos').first()
+
+    def sumar_intento(self, proposito, dueno):
+        fila = self._fila(proposito, dueno)
+        fila.update(intentos=F('intentos') + 1)
+        return fila.values_list('intentos', flat=True).first()
+
+    def borrar(self, proposito, dueno):
+        self._fila(proposito, dueno).delete()
+
+
+en_base = _EnBase()
+
+
+def _con_respaldo(operacion):
+    if settings.CODIGOS_CACHE is None:
+        return operacion(en_base)
+    try:
+        return operacion(_EnCache(caches[settings.CODIGOS_CACHE]))
+    except Exception:
+        logger.warning('La caché de códigos no responde: se usa la tabla CodigoVerificacion.', exc_info=True)
+        return operacion(en_base)
+
+
+# --- 2. CÓDIGOS ---
+def generar(proposito, dueno):
+    """Crea un código de 6 dígitos para ``dueno`` (invalida el anterior) y lo devuelve para enviarlo."""
+    codigo = f'{secrets.randbelow(1000000):06d}'
+    dueno = _dueno(dueno)
+    digesto = _digesto(proposito, dueno, codigo)
+    vigencia, _ = _reglas(proposito)
+    _con_respaldo(lambda almacen: almacen.guardar(proposito, dueno, digesto, vigencia))
+    return codigo
+
+
+def _validar(almacen, proposito, dueno, codigo):
+    _, maximo = _reglas(proposito)
+    datos = almacen.leer(proposito, dueno)
+    if datos is None:
+        return VENCIDO
+    digesto, intentos = datos
+    if intentos >= maximo:
+        return AGOTADO
+    if constant_time_compare(_digesto(proposito, dueno, str(codigo).strip()), digesto):
+        almacen.borrar(proposito, dueno) # De un solo uso
+        return VALIDO
+    intentos = almacen.sumar_intento(proposito, dueno)
+    if intentos is None:
+        return VENCIDO
+    return AGOTADO if intentos >= maximo else INCORRECTO
+
+
+def validar(proposito, dueno, codigo):
+    """Compara ``codigo`` con el vigente de ``dueno``: VALIDO (y lo borra), INCORRECTO, VENCIDO o AGOTADO."""
+    dueno = _dueno(dueno)
+    return _con_respaldo(lambda almacen: _validar(almacen, proposito, dueno, codigo))
+
+
+def hay_vigente(proposito, dueno):
+    """True si ``dueno`` tiene un código sin vencer y con intentos disponibles."""
+    _, maximo = _reglas(proposito)
+    dueno = _dueno(dueno)
+    datos = _con_respaldo(lambda almacen: almacen.leer(proposito, dueno))
+    return datos is not None and datos[1] < maximo
+
+
+# La caché y la tabla de respaldo se usan de forma sync
+agenerar = sync_to_async(generar)
+avalidar = sync_to_async(validar)
+ahay_vigente = sync_to_async(hay_vigente)
+
+
+# --- 3. LIMPIEZA ---
+def vencidos():
+    """Filas de respaldo ya vencidas (las borra el comando purgar_sesiones)."""
+    return CodigoVerificacion.objects.filter(expira__lte=timezone.now())
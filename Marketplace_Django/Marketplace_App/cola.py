@@ -0,0 +1,236 @@
+"""
+Cola de tareas en segundo plano guardada en la base de datos (tabla Tarea).
+
+Las vistas y señales sólo insertan una fila con ``encolar()`` (en la misma
+transacción que el resto de sus cambios) y el comando ``procesar_tareas``
+la ejecuta después, fuera del request. Se pueden correr varios trabajadores
+a la vez: cada uno "toma" una tarea con un UPDATE condicional, así que dos
+procesos nunca ejecutan la misma. Si una tarea falla se reintenta con una
+espera exponencial; al agotar los intentos pasa a TareaFallida. Las tareas
+con una función por lote (``@funcion.por_lote``) que se toman juntas se
+ejecutan en una sola llamada, y cada una se reintenta por separado.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from Marketplace_App.models import Tarea, TareaFallida
+
+logger = logging.getLogger(__name__)
+
+# nombre -> (función, max_intentos)
+_registro = {}
+# nombre -> función que recibe una lista de (args, kwargs) y devuelve, por cada una, None o la excepción
+_por_lote = {}
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando: la tarea va directo a TareaFallida."""
+
+
+# --- 1. REGISTRO Y ENCOLADO ---
+def tarea(nombre, max_intentos=5):
+    """
+    Registra la función decorada como tarea. Se encola con ``funcion.encolar(...)``
+    o ``encolar(nombre, ...)`` (``await funcion.aencolar(...)`` desde una vista
+    async); los argumentos tienen que ser serializables a JSON.
+    """
+    def decorador(funcion):
+        _registro[nombre] = (funcion, max_intentos)
+        funcion.encolar = lambda *args, **kwargs: encolar(nombre, *args, **kwargs)
+        funcion.aencolar = lambda *args, **kwargs: aencolar(nombre, *args, **kwargs)
+
+        def por_lote(funcion_lote):
+            _por_lote[nombre] = funcion_lote
+            return funcion_lote
+
+        funcion.por_lote = por_lote
+        return funcion
+    return decorador
+
+
+def encolar(nombre, *args, **kwargs):
+    """Guarda la tarea ``nombre`` para que la ejecute un trabajador. Devuelve la fila creada."""
+    if nombre not in _registro:
+        raise KeyError(f'La tarea "{nombre}" no está registrada.')
+    _, max_intentos = _registro[nombre]
+    nueva = Tarea.objects.create(
+        nombre=nombre,
+        argumentos={'args': list(args), 'kwargs': kwargs},
+        max_intentos=max_intentos,
+        disponible_desde=timezone.now(),
+    )
+    if settings.TAREAS_INMEDIATAS:
+        # Modo desarrollo: se ejecuta al confirmar la transacción, sin trabajador aparte
+        transaction.on_commit(lambda: procesar_pendientes(limite=1, solo=[nueva.pk]))
+    return nueva
+
+
+async def aencolar(nombre, *args, **kwargs):
+    """Versión async de ``encolar``: el INSERT corre en el hilo de la base, sin bloquear el event loop."""
+    return await sync_to_async(encolar)(nombre, *args, **kwargs)
+
+
+# --- 2. TOMA Y EJECUCIÓN ---
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _disponibles(ahora):
+    # Pendientes ya vencidas, o "en curso" de un trabajador que murió sin terminarlas
+    return Tarea.objects.filter(
+        Q(estado=Tarea.PENDIENTE) | Q(estado=Tarea.EN_CURSO, bloqueada_hasta__lt=ahora),
+        disponible_desde__lte=ahora,
+    )
+
+
+def tomar(trabajador, limite=10, solo=None):
+    """Reserva hasta ``limite`` tareas para ``trabajador`` y las devuelve."""
+    ahora = timezone.now()
+    candidatas = _disponibles(ahora)
+    if solo is not None:
+        candidatas = candidatas.filter(pk__in=solo)
+    tomadas = []
+    for pk, intentos in candidatas.order_by('disponible_desde', 'id').values_list('pk', 'intentos')[:limite]:
+        # Sólo gana quien actualiza primero: el resto ve que cambió "intentos" y sigue
+        reservada = _disponibles(ahora).filter(pk=pk, intentos=intentos).update(
+            estado=Tarea.EN_CURSO,
+            intentos=F('intentos') + 1,
+            trabajador=trabajador,
+            bloqueada_hasta=ahora + timedelta(seconds=settings.TAREAS_TIEMPO_BLOQUEO),
+        )
+        if reservada:
+            tomadas.append(Tarea.objects.get(pk=pk))
+    return tomadas
+
+
+def espera_reintento(intentos):
+    """Segundos hasta el próximo intento: exponencial, con tope y algo de azar."""
+    espera = min(settings.TAREAS_ESPERA_BASE * 2 ** (intentos - 1), settings.TAREAS_ESPERA_MAXIMA)
+    return espera * random.uniform(0.5, 1.0)
+
+
+def _mover_a_fallidas(tarea_actual, error):
+    with transaction.atomic():
+        TareaFallida.objects.create(
+            nombre=tarea_actual.nombre,
+            argumentos=tarea_actual.argumentos,
+            intentos=tarea_actual.intentos,
+            error=error,
+            fecha_creacion=tarea_actual.fecha_creacion,
+        )
+        Tarea.objects.filter(pk=tarea_actual.pk).delete()
+
+
+def _registrar_fallo(tarea_actual, error, permanente=False):
+    if permanente or tarea_actual.intentos >= tarea_actual.max_intentos:
+        logger.error('Tarea %s descartada tras %s intentos', tarea_actual, tarea_actual.intentos)
+        _mover_a_fallidas(tarea_actual, error)
+        return
+    espera = espera_reintento(tarea_actual.intentos)
+    logger.warning('Tarea %s falló, se reintenta en %.0f s', tarea_actual, espera)
+    Tarea.objects.filter(pk=tarea_actual.pk, trabajador=tarea_actual.trabajador).update(
+        estado=Tarea.PENDIENTE,
+        disponible_desde=timezone.now() + timedelta(seconds=espera),
+        bloqueada_hasta=None,
+        ultimo_error=error,
+    )
+
+
+def ejecutar(tarea_actual):
+    """Ejecuta una tarea ya tomada. Devuelve True si terminó bien."""
+    funcion, _ = _registro.get(tarea_actual.nombre, (None, None))
+    if funcion is None:
+        _registrar_fallo(tarea_actual, f'La tarea "{tarea_actual.nombre}" no está registrada.', permanente=True)
+        return False
+    try:
+        funcion(*tarea_actual.argumentos.get('args', []), **tarea_actual.argumentos.get('kwargs', {}))
+    except Exception as error:
+        _registrar_fallo(tarea_actual, traceback.format_exc(), permanente=isinstance(error, ErrorPermanente))
+        return False
+    Tarea.objects.filter(pk=tarea_actual.pk, trabajador=tarea_actual.trabajador).delete()
+    return True
+
+
+def ejecutar_lote(tareas_lote):
+    """
+    Ejecuta en una sola llamada a su función por lote varias tareas ya tomadas
+    del mismo nombre. Devuelve ``(ejecutadas, fallidas)``.
+    """
+    funcion_lote = _por_lote[tareas_lote[0].nombre]
+    try:
+        errores = funcion_lote([
+            (tarea_actual.argumentos.get('args', []), tarea_actual.argumentos.get('kwargs', {}))
+            for tarea_actual in tareas_lote
+        ])
+    except Exception as error:
+        errores = [error] * len(tareas_lote)
+    terminadas = []
+    for tarea_actual, error in zip(tareas_lote, errores):
+        if error is None:
+            terminadas.append(tarea_actual.pk)
+        else:
+            detalle = ''.join(traceback.format_exception(error))
+            _registrar_fallo(tarea_actual, detalle, permanente=isinstance(error, ErrorPermanente))
+    Tarea.objects.filter(pk__in=terminadas, trabajador=tareas_lote[0].trabajador).delete()
+    return len(terminadas), len(tareas_lote) - len(terminadas)
+
+
+def _agrupar(tomadas):
+    """Las tomadas con función por lote, juntas por nombre; el resto, de a una."""
+    grupos = {}
+    for tarea_actual in tomadas:
+        clave = tarea_actual.nombre if tarea_actual.nombre in _por_lote else tarea_actual.pk
+        grupos.setdefault(clave, []).append(tarea_actual)
+    return grupos.values()
+
+
+def procesar_pendientes(trabajador=None, limite=None, solo=None):
+    """
+    Ejecuta tareas disponibles hasta que no quede ninguna (o hasta ``limite``).
+    Devuelve ``(ejecutadas, fallidas)``. Lo usan el comando y los tests.
+    """
+    trabajador = trabajador or nombre_trabajador()
+    ejecutadas = fallidas = 0
+    while limite is None or ejecutadas + fallidas < limite:
+        lote = 10 if limite is None else min(10, limite - ejecutadas - fallidas)
+        tomadas = tomar(trabajador, limite=lote, solo=solo)
+        if not tomadas:
+            break
+        for grupo in _agrupar(tomadas):
+            if len(grupo) > 1:
+                ok, error = ejecutar_lote(grupo)
+                ejecutadas += ok
+                fallidas += error
+            elif ejecutar(grupo[0]):
+                ejecutadas += 1
+            else:
+                fallidas += 1
+    return ejecutadas, fallidas
+
+
+def reencolar(fallidas):
+    """Vuelve a poner en la cola las ``fallidas`` (un queryset de TareaFallida), con intentos en cero."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        nuevas = [
+            Tarea(
+                nombre=fallida.nombre,
+                argumentos=fallida.argumentos,
+                max_intentos=_registro.get(fallida.nombre, (None, 5))[1],
+                disponible_desde=ahora,
+            )
+            for fallida in fallidas
+        ]
+        Tarea.objects.bulk_create(nuevas)
+        fallidas.delete()
+    return len(nuevas)
@@ -0,0 +1,57 @@
+"""
+Comentarios de los anuncios: el hilo paginado por cursor y el contador.
+
+El hilo se lee por el índice (anuncio, fecha_comentario, id) de a
+``POR_PAGINA``, con autor y perfil (avatar) en la misma consulta. La cantidad
+de comentarios se guarda en ``Anuncio.cantidad_comentarios`` (y en su
+tarjeta): cada alta o baja la suma desde signals.py, así ni el detalle ni la
+grilla hacen ``COUNT``. Anuncio.save() relee el contador antes de guardar,
+así que editar un anuncio cargado antes de un comentario nuevo no lo pisa.
+Si alguna vez se desfasa (cambios hechos a mano en la base), ``recalcular``
+lo arregla (comando recalcular_comentarios).
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from Marketplace_App.models import Anuncio, Comentario, TarjetaAnuncio
+from Marketplace_App.paginacion import apaginar_por_cursor, paginar_por_cursor
+
+ORDEN = 'comentarios' # Clave de paginacion.CLAVES_POR_ORDEN
+POR_PAGINA = 10
+
+
+# --- 1. HILO ---
+def hilo(anuncio_id):
+    return Comentario.objects.filter(anuncio_id=anuncio_id).select_related('usuario__perfil')
+
+
+def pagina(anuncio_id, cursor=None):
+    """Una ``PaginaCursor`` del hilo del anuncio (una sola consulta)."""
+    return paginar_por_cursor(hilo(anuncio_id), ORDEN, cursor, por_pagina=POR_PAGINA)
+
+
+async def apagina(anuncio_id, cursor=None):
+    return await apaginar_por_cursor(hilo(anuncio_id), ORDEN, cursor, por_pagina=POR_PAGINA)
+
+
+# --- 2. CONTADOR ---
+def sumar(anuncio_id, delta, using='default'):
+    """Suma ``delta`` a la cantidad de comentarios del anuncio (y de su tarjeta)."""
+    # Nunca por debajo de 0 (la columna es positiva), aunque el contador estuviera desfasado
+    filtro = {'pk': anuncio_id, 'cantidad_comentarios__gte': max(0, -delta)}
+    with transaction.atomic(using=using):
+        Anuncio.objects.using(using).filter(**filtro).update(cantidad_comentarios=F('cantidad_comentarios') + delta)
+        TarjetaAnuncio.objects.using(using).filter(**filtro).update(cantidad_comentarios=F('cantidad_comentarios') + delta)
+
+
+def recalcular(using='default'):
+    """Vuelve a contar los comentarios de todos los anuncios (una subconsulta por el índice del hilo)."""
+    conteo = Coalesce(Subquery(
+        Comentario.objects.using(using).filter(anuncio_id=OuterRef('pk')).order_by()
+        .values('anuncio_id').annotate(total=Count('id')).values('total')
+    ), Value(0))
+    with transaction.atomic(using=using):
+        total = Anuncio.objects.using(using).update(cantidad_comentarios=conteo)
+        TarjetaAnuncio.objects.using(using).update(cantidad_comentarios=conteo)
+    return total
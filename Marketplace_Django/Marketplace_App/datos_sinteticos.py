@@ -0,0 +1,320 @@
+"""
+Generador de datos de prueba con volúmenes y distribuciones realistas.
+
+Usuarios con perfil, categorías, anuncios, comentarios y reportes, insertados
+con bulk_create en lotes (memoria constante salvo los ids de anuncios, que se
+guardan en un array compacto para repartir comentarios y reportes). Con la
+misma semilla se generan exactamente los mismos datos.
+
+- Ubicación: distribución de Zipf (pocas ciudades concentran la mayoría).
+- Precio: log-normal alrededor de una mediana por categoría.
+- Antigüedad: exponencial (muchos anuncios recientes, cola larga de viejos).
+- Vendedores, comentarios y reportes: sesgo log-uniforme (pocos vendedores
+  publican muchos anuncios y pocos anuncios se llevan muchos comentarios).
+"""
+import math
+import random
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from Marketplace_App import comentarios, moderacion
+from Marketplace_App.models import Anuncio, Categoria, Comentario, PerfilUsuario, Reporte, TarjetaAnuncio
+
+# Categoría: (productos, marcas/variantes, precio mediano)
+CATEGORIAS = {
+    'Tecnología': (
+        ['Notebook', 'Celular', 'Tablet', 'Monitor', 'Auriculares', 'Teclado mecánico', 'Smart TV', 'Consola'],
+        ['Samsung', 'Lenovo', 'Apple', 'Motorola', 'Sony', 'LG', 'HP', 'Xiaomi'], 250000,
+    ),
+    'Vehículos': (
+        ['Auto', 'Moto', 'Camioneta', 'Bicicleta', 'Cuatriciclo', 'Scooter'],
+        ['Toyota', 'Ford', 'Fiat', 'Honda', 'Volkswagen', 'Chevrolet', 'Yamaha'], 4000000,
+    ),
+    'Inmuebles': (
+        ['Departamento', 'Casa', 'Terreno', 'Local comercial', 'Oficina', 'Cochera'],
+        ['1 ambiente', '2 ambientes', '3 ambientes', 'con patio', 'a estrenar', 'céntrico'], 6000000,
+    ),
+    'Hogar': (
+        ['Mesa', 'Sillón', 'Heladera', 'Lavarropas', 'Cama', 'Ropero', 'Escritorio', 'Microondas'],
+        ['Drean', 'Whirlpool', 'Gafa', 'Patrick', 'de roble', 'de pino', 'de algarrobo'], 120000,
+    ),
+    'Deportes': (
+        ['Pelota', 'Raqueta', 'Botines', 'Pesas', 'Carpa', 'Kayak', 'Cinta de correr'],
+        ['Nike', 'Adidas', 'Topper', 'Penalty', 'Head', 'Wilson'], 40000,
+    ),
+    'Moda': (
+        ['Campera', 'Zapatillas', 'Jean', 'Vestido', 'Cartera', 'Reloj', 'Anteojos de sol'],
+        ["Levi's", 'Nike', 'Adidas', 'Zara', 'Rip Curl', 'Vans'], 30000,
+    ),
+    'Servicios': (
+        ['Clases de inglés', 'Plomería', 'Electricista', 'Fletes', 'Diseño web', 'Jardinería', 'Pintura'],
+        ['a domicilio', 'con garantía', 'urgencias 24 h', 'presupuesto sin cargo'], 20000,
+    ),
+    'Juguetes': (
+        ['Lego', 'Muñeca', 'Rompecabezas', 'Autito a control remoto', 'Juego de mesa', 'Peluche'],
+        ['Mattel', 'Hasbro', 'Lego', 'Fisher-Price'], 15000,
+    ),
+    'Mascotas': (
+        ['Cucha', 'Transportadora', 'Rascador', 'Pecera', 'Correa', 'Comedero automático'],
+        ['para perro', 'para gato', 'grande', 'mediana', 'chica'], 18000,
+    ),
+    'Herramientas': (
+        ['Taladro', 'Amoladora', 'Sierra circular', 'Soldadora', 'Compresor', 'Caja de herramientas'],
+        ['Bosch', 'DeWalt', 'Black+Decker', 'Makita', 'Stanley'], 90000,
+    ),
+}
+
+UBICACIONES = [
+    'San Miguel de Tucumán', 'Buenos Aires', 'Córdoba', 'Rosario', 'Yerba Buena', 'Mendoza', 'La Plata',
+    'Mar del Plata', 'Salta', 'Tafí Viejo', 'San Juan', 'Neuquén', 'Santa Fe', 'Jujuy', 'Santiago del Estero',
+    'Corrientes', 'Posadas', 'Bahía Blanca', 'Paraná', 'Resistencia',
+]
+# Zipf con s = 1: la ciudad n tiene peso 1/n
+PESOS_UBICACION = [1 / rango for rango in range(1, len(UBICACIONES) + 1)]
+
+ESTADOS = ['NUEVO', 'USADO', 'REACONDICIONADO']
+PESOS_ESTADO = [30, 60, 10]
+DESCRIPCION_ESTADO = {'NUEVO': 'nuevo, sin uso', 'USADO': 'usado, en buen estado', 'REACONDICIONADO': 'reacondicionado'}
+
+FRASES = [
+    'Precio negociable.', 'Acepto permutas.', 'Envíos a todo el país.', 'Poco uso, sin detalles.',
+    'Incluye caja y accesorios.', 'Consultas por mensaje.', 'Entrega inmediata.', 'Factura a nombre del comprador.',
+    'Se puede ver y probar sin compromiso.', 'Único dueño.', 'No respondo ofertas ridículas.', 'Tengo más fotos.',
+]
+COMENTARIOS = [
+    '¿Sigue disponible?', '¿Hacés envíos?', '¿Cuál es el último precio?', '¿Aceptás permutas?',
+    'Me interesa, te escribo por privado.', '¿Tiene garantía?', '¿En qué zona estás?', 'Excelente vendedor, recomendado.',
+    '¿Tenés más fotos?', '¿Aceptás tarjeta?',
+]
+MOTIVOS_REPORTE = ['Estafa', 'Spam', 'Artículo prohibido', 'Precio engañoso', 'Contenido ofensivo', 'Publicación duplicada']
+
+ANTIGUEDAD_MEDIA_DIAS = 45
+ANTIGUEDAD_MAXIMA_DIAS = 730
+PRECIO_MAXIMO = 9999999 # max_digits=9, decimal_places=2
+CLAVE_USUARIOS = 'clave-sintetica'
+
+
+class Generador:
+    """Genera los datos con un ``random.Random`` propio (reproducible con ``semilla``)."""
+
+    def __init__(self, semilla=0, prefijo='sintetico', tamano_lote=2000, informar=None):
+        self.azar = random.Random(semilla)
+        self.prefijo = prefijo
+        self.tamano_lote = tamano_lote
+        self.informar = informar or (lambda mensaje: None)
+        self.ahora = timezone.now()
+
+    # --- Distribuciones ---
+    def ubicacion(self):
+        return self.azar.choices(UBICACIONES, PESOS_UBICACION)[0]
+
+    def precio(self, mediana):
+        precio = self.azar.lognormvariate(math.log(mediana), 0.6)
+        # Los precios altos van redondeados a la centena, como se publican en la realidad
+        return min(round(precio, 2 if precio < 1000 else -2), PRECIO_MAXIMO)
+
+    def antiguedad(self):
+        dias = min(self.azar.expovariate(1 / ANTIGUEDAD_MEDIA_DIAS), ANTIGUEDAD_MAXIMA_DIAS)
+        return timedelta(days=dias)
+
+    def indice_sesgado(self, cantidad):
+        # Índice en [0, cantidad) log-uniforme: el 1% de los primeros se lleva ~40% de los casos
+        return min(int(cantidad ** self.azar.random()) - 1, cantidad - 1)
+
+    def texto_anuncio(self, categoria, estado, ubicacion):
+        productos, variantes, _ = CATEGORIAS[categoria]
+        producto = self.azar.choice(productos)
+        titulo = f'{producto} {self.azar.choice(variantes)}'
+        if self.azar.random() < 0.3:
+            titulo += f' {self.azar.choice(["impecable", "como nuevo", "oportunidad", "liquido", "oferta"])}'
+        frases = self.azar.sample(FRASES, self.azar.randint(1, 4))
+        descripcion = ' '.join([f'{titulo}, {DESCRIPCION_ESTADO[estado]}.', f'Retiro en {ubicacion}.', *frases])
+        return titulo[:200], descripcion
+
+    # --- Inserción ---
+    def _en_lotes(self, cantidad, construir, guardar):
+        hechos = 0
+        while hechos < cantidad:
+            lote = [construir(hechos + i) for i in range(min(self.tamano_lote, cantidad - hechos))]
+            with transaction.atomic():
+                guardar(lote)
+            hechos += len(lote)
+            self.informar(f'  {hechos}/{cantidad}')
+
+    @staticmethod
+    def _fijar_fechas(modelo, objetos, campos):
+        # bulk_create pisa los auto_now_add con "ahora"; las fechas simuladas se escriben
+        # después con un UPDATE por fila en executemany (bulk_update arma un CASE enorme y es
+        # lo más lento de todo)
+        conexion = connections[router.db_for_write(modelo)]
+        campos = [modelo._meta.get_field(nombre) for nombre in campos]
+        asignaciones = ', '.join(f'{conexion.ops.quote_name(campo.column)} = %s' for campo in campos)
+        sql = (
+            f'UPDATE {conexion.ops.quote_name(modelo._meta.db_table)} SET {asignaciones} '
+            f'WHERE {conexion.ops.quote_name(modelo._meta.pk.column)} = %s'
+        )
+        filas = [
+            [campo.get_db_prep_save(getattr(objeto, campo.attname), conexion) for campo in campos] + [objeto.pk]
+            for objeto in objetos
+        ]
+        with conexion.cursor() as cursor:
+            cursor.executemany(sql, filas)
+
+    def categorias(self):
+        categorias = {}
+        for nombre in CATEGORIAS:
+            categoria, _ = Categoria.objects.get_or_create(slug=slugify(nombre), defaults={'nombre': nombre})
+            categorias[nombre] = categoria.pk
+        return categorias
+
+    def usuarios(self, cantidad):
+        """Crea ``cantidad`` usuarios con perfil (y un superusuario para el admin). Devuelve sus ids."""
+        clave = make_password(CLAVE_USUARIOS) # Un solo hash para todos: hashear es lo más lento
+        inicio = User.objects.filter(username__startswith=f'{self.prefijo}_').count()
+        ids = array('q')
+
+        if not User.objects.filter(username=f'{self.prefijo}_admin').exists():
+            User.objects.create(
+                username=f'{self.prefijo}_admin', email=f'{self.prefijo}_admin@example.com', password=clave,
+                is_staff=True, is_superuser=True,
+            )
+
+        def construir(i):
+            numero = inicio + i
+            return User(
+                username=f'{self.prefijo}_{numero:07d}', email=f'{self.prefijo}_{numero:07d}@example.com',
+                password=clave, first_name=f'Usuario {numero}',
+                date_joined=self.ahora - timedelta(days=self.azar.uniform(0, ANTIGUEDAD_MAXIMA_DIAS * 2)),
+            )
+
+        def guardar(lote):
+            creados = User.objects.bulk_create(lote)
+            ids.extend(usuario.pk for usuario in creados)
+            vendedor = [self.azar.random() < 0.3 for _ in creados]
+            PerfilUsuario.objects.bulk_create([
+                PerfilUsuario(
+                    usuario_id=usuario.pk,
+                    telefono_contacto=f'381-{self.azar.randint(4000000, 6999999)}',
+                    ubicacion_contacto=self.ubicacion(),
+                    telefono_verificado=es_vendedor,
+                    verificado=es_vendedor,
+                    rol='VENDEDOR' if es_vendedor else 'COMPRADOR',
+                )
+                for usuario, es_vendedor in zip(creados, vendedor)
+            ])
+
+        self.informar(f'Usuarios: {cantidad}')
+        self._en_lotes(cantidad, construir, guardar)
+        return ids
+
+    def anuncios(self, cantidad, usuarios, categorias):
+        """Crea ``cantidad`` anuncios repartidos entre ``usuarios``. Devuelve sus ids."""
+        nombres = list(categorias)
+        # El orden de los vendedores se mezcla para que los "grandes" no sean siempre los primeros ids
+        vendedores = array('q', usuarios)
+        self.azar.shuffle(vendedores)
+        ids = array('q')
+
+        def construir(i):
+            nombre = self.azar.choice(nombres)
+            estado = self.azar.choices(ESTADOS, PESOS_ESTADO)[0]
+            ubicacion = self.ubicacion()
+            titulo, descripcion = self.texto_anuncio(nombre, estado, ubicacion)
+            anuncio = Anuncio(
+                usuario_id=vendedores[self.indice_sesgado(len(vendedores))],
+                categoria_id=categorias[nombre],
+                titulo=titulo,
+                descripcion=descripcion,
+                precio=self.precio(CATEGORIAS[nombre][2]),
+                ubicacion=ubicacion,
+                estado=estado,
+                activo=self.azar.random() < 0.9,
+            )
+            anuncio._fecha = self.ahora - self.antiguedad()
+            return anuncio
+
+        def guardar(lote):
+            # crear_en_bloque mantiene índice de búsqueda, facetas y caché
+            creados = Anuncio.objects.crear_en_bloque(lote)
+            for anuncio in creados:
+                anuncio.fecha_publicacion = anuncio._fecha
+                anuncio.fecha_modificacion = anuncio._fecha
+                ids.append(anuncio.pk)
+            self._fijar_fechas(Anuncio, creados, ['fecha_publicacion', 'fecha_modificacion'])
+            # La tarjeta del listado se creó con la fecha de "ahora" (mismo id que el anuncio)
+            self._fijar_fechas(TarjetaAnuncio, [anuncio for anuncio in creados if anuncio.activo], ['fecha_publicacion'])
+
+        self.informar(f'Anuncios: {cantidad}')
+        self._en_lotes(cantidad, construir, guardar)
+        return ids
+
+    def comentarios(self, cantidad, usuarios, anuncios):
+        def construir(i):
+            comentario = Comentario(
+                anuncio_id=anuncios[self.indice_sesgado(len(anuncios))],
+                usuario_id=self.azar.choice(usuarios),
+                contenido=self.azar.choice(COMENTARIOS),
+            )
+            comentario._fecha = self.ahora - self.antiguedad() / 2
+            return comentario
+
+        def guardar(lote):
+            creados = Comentario.objects.bulk_create(lote)
+            for comentario in creados:
+                comentario.fecha_comentario = comentario._fecha
+            self._fijar_fechas(Comentario, creados, ['fecha_comentario'])
+
+        self.informar(f'Comentarios: {cantidad}')
+        self._en_lotes(cantidad, construir, guardar)
+        # bulk_create no envía post_save: el contador de cada anuncio se recuenta al final
+        comentarios.recalcular()
+
+    def reportes(self, cantidad, usuarios, anuncios):
+        def construir(i):
+            sobre_anuncio = self.azar.random() < 0.85
+            reporte = Reporte(
+                usuario_reportador_id=self.azar.choice(usuarios),
+                motivo=self.azar.choice(MOTIVOS_REPORTE),
+                descripcion_reporte='' if self.azar.random() < 0.6 else 'Reporte generado automáticamente.',
+                tipo_entidad_reportada='ANUNCIO' if sobre_anuncio else 'USUARIO',
+                # Los reportes se concentran en pocos anuncios/usuarios problemáticos
+                identificador_entidad_reportada=(
+                    anuncios[self.indice_sesgado(len(anuncios))] if sobre_anuncio
+                    else usuarios[self.indice_sesgado(len(usuarios))]
+                ),
+            )
+            reporte._fecha = self.ahora - self.antiguedad() / 3
+            return reporte
+
+        def guardar(lote):
+            creados = Reporte.objects.bulk_create(lote)
+            for reporte in creados:
+                reporte.fecha_reporte = reporte._fecha
+            self._fijar_fechas(Reporte, creados, ['fecha_reporte'])
+
+        self.informar(f'Reportes: {cantidad}')
+        self._en_lotes(cantidad, construir, guardar)
+        # bulk_create no envía post_save: la cola de moderación se arma al final
+        moderacion.recalcular()
+
+    def generar(self, usuarios=100, anuncios=1000, comentarios=0, reportes=0):
+        categorias = self.categorias()
+        ids_usuarios = self.usuarios(usuarios)
+        if not ids_usuarios:
+            ids_usuarios = array('q', User.objects.values_list('pk', flat=True))
+        ids_anuncios = self.anuncios(anuncios, ids_usuarios, categorias) if ids_usuarios else array('q')
+        if ids_anuncios:
+            self.comentarios(comentarios, ids_usuarios, ids_anuncios)
+            self.reportes(reportes, ids_usuarios, ids_anuncios)
+        return {
+            'usuarios': len(ids_usuarios),
+            'anuncios': len(ids_anuncios),
+            'comentarios': comentarios if ids_anuncios else 0,
+            'reportes': reportes if ids_anuncios else 0,
+        }
@@ -0,0 +1,142 @@
+"""
+Verificación en dos pasos al iniciar sesión (ver VerificacionDosPasosMiddleware).
+
+Después del usuario y contraseña se manda un código de 6 dígitos por correo.
+Mientras no lo ingrese, la sesión queda "pendiente" y el middleware sólo lo
+deja entrar a las rutas excluidas. La marca de verificado guarda el id del
+usuario, así no sirve para otra cuenta que inicie sesión con la misma sesión.
+El código no va en la sesión sino en codigos.py (uno por usuario): mandarlo
+o equivocarse al escribirlo no reescribe la sesión. Las cuentas sin correo
+(createsuperuser lo deja vacío) no entran sin el segundo paso: primero
+ingresan un correo, el código va ahí y el correo se guarda en la cuenta
+recién cuando el código es válido.
+Las funciones que empiezan con "a" son las versiones async (API async de la
+sesión y de la cola), para el middleware y las vistas async.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import User
+
+from Marketplace_App import codigos, tareas
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERIFICADO = '2fa_verificado'
+CLAVE_CORREO = '2fa_correo' # Correo a confirmar de una cuenta que no tenía
+
+# Resultados de validar()
+VALIDO = codigos.VALIDO
+INCORRECTO = codigos.INCORRECTO
+VENCIDO = codigos.VENCIDO
+AGOTADO = codigos.AGOTADO
+
+
+def _pendiente(usuario_id, verificado):
+    return usuario_id is not None and verificado != str(usuario_id)
+
+
+def pendiente(session):
+    """True si hay un usuario logueado en ``session`` que todavía no ingresó el código."""
+    return _pendiente(session.get(SESSION_KEY), session.get(CLAVE_VERIFICADO))
+
+
+async def apendiente(session):
+    return _pendiente(await session.aget(SESSION_KEY), await session.aget(CLAVE_VERIFICADO))
+
+
+def marcar_verificado(session):
+    session[CLAVE_VERIFICADO] = str(session[SESSION_KEY])
+
+
+async def amarcar_verificado(session):
+    await session.aset(CLAVE_VERIFICADO, str(await session.aget(SESSION_KEY)))
+
+
+def hay_codigo_vigente(session):
+    return codigos.hay_vigente(codigos.DOS_PASOS, session[SESSION_KEY])
+
+
+async def ahay_codigo_vigente(session):
+    return await codigos.ahay_vigente(codigos.DOS_PASOS, await session.aget(SESSION_KEY))
+
+
+def _correo(codigo):
+    """Argumentos de enviar_correo sin el destinatario."""
+    minutos = settings.CODIGOS[codigos.DOS_PASOS][0] // 60
+    return (
+        'Código de acceso - Marketplace',
+        f'Tu código para iniciar sesión es: {codigo}\n\nVence en {minutos} minutos. '
+        'Si no fuiste vos, cambiá tu contraseña.',
+    )
+
+
+def destinatario(session, usuario):
+    """El correo al que se manda el código: el de la cuenta o el que está por confirmar (o None)."""
+    return usuario.email or session.get(CLAVE_CORREO)
+
+
+async def adestinatario(session, usuario):
+    return usuario.email or await session.aget(CLAVE_CORREO)
+
+
+def enviar_codigo(session, usuario):
+    """Genera un código nuevo (invalida el anterior) y lo manda por correo en segundo plano."""
+    asunto, mensaje = _correo(codigos.generar(codigos.DOS_PASOS, usuario.pk))
+    tareas.enviar_correo.encolar(asunto, mensaje, [destinatario(session, usuario)])
+
+
+async def aenviar_codigo(session, usuario):
+    asunto, mensaje = _correo(await codigos.agenerar(codigos.DOS_PASOS, usuario.pk))
+    await tareas.enviar_correo.aencolar(asunto, mensaje, [await adestinatario(session, usuario)])
+
+
+def pedir_correo(session, usuario, correo):
+    """Para una cuenta sin correo: manda el código a ``correo``, que se guarda al validarlo.
+    Devuelve False (sin mandar nada) si ``correo`` ya es de otra cuenta."""
+    if User.objects.filter(email=correo).exists():
+        return False
+    session[CLAVE_CORREO] = correo
+    enviar_codigo(session, usuario)
+    return True
+
+
+async def apedir_correo(session, usuario, correo):
+    if await User.objects.filter(email=correo).aexists():
+        return False
+    await session.aset(CLAVE_CORREO, correo)
+    await aenviar_codigo(session, usuario)
+    return True
+
+
+def _confirmar_correo(usuario, correo):
+    """Guarda en la cuenta el correo que recibió el código. Devuelve True si hay que guardar el usuario."""
+    if usuario.email or not correo:
+        return False
+    logger.info('El usuario %s confirmó el correo %s en el segundo paso.', usuario.get_username(), correo)
+    usuario.email = correo
+    return True
+
+
+def validar(session, usuario, codigo):
+    """Si ``codigo`` es válido verifica la sesión; si venció o se agotaron los intentos manda otro."""
+    resultado = codigos.validar(codigos.DOS_PASOS, session[SESSION_KEY], codigo)
+    if resultado == VALIDO:
+        if _confirmar_correo(usuario, session.pop(CLAVE_CORREO, None)):
+            usuario.save(update_fields=['email'])
+        marcar_verificado(session)
+    elif resultado != INCORRECTO:
+        enviar_codigo(session, usuario)
+    return resultado
+
+
+async def avalidar(session, usuario, codigo):
+    resultado = await codigos.avalidar(codigos.DOS_PASOS, await session.aget(SESSION_KEY), codigo)
+    if resultado == VALIDO:
+        if _confirmar_correo(usuario, await session.apop(CLAVE_CORREO, None)):
+            await usuario.asave(update_fields=['email'])
+        await amarcar_verificado(session)
+    elif resultado != INCORRECTO:
+        await aenviar_codigo(session, usuario)
+    return resultado
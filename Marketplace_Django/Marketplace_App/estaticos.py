@@ -0,0 +1,184 @@
+"""
+Archivos estáticos: nombres con hash, versiones comprimidas y servidor propio.
+
+``collectstatic`` con AlmacenamientoEstaticos (STORAGES['staticfiles']) copia
+los archivos a STATIC_ROOT con el hash del contenido en el nombre
+(``base.3f2a1b9c0d4e.js``, como ManifestStaticFilesStorage) y deja al lado
+de cada archivo comprimible una versión ``.gz``: la compresión se paga una
+vez, al publicar.
+``{% static %}`` devuelve el nombre con hash, que cambia con el contenido, así
+que el navegador lo puede guardar para siempre sin volver a preguntar.
+
+EstaticosMiddleware sirve STATIC_ROOT sin un proxy delante. El índice de
+archivos se arma una vez al arrancar (sin ``stat()`` por request); cada
+request elige la versión según Accept-Encoding, responde 304 si el navegador
+ya la tiene y manda ``immutable`` por un año a los archivos con hash.
+Después de cada ``collectstatic`` hay que reiniciar el servidor.
+"""
+import gzip
+import mimetypes
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+COMPRIMIBLES = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot',
+)
+MINIMO_COMPRIMIR = 256 # Bytes: por debajo, los encabezados pesan más que lo ahorrado
+
+# Codificación -> extensión del archivo precomprimido, en orden de preferencia
+CODIFICACIONES = (('gzip', '.gz'),)
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+
+# --- 1. COLLECTSTATIC ---
+def comprimir(contenido):
+    """``{codificación: bytes}`` con las versiones que ahorran al menos un 5 %."""
+    versiones = {'gzip': gzip.compress(contenido, compresslevel=9, mtime=0)} # mtime fijo: mismo archivo, mismos bytes
+    return {codificacion: datos for codificacion, datos in versiones.items() if len(datos) < len(contenido) * 0.95}
+
+
+class AlmacenamientoEstaticos(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Los originales y sus copias con hash (las que se sirven)
+        for nombre in set(paths) | set(self.hashed_files.values()):
+            if nombre.endswith(COMPRIMIBLES) and self.exists(nombre):
+                self._comprimir(nombre)
+
+    def _comprimir(self, nombre):
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        versiones = comprimir(contenido) if len(contenido) >= MINIMO_COMPRIMIR else {}
+        for codificacion, extension in CODIFICACIONES:
+            if codificacion in versiones:
+                with open(ruta + extension, 'wb') as archivo:
+                    archivo.write(versiones[codificacion])
+            elif os.path.exists(ruta + extension): # De un collectstatic anterior
+                os.remove(ruta + extension)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Sin collectstatic (desarrollo, tests) no hay manifiesto: la URL sin hash.
+            # En producción un archivo que falta tiene que fallar, no servirse sin cache.
+            if settings.ESTATICOS_MANIFIESTO_ESTRICTO:
+                raise
+            return name
+
+
+# --- 2. ÍNDICE ---
+Archivo = namedtuple('Archivo', ['ruta', 'tamano', 'tipo', 'etag', 'modificado', 'cache', 'variantes'])
+
+
+def indexar(raiz, prefijo, con_hash, max_age):
+    """
+    URL -> Archivo de todo lo que hay en ``raiz``. ``con_hash`` son los nombres
+    con hash del manifiesto (cache inmutable); el resto se cachea ``max_age`` segundos.
+    """
+    indice = {}
+    for directorio, _, nombres in os.walk(raiz):
+        presentes = set(nombres)
+        for nombre in nombres:
+            if any(nombre.endswith(extension) and nombre[:-len(extension)] in presentes for _, extension in CODIFICACIONES):
+                continue # Versión comprimida: va como variante de su original
+            ruta = os.path.join(directorio, nombre)
+            relativo = os.path.relpath(ruta, raiz).replace(os.sep, '/')
+            estado = os.stat(ruta)
+            tipo, _ = mimetypes.guess_type(nombre)
+            if tipo is None:
+                tipo = 'application/octet-stream'
+            elif tipo.startswith('text/') or tipo in ('application/javascript', 'application/json', 'image/svg+xml'):
+                tipo += '; charset=utf-8'
+            variantes = {
+                codificacion: (ruta + extension, os.path.getsize(ruta + extension))
+                for codificacion, extension in CODIFICACIONES if nombre + extension in presentes
+            }
+            indice[prefijo + relativo] = Archivo(
+                ruta=ruta,
+                tamano=estado.st_size,
+                tipo=tipo,
+                etag=f'{estado.st_size:x}-{int(estado.st_mtime):x}',
+                modificado=int(estado.st_mtime),
+                cache=CACHE_INMUTABLE if relativo in con_hash else f'public, max-age={max_age}',
+                variantes=variantes,
+            )
+    return indice
+
+
+def codificaciones_aceptadas(cabecera):
+    """Las codificaciones de Accept-Encoding con q > 0 (``*`` acepta las que no se rechazan)."""
+    aceptadas, rechazadas = set(), set()
+    for parte in cabecera.split(','):
+        nombre, _, parametros = parte.partition(';')
+        nombre = nombre.strip().lower()
+        parametros = parametros.strip().replace(' ', '')
+        try:
+            calidad = float(parametros[2:]) if parametros.startswith('q=') else 1
+        except ValueError:
+            calidad = 0
+        (aceptadas if calidad > 0 else rechazadas).add(nombre)
+    if '*' in aceptadas:
+        aceptadas.update(codificacion for codificacion, _ in CODIFICACIONES)
+    return aceptadas - rechazadas
+
+
+# --- 3. RESPUESTA ---
+def _no_modificado(request, etag, modificado):
+    si_no_coincide = request.META.get('HTTP_IF_NONE_MATCH')
+    if si_no_coincide is not None:
+        # El ETag manda: If-Modified-Since se ignora
+        etiquetas = {etiqueta.strip().removeprefix('W/') for etiqueta in si_no_coincide.split(',')}
+        return '*' in etiquetas or etag in etiquetas
+    desde = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return desde is not None and modificado <= desde
+
+
+def servir(request, archivo, en_memoria=False):
+    """
+    La respuesta para ``archivo``: la mejor versión aceptada, o 304. Con
+    ``en_memoria`` lee el archivo en vez de mandarlo por partes (vistas async:
+    un FileResponse se iteraría de forma sync).
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+    ruta, tamano, codificacion, etag = archivo.ruta, archivo.tamano, None, archivo.etag
+    if archivo.variantes:
+        aceptadas = codificaciones_aceptadas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for candidata, _ in CODIFICACIONES:
+            if candidata in archivo.variantes and candidata in aceptadas:
+                codificacion = candidata
+                ruta, tamano = archivo.variantes[candidata]
+                etag = f'{archivo.etag}-{candidata}'
+                break
+    etag = f'"{etag}"'
+
+    encabezados = {'ETag': etag, 'Cache-Control': archivo.cache, 'Last-Modified': http_date(archivo.modificado)}
+    if archivo.variantes:
+        encabezados['Vary'] = 'Accept-Encoding'
+    if _no_modificado(request, etag, archivo.modificado):
+        return HttpResponseNotModified(headers=encabezados)
+
+    if codificacion:
+        encabezados['Content-Encoding'] = codificacion
+    if request.method == 'HEAD':
+        respuesta = HttpResponse(content_type=archivo.tipo, headers=encabezados)
+    elif en_memoria:
+        with open(ruta, 'rb') as contenido:
+            respuesta = HttpResponse(contenido.read(), content_type=archivo.tipo, headers=encabezados)
+    else:
+        # Con el file_wrapper del servidor WSGI (sendfile) el archivo no pasa por Python
+        respuesta = FileResponse(open(ruta, 'rb'), content_type=archivo.tipo, headers=encabezados)
+        del respuesta['Content-Disposition']
+    respuesta['Content-Length'] = str(tamano)
+    return respuesta
@@ -0,0 +1,116 @@
+"""
+Conteos de anuncios activos por categoría y por ubicación (tabla FacetaAnuncios).
+
+Cada alta, edición, baja o cambio de ``activo`` de un Anuncio se traduce en
+deltas de +1/-1 sobre las filas afectadas, así la barra lateral de home() se
+arma leyendo sólo esta tabla y la de categorías.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from Marketplace_App.models import Anuncio, Categoria, FacetaAnuncios
+
+CATEGORIA = 'CATEGORIA'
+UBICACION = 'UBICACION'
+
+
+def estado(activo, categoria_id, ubicacion):
+    """Estado de un anuncio que importa a las facetas (``None`` si no suma en ninguna)."""
+    if not activo:
+        return None
+    return (categoria_id, ubicacion)
+
+
+def _claves(estado_anuncio):
+    categoria_id, ubicacion = estado_anuncio
+    return [(CATEGORIA, str(categoria_id)), (UBICACION, ubicacion)]
+
+
+def deltas_por_cambio(anterior, nuevo):
+    """Diferencias por faceta al pasar del estado ``anterior`` al ``nuevo``."""
+    deltas = Counter()
+    if anterior is not None:
+        for clave in _claves(anterior):
+            deltas[clave] -= 1
+    if nuevo is not None:
+        for clave in _claves(nuevo):
+            deltas[clave] += 1
+    return deltas
+
+
+def aplicar_deltas(deltas, using='default'):
+    """Suma los ``deltas`` a la tabla de facetas (creando/borrando filas según haga falta)."""
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    facetas = FacetaAnuncios.objects.using(using)
+    with transaction.atomic(using=using):
+        for (tipo, valor), delta in deltas.items():
+            actualizadas = facetas.filter(tipo=tipo, valor=valor).update(cantidad=F('cantidad') + delta)
+            if not actualizadas and delta > 0:
+                faceta, creada = facetas.get_or_create(tipo=tipo, valor=valor, defaults={'cantidad': delta})
+                if not creada:
+                    facetas.filter(pk=faceta.pk).update(cantidad=F('cantidad') + delta)
+            elif delta < 0:
+                # Una faceta vacía no se muestra: se borra la fila
+                facetas.filter(tipo=tipo, valor=valor, cantidad__lte=0).delete()
+
+
+def deltas_por_activacion(pks, activo, using='default'):
+    """Deltas de un cambio de ``activo`` en bloque (todos los ``pks`` pasaron al valor ``activo``)."""
+    signo = 1 if activo else -1
+    grupos = (
+        Anuncio.objects.using(using).filter(pk__in=pks)
+        .values('categoria_id', 'ubicacion').annotate(total=Count('id')).order_by()
+    )
+    deltas = Counter()
+    for grupo in grupos:
+        for clave in _claves((grupo['categoria_id'], grupo['ubicacion'])):
+            deltas[clave] += signo * grupo['total']
+    return deltas
+
+
+def recalcular(using='default'):
+    """Reconstruye toda la tabla de facetas a partir de los anuncios activos."""
+    activos = Anuncio.objects.using(using).filter(activo=True).order_by()
+    filas = [
+        FacetaAnuncios(tipo=CATEGORIA, valor=str(fila['categoria_id']), cantidad=fila['total'])
+        for fila in activos.values('categoria_id').annotate(total=Count('id'))
+    ] + [
+        FacetaAnuncios(tipo=UBICACION, valor=fila['ubicacion'], cantidad=fila['total'])
+        for fila in activos.values('ubicacion').annotate(total=Count('id'))
+    ]
+    with transaction.atomic(using=using):
+        FacetaAnuncios.objects.using(using).all().delete()
+        FacetaAnuncios.objects.using(using).bulk_create(filas, batch_size=500)
+    return len(filas)
+
+
+def _armar_barra_lateral(facetas, categorias):
+    conteos_categoria = {}
+    ubicaciones = []
+    for faceta in facetas:
+        if faceta.tipo == CATEGORIA:
+            conteos_categoria[faceta.valor] = faceta.cantidad
+        elif faceta.cantidad > 0:
+            ubicaciones.append(faceta)
+
+    for categoria in categorias:
+        categoria.cantidad = conteos_categoria.get(str(categoria.pk), 0)
+    return categorias, ubicaciones
+
+
+def barra_lateral():
+    """
+    Devuelve ``(categorias, ubicaciones)`` para la barra lateral: todas las
+    categorías con su atributo ``cantidad`` y las ubicaciones con anuncios.
+    """
+    return _armar_barra_lateral(FacetaAnuncios.objects.order_by('tipo', 'valor'), list(Categoria.objects.all()))
+
+
+async def abarra_lateral():
+    """Versión async de ``barra_lateral``."""
+    facetas = [faceta async for faceta in FacetaAnuncios.objects.order_by('tipo', 'valor')]
+    return _armar_barra_lateral(facetas, [categoria async for categoria in Categoria.objects.all()])
@@ -0,0 +1,71 @@
+"""
+Filtros y ordenamientos del listado público de anuncios.
+
+``home()`` y el resto de las vistas que listan anuncios usan esta misma
+función, así todas producen exactamente las mismas consultas (y los índices
+de ``Anuncio.Meta`` se diseñan en base a ellas).
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from Marketplace_App.busqueda import filtrar_por_texto
+
+# Orden de cada opción del listado (el id desempata y coincide con los índices)
+ORDENAMIENTOS = {
+    'precio_asc': ('precio', 'id'),
+    'precio_desc': ('-precio', '-id'),
+}
+ORDEN_POR_DEFECTO = ('-fecha_publicacion', '-id')
+ORDEN_RELEVANCIA = ('relevancia', '-fecha_publicacion', '-id')
+
+# Ventanas del filtro "Fecha de publicación"
+VENTANAS_TIEMPO = {
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+
+def leer_precio(texto):
+    """``'1500'`` o ``'1500,50'`` -> ``Decimal``; ``None`` si viene vacío o no es un precio válido."""
+    try:
+        precio = Decimal((texto or '').strip().replace(',', '.'))
+    except InvalidOperation:
+        return None
+    return precio if precio.is_finite() and precio >= 0 else None
+
+
+def filtrar_anuncios(queryset, categoria=None, ubicacion=None, busqueda=None, orden=None, tiempo=None,
+                     precio_min=None, precio_max=None):
+    """Aplica a ``queryset`` los filtros y el orden del listado público."""
+    if categoria:
+        queryset = queryset.filter(categoria=categoria)
+
+    if ubicacion:
+        queryset = queryset.filter(ubicacion=ubicacion)
+
+    # Rango de precios (ambos extremos incluidos)
+    if precio_min is not None:
+        queryset = queryset.filter(precio__gte=precio_min)
+    if precio_max is not None:
+        queryset = queryset.filter(precio__lte=precio_max)
+
+    if busqueda:
+        # Índice full-text (con fallback a icontains si no existe)
+        queryset = filtrar_por_texto(queryset, busqueda)
+
+    if orden in ORDENAMIENTOS:
+        queryset = queryset.order_by(*ORDENAMIENTOS[orden])
+    elif busqueda:
+        # Sin orden explícito, los resultados de búsqueda van por relevancia
+        queryset = queryset.order_by(*ORDEN_RELEVANCIA)
+    else:
+        queryset = queryset.order_by(*ORDEN_POR_DEFECTO)
+
+    if tiempo in VENTANAS_TIEMPO:
+        # Filtramos los que sean MAYORES o IGUALES a la fecha límite
+        queryset = queryset.filter(fecha_publicacion__gte=timezone.now() - VENTANAS_TIEMPO[tiempo])
+
+    return queryset
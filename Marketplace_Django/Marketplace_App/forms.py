@@ -1,5 +1,7 @@
 from django import forms
-from .models import Anuncio, PerfilUsuario, Reporte
+from django.contrib.auth.models import User
+from django.core.validators import FileExtensionValidator
+from .models import Anuncio, Comentario, PerfilUsuario, Reporte
 
 class ContactForm(forms.Form):
     name = forms.CharField(label='Nombre', max_length=100)
@@ -12,6 +14,10 @@ class RegisterForm(forms.Form):
     password = forms.CharField(label='Contraseña', widget=forms.PasswordInput)
     password2 = forms.CharField(label='Repetir Contraseña', widget=forms.PasswordInput)
 
+# Correo para recibir el código del segundo paso (cuentas creadas sin correo)
+class CorreoForm(forms.Form):
+    email = forms.EmailField(label='Correo Electrónico')
+
 # --- NUEVO FORMULARIO: AnuncioForm ---
 class AnuncioForm(forms.ModelForm):
     class Meta:
@@ -59,4 +65,29 @@ class ReporteForm(forms.ModelForm):
         widgets = {
             'motivo': forms.TextInput(attrs={'placeholder': 'Ej: Estafa, Artículo prohibido, Spam...'}),
             'descripcion_reporte': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Explica brevemente por qué reportas este anuncio.'}),
-        }
\ No newline at end of file
+        }
+
+class ComentarioForm(forms.ModelForm):
+    class Meta:
+        model = Comentario
+        fields = ['contenido']
+        labels = {'contenido': 'Tu comentario'}
+        widgets = {
+            'contenido': forms.Textarea(attrs={'rows': 2, 'maxlength': 255, 'placeholder': 'Pregúntale algo al vendedor...'}),
+        }
+
+# --- Importación masiva de anuncios (admin) ---
+class ImportarAnunciosForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo (.csv o .jsonl)',
+        validators=[FileExtensionValidator(['csv', 'jsonl', 'ndjson'])],
+    )
+    usuario = forms.CharField(label='Usuario vendedor', max_length=150)
+    tamano_lote = forms.IntegerField(label='Filas por lote', initial=1000, min_value=1, max_value=10000)
+
+    def clean_usuario(self):
+        try:
+            return User.objects.get(username=self.cleaned_data['usuario'])
+        except User.DoesNotExist:
+            raise forms.ValidationError('No existe un usuario con ese nombre.')
+
@@ -0,0 +1,183 @@
+"""
+Importación y exportación masiva de anuncios en CSV o JSONL (un objeto JSON por línea).
+
+Todo se procesa en streaming: el archivo se lee de a una fila, las filas
+válidas se juntan en lotes de tamaño fijo que se insertan con bulk_create
+(cada lote en su transacción) y de los errores sólo se guardan los primeros
+en memoria. Así un archivo de millones de filas usa siempre la misma memoria.
+Las filas se validan con las reglas de AnuncioForm y las del modelo
+(full_clean) y la categoría se indica por su slug. El exportador produce exactamente el mismo formato.
+"""
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from Marketplace_App.forms import AnuncioForm
+from Marketplace_App.models import Anuncio, Categoria
+
+COLUMNAS = ('titulo', 'descripcion', 'precio', 'ubicacion', 'estado', 'categoria')
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 1000
+MAX_ERRORES_EN_MEMORIA = 100
+
+
+class ErrorDeArchivo(Exception):
+    """El archivo no se puede importar (formato desconocido, faltan columnas, ...)."""
+
+
+# Los campos de AnuncioForm que trae el archivo (la categoría va aparte, por slug).
+# Se usan directamente, sin crear un formulario por fila: instanciar el form copia
+# (deepcopy) todos sus campos y era lo más caro de la importación.
+CAMPOS_FORM = {
+    nombre: campo for nombre, campo in AnuncioForm.base_fields.items()
+    if nombre in COLUMNAS and nombre != 'categoria'
+}
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.creados = 0
+        self.con_error = 0
+        self.errores = [] # Primeros (línea, mensaje); el resto va sólo al reporte
+
+    def registrar_error(self, linea, mensaje):
+        self.con_error += 1
+        if len(self.errores) < MAX_ERRORES_EN_MEMORIA:
+            self.errores.append((linea, mensaje))
+
+
+def almacenamiento():
+    """Dónde quedan los archivos subidos desde el admin hasta que los procesa la cola (fuera de MEDIA_ROOT)."""
+    return FileSystemStorage(location=settings.IMPORTACIONES_ROOT)
+
+
+def formato_por_nombre(nombre):
+    extension = os.path.splitext(nombre)[1].lower().lstrip('.')
+    formato = 'jsonl' if extension in ('jsonl', 'ndjson') else extension
+    if formato not in FORMATOS:
+        raise ErrorDeArchivo(f'Formato no soportado: "{extension}" (se acepta {", ".join(FORMATOS)}).')
+    return formato
+
+
+# --- 1. LECTURA ---
+def leer_filas(archivo, formato):
+    """
+    Genera ``(linea, fila, error)`` leyendo ``archivo`` (de texto) de a una fila.
+    ``fila`` es un dict, o ``None`` si la línea no se pudo interpretar (y ``error`` dice por qué).
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        faltantes = [columna for columna in COLUMNAS if columna not in (lector.fieldnames or [])]
+        if faltantes:
+            raise ErrorDeArchivo(f'Faltan columnas en el encabezado: {", ".join(faltantes)}.')
+        for fila in lector:
+            yield lector.line_num, fila, None
+        return
+
+    for linea, texto in enumerate(archivo, start=1):
+        if not texto.strip():
+            continue
+        try:
+            fila = json.loads(texto)
+        except ValueError as error:
+            yield linea, None, f'JSON inválido: {error}'
+            continue
+        if not isinstance(fila, dict):
+            yield linea, None, 'Cada línea tiene que ser un objeto JSON.'
+            continue
+        yield linea, fila, None
+
+
+def validar_fila(fila, categorias):
+    """
+    Aplica las reglas de AnuncioForm y las del modelo a ``fila``. Devuelve ``(anuncio, None)``
+    con un Anuncio sin guardar (ni usuario), o ``(None, mensaje)`` si hay errores.
+    """
+    datos, errores = {}, {}
+    for nombre, campo in CAMPOS_FORM.items():
+        try:
+            datos[nombre] = campo.clean(fila.get(nombre))
+        except ValidationError as error:
+            errores[nombre] = error.messages
+    # Mapa {slug: id} armado una sola vez: ninguna consulta por fila
+    slug = fila.get('categoria')
+    if slug not in categorias:
+        errores['categoria'] = [f'No existe la categoría "{slug}".' if slug else 'Este campo es obligatorio.']
+    if not errores:
+        anuncio = Anuncio(categoria_id=categorias[slug], **datos)
+        # bulk_create no llama a full_clean: Anuncio.clean() y las restricciones del modelo se
+        # validan acá. El usuario se asigna después y la categoría ya salió del mapa (sin consulta)
+        try:
+            anuncio.full_clean(exclude=['usuario', 'categoria'])
+        except ValidationError as error:
+            errores = error.message_dict
+        else:
+            return anuncio, None
+    return None, '; '.join(f'{nombre}: {" ".join(mensajes)}' for nombre, mensajes in errores.items())
+
+
+# --- 2. IMPORTACIÓN ---
+def _guardar_lote(lote, using):
+    with transaction.atomic(using=using):
+        # crear_en_bloque avisa a índice de búsqueda, facetas y caché (bulk_create no envía post_save)
+        Anuncio.objects.using(using).crear_en_bloque(lote)
+
+
+def importar_anuncios(archivo, formato, usuario, tamano_lote=TAMANO_LOTE, reporte=None, using='default'):
+    """
+    Importa los anuncios de ``archivo`` como publicados por ``usuario``.
+    ``reporte(linea, mensaje)``, si se pasa, recibe cada fila rechazada.
+    Devuelve un ``ResultadoImportacion``.
+    """
+    categorias = dict(Categoria.objects.using(using).values_list('slug', 'pk'))
+    resultado = ResultadoImportacion()
+    lote = []
+    for linea, fila, error in leer_filas(archivo, formato):
+        if fila is not None:
+            anuncio, error = validar_fila(fila, categorias)
+            if anuncio is not None:
+                anuncio.usuario = usuario
+                lote.append(anuncio)
+                if len(lote) >= tamano_lote:
+                    _guardar_lote(lote, using)
+                    resultado.creados += len(lote)
+                    lote = []
+                continue
+        resultado.registrar_error(linea, error)
+        if reporte:
+            reporte(linea, error)
+    if lote:
+        _guardar_lote(lote, using)
+        resultado.creados += len(lote)
+    return resultado
+
+
+# --- 3. EXPORTACIÓN ---
+class _Eco:
+    """Pseudo-archivo cuyo write devuelve lo escrito: así csv.writer arma la línea y la devolvemos."""
+    def write(self, valor):
+        return valor
+
+
+def exportar_anuncios(queryset, formato, tamano_lote=2000):
+    """Genera el archivo de a una línea (``str``), listo para escribir a disco o a un StreamingHttpResponse."""
+    if formato not in FORMATOS:
+        raise ErrorDeArchivo(f'Formato no soportado: "{formato}".')
+    filas = (
+        queryset.order_by('pk')
+        .values_list('titulo', 'descripcion', 'precio', 'ubicacion', 'estado', 'categoria__slug')
+        .iterator(chunk_size=tamano_lote)
+    )
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(COLUMNAS)
+        for fila in filas:
+            yield escritor.writerow(fila)
+    else:
+        for fila in filas:
+            yield json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False, default=str) + '\n'
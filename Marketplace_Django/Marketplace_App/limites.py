@@ -0,0 +1,286 @@
+"""
+Límites de frecuencia (rate limiting) para login, registro y verificaciones.
+
+Las reglas se configuran en ``settings.LIMITES``: nombre -> lista de
+``(tasa, clave)`` o ``(tasa, clave, algoritmo)``. El nombre es el de la vista
+decorada con ``@limitar`` o, para vistas ajenas (el LoginView de Django), el
+de la URL: las aplica LimiteFrecuenciaMiddleware. Cada regla cuenta por
+separado por su clave:
+
+- ``ip``: la dirección del cliente.
+- ``usuario``: el usuario logueado (sin usuario, la regla no aplica).
+- ``post:<campo>``: un campo del formulario (email, teléfono, username).
+- ``sesion:<clave>``: un valor de la sesión (el usuario a medio registrar).
+
+Algoritmos, ambos con un número por clave (o dos contadores) y vencimiento:
+
+- ``ventana``: ventana deslizante aproximada con el contador de la ventana
+  actual y el de la anterior. Cuenta también los intentos rechazados, así que
+  insistir no sirve. Usa ``incr`` de la caché, que es atómico en Redis y
+  Memcached (en FileBasedCache no: con mucha concurrencia puede dejar pasar
+  alguno de más).
+- ``cubeta``: token bucket (GCRA): guarda sólo el instante en que la cubeta
+  vuelve a estar llena. Permite ráfagas de hasta ``tasa`` requests. El
+  get/set no es atómico: con mucha concurrencia puede dejar pasar alguno de más.
+
+Se guardan en la caché LIMITES_CACHE, que tiene que ser compartida entre
+procesos: con LocMemCache cada proceso cuenta por su lado y un límite de 5
+deja pasar 5 por proceso (``manage.py check --deploy`` lo marca como error).
+Si la caché compartida falla, se sigue con un diccionario en memoria del
+proceso, acotado.
+"""
+import functools
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from Marketplace_App import metricas
+
+logger = logging.getLogger(__name__)
+
+VENTANA = 'ventana'
+CUBETA = 'cubeta'
+
+_UNIDADES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+# --- 1. REGLAS ---
+def leer_tasa(tasa):
+    """``'5/m'`` -> ``(5, 60)``; ``'3/15m'`` -> ``(3, 900)``."""
+    coincidencia = re.fullmatch(r'(\d+)/(\d*)([smhd])', tasa.strip())
+    if not coincidencia:
+        raise ValueError(f'Tasa inválida: {tasa!r} (ejemplos: "5/m", "3/15m", "100/d").')
+    cantidad, multiplo, unidad = coincidencia.groups()
+    return int(cantidad), int(multiplo or 1) * _UNIDADES[unidad]
+
+
+class Regla:
+    def __init__(self, nombre, tasa, clave, algoritmo=VENTANA):
+        if algoritmo not in (VENTANA, CUBETA):
+            raise ValueError(f'Algoritmo desconocido: {algoritmo!r}.')
+        self.nombre = f'{nombre}:{clave}'
+        self.limite, self.periodo = leer_tasa(tasa)
+        self.clave = clave
+        self.algoritmo = algoritmo
+
+    def valor(self, request):
+        """El valor de la clave en este request (``None`` si la regla no aplica)."""
+        if self.clave == 'ip':
+            return ip_cliente(request)
+        if self.clave == 'usuario':
+            usuario = getattr(request, 'user', None)
+            if usuario is not None:
+                return usuario.pk if usuario.is_authenticated else None
+            return request.session.get(SESSION_KEY) if hasattr(request, 'session') else None
+        tipo, _, campo = self.clave.partition(':')
+        if tipo == 'post':
+            valor = request.POST.get(campo, '').strip().lower()
+            return valor or None
+        if tipo == 'sesion':
+            return request.session.get(campo) if hasattr(request, 'session') else None
+        raise ValueError(f'Clave de límite desconocida: {self.clave!r}.')
+
+
+@functools.lru_cache(maxsize=None)
+def _reglas_configuradas(nombre, configuracion):
+    return tuple(Regla(nombre, *regla) for regla in configuracion)
+
+
+def reglas(nombre):
+    """Las reglas de ``settings.LIMITES[nombre]`` (vacío si no hay)."""
+    configuracion = settings.LIMITES.get(nombre)
+    if not configuracion:
+        return ()
+    return _reglas_configuradas(nombre, tuple(tuple(regla) for regla in configuracion))
+
+
+def ip_cliente(request):
+    # Detrás de un proxy propio (LIMITES_PROXIES = cantidad de saltos) el cliente
+    # es el que agregó el último proxy de confianza en X-Forwarded-For
+    saltos = settings.LIMITES_PROXIES
+    if saltos:
+        reenviado = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(reenviado) >= saltos:
+            return reenviado[-saltos]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+# --- 2. ALMACENAMIENTO ---
+class Memoria:
+    """Caché mínima en memoria del proceso (la alternativa si falla la caché real)."""
+
+    def __init__(self, maximo=10000):
+        self.maximo = maximo
+        self._datos = OrderedDict() # clave -> (valor, vence)
+        self._lock = threading.Lock()
+
+    def _vigente(self, clave, ahora):
+        entrada = self._datos.get(clave)
+        if entrada is None or entrada[1] <= ahora:
+            self._datos.pop(clave, None)
+            return None
+        return entrada[0]
+
+    def _guardar(self, clave, valor, timeout, ahora):
+        self._datos[clave] = (valor, ahora + timeout)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maximo:
+            self._datos.popitem(last=False) # La usada hace más tiempo
+
+    def get(self, clave):
+        with self._lock:
+            return self._vigente(clave, time.monotonic())
+
+    def set(self, clave, valor, timeout):
+        with self._lock:
+            self._guardar(clave, valor, timeout, time.monotonic())
+
+    def sumar(self, clave, timeout):
+        with self._lock:
+            ahora = time.monotonic()
+            valor = (self._vigente(clave, ahora) or 0) + 1
+            if valor == 1:
+                self._guardar(clave, valor, timeout, ahora)
+            else:
+                self._datos[clave] = (valor, self._datos[clave][1])
+            return valor
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+memoria = Memoria()
+
+
+class _Cache:
+    """La caché de Django con la misma interfaz que ``Memoria``."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, clave):
+        return self.cache.get(clave)
+
+    def set(self, clave, valor, timeout):
+        self.cache.set(clave, valor, timeout)
+
+    def sumar(self, clave, timeout):
+        self.cache.add(clave, 0, timeout)
+        try:
+            return self.cache.incr(clave)
+        except ValueError: # Venció entre el add y el incr
+            self.cache.set(clave, 1, timeout)
+            return 1
+
+
+def _con_respaldo(operacion):
+    try:
+        return operacion(_Cache(caches[settings.LIMITES_CACHE]))
+    except Exception:
+        logger.warning('La caché de límites no responde: se usa la memoria del proceso.', exc_info=True)
+        return operacion(memoria)
+
+
+# --- 3. ALGORITMOS ---
+def _ventana(almacen, clave, limite, periodo, ahora):
+    numero = int(ahora // periodo)
+    transcurrido = ahora - numero * periodo
+    actual = almacen.sumar(f'{clave}:{numero}', periodo * 2)
+    anterior = almacen.get(f'{clave}:{numero - 1}') or 0
+    peso = 1 - transcurrido / periodo
+    if anterior * peso + actual <= limite:
+        return 0
+    if actual > limite:
+        # Ni aunque la ventana anterior no pese: hasta que empiece la próxima
+        return periodo - transcurrido
+    # Hasta que la ventana anterior pese lo suficiente menos
+    return max(0.0, periodo * (1 - (limite - actual) / anterior) - transcurrido)
+
+
+def _cubeta(almacen, clave, limite, periodo, ahora):
+    intervalo = periodo / limite # Cada cuánto entra un token
+    lleno = max(almacen.get(clave) or ahora, ahora) # Instante en que la cubeta vuelve a estar llena
+    nuevo = lleno + intervalo
+    if nuevo - ahora > periodo:
+        return nuevo - ahora - periodo
+    almacen.set(clave, nuevo, math.ceil(nuevo - ahora))
+    return 0
+
+
+_ALGORITMOS = {VENTANA: _ventana, CUBETA: _cubeta}
+
+
+def consumir(regla, valor, ahora=None):
+    """Cuenta un request de ``valor`` contra ``regla``. Devuelve los segundos a esperar (0 = permitido)."""
+    ahora = time.time() if ahora is None else ahora
+    digesto = hashlib.sha256(str(valor).encode()).hexdigest()[:24] # Sin emails ni IPs en las claves
+    clave = f'limite:{regla.nombre}:{digesto}'
+    return _con_respaldo(lambda almacen: _ALGORITMOS[regla.algoritmo](almacen, clave, regla.limite, regla.periodo, ahora))
+
+
+def espera(nombre, request):
+    """Aplica las reglas de ``nombre`` a ``request``. Devuelve los segundos a esperar (0 = permitido)."""
+    if not settings.LIMITES_ACTIVOS or request.method not in settings.LIMITES_METODOS:
+        return 0
+    maxima = 0
+    for regla in reglas(nombre):
+        valor = regla.valor(request)
+        if valor is None:
+            continue
+        segundos = consumir(regla, valor)
+        if segundos:
+            metricas.LIMITES_RECHAZOS.incrementar(regla.nombre)
+            maxima = max(maxima, segundos)
+    return maxima
+
+
+def respuesta_429(request, segundos):
+    segundos = max(1, math.ceil(segundos))
+    mensaje = f'Demasiados intentos. Probá de nuevo en {segundos} segundos.'
+    if request.path_info.startswith('/api/'):
+        respuesta = JsonResponse({'error': mensaje}, status=429)
+    else:
+        respuesta = HttpResponse(mensaje, status=429, content_type='text/plain; charset=utf-8')
+    respuesta['Retry-After'] = str(segundos)
+    return respuesta
+
+
+# --- 4. DECORADOR ---
+def limitar(nombre=None):
+    """
+    Aplica a la vista las reglas de ``settings.LIMITES[nombre]`` (por defecto,
+    el nombre de la función). Con sus reglas ya aplicadas, el middleware la saltea.
+    """
+    def decorador(vista):
+        regla = nombre or vista.__name__
+
+        if iscoroutinefunction(vista):
+            @functools.wraps(vista)
+            async def envuelta(request, *args, **kwargs):
+                # La sesión y el usuario se leen de forma sync (pueden consultar la base)
+                segundos = await sync_to_async(espera)(regla, request)
+                if segundos:
+                    return respuesta_429(request, segundos)
+                return await vista(request, *args, **kwargs)
+        else:
+            @functools.wraps(vista)
+            def envuelta(request, *args, **kwargs):
+                segundos = espera(regla, request)
+                if segundos:
+                    return respuesta_429(request, segundos)
+                return vista(request, *args, **kwargs)
+
+        envuelta.limite_frecuencia = regla
+        return envuelta
+    return decorador
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Marketplace_App import importacion
+from Marketplace_App.models import Anuncio
+
+
+class Command(BaseCommand):
+    help = 'Exporta anuncios a CSV o JSONL (el mismo formato que acepta importar_anuncios).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta de salida (.csv o .jsonl), o "-" para la salida estándar.')
+        parser.add_argument('--formato', choices=importacion.FORMATOS, help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--usuario', help='Sólo los anuncios de este nombre de usuario.')
+        parser.add_argument('--categoria', help='Sólo los anuncios de esta categoría (slug).')
+        parser.add_argument('--solo-activos', action='store_true')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['archivo'] == '-' and not options['formato']:
+            raise CommandError('Con "-" hay que indicar --formato.')
+        try:
+            formato = options['formato'] or importacion.formato_por_nombre(options['archivo'])
+        except importacion.ErrorDeArchivo as error:
+            raise CommandError(error)
+
+        anuncios = Anuncio.objects.using(options['database'])
+        if options['usuario']:
+            anuncios = anuncios.filter(usuario__username=options['usuario'])
+        if options['categoria']:
+            anuncios = anuncios.filter(categoria__slug=options['categoria'])
+        if options['solo_activos']:
+            anuncios = anuncios.filter(activo=True)
+
+        lineas = importacion.exportar_anuncios(anuncios, formato)
+        if options['archivo'] == '-':
+            for linea in lineas:
+                self.stdout.write(linea, ending='')
+            return
+        with open(options['archivo'], 'w', newline='', encoding='utf-8') as salida:
+            salida.writelines(lineas)
+        self.stdout.write(self.style.SUCCESS(f'Exportado a {options["archivo"]}.'))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Marketplace_App.datos_sinteticos import Generador
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera usuarios con perfil, categorías, anuncios, comentarios y reportes sintéticos '
+        'con distribuciones realistas (para pruebas de carga y medir_rendimiento).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000)
+        parser.add_argument('--anuncios', type=int, default=100000)
+        parser.add_argument('--comentarios', type=int, default=200000)
+        parser.add_argument('--reportes', type=int, default=5000)
+        parser.add_argument('--semilla', type=int, default=0, help='Con la misma semilla se generan los mismos datos.')
+        parser.add_argument('--prefijo', default='sintetico', help='Prefijo de los nombres de usuario creados.')
+        parser.add_argument('--lote', type=int, default=2000, help='Filas por bulk_create (cada lote en su transacción).')
+
+    def handle(self, *args, **options):
+        if min(options['usuarios'], options['anuncios'], options['comentarios'], options['reportes']) < 0:
+            raise CommandError('Las cantidades no pueden ser negativas.')
+        if options['lote'] < 1:
+            raise CommandError('--lote tiene que ser mayor que cero.')
+
+        inicio = time.perf_counter()
+        generador = Generador(
+            semilla=options['semilla'],
+            prefijo=options['prefijo'],
+            tamano_lote=options['lote'],
+            informar=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        creados = generador.generar(
+            usuarios=options['usuarios'],
+            anuncios=options['anuncios'],
+            comentarios=options['comentarios'],
+            reportes=options['reportes'],
+        )
+        resumen = ', '.join(f'{cantidad} {nombre}' for nombre, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(f'Generados {resumen} en {time.perf_counter() - inicio:.1f} s.'))
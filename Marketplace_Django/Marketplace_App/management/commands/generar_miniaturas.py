@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import miniaturas
+from Marketplace_App.models import Anuncio, PerfilUsuario
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de anuncios y perfiles que todavía no las tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenera también las que ya estaban generadas.')
+
+    def handle(self, *args, **options):
+        for modelo, campo in ((Anuncio, 'imagen_principal'), (PerfilUsuario, 'imagen')):
+            queryset = modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+            if not options['forzar']:
+                queryset = queryset.filter(imagen_miniaturas=False)
+
+            generadas = fallidas = 0
+            for instancia in queryset.only('pk', campo, 'imagen_miniaturas').iterator(chunk_size=200):
+                if miniaturas.generar_para(instancia, campo):
+                    generadas += 1
+                else:
+                    fallidas += 1
+            self.stdout.write(f'{modelo._meta.verbose_name_plural}: {generadas} generadas, {fallidas} con error.')
+        self.stdout.write(self.style.SUCCESS('Listo.'))
@@ -0,0 +1,59 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Marketplace_App import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa anuncios desde un archivo CSV o JSONL (en streaming, por lotes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .jsonl.')
+        parser.add_argument('--usuario', required=True, help='Nombre de usuario del vendedor.')
+        parser.add_argument('--formato', choices=importacion.FORMATOS, help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Filas por bulk_create/transacción.')
+        parser.add_argument('--reporte', help='Archivo CSV donde escribir las filas rechazadas (línea, error).')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            usuario = User.objects.using(options['database']).get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario "{options["usuario"]}".')
+
+        try:
+            formato = options['formato'] or importacion.formato_por_nombre(options['archivo'])
+        except importacion.ErrorDeArchivo as error:
+            raise CommandError(error)
+
+        archivo_reporte = open(options['reporte'], 'w', newline='', encoding='utf-8') if options['reporte'] else None
+        try:
+            reporte = None
+            if archivo_reporte:
+                escritor = csv.writer(archivo_reporte)
+                escritor.writerow(['linea', 'error'])
+                reporte = lambda linea, mensaje: escritor.writerow([linea, mensaje])
+
+            # utf-8-sig: acepta los CSV con BOM que guarda Excel
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                resultado = importacion.importar_anuncios(
+                    archivo, formato, usuario,
+                    tamano_lote=options['lote'], reporte=reporte, using=options['database'],
+                )
+        except (OSError, importacion.ErrorDeArchivo) as error:
+            raise CommandError(error)
+        finally:
+            if archivo_reporte:
+                archivo_reporte.close()
+
+        if not archivo_reporte:
+            for linea, mensaje in resultado.errores:
+                self.stderr.write(f'Línea {linea}: {mensaje}')
+            if resultado.con_error > len(resultado.errores):
+                self.stderr.write(f'... y {resultado.con_error - len(resultado.errores)} errores más (usar --reporte).')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creados} anuncios importados, {resultado.con_error} filas rechazadas.'
+        ))
@@ -0,0 +1,42 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import rendimiento
+
+PERFILES = ('sqlite_sin_ajustes', 'sqlite', 'postgresql')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la concurrencia de escrituras de los perfiles de base de datos: SQLite como venía, '
+        'SQLite con WAL (settings.PERFILES_BASE_DATOS) y PostgreSQL si está disponible. '
+        'Las bases de SQLite son archivos temporales; en PostgreSQL usa una tabla propia que después borra.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', nargs='+', choices=PERFILES, default=list(PERFILES))
+        parser.add_argument('--concurrencias', nargs='+', type=int, default=list(rendimiento.CONCURRENCIAS))
+        parser.add_argument('--transacciones', type=int, default=500, help='Transacciones por perfil y concurrencia.')
+        parser.add_argument('--salida', help='Guardar el informe JSON en este archivo (por defecto, a la salida estándar).')
+
+    def handle(self, *args, **options):
+        progreso = self.stderr.write if options['verbosity'] > 1 else None
+        with tempfile.TemporaryDirectory() as directorio:
+            perfiles = {
+                nombre: perfil
+                for nombre, perfil in rendimiento.perfiles_escrituras(directorio).items()
+                if nombre in options['perfiles']
+            }
+            resultado = rendimiento.prueba_escrituras(
+                perfiles, options['concurrencias'], options['transacciones'], progreso=progreso,
+            )
+
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(f'Informe guardado en {options["salida"]}.')
+        else:
+            self.stdout.write(texto)
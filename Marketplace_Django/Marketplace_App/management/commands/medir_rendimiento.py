@@ -0,0 +1,92 @@
+import json
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Marketplace_App import rendimiento
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia y consultas SQL de home, detalle_anuncio, mi_perfil, el admin y la API '
+        'con el cliente de pruebas, y genera un informe JSON comparable entre corridas. '
+        'Con --carga agrega una prueba de carga concurrente WSGI vs ASGI.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escenarios', nargs='*', choices=rendimiento.ESCENARIOS, default=list(rendimiento.ESCENARIOS))
+        parser.add_argument('--repeticiones', type=int, default=1)
+        parser.add_argument('--muestra-home', type=int, help='Medir sólo N combinaciones de home al azar (por defecto, todas).')
+        parser.add_argument('--detalles', type=int, default=50, help='Anuncios al azar para detalle_anuncio y la API.')
+        parser.add_argument('--perfiles', type=int, default=10, help='Vendedores al azar para mi_perfil.')
+        parser.add_argument('--admin', help='Usuario staff para el admin (por defecto, el primer superusuario).')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--limpiar-cache', action='store_true', help='Vaciar la caché antes de cada request (todo en frío).')
+        parser.add_argument('--salida', help='Guardar el informe JSON en este archivo (por defecto, a la salida estándar).')
+        parser.add_argument('--comparar', help='Informe JSON de una corrida anterior: falla si hay regresiones.')
+        parser.add_argument('--carga', action='store_true', help='Correr también la prueba de carga WSGI vs ASGI.')
+        parser.add_argument('--modos', nargs='+', choices=list(rendimiento.MODOS_CARGA), default=list(rendimiento.MODOS_CARGA))
+        parser.add_argument('--concurrencias', nargs='+', type=int, default=list(rendimiento.CONCURRENCIAS))
+        parser.add_argument('--requests-carga', type=int, default=200, help='Requests por modo y concurrencia.')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento de latencia p95 tolerado (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        administrador = None
+        if 'admin' in options['escenarios']:
+            if options['admin']:
+                administrador = User.objects.filter(username=options['admin'], is_staff=True).first()
+                if administrador is None:
+                    raise CommandError(f'No existe el usuario staff "{options["admin"]}".')
+            else:
+                administrador = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+                if administrador is None:
+                    self.stderr.write('No hay superusuarios: se omite el escenario admin.')
+
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anterior = json.load(archivo)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {error}')
+
+        peticiones = rendimiento.armar_peticiones(
+            escenarios=options['escenarios'],
+            semilla=options['semilla'],
+            muestra_home=options['muestra_home'],
+            detalles=options['detalles'],
+            perfiles=options['perfiles'],
+            administrador=administrador,
+        )
+        progreso = self.stderr.write if options['verbosity'] > 1 else None
+        mediciones = rendimiento.medir(
+            peticiones, repeticiones=options['repeticiones'], limpiar_cache=options['limpiar_cache'], progreso=progreso,
+        )
+        parametros = {
+            clave: options[clave]
+            for clave in ('escenarios', 'repeticiones', 'muestra_home', 'detalles', 'perfiles', 'semilla', 'limpiar_cache')
+        }
+        carga = None
+        if options['carga']:
+            urls = rendimiento.peticiones_carga(random.Random(options['semilla']), min(options['detalles'], 20))
+            carga = rendimiento.prueba_carga(
+                urls, options['modos'], options['concurrencias'], options['requests_carga'], progreso=progreso,
+            )
+            parametros.update({clave: options[clave] for clave in ('modos', 'concurrencias', 'requests_carga')})
+        informe = rendimiento.informe(mediciones, parametros, carga)
+
+        texto = json.dumps(informe, ensure_ascii=False, indent=2)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(f'Informe guardado en {options["salida"]}.')
+        else:
+            self.stdout.write(texto)
+
+        if anterior is not None:
+            regresiones = rendimiento.comparar(informe, anterior, options['tolerancia'])
+            if regresiones:
+                raise CommandError('Regresiones respecto de la corrida anterior:\n  ' + '\n  '.join(regresiones))
+            self.stderr.write('Sin regresiones respecto de la corrida anterior.')
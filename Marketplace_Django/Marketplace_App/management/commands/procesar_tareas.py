@@ -0,0 +1,46 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from Marketplace_App import cola, sms
+
+
+class Command(BaseCommand):
+    help = (
+        'Trabajador de la cola de tareas en segundo plano (correos, miniaturas, avisos). '
+        'Se pueden correr varios procesos a la vez.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument('--nombre', default=None, help='Identificador del trabajador (por defecto host:pid).')
+
+    def handle(self, *args, **options):
+        trabajador = options['nombre'] or cola.nombre_trabajador()
+        self.detener = False
+
+        def pedir_detencion(signum, frame):
+            # Termina la tarea en curso y sale
+            self.detener = True
+
+        signal.signal(signal.SIGTERM, pedir_detencion)
+        signal.signal(signal.SIGINT, pedir_detencion)
+
+        self.stdout.write(f'Trabajador {trabajador} iniciado.')
+        total_ok = total_error = 0
+        while not self.detener:
+            close_old_connections()
+            ejecutadas, fallidas = cola.procesar_pendientes(trabajador=trabajador, limite=50)
+            total_ok += ejecutadas
+            total_error += fallidas
+            if ejecutadas or fallidas:
+                self.stdout.write(f'{ejecutadas} tareas ejecutadas, {fallidas} con error.')
+            elif options['una_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
+        sms.cerrar() # La conexión al proveedor queda abierta entre tareas
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total_ok} ejecutadas, {total_error} con error.'))
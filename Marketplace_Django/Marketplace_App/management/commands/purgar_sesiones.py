@@ -0,0 +1,42 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Marketplace_App import codigos
+
+
+def borrar_en_lotes(filas, lote):
+    """Borra ``filas`` de a ``lote`` por clave primaria: transacciones cortas que no traban a los requests."""
+    total = 0
+    while True:
+        claves = list(filas.values_list('pk', flat=True)[:lote])
+        if not claves:
+            return total
+        total += filas.model.objects.filter(pk__in=claves).delete()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las sesiones vencidas de la tabla django_session y los códigos de verificación '
+        'vencidos de la tabla de respaldo. Programarlo en cron (por ejemplo, cada hora).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por cada DELETE.')
+
+    def handle(self, *args, **options):
+        motor = import_module(settings.SESSION_ENGINE).SessionStore
+        if hasattr(motor, 'get_model_class'):
+            # db y cached_db: la tabla crece con cada visitante que no cierra sesión
+            vencidas = motor.get_model_class().objects.filter(expire_date__lt=timezone.now())
+            sesiones = borrar_en_lotes(vencidas, options['lote'])
+        else:
+            # signed_cookies no guarda nada; file y cache se limpian a su manera
+            motor.clear_expired()
+            sesiones = 0
+        total_codigos = borrar_en_lotes(codigos.vencidos(), options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Borradas {sesiones} sesiones y {total_codigos} códigos de verificación vencidos.'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import comentarios
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a contar los comentarios de cada anuncio (contador desnormalizado del detalle y la grilla).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a recalcular.')
+
+    def handle(self, *args, **options):
+        total = comentarios.recalcular(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Comentarios recontados en {total} anuncios.'))
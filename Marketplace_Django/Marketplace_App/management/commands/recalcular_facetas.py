@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import facetas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los conteos de anuncios activos por categoría y ubicación.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a recalcular.')
+
+    def handle(self, *args, **options):
+        total = facetas.recalcular(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Facetas recalculadas: {total} filas.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import moderacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los contadores de reportes por entidad de la cola de moderación.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a recalcular.')
+
+    def handle(self, *args, **options):
+        total = moderacion.recalcular(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Cola de moderación recalculada: {total} entidades reportadas.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import precios
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero el histograma de precios (cubetas por categoría y ubicación).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a recalcular.')
+
+    def handle(self, *args, **options):
+        total = precios.recalcular(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Histograma de precios recalculado: {total} filas.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Marketplace_App import busqueda
+from Marketplace_App.models import Anuncio
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el índice de búsqueda full-text de los anuncios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a reindexar.')
+        parser.add_argument('--lote', type=int, default=1000, help='Cantidad de anuncios indexados por lote.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError('Este motor de base de datos no soporta el índice de búsqueda.')
+        queryset = Anuncio.objects.using(options['database'])
+        total = busqueda.reconstruir_indice(queryset, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {total} anuncios indexados.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from Marketplace_App import tarjetas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla de tarjetas del listado (modelo de lectura de home).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos a reconstruir.')
+        parser.add_argument('--lote', type=int, default=2000, help='Cantidad de tarjetas insertadas por lote.')
+
+    def handle(self, *args, **options):
+        total = tarjetas.reconstruir(using=options['database'], tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Tarjetas reconstruidas: {total} anuncios activos.'))
@@ -0,0 +1,39 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Marketplace_App import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base principal sobre las réplicas de lectura SQLite (DB_REPLICAS). '
+        'Sólo para desarrollo: hace de replicación para probar el router de réplicas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=0, help='Repetir cada N segundos (0 = una sola vez).')
+
+    def handle(self, *args, **options):
+        if not settings.REPLICAS_LECTURA:
+            raise CommandError('No hay réplicas de lectura configuradas (DB_REPLICAS).')
+        self.detener = False
+
+        def pedir_detencion(signum, frame):
+            self.detener = True
+
+        signal.signal(signal.SIGTERM, pedir_detencion)
+        signal.signal(signal.SIGINT, pedir_detencion)
+
+        copias = 0
+        while not self.detener:
+            replicas.replicar()
+            copias += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Réplicas actualizadas: {", ".join(settings.REPLICAS_LECTURA)}.')
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write(self.style.SUCCESS(f'Listo: {copias} copias de la base principal.'))
@@ -0,0 +1,322 @@
+"""
+Métricas de rendimiento por vista, agregadas entre los procesos del servidor.
+
+InstrumentacionMiddleware mide cada request (muestreado) y acumula acá
+histogramas por nombre de URL: duración total, cantidad y tiempo de
+consultas SQL, tiempo de render de templates y tamaño de la respuesta.
+``exportar()`` los devuelve en el formato de texto de Prometheus.
+
+Cada proceso (worker) cuenta en su memoria, y /metricas lo atiende uno
+cualquiera: Prometheus no ve a los demás ni puede sumarlos. Por eso cada
+proceso guarda cada METRICAS_INTERVALO segundos lo que lleva en un archivo
+propio de METRICAS_DIRECTORIO, y ``exportar()`` suma todos los archivos. Los
+de procesos que ya terminaron se siguen sumando (son contadores acumulados):
+se borran al reiniciar el servicio. Sin METRICAS_DIRECTORIO cada proceso
+exporta sólo lo suyo.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets de cada histograma
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+BUCKETS_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histograma:
+    """Histograma acumulativo con una etiqueta (la vista), seguro entre hilos."""
+
+    def __init__(self, nombre, ayuda, limites):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self._series = {} # vista -> (conteos por bucket con +Inf al final, suma)
+        self._lock = threading.Lock()
+
+    def observar(self, vista, valor):
+        with self._lock:
+            conteos, suma = self._series.get(vista, ([0] * (len(self.limites) + 1), 0))
+            for indice, limite in enumerate(self.limites):
+                if valor <= limite:
+                    conteos[indice] += 1
+                    break
+            else:
+                conteos[-1] += 1
+            self._series[vista] = (conteos, suma + valor)
+
+    def instantanea(self):
+        """``{vista: [conteos, suma]}`` (se guarda como JSON, ver guardar_instantanea)."""
+        with self._lock:
+            return {vista: [list(conteos), suma] for vista, (conteos, suma) in self._series.items()}
+
+    @staticmethod
+    def sumar(total, instantanea):
+        for vista, (conteos, suma) in instantanea.items():
+            anteriores, suma_anterior = total.get(vista, ([0] * len(conteos), 0))
+            total[vista] = [[a + b for a, b in zip(anteriores, conteos)], suma_anterior + suma]
+
+    def exportar(self, series=None):
+        """Líneas de Prometheus de ``series`` (una instantánea, o sumadas), por defecto las del proceso."""
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        series = self.instantanea() if series is None else series
+        for vista, (conteos, suma) in sorted(series.items()):
+            etiqueta = _etiqueta(vista)
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ('+Inf',), conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{{vista="{etiqueta}"}} {suma}')
+            lineas.append(f'{self.nombre}_count{{vista="{etiqueta}"}} {acumulado}')
+        return lineas
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._valores = Counter()
+        self._lock = threading.Lock()
+
+    def incrementar(self, vista, cantidad=1):
+        with self._lock:
+            self._valores[vista] += cantidad
+
+    def instantanea(self):
+        with self._lock:
+            return dict(self._valores)
+
+    @staticmethod
+    def sumar(total, instantanea):
+        for vista, valor in instantanea.items():
+            total[vista] = total.get(vista, 0) + valor
+
+    def exportar(self, valores=None):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        valores = self.instantanea() if valores is None else valores
+        lineas += [f'{self.nombre}{{vista="{_etiqueta(vista)}"}} {valor}' for vista, valor in sorted(valores.items())]
+        return lineas
+
+    def reiniciar(self):
+        with self._lock:
+            self._valores.clear()
+
+
+def _etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+DURACION = Histograma('marketplace_request_duracion_segundos', 'Duración total del request.', BUCKETS_SEGUNDOS)
+CONSULTAS = Histograma('marketplace_request_consultas', 'Consultas SQL por request.', BUCKETS_CONSULTAS)
+TIEMPO_CONSULTAS = Histograma('marketplace_request_consultas_segundos', 'Tiempo en consultas SQL por request.', BUCKETS_SEGUNDOS)
+TIEMPO_TEMPLATES = Histograma('marketplace_request_templates_segundos', 'Tiempo de render de templates por request.', BUCKETS_SEGUNDOS)
+TAMANO_RESPUESTA = Histograma('marketplace_respuesta_bytes', 'Tamaño del cuerpo de la respuesta.', BUCKETS_BYTES)
+CONSULTAS_REPETIDAS = Contador(
+    'marketplace_consultas_repetidas_total',
+    'Requests con la misma consulta SQL repetida muchas veces (posible N+1).',
+)
+LIMITES_RECHAZOS = Contador(
+    'marketplace_limite_rechazos_total',
+    'Requests rechazados con 429 por cada regla de límite de frecuencia (vista:clave).',
+)
+METRICAS = (
+    DURACION, CONSULTAS, TIEMPO_CONSULTAS, TIEMPO_TEMPLATES, TAMANO_RESPUESTA, CONSULTAS_REPETIDAS, LIMITES_RECHAZOS,
+)
+
+
+# --- MEDICIÓN DE UN REQUEST ---
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Lo que se va juntando durante un request instrumentado."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_consultas = 0.0
+        self.tiempo_templates = 0.0
+        self.profundidad_templates = 0
+        self.por_sql = Counter()
+
+    def __enter__(self):
+        self._token = _medicion_actual.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _medicion_actual.reset(self._token)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Lo llama la envoltura de consultas de cada conexión (ver instalar_medicion_consultas)
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_consultas += time.perf_counter() - inicio
+            self.consultas += 1
+            # El SQL con placeholders: la misma consulta con distintos parámetros cuenta igual
+            self.por_sql[sql] += 1
+
+    def repetidas(self, umbral):
+        return [(sql, veces) for sql, veces in self.por_sql.most_common() if veces >= umbral]
+
+
+def medicion_actual():
+    return _medicion_actual.get()
+
+
+def registrar(vista, medicion, tamano=None):
+    DURACION.observar(vista, time.perf_counter() - medicion.inicio)
+    CONSULTAS.observar(vista, medicion.consultas)
+    TIEMPO_CONSULTAS.observar(vista, medicion.tiempo_consultas)
+    TIEMPO_TEMPLATES.observar(vista, medicion.tiempo_templates)
+    if tamano is not None:
+        TAMANO_RESPUESTA.observar(vista, tamano)
+    if time.monotonic() - _ultimo_guardado >= settings.METRICAS_INTERVALO:
+        guardar_instantanea()
+
+
+def exportar():
+    """Todas las métricas, sumadas entre procesos, en formato de texto de Prometheus (versión 0.0.4)."""
+    instantaneas = instantaneas_de_procesos()
+    lineas = []
+    for metrica in METRICAS:
+        total = {}
+        for instantanea in instantaneas:
+            metrica.sumar(total, instantanea.get(metrica.nombre, {}))
+        lineas += metrica.exportar(total)
+    return '\n'.join(lineas) + '\n'
+
+
+def reiniciar():
+    for metrica in METRICAS:
+        metrica.reiniciar()
+
+
+# --- SUMA ENTRE PROCESOS ---
+_archivo = (None, None) # (pid, nombre del archivo de este proceso)
+_ultimo_guardado = float('-inf')
+_lock_guardado = threading.Lock()
+
+
+def _archivo_proceso():
+    """Nombre del archivo de este proceso. Se arma en el propio proceso (no al importar, que con
+    gunicorn --preload pasa en el master) y con la hora: un pid reutilizado no pisa uno anterior."""
+    global _archivo
+    if _archivo[0] != os.getpid():
+        _archivo = (os.getpid(), f'{os.getpid()}-{time.time_ns()}.json')
+    return _archivo[1]
+
+
+def _instantanea_propia():
+    return {metrica.nombre: metrica.instantanea() for metrica in METRICAS}
+
+
+def guardar_instantanea():
+    """Escribe lo que lleva este proceso en su archivo de METRICAS_DIRECTORIO (si hay uno)."""
+    global _ultimo_guardado
+    directorio = settings.METRICAS_DIRECTORIO
+    if not directorio:
+        return
+    with _lock_guardado:
+        _ultimo_guardado = time.monotonic()
+        directorio = Path(directorio)
+        try:
+            directorio.mkdir(parents=True, exist_ok=True)
+            archivo = directorio / _archivo_proceso()
+            temporal = archivo.with_suffix('.tmp')
+            temporal.write_text(json.dumps(_instantanea_propia()))
+            # Reemplazo atómico: quien lee no ve nunca un archivo a medio escribir
+            os.replace(temporal, archivo)
+        except OSError:
+            logger.warning('No se pudieron guardar las métricas en %s.', directorio, exc_info=True)
+
+
+def instantaneas_de_procesos():
+    """Las instantáneas de todos los procesos (la de éste, de la memoria)."""
+    propia = _instantanea_propia()
+    directorio = settings.METRICAS_DIRECTORIO
+    if not directorio:
+        return [propia]
+    guardar_instantanea()
+    instantaneas = [propia]
+    for archivo in Path(directorio).glob('*.json'):
+        if archivo.name == _archivo_proceso():
+            continue
+        try:
+            instantaneas.append(json.loads(archivo.read_text()))
+        except (OSError, ValueError):
+            logger.warning('Se ignora el archivo de métricas %s.', archivo, exc_info=True)
+    return instantaneas
+
+
+# --- CONSULTAS SQL ---
+def _envoltura_consultas(execute, sql, params, many, context):
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return medicion(execute, sql, params, many, context)
+
+
+def _agregar_envoltura(connection, **kwargs):
+    if _envoltura_consultas not in connection.execute_wrappers:
+        # Al principio: connection.execute_wrapper() saca siempre la última de la lista
+        connection.execute_wrappers.insert(0, _envoltura_consultas)
+
+
+def instalar_medicion_consultas():
+    """
+    Agrega a cada conexión (las abiertas y las que se abran después, en
+    cualquier hilo) una envoltura que suma sus consultas a la medición actual.
+    Como la medición viaja en un ContextVar, cuenta también las consultas del
+    ORM async, que corren en el hilo de la base y no en el del event loop.
+    """
+    connection_created.connect(_agregar_envoltura, dispatch_uid='metricas_medicion_consultas')
+    for connection in connections.all(initialized_only=True):
+        _agregar_envoltura(connection)
+
+
+# --- TIEMPO DE TEMPLATES ---
+_instalado = False
+
+
+def instalar_medicion_templates():
+    """Envuelve el render de los templates de Django para sumar su tiempo a la medición actual."""
+    global _instalado
+    if _instalado:
+        return
+    from django.template.backends.django import Template
+
+    render_original = Template.render
+
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return render_original(self, context, request)
+        # Un template renderizado dentro de otro ya se cuenta en el de afuera
+        medicion.profundidad_templates += 1
+        inicio = time.perf_counter()
+        try:
+            return render_original(self, context, request)
+        finally:
+            medicion.profundidad_templates -= 1
+            if not medicion.profundidad_templates:
+                medicion.tiempo_templates += time.perf_counter() - inicio
+
+    Template.render = render
+    _instalado = True
@@ -1,32 +1,240 @@
+import logging
+import random
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from Marketplace_App import dos_pasos, estaticos, limites, metricas, replicas
+
+logger = logging.getLogger(__name__)
+
 class VerificacionDosPasosMiddleware:
+    """
+    Exige el segundo factor (ver dos_pasos.py) a los usuarios logueados antes
+    de dejarlos usar el sitio. Las rutas excluidas se resuelven una sola vez al
+    arrancar. Los archivos estáticos y los requests sin cookie de sesión (todo
+    el tráfico anónimo) pasan sin tocar la sesión ni la base, y para el resto
+    alcanza con la sesión: nunca se consulta el usuario.
+    Va después de SessionMiddleware. Funciona con vistas sync y async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        self.cookie_sesion = settings.SESSION_COOKIE_NAME
+        self.url_verificacion = reverse('verificacion_2fa')
+        self.rutas_excluidas = frozenset(
+            [self.url_verificacion] + [reverse(nombre) for nombre in settings.DOS_PASOS_RUTAS_EXCLUIDAS]
+        )
+        # str.startswith con una tupla compara contra todos los prefijos en una sola llamada
+        self.prefijos_excluidos = tuple(
+            prefijo for prefijo in (settings.STATIC_URL, settings.MEDIA_URL, *settings.DOS_PASOS_PREFIJOS_EXCLUIDOS)
+            if prefijo
+        )
+
+    def _libre(self, request):
+        ruta = request.path_info
+        return (
+            self.cookie_sesion not in request.COOKIES
+            or ruta in self.rutas_excluidas
+            or ruta.startswith(self.prefijos_excluidos)
+        )
+
+    def _a_verificar(self, request):
+        return redirect(f'{self.url_verificacion}?{urlencode({"next": request.get_full_path()})}')
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not self._libre(request) and dos_pasos.pendiente(request.session):
+            return self._a_verificar(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._libre(request) and await dos_pasos.apendiente(request.session):
+            return self._a_verificar(request)
+        return await self.get_response(request)
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide una muestra de los requests (METRICAS_MUESTREO) y acumula por vista
+    duración, consultas SQL, render de templates y tamaño de la respuesta
+    (ver metricas.py). Avisa en el log cuando una misma consulta se repite
+    METRICAS_UMBRAL_REPETIDAS veces o más en un request (patrón N+1).
+    Conviene ponerlo primero en MIDDLEWARE para medir todo el request.
+    Funciona con vistas sync y async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        self.muestreo = settings.METRICAS_MUESTREO
+        self.umbral_repetidas = settings.METRICAS_UMBRAL_REPETIDAS
+        metricas.instalar_medicion_templates()
+
+    def _en_muestra(self):
+        # Fuera de la muestra el costo es un número al azar
+        return self.muestreo > 0 and (self.muestreo >= 1 or random.random() < self.muestreo)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not self._en_muestra():
+            return self.get_response(request)
+
+        with metricas.Medicion() as medicion:
+            response = self.get_response(request)
+        return self._registrar(request, response, medicion)
+
+    async def __acall__(self, request):
+        if not self._en_muestra():
+            return await self.get_response(request)
+
+        # La Medicion viaja en un ContextVar: la ven también las consultas que
+        # el ORM async corre en el hilo de la base (sync_to_async copia el contexto)
+        with metricas.Medicion() as medicion:
+            response = await self.get_response(request)
+        return self._registrar(request, response, medicion)
+
+    def _registrar(self, request, response, medicion):
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_resolver'
+        if vista == 'metricas':
+            return response
+
+        tamano = None if response.streaming else len(response.content)
+        metricas.registrar(vista, medicion, tamano)
+
+        repetidas = medicion.repetidas(self.umbral_repetidas)
+        if repetidas:
+            metricas.CONSULTAS_REPETIDAS.incrementar(vista)
+            sql, veces = repetidas[0]
+            logger.warning('Posible N+1 en %s (%s): consulta repetida %s veces: %s', vista, request.path, veces, sql)
+        return response
+
+
+class LimiteFrecuenciaMiddleware:
+    """
+    Aplica ``settings.LIMITES`` por nombre de URL a las vistas que no usan
+    ``@limitar`` (por ejemplo el LoginView de Django) y devuelve 429 con
+    Retry-After. Las vistas decoradas se saltean, así no se cuentan dos veces.
+    Va después de AuthenticationMiddleware. Funciona con vistas sync y async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Todo el trabajo está en process_view; en modo async esto devuelve la corrutina
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        nombre = request.resolver_match.view_name
+        if getattr(view_func, 'limite_frecuencia', None) or nombre not in settings.LIMITES:
+            return None
+        segundos = limites.espera(nombre, request)
+        if segundos:
+            return limites.respuesta_429(request, segundos)
+        return None
+
+
+class LecturaEnReplicasMiddleware:
+    """
+    Abre un bloque de lectura en réplicas por request (ver replicas.py). Los
+    requests que escriben (POST, ...) y los de un usuario que escribió hace
+    menos de REPLICAS_FIJAR_PRIMARIA segundos (cookie) leen de la principal;
+    si el request escribe, pone la cookie. Va antes de SessionMiddleware
+    (guardar la sesión es una escritura). Sin réplicas no hace nada.
+    Funciona con vistas sync y async.
+    """
+    sync_capable = True
+    async_capable = True
+    METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        self.activo = bool(settings.REPLICAS_LECTURA)
+        self.cookie = settings.REPLICAS_COOKIE
+        self.segundos = settings.REPLICAS_FIJAR_PRIMARIA
+
+    def _lectura(self, request):
+        primaria = request.method not in self.METODOS_LECTURA or self.cookie in request.COOKIES
+        return replicas.Lectura(primaria=primaria)
+
+    def _fijar(self, lectura, response):
+        if lectura.escribio:
+            response.set_cookie(self.cookie, '1', max_age=self.segundos, httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not self.activo:
+            return self.get_response(request)
+        with self._lectura(request) as lectura:
+            response = self.get_response(request)
+        return self._fijar(lectura, response)
+
+    async def __acall__(self, request):
+        if not self.activo:
+            return await self.get_response(request)
+        with self._lectura(request) as lectura:
+            response = await self.get_response(request)
+        return self._fijar(lectura, response)
+
+
+class EstaticosMiddleware:
+    """
+    Sirve los archivos de STATIC_ROOT (ver estaticos.py) sin pasar por el resto
+    de los middlewares ni por las URLs: va primero. El índice se arma una sola
+    vez al arrancar; las URLs que no están en él siguen de largo. Se apaga con
+    ESTATICOS_SERVIR=0 (cuando los sirve un proxy o un CDN).
+    Funciona con vistas sync y async.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        self.indice = {}
+        prefijo = settings.STATIC_URL or ''
+        if settings.ESTATICOS_SERVIR and settings.STATIC_ROOT and prefijo.startswith('/'):
+            con_hash = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+            self.indice = estaticos.indexar(settings.STATIC_ROOT, prefijo, con_hash, settings.ESTATICOS_MAX_AGE)
 
     def __call__(self, request):
-        # Lista de rutas permitidas sin verificación (Login, Logout, Admin, y la propia verificación)
-        rutas_excluidas = [
-            reverse('login'),
-            reverse('logout'),
-            reverse('registro'),
-            reverse('verificacion_2fa'),
-        ]
-        
-        # También excluimos rutas estáticas o de admin si es necesario
-        if request.path.startswith('/static/') or request.path.startswith('/media/') or request.path.startswith('/admin/'):
+        if self.es_async:
+            return self.__acall__(request)
+        archivo = self.indice.get(request.path_info)
+        if archivo is None:
             return self.get_response(request)
+        return estaticos.servir(request, archivo)
 
-        # LÓGICA DEL GUARDIA:
-        # Si el usuario está autenticado...
-        if request.user.is_authenticated:
-            # ...y NO tiene la marca de verificado en su sesión...
-            if not request.session.get('2fa_verificado'):
-                # ...y no está intentando ir a una ruta permitida...
-                if request.path not in rutas_excluidas:
-                    # ...¡LO MANDAMOS A VERIFICAR!
-                    return redirect('verificacion_2fa')
-
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+    async def __acall__(self, request):
+        archivo = self.indice.get(request.path_info)
+        if archivo is None:
+            return await self.get_response(request)
+        return await sync_to_async(estaticos.servir, thread_sensitive=False)(request, archivo, en_memoria=True)
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from Marketplace_App import busqueda
+
+
+def crear_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if not busqueda.crear_indice(connection):
+        return
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    filas = Anuncio.objects.using(connection.alias).values_list('pk', 'titulo', 'descripcion')
+    busqueda.indexar_filas(filas, using=connection.alias)
+
+
+def eliminar_indice(apps, schema_editor):
+    busqueda.eliminar_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0003_perfilusuario_telefono_verificado'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0004_indice_busqueda_anuncio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-fecha_publicacion', '-id'], name='anuncio_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['precio', 'id'], name='anuncio_activo_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria', '-fecha_publicacion', '-id'], name='anuncio_cat_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria', 'precio', 'id'], name='anuncio_cat_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['ubicacion', '-fecha_publicacion', '-id'], name='anuncio_ubi_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['ubicacion', 'precio', 'id'], name='anuncio_ubi_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria', 'ubicacion', '-fecha_publicacion', '-id'], name='anuncio_cat_ubi_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_facetas(apps, schema_editor):
+    # Llena la tabla con los anuncios activos que ya existen
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    FacetaAnuncios = apps.get_model('Marketplace_App', 'FacetaAnuncios')
+    alias = schema_editor.connection.alias
+    activos = Anuncio.objects.using(alias).filter(activo=True).order_by()
+    filas = [
+        FacetaAnuncios(tipo='CATEGORIA', valor=str(fila['categoria_id']), cantidad=fila['total'])
+        for fila in activos.values('categoria_id').annotate(total=Count('id'))
+    ] + [
+        FacetaAnuncios(tipo='UBICACION', valor=fila['ubicacion'], cantidad=fila['total'])
+        for fila in activos.values('ubicacion').annotate(total=Count('id'))
+    ]
+    FacetaAnuncios.objects.using(alias).bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0005_indices_anuncio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetaAnuncios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CATEGORIA', 'Categoría'), ('UBICACION', 'Ubicación')], max_length=10)),
+                ('valor', models.CharField(max_length=100)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Faceta de Anuncios',
+                'verbose_name_plural': 'Facetas de Anuncios',
+                'ordering': ['tipo', 'valor'],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'valor'), name='faceta_tipo_valor_unica')],
+            },
+        ),
+        migrations.RunPython(calcular_facetas, migrations.RunPython.noop),
+    ]
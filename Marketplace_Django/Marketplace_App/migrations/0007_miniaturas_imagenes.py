@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0006_facetaanuncios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anuncio',
+            name='imagen_miniaturas',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='imagen_miniaturas',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
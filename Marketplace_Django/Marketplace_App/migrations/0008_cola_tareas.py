@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0007_miniaturas_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaFallida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('argumentos', models.JSONField(default=dict)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_fallo', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea Fallida',
+                'verbose_name_plural': 'Tareas Fallidas',
+                'ordering': ['-fecha_fallo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('argumentos', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso')], default='PENDIENTE', max_length=10)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('disponible_desde', models.DateTimeField()),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, null=True)),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['disponible_desde', 'id'],
+                'indexes': [models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_estado_disponible_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+def copiar_fecha_publicacion(apps, schema_editor):
+    # Los anuncios existentes no se modificaron desde que se publicaron
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    Anuncio.objects.using(schema_editor.connection.alias).update(fecha_modificacion=models.F('fecha_publicacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0008_cola_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anuncio',
+            name='fecha_modificacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copiar_fecha_publicacion, migrations.RunPython.noop),
+    ]
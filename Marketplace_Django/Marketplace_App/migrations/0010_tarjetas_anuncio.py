@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def llenar_tarjetas(apps, schema_editor):
+    # Una tarjeta por cada anuncio activo que ya existe
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    Categoria = apps.get_model('Marketplace_App', 'Categoria')
+    TarjetaAnuncio = apps.get_model('Marketplace_App', 'TarjetaAnuncio')
+    alias = schema_editor.connection.alias
+    nombres = dict(Categoria.objects.using(alias).values_list('pk', 'nombre'))
+    campos = ('categoria_id', 'titulo', 'precio', 'ubicacion', 'estado', 'fecha_publicacion', 'imagen_principal', 'imagen_miniaturas')
+    filas = Anuncio.objects.using(alias).filter(activo=True).order_by().values('id', *campos)
+    TarjetaAnuncio.objects.using(alias).bulk_create(
+        (TarjetaAnuncio(categoria_nombre=nombres[fila['categoria_id']], **fila) for fila in filas.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0009_fecha_modificacion_anuncio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarjetaAnuncio',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('categoria_nombre', models.CharField(max_length=100)),
+                ('titulo', models.CharField(max_length=200)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('ubicacion', models.CharField(max_length=100)),
+                ('estado', models.CharField(choices=[('NUEVO', 'Nuevo'), ('USADO', 'Usado'), ('REACONDICIONADO', 'Reacondicionado')], max_length=20)),
+                ('fecha_publicacion', models.DateTimeField()),
+                ('imagen_principal', models.ImageField(blank=True, null=True, upload_to='anuncios_imagenes/')),
+                ('imagen_miniaturas', models.BooleanField(default=False)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Marketplace_App.categoria')),
+            ],
+            options={
+                'verbose_name': 'Tarjeta de Anuncio',
+                'verbose_name_plural': 'Tarjetas de Anuncios',
+                'ordering': ['-fecha_publicacion'],
+                'indexes': [models.Index(fields=['-fecha_publicacion', '-id'], name='tarjeta_fecha_idx'), models.Index(fields=['precio', 'id'], name='tarjeta_precio_idx'), models.Index(fields=['categoria', '-fecha_publicacion', '-id'], name='tarjeta_cat_fecha_idx'), models.Index(fields=['categoria', 'precio', 'id'], name='tarjeta_cat_precio_idx'), models.Index(fields=['ubicacion', '-fecha_publicacion', '-id'], name='tarjeta_ubi_fecha_idx'), models.Index(fields=['ubicacion', 'precio', 'id'], name='tarjeta_ubi_precio_idx'), models.Index(fields=['categoria', 'ubicacion', '-fecha_publicacion', '-id'], name='tarjeta_cat_ubi_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(llenar_tarjetas, migrations.RunPython.noop),
+    ]
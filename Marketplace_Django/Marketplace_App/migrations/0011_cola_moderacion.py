@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def resumir_reportes(apps, schema_editor):
+    # Agrupa los reportes que ya existen por entidad (todos quedan pendientes)
+    Reporte = apps.get_model('Marketplace_App', 'Reporte')
+    ResumenReportes = apps.get_model('Marketplace_App', 'ResumenReportes')
+    alias = schema_editor.connection.alias
+    grupos = (
+        Reporte.objects.using(alias).order_by()
+        .values('tipo_entidad_reportada', 'identificador_entidad_reportada')
+        .annotate(
+            cantidad=Count('id'),
+            conocidos=Count('usuario_reportador', distinct=True),
+            con_usuario=Count('usuario_reportador'),
+            primero=Min('fecha_reporte'),
+            ultimo=Max('fecha_reporte'),
+        )
+    )
+    ResumenReportes.objects.using(alias).bulk_create([
+        ResumenReportes(
+            tipo_entidad=grupo['tipo_entidad_reportada'],
+            identificador_entidad=grupo['identificador_entidad_reportada'],
+            cantidad=grupo['cantidad'],
+            reportadores=grupo['conocidos'] + grupo['cantidad'] - grupo['con_usuario'],
+            primer_reporte=grupo['primero'],
+            ultimo_reporte=grupo['ultimo'],
+        )
+        for grupo in grupos
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0010_tarjetas_anuncio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenReportes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_entidad', models.CharField(choices=[('ANUNCIO', 'Anuncio'), ('USUARIO', 'Usuario')], max_length=10)),
+                ('identificador_entidad', models.IntegerField()),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('reportadores', models.PositiveIntegerField(default=0)),
+                ('reportadores_al_revisar', models.PositiveIntegerField(default=0)),
+                ('primer_reporte', models.DateTimeField()),
+                ('ultimo_reporte', models.DateTimeField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('DESCARTADO', 'Descartado'), ('DESACTIVADO', 'Desactivado')], default='PENDIENTE', max_length=12)),
+                ('desactivado_automaticamente', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Entidad reportada',
+                'verbose_name_plural': 'Cola de moderación',
+                'ordering': ['-reportadores', '-ultimo_reporte'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reporte',
+            index=models.Index(fields=['tipo_entidad_reportada', 'identificador_entidad_reportada', 'usuario_reportador'], name='reporte_entidad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenreportes',
+            index=models.Index(fields=['estado', '-reportadores', '-ultimo_reporte'], name='resumen_reportes_cola_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenreportes',
+            constraint=models.UniqueConstraint(fields=('tipo_entidad', 'identificador_entidad'), name='resumen_reportes_entidad_unica'),
+        ),
+        migrations.RunPython(resumir_reportes, migrations.RunPython.noop),
+    ]
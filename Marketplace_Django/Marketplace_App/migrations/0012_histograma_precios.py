@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def llenar_histograma(apps, schema_editor):
+    # Cubetas 1-2-5 (ver precios.cubeta, copiada acá para que la migración no cambie si cambia el módulo)
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    CubetaPrecios = apps.get_model('Marketplace_App', 'CubetaPrecios')
+    alias = schema_editor.connection.alias
+
+    def cubeta(precio):
+        if precio < 1:
+            return 0
+        exponente = precio.adjusted()
+        primero = precio.scaleb(-exponente)
+        return 3 * exponente + (0 if primero < 2 else 1 if primero < 5 else 2)
+
+    conteos = Counter()
+    filas = Anuncio.objects.using(alias).filter(activo=True).order_by().values_list('categoria_id', 'ubicacion', 'precio')
+    for categoria_id, ubicacion, precio in filas.iterator(chunk_size=2000):
+        conteos[(categoria_id, ubicacion, cubeta(precio))] += 1
+    CubetaPrecios.objects.using(alias).bulk_create([
+        CubetaPrecios(categoria_id=categoria_id, ubicacion=ubicacion, cubeta=numero, cantidad=cantidad)
+        for (categoria_id, ubicacion, numero), cantidad in conteos.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0011_cola_moderacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubetaPrecios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ubicacion', models.CharField(max_length=100)),
+                ('cubeta', models.SmallIntegerField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Marketplace_App.categoria')),
+            ],
+            options={
+                'verbose_name': 'Cubeta de precios',
+                'verbose_name_plural': 'Histograma de precios',
+                'ordering': ['categoria', 'ubicacion', 'cubeta'],
+                'indexes': [models.Index(fields=['ubicacion', 'cubeta'], name='cubeta_precios_ubi_idx')],
+                'constraints': [models.UniqueConstraint(fields=('categoria', 'ubicacion', 'cubeta'), name='cubeta_precios_unica')],
+            },
+        ),
+        migrations.RunPython(llenar_histograma, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contar_comentarios(apps, schema_editor):
+    # Igual que comentarios.recalcular (copiado para que la migración no dependa del módulo)
+    Anuncio = apps.get_model('Marketplace_App', 'Anuncio')
+    Comentario = apps.get_model('Marketplace_App', 'Comentario')
+    TarjetaAnuncio = apps.get_model('Marketplace_App', 'TarjetaAnuncio')
+    alias = schema_editor.connection.alias
+    conteo = Coalesce(Subquery(
+        Comentario.objects.using(alias).filter(anuncio_id=OuterRef('pk')).order_by()
+        .values('anuncio_id').annotate(total=Count('id')).values('total')
+    ), Value(0))
+    Anuncio.objects.using(alias).update(cantidad_comentarios=conteo)
+    TarjetaAnuncio.objects.using(alias).update(cantidad_comentarios=conteo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0012_histograma_precios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anuncio',
+            name='cantidad_comentarios',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tarjetaanuncio',
+            name='cantidad_comentarios',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['anuncio', 'fecha_comentario', 'id'], name='comentario_anuncio_fecha_idx'),
+        ),
+        migrations.RunPython(contar_comentarios, migrations.RunPython.noop),
+    ]
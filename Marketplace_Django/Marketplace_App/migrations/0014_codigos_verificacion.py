@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0013_comentarios_anuncio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoVerificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proposito', models.CharField(max_length=20)),
+                ('dueno', models.CharField(max_length=32)),
+                ('digesto', models.CharField(max_length=64)),
+                ('expira', models.DateTimeField(db_index=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Código de verificación',
+                'verbose_name_plural': 'Códigos de verificación',
+                'constraints': [models.UniqueConstraint(fields=('proposito', 'dueno'), name='codigo_verificacion_unico')],
+            },
+        ),
+    ]
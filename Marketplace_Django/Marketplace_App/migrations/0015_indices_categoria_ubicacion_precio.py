@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Marketplace_App', '0014_codigos_verificacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria', 'ubicacion', 'precio', 'id'], name='anuncio_cat_ubi_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarjetaanuncio',
+            index=models.Index(fields=['categoria', 'ubicacion', 'precio', 'id'], name='tarjeta_cat_ubi_precio_idx'),
+        ),
+    ]
@@ -0,0 +1,127 @@
+"""
+Miniaturas (derivados WebP/JPEG en anchos fijos) de las imágenes subidas.
+
+Para ``anuncios_imagenes/foto.jpg`` se generan, en la misma carpeta,
+``foto_160w.webp``, ``foto_160w.jpg``, ``foto_320w.webp``, etc. El modelo
+marca con un booleano cuándo ya existen, así los templates no tienen que
+consultar el disco para decidir si usan el ``srcset`` o la imagen original.
+Cuando la imagen se reemplaza o se borra el registro, signals.py borra las
+miniaturas de la anterior (``borrar``).
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+ANCHOS = (160, 320, 640)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+def nombre_miniatura(nombre, ancho, extension):
+    base, _ = os.path.splitext(nombre)
+    return f'{base}_{ancho}w.{extension}'
+
+
+def nombres_miniaturas(nombre):
+    return [nombre_miniatura(nombre, ancho, extension) for ancho in ANCHOS for extension in FORMATOS]
+
+
+def borrar(nombre, storage):
+    """Borra las miniaturas de la imagen ``nombre`` (las que existan)."""
+    for miniatura in nombres_miniaturas(nombre):
+        storage.delete(miniatura)
+
+
+def generar(archivo):
+    """Genera todas las miniaturas de ``archivo`` (un FieldFile). Devuelve los nombres creados."""
+    storage = archivo.storage
+    with archivo.open('rb') as original:
+        imagen = ImageOps.exif_transpose(Image.open(original))
+        imagen.load()
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info else 'RGB')
+
+    creados = []
+    for ancho in ANCHOS:
+        copia = imagen.copy()
+        # Nunca se agranda: si la original es más chica queda con su tamaño
+        copia.thumbnail((ancho, ancho * 4), Image.LANCZOS)
+        for extension, (formato, opciones) in FORMATOS.items():
+            salida = copia.convert('RGB') if formato == 'JPEG' else copia
+            buffer = BytesIO()
+            salida.save(buffer, formato, **opciones)
+            nombre = nombre_miniatura(archivo.name, ancho, extension)
+            if storage.exists(nombre):
+                storage.delete(nombre)
+            creados.append(storage.save(nombre, ContentFile(buffer.getvalue())))
+    return creados
+
+
+def generar_para(instancia, campo):
+    """
+    Genera las miniaturas de ``instancia.<campo>`` y marca ``imagen_miniaturas``.
+    Si la imagen no se puede leer se deja sin marcar (se sigue usando la original).
+    """
+    archivo = getattr(instancia, campo)
+    if not archivo:
+        return False
+    try:
+        generar(archivo)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('No se pudieron generar las miniaturas de %s', archivo.name)
+        return False
+    # update() y no save(): no hace falta volver a disparar las señales del modelo.
+    # Sólo si la imagen sigue siendo la misma: si la cambiaron mientras se generaban,
+    # estas miniaturas ya no sirven (la nueva tiene su propia tarea).
+    marcada = type(instancia)._default_manager.filter(pk=instancia.pk, **{campo: archivo.name}).update(
+        imagen_miniaturas=True,
+    )
+    if not marcada:
+        borrar(archivo.name, archivo.storage)
+        return False
+    instancia.imagen_miniaturas = True
+    return True
+
+
+class Miniaturas:
+    """URLs de las miniaturas de una imagen (o de la original si todavía no se generaron)."""
+
+    def __init__(self, archivo, disponibles):
+        self.archivo = archivo
+        self.disponibles = bool(archivo) and disponibles
+
+    def __bool__(self):
+        return bool(self.archivo)
+
+    @property
+    def original(self):
+        return self.archivo.url if self.archivo else ''
+
+    def url(self, ancho, extension='jpg'):
+        if not self.disponibles:
+            return self.original
+        return self.archivo.storage.url(nombre_miniatura(self.archivo.name, ancho, extension))
+
+    def srcset(self, extension='jpg'):
+        if not self.disponibles:
+            return ''
+        return ', '.join(f'{self.url(ancho, extension)} {ancho}w' for ancho in ANCHOS)
+
+    @property
+    def chica(self):
+        return self.url(ANCHOS[0])
+
+    @property
+    def mediana(self):
+        return self.url(ANCHOS[1])
+
+    @property
+    def grande(self):
+        return self.url(ANCHOS[-1])
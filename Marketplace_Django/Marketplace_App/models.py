@@ -2,6 +2,11 @@ from django.db import models
 
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from Marketplace_App.miniaturas import Miniaturas
 
 # Obtenemos el modelo de usuario de Django, que ya está normalizado (idUsuario, nombreUsuario, contraseña, etc.)
 User = get_user_model()
@@ -20,6 +25,7 @@ class PerfilUsuario(models.Model):
 
     # Campos adicionales de información personal
     imagen = models.ImageField(upload_to='perfil_imagenes/', blank=True, null=True, verbose_name="Foto de Perfil")
+    imagen_miniaturas = models.BooleanField(default=False, editable=False) # Miniaturas ya generadas (ver miniaturas.py)
     telefono_contacto = models.CharField(max_length=20, blank=True, null=True, verbose_name="Teléfono de Contacto")
     ubicacion_contacto = models.CharField(max_length=100, blank=True, null=True, verbose_name="Ubicación/Ciudad")
     fecha_registro = models.DateTimeField(auto_now_add=True)
@@ -45,6 +51,10 @@ class PerfilUsuario(models.Model):
     def __str__(self):
         return f'Perfil de {self.usuario.username}'
 
+    @property
+    def miniaturas(self):
+        return Miniaturas(self.imagen, self.imagen_miniaturas)
+
 # --- ENTIDAD: Categoría (1FN, 2FN, 3FN) ---
 # Clave Primaria: id (automático)
 # No hay dependencias parciales ni transitivas.
@@ -63,6 +73,33 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nombre
 
+# Señal enviada al activar/desactivar anuncios en bloque (queryset.update no envía post_save).
+# Argumentos: pks (ids que cambiaron), activo (el nuevo valor) y using (alias de la base).
+activo_cambiado = Signal()
+
+# Señal enviada después de un alta masiva (bulk_create tampoco envía post_save).
+# Argumentos: anuncios (las instancias creadas, con pk) y using (alias de la base).
+anuncios_creados = Signal()
+
+
+class AnuncioQuerySet(models.QuerySet):
+    def cambiar_activo(self, activo):
+        """Activa o desactiva en bloque los anuncios del queryset y avisa con ``activo_cambiado``."""
+        pks = list(self.exclude(activo=activo).values_list('pk', flat=True))
+        if pks:
+            # update() no toca los auto_now: la fecha de modificación se pone a mano
+            self.model.objects.using(self.db).filter(pk__in=pks).update(activo=activo, fecha_modificacion=timezone.now())
+            activo_cambiado.send(sender=self.model, pks=pks, activo=activo, using=self.db)
+        return len(pks)
+
+    def crear_en_bloque(self, anuncios, tamano_lote=None):
+        """``bulk_create`` que avisa con ``anuncios_creados`` para mantener las tablas derivadas."""
+        creados = self.bulk_create(anuncios, batch_size=tamano_lote)
+        if creados:
+            anuncios_creados.send(sender=self.model, anuncios=creados, using=self.db)
+        return creados
+
+
 # --- ENTIDAD: Anuncio (1FN, 2FN, 3FN) ---
 # Clave Primaria: id (automático)
 # Dependencias: categoría (FK) y usuario (FK). No hay dependencias parciales ni transitivas.
@@ -92,19 +129,71 @@ class Anuncio(models.Model):
 
     # Fechas y control
     fecha_publicacion = models.DateTimeField(auto_now_add=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True) # Para ETag/Last-Modified de la API
     activo = models.BooleanField(default=True) 
 
     # Gestión de archivos
     imagen_principal = models.ImageField(upload_to='anuncios_imagenes/', blank=True, null=True)
+    imagen_miniaturas = models.BooleanField(default=False, editable=False) # Miniaturas ya generadas (ver miniaturas.py)
+
+    # Contador desnormalizado (lo mantiene comentarios.py): el detalle y la grilla no cuentan comentarios
+    cantidad_comentarios = models.PositiveIntegerField(default=0, editable=False)
+
+    # Campos que se actualizan con UPDATE por fuera del save(): uno completo los relee
+    CAMPOS_MANTENIDOS_APARTE = ('cantidad_comentarios', 'imagen_miniaturas')
+    # Valores guardados que comparan las señales (facetas, caché de vistas, miniaturas)
+    CAMPOS_ESTADO_ANTERIOR = ('activo', 'categoria_id', 'ubicacion', 'precio', 'imagen_principal')
     
+    objects = AnuncioQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Anuncio"
         verbose_name_plural = "Anuncios"
         ordering = ['-fecha_publicacion'] 
+        # Índices parciales (sólo anuncios activos) para las combinaciones de filtro/orden
+        # que arma filtros.filtrar_anuncios. home lee de TarjetaAnuncio (con los mismos
+        # índices); éstos son los de la API (/api/anuncios/), que filtra Anuncio directamente
+        indexes = [
+            models.Index(fields=['-fecha_publicacion', '-id'], condition=models.Q(activo=True), name='anuncio_activo_fecha_idx'),
+            models.Index(fields=['precio', 'id'], condition=models.Q(activo=True), name='anuncio_activo_precio_idx'),
+            models.Index(fields=['categoria', '-fecha_publicacion', '-id'], condition=models.Q(activo=True), name='anuncio_cat_fecha_idx'),
+            models.Index(fields=['categoria', 'precio', 'id'], condition=models.Q(activo=True), name='anuncio_cat_precio_idx'),
+            models.Index(fields=['ubicacion', '-fecha_publicacion', '-id'], condition=models.Q(activo=True), name='anuncio_ubi_fecha_idx'),
+            models.Index(fields=['ubicacion', 'precio', 'id'], condition=models.Q(activo=True), name='anuncio_ubi_precio_idx'),
+            models.Index(fields=['categoria', 'ubicacion', '-fecha_publicacion', '-id'], condition=models.Q(activo=True), name='anuncio_cat_ubi_fecha_idx'),
+            models.Index(fields=['categoria', 'ubicacion', 'precio', 'id'], condition=models.Q(activo=True), name='anuncio_cat_ubi_precio_idx'),
+        ]
 
     def __str__(self):
         return self.titulo
 
+    def save(self, *args, **kwargs):
+        # Editar un anuncio cargado antes de un comentario nuevo o de que el trabajador
+        # termine las miniaturas (editar_anuncio, admin) no tiene que guardar los valores
+        # viejos. La fila queda bloqueada hasta el final, así que comentarios.sumar espera
+        # y la tarjeta sale con el valor actual. La misma lectura trae el estado anterior
+        # que usan las señales (signals.guardar_estado_anterior no vuelve a consultar).
+        if self._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(Anuncio, instance=self)
+        with transaction.atomic(using=using):
+            actuales = (
+                Anuncio.objects.using(using).select_for_update().filter(pk=self.pk)
+                .values(*self.CAMPOS_ESTADO_ANTERIOR, *self.CAMPOS_MANTENIDOS_APARTE).first()
+            )
+            if actuales is not None:
+                for campo in self.CAMPOS_MANTENIDOS_APARTE:
+                    setattr(self, campo, actuales.pop(campo))
+            self._estado_leido = actuales
+            try:
+                super().save(*args, **kwargs)
+            finally:
+                self.__dict__.pop('_estado_leido', None)
+
+    @property
+    def miniaturas(self):
+        return Miniaturas(self.imagen_principal, self.imagen_miniaturas)
+
 
 # --- ENTIDAD: Comentario (1FN, 2FN, 3FN) ---
 # Clave Primaria: id (automático)
@@ -126,9 +215,18 @@ class Comentario(models.Model):
         verbose_name = "Comentario"
         verbose_name_plural = "Comentarios"
         ordering = ['fecha_comentario']
+        indexes = [
+            # El hilo de un anuncio en orden, paginado por cursor (ver comentarios.py)
+            models.Index(fields=['anuncio', 'fecha_comentario', 'id'], name='comentario_anuncio_fecha_idx'),
+        ]
 
     def __str__(self):
-        return f'Comentario de {self.usuario.username} en {self.anuncio.titulo}'
+        # Sin consultas: usa el usuario y el anuncio sólo si ya están cargados
+        autor = f'usuario #{self.usuario_id}'
+        if Comentario.usuario.is_cached(self) and self.usuario is not None:
+            autor = self.usuario.username
+        anuncio = self.anuncio.titulo if Comentario.anuncio.is_cached(self) else f'anuncio #{self.anuncio_id}'
+        return f'Comentario de {autor} en {anuncio}'
 
 
 # --- ENTIDAD: Reporte (1FN, 2FN, 3FN) ---
@@ -161,6 +259,238 @@ class Reporte(models.Model):
         verbose_name = "Reporte"
         verbose_name_plural = "Reportes"
         ordering = ['-fecha_reporte']
+        indexes = [
+            # Los reportes de una entidad (y si un usuario ya la reportó) sin recorrer la tabla
+            models.Index(
+                fields=['tipo_entidad_reportada', 'identificador_entidad_reportada', 'usuario_reportador'],
+                name='reporte_entidad_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Reporte de {self.tipo_entidad_reportada} ID {self.identificador_entidad_reportada}'
+
+
+# --- RESUMEN: Reportes por entidad (cola de moderación) ---
+# Tabla derivada: se mantiene desde señales (ver moderacion.py) y se puede recalcular.
+class ResumenReportes(models.Model):
+    """
+    Cuántos reportes (y de cuántos usuarios distintos) tiene cada anuncio o
+    usuario reportado. Es la cola de moderación del admin, ordenada por
+    gravedad, y lo que decide la desactivación automática de un anuncio.
+    """
+    PENDIENTE = 'PENDIENTE'
+    DESCARTADO = 'DESCARTADO'
+    DESACTIVADO = 'DESACTIVADO'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (DESCARTADO, 'Descartado'),
+        (DESACTIVADO, 'Desactivado'),
+    ]
+
+    tipo_entidad = models.CharField(max_length=10, choices=Reporte.TIPOS_ENTIDAD)
+    identificador_entidad = models.IntegerField()
+    cantidad = models.PositiveIntegerField(default=0) # Todos los reportes
+    reportadores = models.PositiveIntegerField(default=0) # Usuarios distintos que reportaron
+    reportadores_al_revisar = models.PositiveIntegerField(default=0) # Los que ya vio un moderador
+    primer_reporte = models.DateTimeField()
+    ultimo_reporte = models.DateTimeField()
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE)
+    desactivado_automaticamente = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Entidad reportada"
+        verbose_name_plural = "Cola de moderación"
+        ordering = ['-reportadores', '-ultimo_reporte']
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_entidad', 'identificador_entidad'], name='resumen_reportes_entidad_unica'),
+        ]
+        indexes = [
+            # La cola (filtrada por estado): los reportados por más usuarios arriba
+            models.Index(fields=['estado', '-reportadores', '-ultimo_reporte'], name='resumen_reportes_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_entidad_display()} #{self.identificador_entidad}: {self.reportadores} usuarios'
+
+    @property
+    def reportadores_nuevos(self):
+        return self.reportadores - self.reportadores_al_revisar
+
+
+# --- RESUMEN: Conteo de anuncios activos por faceta (categoría / ubicación) ---
+# Tabla derivada: se mantiene desde señales (ver facetas.py) y se puede recalcular.
+class FacetaAnuncios(models.Model):
+    """
+    Cantidad de anuncios activos por categoría o por ubicación, para armar la barra
+    lateral de home() sin recorrer la tabla de anuncios.
+    """
+    TIPOS = [
+        ('CATEGORIA', 'Categoría'),
+        ('UBICACION', 'Ubicación'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    valor = models.CharField(max_length=100) # id de la categoría o texto de la ubicación
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Faceta de Anuncios"
+        verbose_name_plural = "Facetas de Anuncios"
+        ordering = ['tipo', 'valor']
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'valor'], name='faceta_tipo_valor_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} {self.valor}: {self.cantidad}'
+
+
+# --- RESUMEN: Histograma de precios por categoría y ubicación ---
+# Tabla derivada: se mantiene desde señales (ver precios.py) y se puede recalcular.
+class CubetaPrecios(models.Model):
+    """
+    Cantidad de anuncios activos de una categoría y ubicación cuyo precio cae
+    en una cubeta de escala logarítmica (1, 2, 5, 10, 20, 50, ...). Sumando
+    las filas se dibuja el histograma de home() sin leer la tabla de anuncios.
+    """
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='+')
+    ubicacion = models.CharField(max_length=100)
+    cubeta = models.SmallIntegerField() # Ver precios.cubeta()
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Cubeta de precios"
+        verbose_name_plural = "Histograma de precios"
+        ordering = ['categoria', 'ubicacion', 'cubeta']
+        constraints = [
+            # También sirve de índice para el histograma de una categoría
+            models.UniqueConstraint(fields=['categoria', 'ubicacion', 'cubeta'], name='cubeta_precios_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['ubicacion', 'cubeta'], name='cubeta_precios_ubi_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.categoria_id} / {self.ubicacion} / cubeta {self.cubeta}: {self.cantidad}'
+
+
+# --- MODELO DE LECTURA: Tarjetas del listado (home) ---
+# Tabla derivada: se mantiene desde señales (ver tarjetas.py) y se puede reconstruir.
+class TarjetaAnuncio(models.Model):
+    """
+    Un anuncio activo con sólo lo que muestra su tarjeta en la grilla de home()
+    y las columnas por las que se filtra y ordena. Sin la descripción (TextField
+    sin límite) ni joins: cada página del listado lee filas chicas de una sola tabla.
+    """
+    id = models.BigIntegerField(primary_key=True) # El mismo id del Anuncio
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='+')
+    categoria_nombre = models.CharField(max_length=100)
+    titulo = models.CharField(max_length=200)
+    precio = models.DecimalField(max_digits=9, decimal_places=2)
+    ubicacion = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20, choices=Anuncio.ESTADOS)
+    fecha_publicacion = models.DateTimeField()
+    imagen_principal = models.ImageField(upload_to='anuncios_imagenes/', blank=True, null=True)
+    imagen_miniaturas = models.BooleanField(default=False)
+    cantidad_comentarios = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Tarjeta de Anuncio"
+        verbose_name_plural = "Tarjetas de Anuncios"
+        ordering = ['-fecha_publicacion']
+        # Los mismos índices del listado que Anuncio (sin condición: acá todos son activos)
+        indexes = [
+            models.Index(fields=['-fecha_publicacion', '-id'], name='tarjeta_fecha_idx'),
+            models.Index(fields=['precio', 'id'], name='tarjeta_precio_idx'),
+            models.Index(fields=['categoria', '-fecha_publicacion', '-id'], name='tarjeta_cat_fecha_idx'),
+            models.Index(fields=['categoria', 'precio', 'id'], name='tarjeta_cat_precio_idx'),
+            models.Index(fields=['ubicacion', '-fecha_publicacion', '-id'], name='tarjeta_ubi_fecha_idx'),
+            models.Index(fields=['ubicacion', 'precio', 'id'], name='tarjeta_ubi_precio_idx'),
+            models.Index(fields=['categoria', 'ubicacion', '-fecha_publicacion', '-id'], name='tarjeta_cat_ubi_fecha_idx'),
+            models.Index(fields=['categoria', 'ubicacion', 'precio', 'id'], name='tarjeta_cat_ubi_precio_idx'),
+        ]
+
+    def __str__(self):
+        return self.titulo
+
+    @property
+    def miniaturas(self):
+        return Miniaturas(self.imagen_principal, self.imagen_miniaturas)
+
+
+# --- COLA DE TAREAS EN SEGUNDO PLANO (ver cola.py) ---
+class Tarea(models.Model):
+    """
+    Trabajo pendiente (envío de correo, miniaturas, ...) que procesa el comando
+    procesar_tareas fuera del request. La fila se borra al terminar bien.
+    """
+    PENDIENTE = 'PENDIENTE'
+    EN_CURSO = 'EN_CURSO'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+    ]
+
+    nombre = models.CharField(max_length=100) # Nombre con el que se registró la función
+    argumentos = models.JSONField(default=dict) # {"args": [...], "kwargs": {...}}
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_desde = models.DateTimeField() # No se ejecuta antes (reintentos con espera)
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True) # Si el trabajador muere, se libera sola
+    trabajador = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['disponible_desde', 'id']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.nombre} #{self.pk} ({self.get_estado_display()}, intento {self.intentos})'
+
+
+class TareaFallida(models.Model):
+    """Tarea que agotó sus reintentos (dead letter). Se puede volver a encolar desde el admin."""
+    nombre = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict)
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField() # Cuándo se encoló la tarea original
+    fecha_fallo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Tarea Fallida"
+        verbose_name_plural = "Tareas Fallidas"
+        ordering = ['-fecha_fallo']
+
+    def __str__(self):
+        return f'{self.nombre} (falló tras {self.intentos} intentos)'
+
+
+# --- RESPALDO DE LOS CÓDIGOS DE VERIFICACIÓN (ver codigos.py) ---
+class CodigoVerificacion(models.Model):
+    """
+    Código de verificación guardado en la base sólo cuando la caché no
+    responde. Tiene el HMAC del código (nunca el código) y el dueño ya hasheado.
+    """
+    proposito = models.CharField(max_length=20)
+    dueno = models.CharField(max_length=32)
+    digesto = models.CharField(max_length=64)
+    expira = models.DateTimeField(db_index=True) # Para purgar_sesiones
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Código de verificación"
+        verbose_name_plural = "Códigos de verificación"
+        constraints = [
+            models.UniqueConstraint(fields=['proposito', 'dueno'], name='codigo_verificacion_unico'),
+        ]
 
     def __str__(self):
-        return f'Reporte de {self.tipo_entidad_reportada} ID {self.identificador_entidad_reportada}'
\ No newline at end of file
+        return f'{self.proposito} (vence {self.expira:%Y-%m-%d %H:%M})'
@@ -0,0 +1,151 @@
+"""
+Cola de moderación: reportes agregados por entidad (tabla ResumenReportes).
+
+Cada reporte nuevo suma en la fila de su entidad (anuncio o usuario) la
+cantidad de reportes y, si es el primero de ese usuario, la de reportadores
+distintos. Todo con búsquedas por índice, sin agrupar la tabla de reportes.
+Cuando un anuncio pendiente junta MODERACION_UMBRAL_DESACTIVAR reportadores
+nuevos (desde la última revisión) se desactiva solo, hasta que un moderador
+lo revise desde el admin.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+
+from Marketplace_App.models import Anuncio, Reporte, ResumenReportes
+
+ANUNCIO = 'ANUNCIO'
+USUARIO = 'USUARIO'
+
+
+def _reportes_de(reporte, using):
+    return Reporte.objects.using(using).filter(
+        tipo_entidad_reportada=reporte.tipo_entidad_reportada,
+        identificador_entidad_reportada=reporte.identificador_entidad_reportada,
+    )
+
+
+def _es_reportador_nuevo(reporte, using):
+    # Anónimo (usuario borrado): cuenta como reportador distinto
+    if reporte.usuario_reportador_id is None:
+        return True
+    return not _reportes_de(reporte, using).filter(
+        usuario_reportador_id=reporte.usuario_reportador_id,
+    ).exclude(pk=reporte.pk).exists()
+
+
+def registrar_reporte(reporte, using='default'):
+    """Suma ``reporte`` (ya guardado) a su entidad y aplica la desactivación automática."""
+    nuevo = int(_es_reportador_nuevo(reporte, using))
+    resumenes = ResumenReportes.objects.using(using)
+    entidad = {
+        'tipo_entidad': reporte.tipo_entidad_reportada,
+        'identificador_entidad': reporte.identificador_entidad_reportada,
+    }
+    with transaction.atomic(using=using):
+        cambios = {
+            'cantidad': F('cantidad') + 1,
+            'reportadores': F('reportadores') + nuevo,
+            'ultimo_reporte': reporte.fecha_reporte,
+        }
+        if not resumenes.filter(**entidad).update(**cambios):
+            _, creado = resumenes.get_or_create(**entidad, defaults={
+                'cantidad': 1, 'reportadores': nuevo,
+                'primer_reporte': reporte.fecha_reporte, 'ultimo_reporte': reporte.fecha_reporte,
+            })
+            if not creado: # Otro request la creó entre el update y el get_or_create
+                resumenes.filter(**entidad).update(**cambios)
+        # Un reporte nuevo sobre algo descartado vuelve a la cola
+        resumenes.filter(**entidad, estado=ResumenReportes.DESCARTADO).update(estado=ResumenReportes.PENDIENTE)
+        resumen = resumenes.select_for_update().get(**entidad)
+        if debe_desactivarse(resumen):
+            desactivar(resumen, automaticamente=True, using=using)
+    return resumen
+
+
+def debe_desactivarse(resumen):
+    umbral = settings.MODERACION_UMBRAL_DESACTIVAR
+    return (
+        bool(umbral)
+        and resumen.tipo_entidad == ANUNCIO
+        and resumen.estado == ResumenReportes.PENDIENTE
+        and resumen.reportadores_nuevos >= umbral
+    )
+
+
+def desactivar(resumen, automaticamente=False, using='default'):
+    """Oculta el anuncio reportado (cambiar_activo avisa a facetas, tarjetas y caché)."""
+    if resumen.tipo_entidad == ANUNCIO:
+        Anuncio.objects.using(using).filter(pk=resumen.identificador_entidad).cambiar_activo(False)
+    resumen.estado = ResumenReportes.DESACTIVADO
+    resumen.desactivado_automaticamente = automaticamente
+    resumen.reportadores_al_revisar = resumen.reportadores
+    resumen.save(using=using, update_fields=['estado', 'desactivado_automaticamente', 'reportadores_al_revisar'])
+
+
+def descartar(resumen, using='default'):
+    """Los reportes no proceden: vuelve a mostrar el anuncio y sólo cuentan los reportadores de acá en más."""
+    if resumen.tipo_entidad == ANUNCIO and resumen.estado == ResumenReportes.DESACTIVADO:
+        Anuncio.objects.using(using).filter(pk=resumen.identificador_entidad).cambiar_activo(True)
+    resumen.estado = ResumenReportes.DESCARTADO
+    resumen.desactivado_automaticamente = False
+    resumen.reportadores_al_revisar = resumen.reportadores
+    resumen.save(using=using, update_fields=['estado', 'desactivado_automaticamente', 'reportadores_al_revisar'])
+
+
+def descontar_reporte(reporte, using='default'):
+    """Resta un reporte borrado (el resumen se borra si no le queda ninguno)."""
+    resumenes = ResumenReportes.objects.using(using).filter(
+        tipo_entidad=reporte.tipo_entidad_reportada, identificador_entidad=reporte.identificador_entidad_reportada,
+    )
+    with transaction.atomic(using=using):
+        resumenes.update(
+            cantidad=F('cantidad') - 1,
+            reportadores=F('reportadores') - int(_es_reportador_nuevo(reporte, using)),
+        )
+        resumenes.filter(cantidad__lte=0).delete()
+
+
+def recalcular(using='default'):
+    """
+    Reconstruye los contadores desde la tabla de reportes (por ejemplo tras
+    una carga masiva). Conserva el estado de moderación de las entidades que
+    ya estaban; no desactiva nada.
+    """
+    anteriores = {
+        (fila['tipo_entidad'], fila['identificador_entidad']): fila
+        for fila in ResumenReportes.objects.using(using).values(
+            'tipo_entidad', 'identificador_entidad', 'estado', 'reportadores_al_revisar', 'desactivado_automaticamente',
+        )
+    }
+    grupos = (
+        Reporte.objects.using(using).order_by()
+        .values('tipo_entidad_reportada', 'identificador_entidad_reportada')
+        .annotate(
+            cantidad=Count('id'),
+            # Los reportes anónimos cuentan cada uno como un reportador distinto
+            conocidos=Count('usuario_reportador', distinct=True),
+            con_usuario=Count('usuario_reportador'),
+            primero=Min('fecha_reporte'),
+            ultimo=Max('fecha_reporte'),
+        )
+    )
+    filas = []
+    for grupo in grupos.iterator(chunk_size=2000):
+        clave = (grupo['tipo_entidad_reportada'], grupo['identificador_entidad_reportada'])
+        anterior = anteriores.get(clave, {})
+        filas.append(ResumenReportes(
+            tipo_entidad=clave[0],
+            identificador_entidad=clave[1],
+            cantidad=grupo['cantidad'],
+            reportadores=grupo['conocidos'] + grupo['cantidad'] - grupo['con_usuario'],
+            primer_reporte=grupo['primero'],
+            ultimo_reporte=grupo['ultimo'],
+            estado=anterior.get('estado', ResumenReportes.PENDIENTE),
+            reportadores_al_revisar=anterior.get('reportadores_al_revisar', 0),
+            desactivado_automaticamente=anterior.get('desactivado_automaticamente', False),
+        ))
+    with transaction.atomic(using=using):
+        ResumenReportes.objects.using(using).all().delete()
+        ResumenReportes.objects.using(using).bulk_create(filas, batch_size=500)
+    return len(filas)
@@ -0,0 +1,231 @@
+"""
+Paginación por cursor (keyset) para el listado de anuncios y los comentarios.
+
+En lugar de ``OFFSET`` + ``COUNT(*)``, cada página se pide "a partir de" la
+última fila vista, usando como clave las columnas del orden más el ``id``
+como desempate. Los cursores son tokens firmados y opacos para el cliente.
+
+Para las páginas numeradas de tablas grandes (el admin) está
+``PaginadorEstimado``, que evita el ``COUNT(*)`` de toda la tabla.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+SALT_CURSOR = 'Marketplace_App.paginacion.cursor'
+
+# Columnas de la clave para cada orden del listado: (campo, descendente)
+CLAVES_POR_ORDEN = {
+    '': (('fecha_publicacion', True), ('id', True)),
+    'precio_asc': (('precio', False), ('id', False)),
+    'precio_desc': (('precio', True), ('id', True)),
+    'relevancia': (('relevancia', False), ('fecha_publicacion', True), ('id', True)),
+    # Hilo de comentarios de un anuncio (del más viejo al más nuevo)
+    'comentarios': (('fecha_comentario', False), ('id', False)),
+}
+
+# Cómo se reconstruye cada valor desde el token
+_CONVERSORES = {
+    'fecha_publicacion': datetime.fromisoformat,
+    'fecha_comentario': datetime.fromisoformat,
+    'precio': Decimal,
+    'relevancia': float,
+    'id': int,
+}
+
+
+class PaginaCursor:
+    """Página de resultados con la misma interfaz básica que ``django.core.paginator.Page``."""
+
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _valor(objeto, campo):
+    # Instancias de modelo o filas de values() (la API serializa desde diccionarios)
+    return objeto[campo] if isinstance(objeto, dict) else getattr(objeto, campo)
+
+
+def _crear_cursor(objeto, orden, claves, hacia_adelante):
+    valores = [_serializar(_valor(objeto, campo)) for campo, _ in claves]
+    return signing.dumps({'o': orden, 'v': valores, 'a': hacia_adelante}, salt=SALT_CURSOR, compress=True)
+
+
+def _leer_cursor(token, orden, claves):
+    """Devuelve ``(valores, hacia_adelante)`` o ``None`` si el token no es válido para este orden."""
+    try:
+        datos = signing.loads(token, salt=SALT_CURSOR)
+        if datos['o'] != orden or len(datos['v']) != len(claves):
+            return None
+        valores = [_CONVERSORES[campo](valor) for (campo, _), valor in zip(claves, datos['v'])]
+        return valores, bool(datos['a'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def _condicion(claves, valores, hacia_adelante):
+    # Comparación lexicográfica de tuplas: (a, b, id) "después de" (va, vb, vid)
+    condicion = Q()
+    prefijo = Q()
+    for (campo, descendente), valor in zip(claves, valores):
+        operador = 'lt' if descendente == hacia_adelante else 'gt'
+        condicion |= prefijo & Q(**{f'{campo}__{operador}': valor})
+        prefijo &= Q(**{campo: valor})
+    return condicion
+
+
+def _orden(claves, invertir=False):
+    return [f'-{campo}' if descendente != invertir else campo for campo, descendente in claves]
+
+
+def orden_para_cursor(orden, busqueda=None):
+    """Clave de ``CLAVES_POR_ORDEN`` que corresponde al ``orden`` pedido en el listado."""
+    if orden in ('precio_asc', 'precio_desc'):
+        return orden
+    return 'relevancia' if busqueda else ''
+
+
+def _consulta_pagina(queryset, orden, token, por_pagina):
+    claves = CLAVES_POR_ORDEN.get(orden, CLAVES_POR_ORDEN[''])
+    posicion = _leer_cursor(token, orden, claves) if token else None
+
+    if posicion is None:
+        valores, hacia_adelante = None, True
+    else:
+        valores, hacia_adelante = posicion
+
+    queryset = queryset.order_by(*_orden(claves, invertir=not hacia_adelante))
+    if valores is not None:
+        queryset = queryset.filter(_condicion(claves, valores, hacia_adelante))
+    return queryset[:por_pagina + 1], (claves, valores, hacia_adelante)
+
+
+def _armar_pagina(objetos, orden, por_pagina, claves, valores, hacia_adelante):
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+    if not hacia_adelante:
+        objetos.reverse()
+
+    if hacia_adelante:
+        hay_siguiente, hay_anterior = hay_mas, valores is not None
+    else:
+        hay_siguiente, hay_anterior = True, hay_mas
+
+    cursor_siguiente = cursor_anterior = None
+    if objetos and hay_siguiente:
+        cursor_siguiente = _crear_cursor(objetos[-1], orden, claves, True)
+    if objetos and hay_anterior:
+        cursor_anterior = _crear_cursor(objetos[0], orden, claves, False)
+    return PaginaCursor(objetos, cursor_siguiente, cursor_anterior)
+
+
+def paginar_por_cursor(queryset, orden, token=None, por_pagina=9):
+    """
+    Devuelve una ``PaginaCursor`` de ``queryset`` ordenado según ``orden``
+    (una clave de ``CLAVES_POR_ORDEN``). No ejecuta ningún ``COUNT``: se pide
+    una fila de más para saber si hay otra página en esa dirección.
+    """
+    consulta, posicion = _consulta_pagina(queryset, orden, token, por_pagina)
+    return _armar_pagina(list(consulta), orden, por_pagina, *posicion)
+
+
+async def apaginar_por_cursor(queryset, orden, token=None, por_pagina=9):
+    """Versión async de ``paginar_por_cursor`` (para las vistas async)."""
+    consulta, posicion = _consulta_pagina(queryset, orden, token, por_pagina)
+    return _armar_pagina([objeto async for objeto in consulta], orden, por_pagina, *posicion)
+
+
+async def apaginar_numerado(queryset, numero, por_pagina):
+    """
+    Como ``Paginator(queryset, por_pagina).get_page(numero)`` pero con
+    consultas async: el COUNT y la página se leen antes de devolverla, así el
+    template no consulta la base.
+    """
+    paginator = Paginator(queryset, por_pagina)
+    paginator.count = await queryset.acount() # count es un cached_property: queda fijado
+    try:
+        numero = paginator.validate_number(numero)
+    except PageNotAnInteger:
+        numero = 1
+    except EmptyPage:
+        numero = paginator.num_pages
+    inicio = (numero - 1) * por_pagina
+    return Page([objeto async for objeto in queryset[inicio:inicio + por_pagina]], numero, paginator)
+
+
+# --- PÁGINAS NUMERADAS CON TOTAL ESTIMADO ---
+def estimar_filas(modelo, using='default'):
+    """
+    Cantidad de filas de la tabla de ``modelo`` según las estadísticas del
+    motor (``pg_class.reltuples`` o ``sqlite_stat1`` tras un ANALYZE), sin
+    recorrerla. ``None`` si el motor no tiene estimación.
+    """
+    connection = connections[using]
+    tabla = modelo._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [connection.ops.quote_name(tabla)])
+        elif connection.vendor == 'sqlite':
+            if 'sqlite_stat1' not in connection.introspection.table_names(cursor):
+                return None
+            # La primera cifra de cada fila es la cantidad de filas del índice (los parciales tienen menos)
+            cursor.execute("SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s", [tabla])
+        else:
+            return None
+        fila = cursor.fetchone()
+    # PostgreSQL devuelve -1 si la tabla nunca se analizó
+    return fila[0] if fila and fila[0] is not None and fila[0] >= 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator del admin para tablas grandes. Sin filtros usa la estimación del
+    motor cuando supera ``ADMIN_CONTEO_MAXIMO`` (puede estar algo
+    desactualizada); si no, cuenta, pero como mucho hasta ese número: las
+    últimas páginas de un filtro muy amplio no se listan, se afina el filtro.
+    """
+
+    @cached_property
+    def count(self):
+        consulta = self.object_list
+        maximo = settings.ADMIN_CONTEO_MAXIMO
+        if not consulta.query.where:
+            estimado = estimar_filas(consulta.model, consulta.db)
+            if estimado is not None and estimado > maximo:
+                return estimado
+        # COUNT(*) sobre un subselect con LIMIT (y sin ORDER BY): deja de leer al llegar al máximo
+        return consulta.order_by()[:maximo].count()
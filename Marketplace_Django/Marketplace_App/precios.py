@@ -0,0 +1,135 @@
+"""
+Histograma de precios por categoría y ubicación (tabla CubetaPrecios).
+
+Los precios se agrupan en cubetas de escala logarítmica con la serie 1-2-5
+(0-2, 2-5, 5-10, 10-20, ...): pocas barras cubren desde lo más barato hasta
+lo más caro y los límites son números redondos. Igual que las facetas, cada
+alta, edición, baja o cambio de ``activo`` de un Anuncio suma +1/-1 en las
+filas afectadas desde signals.py, así el histograma se dibuja sumando unas
+pocas filas de esta tabla.
+"""
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from Marketplace_App.models import Anuncio, CubetaPrecios
+
+SERIE = (1, 2, 5)
+
+# Una barra del histograma: desde <= precio < hasta
+Barra = namedtuple('Barra', ['cubeta', 'desde', 'hasta', 'cantidad', 'altura'])
+
+
+# --- 1. CUBETAS ---
+def cubeta(precio):
+    """Número de cubeta de ``precio`` (0 para menos de 2, 1 para 2-5, 2 para 5-10, 3 para 10-20, ...)."""
+    precio = Decimal(str(precio))
+    if precio < 1:
+        return 0
+    # Con Decimal la cantidad de cifras y el primer dígito son exactos (sin log10 en coma flotante)
+    exponente = precio.adjusted()
+    primero = precio.scaleb(-exponente)
+    paso = 0 if primero < 2 else 1 if primero < 5 else 2
+    return 3 * exponente + paso
+
+
+def limite(numero):
+    """Precio donde empieza la cubeta ``numero`` (la 0 empieza en 0)."""
+    if numero <= 0:
+        return 0
+    return SERIE[numero % 3] * 10 ** (numero // 3)
+
+
+# --- 2. MANTENIMIENTO (deltas como en facetas.py) ---
+def estado(activo, categoria_id, ubicacion, precio):
+    """Fila del histograma en la que suma un anuncio (``None`` si no suma)."""
+    if not activo:
+        return None
+    return (categoria_id, ubicacion, cubeta(precio))
+
+
+def deltas_por_cambio(anterior, nuevo):
+    deltas = Counter()
+    if anterior is not None:
+        deltas[anterior] -= 1
+    if nuevo is not None:
+        deltas[nuevo] += 1
+    return deltas
+
+
+def aplicar_deltas(deltas, using='default'):
+    """Suma los ``deltas`` a la tabla (creando/borrando filas según haga falta)."""
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    cubetas = CubetaPrecios.objects.using(using)
+    with transaction.atomic(using=using):
+        for (categoria_id, ubicacion, numero), delta in deltas.items():
+            fila = cubetas.filter(categoria_id=categoria_id, ubicacion=ubicacion, cubeta=numero)
+            if fila.update(cantidad=F('cantidad') + delta):
+                if delta < 0:
+                    fila.filter(cantidad__lte=0).delete()
+            elif delta > 0:
+                _, creada = cubetas.get_or_create(
+                    categoria_id=categoria_id, ubicacion=ubicacion, cubeta=numero, defaults={'cantidad': delta},
+                )
+                if not creada:
+                    fila.update(cantidad=F('cantidad') + delta)
+
+
+def deltas_por_activacion(pks, activo, using='default'):
+    """Deltas de un cambio de ``activo`` en bloque (todos los ``pks`` pasaron al valor ``activo``)."""
+    signo = 1 if activo else -1
+    deltas = Counter()
+    filas = Anuncio.objects.using(using).filter(pk__in=pks).order_by().values_list('categoria_id', 'ubicacion', 'precio')
+    for categoria_id, ubicacion, precio in filas.iterator(chunk_size=2000):
+        deltas[(categoria_id, ubicacion, cubeta(precio))] += signo
+    return deltas
+
+
+def recalcular(using='default'):
+    """Reconstruye todo el histograma a partir de los anuncios activos."""
+    conteos = Counter()
+    filas = Anuncio.objects.using(using).filter(activo=True).order_by().values_list('categoria_id', 'ubicacion', 'precio')
+    for categoria_id, ubicacion, precio in filas.iterator(chunk_size=2000):
+        conteos[(categoria_id, ubicacion, cubeta(precio))] += 1
+    with transaction.atomic(using=using):
+        CubetaPrecios.objects.using(using).all().delete()
+        CubetaPrecios.objects.using(using).bulk_create([
+            CubetaPrecios(categoria_id=categoria_id, ubicacion=ubicacion, cubeta=numero, cantidad=cantidad)
+            for (categoria_id, ubicacion, numero), cantidad in conteos.items()
+        ], batch_size=500)
+    return len(conteos)
+
+
+# --- 3. CONSULTA ---
+def _consulta(categoria_id, ubicacion):
+    filas = CubetaPrecios.objects.all()
+    if categoria_id:
+        filas = filas.filter(categoria_id=categoria_id)
+    if ubicacion:
+        filas = filas.filter(ubicacion=ubicacion)
+    return filas.order_by().values('cubeta').annotate(total=Sum('cantidad')).values_list('cubeta', 'total')
+
+
+def _barras(conteos):
+    # De la primera a la última cubeta con anuncios, incluidas las vacías del medio
+    if not conteos:
+        return []
+    maximo = max(conteos.values())
+    return [
+        Barra(numero, limite(numero), limite(numero + 1), conteos.get(numero, 0), round(100 * conteos.get(numero, 0) / maximo))
+        for numero in range(min(conteos), max(conteos) + 1)
+    ]
+
+
+def histograma(categoria_id=None, ubicacion=None):
+    """Barras del histograma de los anuncios activos (de una categoría y/o ubicación, o de todos)."""
+    return _barras(dict(_consulta(categoria_id, ubicacion)))
+
+
+async def ahistograma(categoria_id=None, ubicacion=None):
+    """Versión async de ``histograma``."""
+    return _barras({numero: total async for numero, total in _consulta(categoria_id, ubicacion)})
@@ -0,0 +1,35 @@
+"""
+Ejecutor de los tests (``TEST_RUNNER``).
+
+La caché por defecto es FileBasedCache y las métricas de cada proceso se
+guardan en archivos, las dos en carpetas del proyecto: lo que quedara de una
+corrida (versiones de la caché de vistas, contadores de los límites,
+códigos, métricas) se mezclaría con la siguiente. Durante los tests usan una
+carpeta temporal que se borra al terminar.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class EjecutorPruebas(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._carpeta = tempfile.mkdtemp(prefix='marketplace_pruebas_')
+        caches = {alias: dict(opciones) for alias, opciones in settings.CACHES.items()}
+        for opciones in caches.values():
+            if opciones['BACKEND'] == 'django.core.cache.backends.filebased.FileBasedCache':
+                opciones['LOCATION'] = os.path.join(self._carpeta, 'cache')
+        self._temporales = override_settings(
+            CACHES=caches, METRICAS_DIRECTORIO=os.path.join(self._carpeta, 'metricas'),
+        )
+        self._temporales.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._temporales.disable()
+        shutil.rmtree(self._carpeta, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,574 @@
+"""
+Banco de pruebas de rendimiento de las vistas (ver el comando medir_rendimiento).
+
+Recorre con el cliente de pruebas de Django las páginas principales: home con
+todas las combinaciones de filtros, orden y página, detalle_anuncio, mi_perfil,
+los listados del admin y la API. De cada request se mide la latencia, la
+cantidad y el tiempo de las consultas SQL, el render de templates y el tamaño
+de la respuesta, y se resume por escenario en percentiles. El informe es un
+dict listo para guardar como JSON y comparar contra una corrida anterior.
+
+La prueba de carga (``prueba_carga``) manda requests concurrentes anónimos a
+los handlers reales de Django, WSGI (un hilo por request, como gunicorn con
+threads) y ASGI (un event loop, como uvicorn), para ver cómo escala cada uno
+con la concurrencia. Corre en el mismo proceso, sin red: mide el costo de
+Django y la base, no el del servidor.
+
+La prueba de escrituras (``prueba_escrituras``, comando medir_escrituras)
+compara los perfiles de base de datos de settings.PERFILES_BASE_DATOS con
+transacciones concurrentes de lectura y escritura sobre una tabla propia.
+"""
+import asyncio
+import copy
+import io
+import itertools
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.asgi import ASGIHandler
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.wsgi import WSGIHandler
+from django.db import DatabaseError, connections
+from django.db.utils import ConnectionHandler
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from Marketplace_App import dos_pasos, metricas
+from Marketplace_App.facetas import UBICACION
+from Marketplace_App.filtros import ORDENAMIENTOS, VENTANAS_TIEMPO
+from Marketplace_App.models import Anuncio, Categoria, Comentario, FacetaAnuncios, Reporte
+
+User = get_user_model()
+
+ESCENARIOS = ('home', 'detalle_anuncio', 'mi_perfil', 'admin', 'api')
+PERCENTILES = (50, 90, 95, 99)
+# Variantes de paginación de home: numerada (páginas 1, 2 y 5) y primera página por cursor
+PAGINAS_HOME = ({}, {'page': 2}, {'page': 5}, {'cursor': ''})
+MAS_LENTAS = 10
+# Prueba de carga: modo -> (handler ASGI, vistas async). "asgi_vistas_sync" muestra el costo
+# de correr las vistas sync bajo ASGI (cada una pasa por el hilo de sync_to_async).
+MODOS_CARGA = {'wsgi': (False, False), 'asgi_vistas_sync': (True, False), 'asgi': (True, True)}
+CONCURRENCIAS = (1, 4, 16)
+URLCONF_CARGA = {False: 'Marketplace_Django.urls_sincronas', True: 'Marketplace_Django.urls_asincronas'}
+# Prueba de escrituras: tabla propia, creada y borrada en cada base
+TABLA_ESCRITURAS = 'prueba_escrituras'
+_CREAR_TABLA_ESCRITURAS = {
+    'sqlite': f'CREATE TABLE IF NOT EXISTS {TABLA_ESCRITURAS} (id INTEGER PRIMARY KEY AUTOINCREMENT, hilo INTEGER NOT NULL, valor INTEGER NOT NULL)',
+    'postgresql': f'CREATE TABLE IF NOT EXISTS {TABLA_ESCRITURAS} (id BIGSERIAL PRIMARY KEY, hilo INTEGER NOT NULL, valor INTEGER NOT NULL)',
+}
+
+
+class Peticion:
+    """Una URL a medir y con qué usuario (``None`` = anónimo)."""
+
+    def __init__(self, escenario, url, usuario=None):
+        self.escenario = escenario
+        self.url = url
+        self.usuario = usuario
+
+
+# --- 1. ESTADÍSTICAS ---
+def percentil(valores, p):
+    """Percentil ``p`` por rango más cercano (``valores`` ordenados)."""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def _resumen(valores, decimales=2):
+    valores = sorted(valores)
+    if not valores:
+        return {}
+    resumen = {f'p{p}': round(percentil(valores, p), decimales) for p in PERCENTILES}
+    resumen['max'] = round(valores[-1], decimales)
+    resumen['media'] = round(statistics.fmean(valores), decimales)
+    return resumen
+
+
+def resumir(mediciones):
+    """Resume las mediciones de un escenario (lista de dicts de ``medir``)."""
+    correctas = [m for m in mediciones if m['status'] < 400]
+    return {
+        'requests': len(mediciones),
+        'errores': len(mediciones) - len(correctas),
+        'latencia_ms': _resumen([m['ms'] for m in correctas]),
+        'consultas': _resumen([m['consultas'] for m in correctas], 0),
+        'consultas_ms': _resumen([m['consultas_ms'] for m in correctas]),
+        'templates_ms': _resumen([m['templates_ms'] for m in correctas]),
+        'bytes': _resumen([m['bytes'] for m in correctas], 0),
+    }
+
+
+# --- 2. ESCENARIOS ---
+def _url(base, parametros):
+    parametros = {clave: valor for clave, valor in parametros.items() if valor is not None}
+    return f'{base}?{urlencode(parametros)}' if parametros else base
+
+
+def _ids_al_azar(modelo, cantidad, azar, **filtros):
+    """Hasta ``cantidad`` pks existentes elegidos al azar sin ORDER BY RANDOM() (que recorre toda la tabla)."""
+    limites = modelo.objects.filter(**filtros).aggregate(minimo=Min('pk'), maximo=Max('pk'))
+    if limites['minimo'] is None:
+        return []
+    ids = set()
+    for _ in range(5): # Los huecos (borrados, filtrados) se compensan con más intentos
+        faltan = cantidad - len(ids)
+        if faltan <= 0:
+            break
+        candidatos = {azar.randint(limites['minimo'], limites['maximo']) for _ in range(faltan * 2)}
+        ids.update(modelo.objects.filter(pk__in=candidatos, **filtros).values_list('pk', flat=True)[:faltan])
+    return sorted(ids)[:cantidad]
+
+
+def peticiones_home(azar, muestra=None):
+    """Todas las combinaciones de categoría, ubicación, búsqueda, orden, tiempo y página (o una muestra)."""
+    bases = [reverse('home')] + [
+        reverse('home_por_categoria', args=[slug]) for slug in Categoria.objects.values_list('slug', flat=True)
+    ]
+    ubicaciones = list(
+        FacetaAnuncios.objects.filter(tipo=UBICACION, cantidad__gt=0).order_by('-cantidad').values_list('valor', flat=True)[:2]
+    )
+    # Una búsqueda real: la primera palabra del título de un anuncio activo
+    titulo = Anuncio.objects.filter(activo=True).values_list('titulo', flat=True).first()
+    busquedas = [None] + ([titulo.split()[0]] if titulo else [])
+    combinaciones = list(itertools.product(
+        bases, [None] + ubicaciones, busquedas, [None, *ORDENAMIENTOS], [None, *VENTANAS_TIEMPO], PAGINAS_HOME,
+    ))
+    if muestra and muestra < len(combinaciones):
+        combinaciones = azar.sample(combinaciones, muestra)
+    return [
+        Peticion('home', _url(base, {'ubicacion': ubicacion, 'q': q, 'orden': orden, 'tiempo': tiempo, **pagina}))
+        for base, ubicacion, q, orden, tiempo, pagina in combinaciones
+    ]
+
+
+def peticiones_detalle(azar, cantidad):
+    return [
+        Peticion('detalle_anuncio', reverse('detalle_anuncio', args=[pk]))
+        for pk in _ids_al_azar(Anuncio, cantidad, azar, activo=True)
+    ]
+
+
+def peticiones_perfil(azar, cantidad):
+    # Dueños de anuncios al azar: los vendedores grandes salen más seguido, como en la realidad
+    anuncios = _ids_al_azar(Anuncio, cantidad * 3, azar)
+    vendedores = list(dict.fromkeys(Anuncio.objects.filter(pk__in=anuncios).values_list('usuario_id', flat=True)))
+    usuarios = {usuario.pk: usuario for usuario in User.objects.filter(pk__in=vendedores[:cantidad])}
+    return [Peticion('mi_perfil', reverse('mi_perfil'), usuarios[pk]) for pk in vendedores[:cantidad] if pk in usuarios]
+
+
+def peticiones_admin(administrador):
+    """El listado de cada modelo registrado: sin filtros, página 2 y con búsqueda (si tiene search_fields)."""
+    if administrador is None:
+        return []
+    peticiones = []
+    for modelo, modelo_admin in admin.site._registry.items():
+        base = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist')
+        variantes = [{}, {'p': 2}] + ([{'q': 'a'}] if modelo_admin.search_fields else [])
+        peticiones += [Peticion('admin', _url(base, variante), administrador) for variante in variantes]
+    return peticiones
+
+
+def peticiones_api(azar, cantidad):
+    categoria = Categoria.objects.values_list('slug', flat=True).first()
+    peticiones = [
+        Peticion('api', reverse('api_anuncios')),
+        Peticion('api', _url(reverse('api_anuncios'), {'orden': 'precio_asc', 'limite': 100})),
+        Peticion('api', _url(reverse('api_anuncios'), {'categoria': categoria, 'campos': 'id,titulo,precio'})),
+        Peticion('api', reverse('api_categorias')),
+        Peticion('api', reverse('api_ubicaciones')),
+    ]
+    peticiones += [
+        Peticion('api', reverse('api_detalle_anuncio', args=[pk]))
+        for pk in _ids_al_azar(Anuncio, cantidad, azar, activo=True)
+    ]
+    return peticiones
+
+
+def armar_peticiones(escenarios=ESCENARIOS, semilla=0, muestra_home=None, detalles=50, perfiles=10, administrador=None):
+    azar = random.Random(semilla)
+    constructores = {
+        'home': lambda: peticiones_home(azar, muestra_home),
+        'detalle_anuncio': lambda: peticiones_detalle(azar, detalles),
+        'mi_perfil': lambda: peticiones_perfil(azar, perfiles),
+        'admin': lambda: peticiones_admin(administrador),
+        'api': lambda: peticiones_api(azar, detalles),
+    }
+    return {escenario: constructores[escenario]() for escenario in escenarios}
+
+
+# --- 3. MEDICIÓN ---
+def _cliente(clientes, usuario):
+    clave = usuario.pk if usuario else None
+    if clave not in clientes:
+        # Un error del servidor se registra como status 500, no corta la corrida
+        clientes[clave] = Client(raise_request_exception=False)
+        if usuario:
+            clientes[clave].force_login(usuario)
+            # Sesión con el segundo paso ya hecho: se mide la página, no la redirección
+            sesion = clientes[clave].session
+            dos_pasos.marcar_verificado(sesion)
+            sesion.save()
+    return clientes[clave]
+
+
+def medir_peticion(cliente, url, limpiar_cache=False):
+    """Hace el GET y devuelve lo medido (el cuerpo se consume entero, también si es streaming)."""
+    if limpiar_cache:
+        cache.clear()
+    with metricas.Medicion() as medicion:
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url)
+        contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        duracion = time.perf_counter() - inicio
+    return {
+        'url': url,
+        'status': respuesta.status_code,
+        'ms': duracion * 1000,
+        'consultas': medicion.consultas,
+        'consultas_ms': medicion.tiempo_consultas * 1000,
+        'templates_ms': medicion.tiempo_templates * 1000,
+        'bytes': len(contenido),
+    }
+
+
+def medir(peticiones, repeticiones=1, limpiar_cache=False, progreso=None):
+    """
+    Mide ``peticiones`` (dict escenario -> lista de Peticion) ``repeticiones`` veces.
+    Devuelve dict escenario -> lista de mediciones.
+    """
+    metricas.instalar_medicion_templates()
+    clientes = {}
+    resultado = {escenario: [] for escenario in peticiones}
+    # Sin muestreo del middleware: si no, su Medicion taparía a la nuestra
+    with override_settings(METRICAS_MUESTREO=0, ALLOWED_HOSTS=['*']):
+        for repeticion in range(repeticiones):
+            for escenario, lista in peticiones.items():
+                for peticion in lista:
+                    resultado[escenario].append(
+                        medir_peticion(_cliente(clientes, peticion.usuario), peticion.url, limpiar_cache)
+                    )
+                if progreso:
+                    progreso(f'{escenario}: {len(lista)} requests (repetición {repeticion + 1}/{repeticiones})')
+    return resultado
+
+
+def informe(mediciones, parametros=None, carga=None):
+    todas = [m for lista in mediciones.values() for m in lista]
+    lentas = sorted(todas, key=lambda m: m['ms'], reverse=True)[:MAS_LENTAS]
+    resultado = {
+        'version': 1,
+        'fecha': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'base_de_datos': connections['default'].vendor,
+        'datos': {
+            'usuarios': User.objects.count(),
+            'anuncios': Anuncio.objects.count(),
+            'comentarios': Comentario.objects.count(),
+            'reportes': Reporte.objects.count(),
+        },
+        'parametros': parametros or {},
+        'escenarios': {escenario: resumir(lista) for escenario, lista in mediciones.items()},
+        'mas_lentas': [
+            {'url': m['url'], 'ms': round(m['ms'], 2), 'consultas': m['consultas'], 'status': m['status']}
+            for m in lentas
+        ],
+    }
+    if carga is not None:
+        resultado['carga'] = carga
+    return resultado
+
+
+# --- 4. PRUEBA DE CARGA: WSGI vs ASGI ---
+def peticiones_carga(azar, detalles=20):
+    """URLs anónimas para la prueba de carga: variantes de home, detalles al azar y la API."""
+    categoria = Categoria.objects.values_list('slug', flat=True).first()
+    urls = [
+        reverse('home'),
+        _url(reverse('home'), {'page': 2}),
+        _url(reverse('home'), {'orden': 'precio_asc'}),
+        reverse('api_anuncios'),
+    ]
+    if categoria:
+        urls.append(reverse('home_por_categoria', args=[categoria]))
+    for pk in _ids_al_azar(Anuncio, detalles, azar, activo=True):
+        urls += [reverse('detalle_anuncio', args=[pk]), reverse('api_detalle_anuncio', args=[pk])]
+    return urls
+
+
+def _get_wsgi(handler, url):
+    ruta, _, consulta = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': ruta, 'QUERY_STRING': consulta,
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    estado = []
+    cuerpo = handler(environ, lambda status, headers, exc_info=None: estado.append(int(status.split()[0])))
+    try:
+        for _ in cuerpo:
+            pass
+    finally:
+        cuerpo.close() # Dispara request_finished, como el servidor
+    return estado[0]
+
+
+async def _get_asgi(handler, url):
+    ruta, _, consulta = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': ruta, 'raw_path': ruta.encode(), 'query_string': consulta.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    pedido = []
+    estado = []
+
+    async def receive():
+        if not pedido:
+            pedido.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.get_running_loop().create_future() # El cliente nunca se desconecta
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    await handler(scope, receive, send)
+    return estado[0]
+
+
+def _carga_wsgi(urls, concurrencia):
+    handler = WSGIHandler()
+    pendientes = iter(urls)
+    lock = threading.Lock()
+    resultados = []
+
+    def trabajador():
+        while True:
+            with lock:
+                url = next(pendientes, None)
+            if url is None:
+                return
+            inicio = time.perf_counter()
+            status = _get_wsgi(handler, url)
+            resultados.append((status, time.perf_counter() - inicio))
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as hilos:
+        for tarea in [hilos.submit(trabajador) for _ in range(concurrencia)]:
+            tarea.result()
+    return resultados
+
+
+def _carga_asgi(urls, concurrencia):
+    async def correr():
+        handler = ASGIHandler()
+        pendientes = iter(urls)
+        resultados = []
+
+        async def trabajador():
+            for url in pendientes:
+                inicio = time.perf_counter()
+                status = await _get_asgi(handler, url)
+                resultados.append((status, time.perf_counter() - inicio))
+
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        return resultados
+
+    return asyncio.run(correr())
+
+
+def prueba_carga(urls, modos=tuple(MODOS_CARGA), concurrencias=CONCURRENCIAS, requests=200, progreso=None):
+    """
+    Manda ``requests`` GET (recorriendo ``urls`` en ronda) con cada modo y
+    concurrencia. Devuelve dict modo -> concurrencia (str, para JSON) -> resumen
+    con requests por segundo y percentiles de latencia.
+    """
+    lista = list(itertools.islice(itertools.cycle(urls), requests)) if urls else []
+    resultado = {}
+    with override_settings(METRICAS_MUESTREO=0, ALLOWED_HOSTS=['*']):
+        for modo in modos:
+            es_asgi, vistas_async = MODOS_CARGA[modo]
+            with override_settings(ROOT_URLCONF=URLCONF_CARGA[vistas_async]):
+                # Una pasada de calentamiento: cachés, templates y conexiones, como en un servidor andando
+                (_carga_asgi if es_asgi else _carga_wsgi)(urls, 1)
+                resultado[modo] = {}
+                for concurrencia in concurrencias:
+                    inicio = time.perf_counter()
+                    respuestas = (_carga_asgi if es_asgi else _carga_wsgi)(lista, concurrencia)
+                    segundos = time.perf_counter() - inicio
+                    correctas = [duracion * 1000 for status, duracion in respuestas if status < 400]
+                    resultado[modo][str(concurrencia)] = {
+                        'requests': len(respuestas),
+                        'errores': len(respuestas) - len(correctas),
+                        'segundos': round(segundos, 3),
+                        'rps': round(len(respuestas) / segundos, 1) if segundos else None,
+                        'latencia_ms': _resumen(correctas),
+                    }
+                    if progreso:
+                        progreso(f'{modo} x{concurrencia}: {resultado[modo][str(concurrencia)]["rps"]} req/s')
+    return resultado
+
+
+# --- 5. PRUEBA DE ESCRITURAS: PERFILES DE BASE DE DATOS ---
+def perfiles_escrituras(directorio):
+    """
+    Perfiles a comparar (nombre -> settings de la conexión). Los de SQLite usan
+    archivos nuevos en ``directorio``: 'sqlite_sin_ajustes' es la configuración
+    de antes (sin OPTIONS ni conexiones persistentes) y 'sqlite' la de
+    settings.PERFILES_BASE_DATOS. 'postgresql' usa la base configurada.
+    """
+    sqlite = settings.PERFILES_BASE_DATOS['sqlite']
+    return {
+        'sqlite_sin_ajustes': {'ENGINE': sqlite['ENGINE'], 'NAME': os.path.join(directorio, 'sin_ajustes.sqlite3')},
+        'sqlite': {**copy.deepcopy(sqlite), 'NAME': os.path.join(directorio, 'ajustes.sqlite3')},
+        'postgresql': copy.deepcopy(settings.PERFILES_BASE_DATOS['postgresql']),
+    }
+
+
+def _ajustes(conexion):
+    """Lo que quedó aplicado en la conexión (para ver en el informe que los PRAGMA se usaron)."""
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'sqlite':
+            ajustes = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                ajustes[pragma] = cursor.fetchone()[0]
+            ajustes['transaction_mode'] = conexion.transaction_mode or 'DEFERRED'
+            return ajustes
+        cursor.execute('SHOW synchronous_commit')
+        return {'version': conexion.pg_version, 'synchronous_commit': cursor.fetchone()[0]}
+
+
+def _escribir(conexion, hilo):
+    # Como muchas transacciones de la app (sesión, get_or_create, contadores): lee y después escribe
+    conexion.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {TABLA_ESCRITURAS} WHERE hilo = %s', [hilo])
+            cursor.execute(f'INSERT INTO {TABLA_ESCRITURAS} (hilo, valor) VALUES (%s, %s)', [hilo, cursor.fetchone()[0]])
+        conexion.commit()
+    except DatabaseError:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.set_autocommit(True)
+
+
+def _escrituras(manejador, transacciones, concurrencia, persistente):
+    pendientes = iter(range(transacciones))
+    lock = threading.Lock()
+    resultados = []
+
+    def trabajador(hilo):
+        conexion = manejador['default'] # Una conexión por hilo
+        try:
+            while True:
+                with lock:
+                    if next(pendientes, None) is None:
+                        return
+                inicio = time.perf_counter()
+                try:
+                    _escribir(conexion, hilo)
+                    correcta = True
+                except DatabaseError: # "database is locked"
+                    correcta = False
+                resultados.append((correcta, time.perf_counter() - inicio))
+                if not persistente:
+                    conexion.close() # Como al terminar cada request con CONN_MAX_AGE = 0
+        finally:
+            conexion.close()
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as hilos:
+        for tarea in [hilos.submit(trabajador, hilo) for hilo in range(concurrencia)]:
+            tarea.result()
+    return resultados
+
+
+def prueba_escrituras(perfiles, concurrencias=CONCURRENCIAS, transacciones=500, progreso=None):
+    """
+    Corre ``transacciones`` escrituras con cada perfil y concurrencia, cada
+    hilo con su conexión. Devuelve dict perfil -> {'ajustes', 'concurrencias'}
+    (concurrencia -> transacciones por segundo, errores y latencia), o
+    ``{'error': ...}`` si no se pudo conectar.
+    """
+    resultado = {}
+    for nombre, perfil in perfiles.items():
+        manejador = ConnectionHandler({'default': copy.deepcopy(perfil)})
+        try:
+            conexion = manejador['default']
+            with conexion.cursor() as cursor:
+                cursor.execute(_CREAR_TABLA_ESCRITURAS[conexion.vendor])
+            ajustes = _ajustes(conexion)
+        except (ImproperlyConfigured, DatabaseError) as error: # Sin driver o sin servidor
+            resultado[nombre] = {'error': str(error).strip()}
+            if progreso:
+                progreso(f'{nombre}: no se pudo conectar ({resultado[nombre]["error"]})')
+            continue
+        persistente = manejador.settings['default']['CONN_MAX_AGE'] != 0
+        resultado[nombre] = {'ajustes': {**ajustes, 'conexiones_persistentes': persistente}, 'concurrencias': {}}
+        try:
+            for concurrencia in concurrencias:
+                inicio = time.perf_counter()
+                respuestas = _escrituras(manejador, transacciones, concurrencia, persistente)
+                segundos = time.perf_counter() - inicio
+                correctas = [duracion * 1000 for correcta, duracion in respuestas if correcta]
+                resultado[nombre]['concurrencias'][str(concurrencia)] = {
+                    'transacciones': len(respuestas),
+                    'errores': len(respuestas) - len(correctas),
+                    'segundos': round(segundos, 3),
+                    'tps': round(len(correctas) / segundos, 1) if segundos else None,
+                    'latencia_ms': _resumen(correctas),
+                }
+                if progreso:
+                    datos = resultado[nombre]['concurrencias'][str(concurrencia)]
+                    progreso(f'{nombre} x{concurrencia}: {datos["tps"]} tx/s, {datos["errores"]} errores')
+        finally:
+            with manejador['default'].cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {TABLA_ESCRITURAS}')
+            manejador.close_all()
+    return resultado
+
+
+# --- 6. COMPARACIÓN ENTRE CORRIDAS ---
+def comparar(actual, anterior, tolerancia=0.2):
+    """
+    Regresiones de ``actual`` respecto de ``anterior`` (dos informes). La
+    latencia p95 tolera ``tolerancia`` (fracción) de ruido; las consultas son
+    deterministas, así que cualquier aumento del máximo cuenta. En la prueba
+    de carga, una caída de requests por segundo mayor a ``tolerancia``.
+    """
+    regresiones = []
+    for escenario, datos in actual['escenarios'].items():
+        previo = anterior.get('escenarios', {}).get(escenario)
+        if not previo or not datos['requests'] or not previo['requests']:
+            continue
+        antes, ahora = previo['latencia_ms'].get('p95'), datos['latencia_ms'].get('p95')
+        if antes and ahora and ahora > antes * (1 + tolerancia):
+            regresiones.append(f'{escenario}: latencia p95 {antes} ms -> {ahora} ms')
+        antes, ahora = previo['consultas'].get('max'), datos['consultas'].get('max')
+        if antes is not None and ahora is not None and ahora > antes:
+            regresiones.append(f'{escenario}: consultas máx. {antes} -> {ahora}')
+        if datos['errores'] > previo['errores']:
+            regresiones.append(f'{escenario}: errores {previo["errores"]} -> {datos["errores"]}')
+    for modo, por_concurrencia in actual.get('carga', {}).items():
+        for concurrencia, datos in por_concurrencia.items():
+            previo = anterior.get('carga', {}).get(modo, {}).get(concurrencia)
+            if previo and previo['rps'] and datos['rps'] and datos['rps'] < previo['rps'] * (1 - tolerancia):
+                regresiones.append(f'carga {modo} x{concurrencia}: {previo["rps"]} -> {datos["rps"]} req/s')
+    return regresiones
@@ -0,0 +1,105 @@
+"""
+Réplicas de lectura: router que separa lecturas y escrituras.
+
+Las escrituras van siempre a la base principal ('default'). Dentro de un
+bloque ``Lectura`` (LecturaEnReplicasMiddleware abre uno por request) las
+lecturas van a una réplica al azar de settings.REPLICAS_LECTURA, salvo:
+
+- en requests que escriben (POST, ...) y desde la primera escritura del bloque;
+- dentro de ``transaction.atomic()`` en la principal;
+- las relaciones de un objeto ya leído, que salen de la misma base que él;
+- durante REPLICAS_FIJAR_PRIMARIA segundos después de que el usuario
+  escribió (cookie): así ve enseguida lo que publicó aunque la réplica venga
+  atrasada (read-your-writes).
+
+Fuera de un bloque (comandos, trabajadores de la cola) todo va a la
+principal. La caché de fragmentos (cache_vistas.py) se invalida al escribir:
+si una réplica se atrasa más que eso, otro usuario puede cachear el
+fragmento viejo hasta su TIMEOUT.
+
+Para probarlo en desarrollo con SQLite: DB_REPLICAS=replica.sqlite3 y el
+comando replicar_sqlite, que hace de replicación copiando la base principal.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_lectura_actual = ContextVar('lectura_actual', default=None)
+
+
+# --- 1. BLOQUES DE LECTURA ---
+class Lectura:
+    """
+    Un bloque (un request) que lee de las réplicas. Viaja en un ContextVar,
+    así lo ven también las consultas del ORM async (sync_to_async copia el contexto).
+    """
+
+    def __init__(self, primaria=False):
+        self.primaria = primaria # Leer de la principal
+        self.escribio = False
+
+    def __enter__(self):
+        self._token = _lectura_actual.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _lectura_actual.reset(self._token)
+
+
+def lectura_actual():
+    return _lectura_actual.get()
+
+
+# --- 2. ROUTER ---
+class RouterLecturaEscritura:
+    def db_for_read(self, model, **hints):
+        lectura = _lectura_actual.get()
+        replicas = settings.REPLICAS_LECTURA
+        if lectura is None or lectura.primaria or not replicas:
+            return None
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return None # Django usa la base de la que salió la instancia
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        lectura = _lectura_actual.get()
+        if lectura is not None:
+            # Lo que se lea después en este request tiene que ver esta escritura
+            lectura.escribio = lectura.primaria = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Un objeto leído de una réplica se puede asignar a otro que se guarda en la principal
+        bases = {DEFAULT_DB_ALIAS, *settings.REPLICAS_LECTURA}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema de la principal
+        return False if db in settings.REPLICAS_LECTURA else None
+
+
+# --- 3. REPLICADOR DE PRUEBA (SQLite) ---
+def replicar(origen=DEFAULT_DB_ALIAS, destinos=None):
+    """
+    Copia la base ``origen`` entera sobre cada réplica con la API de backup de
+    SQLite. Hace de replicación en desarrollo y en los tests; en producción la
+    replicación es del motor (streaming replication de PostgreSQL).
+    """
+    destinos = settings.REPLICAS_LECTURA if destinos is None else destinos
+    fuente = connections[origen]
+    for alias in destinos:
+        destino = connections[alias]
+        if fuente.vendor != 'sqlite' or destino.vendor != 'sqlite':
+            raise ImproperlyConfigured('replicar sólo copia bases SQLite: en PostgreSQL la replicación es del servidor.')
+        fuente.ensure_connection()
+        destino.ensure_connection()
+        fuente.connection.backup(destino.connection)
+    return len(destinos)
@@ -0,0 +1,295 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from Marketplace_App import (
+    busqueda, cache_vistas, comentarios, facetas, miniaturas, moderacion, precios, tareas, tarjetas,
+)
+from Marketplace_App.models import (
+    Anuncio, Categoria, Comentario, PerfilUsuario, Reporte, activo_cambiado, anuncios_creados,
+)
+
+User = get_user_model()
+
+
+# --- 0. ESTADO PREVIO DEL ANUNCIO ---
+@receiver(pre_save, sender=Anuncio)
+def guardar_estado_anterior(sender, instance, using, raw=False, **kwargs):
+    # Estado previo en la base (no el del objeto en memoria, que puede estar desactualizado)
+    instance._estado_anterior = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if '_estado_leido' in instance.__dict__:
+        # Un save() completo ya lo leyó, junto con los campos que se mantienen aparte
+        instance._estado_anterior = instance.__dict__.pop('_estado_leido')
+    else:
+        instance._estado_anterior = (
+            sender.objects.using(using).filter(pk=instance.pk).values(*sender.CAMPOS_ESTADO_ANTERIOR).first()
+        )
+    # Si cambió la foto, las miniaturas viejas ya no sirven
+    if instance._estado_anterior and instance._estado_anterior['imagen_principal'] != instance.imagen_principal.name:
+        instance.imagen_miniaturas = False
+        borrar_miniaturas_al_confirmar(instance._estado_anterior['imagen_principal'], instance.imagen_principal.storage, using)
+
+
+# --- 1. ÍNDICE DE BÚSQUEDA ---
+@receiver(post_save, sender=Anuncio)
+def indexar_anuncio(sender, instance, using, raw=False, **kwargs):
+    # Mantiene el índice full-text al día con cada alta o edición
+    if not raw:
+        busqueda.indexar_anuncio(instance, using=using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def desindexar_anuncio(sender, instance, using, **kwargs):
+    busqueda.desindexar_anuncio(instance.pk, using=using)
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def indexar_anuncios_creados(sender, anuncios, using='default', **kwargs):
+    busqueda.indexar_filas([(anuncio.pk, anuncio.titulo, anuncio.descripcion) for anuncio in anuncios], using=using)
+
+
+# --- 2. FACETAS (conteos por categoría / ubicación) ---
+@receiver(post_save, sender=Anuncio)
+def actualizar_facetas(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    nuevo = facetas.estado(instance.activo, instance.categoria_id, instance.ubicacion)
+    if anterior:
+        anterior = facetas.estado(anterior['activo'], anterior['categoria_id'], anterior['ubicacion'])
+    facetas.aplicar_deltas(facetas.deltas_por_cambio(anterior, nuevo), using=using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def descontar_facetas(sender, instance, using, **kwargs):
+    anterior = facetas.estado(instance.activo, instance.categoria_id, instance.ubicacion)
+    facetas.aplicar_deltas(facetas.deltas_por_cambio(anterior, None), using=using)
+
+
+@receiver(activo_cambiado, sender=Anuncio)
+def facetas_por_activacion(sender, pks, activo, using='default', **kwargs):
+    facetas.aplicar_deltas(facetas.deltas_por_activacion(pks, activo, using=using), using=using)
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def facetas_por_alta_masiva(sender, anuncios, using='default', **kwargs):
+    deltas = Counter()
+    for anuncio in anuncios:
+        deltas.update(facetas.deltas_por_cambio(None, facetas.estado(anuncio.activo, anuncio.categoria_id, anuncio.ubicacion)))
+    facetas.aplicar_deltas(deltas, using=using)
+
+
+# --- 3. CACHÉ DE VISTAS (invalidación por versiones, al confirmar la transacción) ---
+@receiver(post_save, sender=Anuncio)
+@receiver(post_delete, sender=Anuncio)
+def invalidar_cache_anuncio(sender, instance, using, **kwargs):
+    alcances = {'listado', cache_vistas.alcance_grilla(instance.categoria_id)}
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior and anterior['categoria_id'] != instance.categoria_id:
+        alcances.add(cache_vistas.alcance_grilla(anterior['categoria_id']))
+    cache_vistas.invalidar_al_confirmar(f'anuncio:{instance.pk}', *alcances, using=using)
+
+
+@receiver(activo_cambiado, sender=Anuncio)
+def invalidar_cache_activacion(sender, pks, using='default', **kwargs):
+    categorias = Anuncio.objects.using(using).filter(pk__in=pks).values_list('categoria_id', flat=True).distinct()
+    cache_vistas.invalidar_al_confirmar(
+        'listado',
+        *[cache_vistas.alcance_grilla(categoria_id) for categoria_id in categorias.order_by()],
+        *[f'anuncio:{pk}' for pk in pks],
+        using=using,
+    )
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def invalidar_cache_alta_masiva(sender, anuncios, using='default', **kwargs):
+    # Los anuncios nuevos todavía no tienen detalle cacheado: sólo cambian los listados
+    categorias = {anuncio.categoria_id for anuncio in anuncios}
+    cache_vistas.invalidar_al_confirmar(
+        'listado', *[cache_vistas.alcance_grilla(categoria_id) for categoria_id in categorias], using=using,
+    )
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_categoria(sender, instance, using, **kwargs):
+    # El nombre de la categoría aparece en las tarjetas y en el detalle
+    cache_vistas.invalidar_al_confirmar(
+        'listado', cache_vistas.alcance_grilla(instance.pk), f'categoria:{instance.pk}', using=using,
+    )
+
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+def invalidar_cache_comentario(sender, instance, using, created=True, raw=False, **kwargs):
+    # La cantidad de comentarios aparece en el detalle y en la tarjeta de la grilla (editar uno no la cambia)
+    if raw or not created:
+        return
+    if Comentario.anuncio.is_cached(instance):
+        categoria_id = instance.anuncio.categoria_id
+    else:
+        categoria_id = Anuncio.objects.using(using).filter(pk=instance.anuncio_id).values_list('categoria_id', flat=True).first()
+    cache_vistas.invalidar_al_confirmar(
+        f'anuncio:{instance.anuncio_id}', 'listado', cache_vistas.alcance_grilla(categoria_id), using=using,
+    )
+
+
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_cache_perfil(sender, instance, using, **kwargs):
+    # Teléfono y foto del vendedor aparecen en el detalle de sus anuncios
+    cache_vistas.invalidar_al_confirmar(f'usuario:{instance.usuario_id}', using=using)
+
+
+@receiver(post_save, sender=User)
+def invalidar_cache_usuario(sender, instance, using, update_fields=None, **kwargs):
+    # El login sólo actualiza last_login, que no se muestra en ningún lado
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cache_vistas.invalidar_al_confirmar(f'usuario:{instance.pk}', using=using)
+
+
+# --- 4. MINIATURAS DE IMÁGENES (se generan en segundo plano, ver tareas.py) ---
+def borrar_miniaturas_al_confirmar(nombre, storage, using):
+    # Recién con la transacción confirmada: si se deshace, la imagen vieja sigue en uso
+    if nombre:
+        transaction.on_commit(lambda: miniaturas.borrar(nombre, storage), using=using)
+
+
+@receiver(pre_save, sender=PerfilUsuario)
+def detectar_cambio_imagen_perfil(sender, instance, using, raw=False, **kwargs):
+    instance._imagen_anterior = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._imagen_anterior = sender.objects.using(using).filter(pk=instance.pk).values_list('imagen', flat=True).first()
+    if instance._imagen_anterior != instance.imagen.name:
+        instance.imagen_miniaturas = False
+        borrar_miniaturas_al_confirmar(instance._imagen_anterior, instance.imagen.storage, using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def borrar_miniaturas_anuncio(sender, instance, using, **kwargs):
+    borrar_miniaturas_al_confirmar(instance.imagen_principal.name, instance.imagen_principal.storage, using)
+
+
+@receiver(post_delete, sender=PerfilUsuario)
+def borrar_miniaturas_perfil(sender, instance, using, **kwargs):
+    borrar_miniaturas_al_confirmar(instance.imagen.name, instance.imagen.storage, using)
+
+
+@receiver(post_save, sender=Anuncio)
+def encolar_miniaturas_anuncio(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.imagen_principal or instance.imagen_miniaturas:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    # Sólo si la imagen es nueva: editar otro campo no vuelve a encolar
+    if created or anterior is None or anterior['imagen_principal'] != instance.imagen_principal.name:
+        tareas.miniaturas_anuncio.encolar(instance.pk)
+
+
+@receiver(post_save, sender=PerfilUsuario)
+def encolar_miniaturas_perfil(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.imagen or instance.imagen_miniaturas:
+        return
+    if created or getattr(instance, '_imagen_anterior', None) != instance.imagen.name:
+        tareas.miniaturas_perfil.encolar(instance.pk)
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def encolar_miniaturas_alta_masiva(sender, anuncios, **kwargs):
+    for anuncio in anuncios:
+        if anuncio.imagen_principal and not anuncio.imagen_miniaturas:
+            tareas.miniaturas_anuncio.encolar(anuncio.pk)
+
+
+# --- 5. TARJETAS DEL LISTADO (modelo de lectura de home, ver tarjetas.py) ---
+@receiver(post_save, sender=Anuncio)
+def actualizar_tarjeta(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        tarjetas.actualizar(instance, using=using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def quitar_tarjeta(sender, instance, using, **kwargs):
+    tarjetas.quitar([instance.pk], using=using)
+
+
+@receiver(activo_cambiado, sender=Anuncio)
+def tarjetas_por_activacion(sender, pks, activo, using='default', **kwargs):
+    if activo:
+        tarjetas.agregar_por_id(pks, using=using)
+    else:
+        tarjetas.quitar(pks, using=using)
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def tarjetas_por_alta_masiva(sender, anuncios, using='default', **kwargs):
+    tarjetas.agregar(anuncios, using=using)
+
+
+@receiver(post_save, sender=Categoria)
+def renombrar_categoria_en_tarjetas(sender, instance, created, using, raw=False, **kwargs):
+    if not raw and not created:
+        tarjetas.renombrar_categoria(instance, using=using)
+
+
+# --- 6. COLA DE MODERACIÓN (reportes por entidad, ver moderacion.py) ---
+@receiver(post_save, sender=Reporte)
+def sumar_reporte(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        moderacion.registrar_reporte(instance, using=using)
+
+
+@receiver(post_delete, sender=Reporte)
+def restar_reporte(sender, instance, using, **kwargs):
+    moderacion.descontar_reporte(instance, using=using)
+
+
+# --- 7. HISTOGRAMA DE PRECIOS (cubetas por categoría / ubicación, ver precios.py) ---
+@receiver(post_save, sender=Anuncio)
+def actualizar_histograma(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    nuevo = precios.estado(instance.activo, instance.categoria_id, instance.ubicacion, instance.precio)
+    if anterior:
+        anterior = precios.estado(anterior['activo'], anterior['categoria_id'], anterior['ubicacion'], anterior['precio'])
+    precios.aplicar_deltas(precios.deltas_por_cambio(anterior, nuevo), using=using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def descontar_histograma(sender, instance, using, **kwargs):
+    anterior = precios.estado(instance.activo, instance.categoria_id, instance.ubicacion, instance.precio)
+    precios.aplicar_deltas(precios.deltas_por_cambio(anterior, None), using=using)
+
+
+@receiver(activo_cambiado, sender=Anuncio)
+def histograma_por_activacion(sender, pks, activo, using='default', **kwargs):
+    precios.aplicar_deltas(precios.deltas_por_activacion(pks, activo, using=using), using=using)
+
+
+@receiver(anuncios_creados, sender=Anuncio)
+def histograma_por_alta_masiva(sender, anuncios, using='default', **kwargs):
+    deltas = Counter()
+    for anuncio in anuncios:
+        deltas.update(precios.deltas_por_cambio(
+            None, precios.estado(anuncio.activo, anuncio.categoria_id, anuncio.ubicacion, anuncio.precio),
+        ))
+    precios.aplicar_deltas(deltas, using=using)
+
+
+# --- 8. COMENTARIOS (contador desnormalizado, ver comentarios.py) ---
+@receiver(post_save, sender=Comentario)
+def sumar_comentario(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        comentarios.sumar(instance.anuncio_id, 1, using=using)
+
+
+@receiver(post_delete, sender=Comentario)
+def restar_comentario(sender, instance, using, **kwargs):
+    comentarios.sumar(instance.anuncio_id, -1, using=using)
@@ -0,0 +1,280 @@
+"""
+Envío de SMS con backends intercambiables, como los de correo de Django.
+
+``settings.SMS_BACKEND`` elige la clase:
+
+- ``ConsolaBackend``: escribe los mensajes en la salida estándar (desarrollo).
+- ``ArchivoBackend``: los agrega a un archivo por conexión en SMS_ARCHIVO_RUTA.
+- ``MemoriaBackend``: los guarda en ``sms.bandeja`` (tests).
+- ``HttpBackend``: los manda por HTTP al proveedor (SMS_HTTP_URL), de a
+  SMS_LOTE mensajes por pedido y por una conexión keep-alive.
+
+Las vistas no mandan nada: encolan la tarea enviar_sms y el trabajador de la
+cola toma varias juntas y las manda en un solo pedido (ver tareas.py). La
+conexión de cada hilo del trabajador queda abierta entre tareas
+(``conexion()``) y el comando procesar_tareas la cierra al terminar.
+``ProveedorLocal`` es un proveedor HTTP de mentira para tests y desarrollo.
+"""
+import http.client
+import json
+import logging
+import sys
+import threading
+from collections import namedtuple
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from Marketplace_App.cola import ErrorPermanente
+
+logger = logging.getLogger(__name__)
+
+Mensaje = namedtuple('Mensaje', ['telefono', 'texto'])
+
+# Lo que mandó MemoriaBackend (como django.core.mail.outbox)
+bandeja = []
+
+
+class ErrorProveedor(Exception):
+    """El proveedor no respondió o respondió con un error temporal (la cola reintenta)."""
+
+
+# --- 1. BACKENDS ---
+class BaseBackend:
+    def __init__(self, fail_silently=False, **kwargs):
+        self.fail_silently = fail_silently
+
+    def open(self):
+        """Abre la conexión si hace falta. Devuelve True si abrió una nueva."""
+        return False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enviar_mensajes(self, mensajes):
+        """Manda ``mensajes`` juntos. Devuelve cuántos mandó; si falla, lanza (salvo con ``fail_silently``)."""
+        if not mensajes:
+            return 0
+        try:
+            self._enviar(list(mensajes))
+        except Exception:
+            if self.fail_silently:
+                return 0
+            raise
+        return len(mensajes)
+
+    def _enviar(self, mensajes):
+        raise NotImplementedError
+
+
+class ConsolaBackend(BaseBackend):
+    def __init__(self, stream=None, **kwargs):
+        super().__init__(**kwargs)
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def _formato(self, mensaje):
+        return f'SMS a {mensaje.telefono}\n{mensaje.texto}\n{"-" * 40}\n'
+
+    def _enviar(self, mensajes):
+        # Una sola escritura por lote: los hilos no intercalan líneas
+        texto = ''.join(self._formato(mensaje) for mensaje in mensajes)
+        with self._lock:
+            self.stream.write(texto)
+            self.stream.flush()
+
+
+class ArchivoBackend(ConsolaBackend):
+    def __init__(self, ruta=None, **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = Path(ruta or settings.SMS_ARCHIVO_RUTA)
+        self.stream = None
+
+    def open(self):
+        if self.stream is not None:
+            return False
+        self.ruta.mkdir(parents=True, exist_ok=True)
+        nombre = f'{datetime.now():%Y%m%d-%H%M%S}-{id(self)}.log'
+        self.stream = open(self.ruta / nombre, 'a', encoding='utf-8')
+        return True
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def _enviar(self, mensajes):
+        self.open()
+        super()._enviar(mensajes)
+
+
+class MemoriaBackend(BaseBackend):
+    def _enviar(self, mensajes):
+        bandeja.extend(mensajes)
+
+
+class HttpBackend(BaseBackend):
+    """
+    POST de ``{"mensajes": [{"telefono": ..., "texto": ...}, ...]}`` al proveedor.
+    2xx: enviados. 429 o 5xx: ErrorProveedor (se reintenta). Otro 4xx: ErrorPermanente.
+    """
+
+    def __init__(self, url=None, token=None, timeout=None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = urlsplit(url or settings.SMS_HTTP_URL)
+        self.token = settings.SMS_HTTP_TOKEN if token is None else token
+        self.timeout = timeout or settings.SMS_HTTP_TIMEOUT
+        self.conexion = None
+
+    def open(self):
+        if self.conexion is not None:
+            return False
+        clase = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        self.conexion = clase(self.url.hostname, self.url.port, timeout=self.timeout)
+        return True
+
+    def close(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+    def _post(self, cuerpo):
+        encabezados = {'Content-Type': 'application/json'}
+        if self.token:
+            encabezados['Authorization'] = f'Bearer {self.token}'
+        self.conexion.request('POST', self.url.path or '/', cuerpo, encabezados)
+        respuesta = self.conexion.getresponse()
+        # Leer todo el cuerpo: si no, la conexión no se puede reutilizar
+        return respuesta.status, respuesta.read()
+
+    def _enviar(self, mensajes):
+        cuerpo = json.dumps({'mensajes': [mensaje._asdict() for mensaje in mensajes]}).encode()
+        for intento in (1, 2):
+            nueva = self.open()
+            try:
+                estado, respuesta = self._post(cuerpo)
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError) as error:
+                # El proveedor cerró la conexión ociosa antes de leer el pedido: otra vez con una nueva
+                self.close()
+                if nueva or intento == 2:
+                    raise ErrorProveedor('El proveedor de SMS cerró la conexión.') from error
+            except (http.client.HTTPException, OSError) as error:
+                self.close()
+                raise ErrorProveedor(f'No se pudo conectar con el proveedor de SMS: {error}') from error
+
+        if 200 <= estado < 300:
+            return
+        detalle = respuesta[:200].decode('utf-8', 'replace')
+        if estado == 429 or estado >= 500:
+            raise ErrorProveedor(f'El proveedor de SMS respondió {estado}: {detalle}')
+        raise ErrorPermanente(f'El proveedor de SMS rechazó el envío ({estado}): {detalle}')
+
+
+# --- 2. CONEXIONES ---
+def obtener_conexion(backend=None, **kwargs):
+    """Una instancia (sin abrir) de ``backend`` o de SMS_BACKEND."""
+    return import_string(backend or settings.SMS_BACKEND)(**kwargs)
+
+
+_local = threading.local()
+
+
+def conexion():
+    """La conexión abierta de este hilo, reutilizada entre envíos (se reemplaza si cambia SMS_BACKEND)."""
+    actual = getattr(_local, 'conexion', None)
+    if actual is None or _local.backend != settings.SMS_BACKEND:
+        cerrar()
+        actual = obtener_conexion()
+        actual.open()
+        _local.conexion, _local.backend = actual, settings.SMS_BACKEND
+    return actual
+
+
+def cerrar():
+    actual = getattr(_local, 'conexion', None)
+    if actual is not None:
+        _local.conexion = None
+        actual.close()
+
+
+def enviar_en_lotes(mensajes):
+    """
+    Manda ``mensajes`` de a SMS_LOTE por pedido, por la conexión del hilo.
+    Devuelve, por cada mensaje, ``None`` si salió o el error de su lote.
+    """
+    errores = []
+    for inicio in range(0, len(mensajes), settings.SMS_LOTE):
+        lote = mensajes[inicio:inicio + settings.SMS_LOTE]
+        try:
+            conexion().enviar_mensajes(lote)
+        except Exception as error:
+            logger.warning('Falló el envío de %s SMS: %s', len(lote), error)
+            errores.extend([error] * len(lote))
+        else:
+            errores.extend([None] * len(lote))
+    return errores
+
+
+# --- 3. PROVEEDOR DE PRUEBA ---
+class ProveedorLocal:
+    """
+    Proveedor HTTP en 127.0.0.1 (puerto libre) que acepta lo que manda
+    HttpBackend. Guarda los pedidos en ``pedidos`` y cuenta las conexiones;
+    ``estado`` es el código con el que responde. Se usa con ``with``.
+    """
+
+    def __init__(self, token=''):
+        self.token = token
+        self.estado = 200
+        self.pedidos = []
+        self.conexiones = 0
+        proveedor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive
+
+            def setup(self):
+                super().setup()
+                proveedor.conexiones += 1
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if proveedor.token and self.headers.get('Authorization') != f'Bearer {proveedor.token}':
+                    estado = 401
+                else:
+                    estado = proveedor.estado
+                    if estado < 300:
+                        proveedor.pedidos.append(json.loads(cuerpo)['mensajes'])
+                respuesta = json.dumps({'estado': estado}).encode()
+                self.send_response(estado)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(respuesta)))
+                self.end_headers()
+                self.wfile.write(respuesta)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.servidor.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}/mensajes'
+
+    def __enter__(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
@@ -0,0 +1,15 @@
+// Menú del usuario en la barra de navegación (base.html)
+function toggleUserMenu() {
+    const menu = document.getElementById('user-menu-dropdown');
+    menu.classList.toggle('hidden');
+}
+window.addEventListener('click', function (e) {
+    const button = document.getElementById('user-menu-button');
+    const menu = document.getElementById('user-menu-dropdown');
+    // Verificamos si los elementos existen antes de chequear (por si el usuario no está logueado)
+    if (button && menu) {
+        if (!button.contains(e.target) && !menu.contains(e.target)) {
+            menu.classList.add('hidden');
+        }
+    }
+});
@@ -0,0 +1,112 @@
+"""
+Tareas que se ejecutan en segundo plano (ver cola.py y el comando procesar_tareas).
+
+Todo lo que depende de un servicio externo o del disco (SMTP, SMS, procesamiento
+de imágenes) va acá, así la duración de un request no depende de ellos.
+"""
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from Marketplace_App import cache_vistas, importacion, miniaturas, sms, tarjetas
+from Marketplace_App.cola import tarea
+from Marketplace_App.models import Anuncio, PerfilUsuario, Reporte
+
+User = get_user_model()
+
+
+# --- 1. CORREO ---
+@tarea('enviar_correo', max_intentos=6)
+def enviar_correo(asunto, mensaje, destinatarios):
+    # Si el servidor SMTP no responde se lanza la excepción y la cola reintenta
+    send_mail(asunto, mensaje, settings.EMAIL_HOST_USER, destinatarios, fail_silently=False)
+
+
+@tarea('notificar_reporte')
+def notificar_reporte(reporte_id):
+    """Avisa por correo a los administradores que llegó un reporte nuevo."""
+    reporte = Reporte.objects.select_related('usuario_reportador').filter(pk=reporte_id).first()
+    if reporte is None:
+        return
+    destinatarios = list(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    )
+    if not destinatarios:
+        return
+    enlace = reverse('admin:Marketplace_App_reporte_change', args=[reporte.pk])
+    send_mail(
+        f'Nuevo reporte: {reporte.motivo} - Marketplace',
+        f'{reporte.usuario_reportador or "Un usuario"} reportó {reporte.tipo_entidad_reportada} '
+        f'#{reporte.identificador_entidad_reportada}.\n\n'
+        f'Motivo: {reporte.motivo}\n{reporte.descripcion_reporte or ""}\n\n'
+        f'Revisarlo en el panel: {enlace}',
+        settings.EMAIL_HOST_USER,
+        destinatarios,
+        fail_silently=False,
+    )
+
+
+@tarea('enviar_sms', max_intentos=6)
+def enviar_sms(telefono, texto):
+    # Por el backend de SMS_BACKEND (ver sms.py); si el proveedor falla, la cola reintenta
+    sms.conexion().enviar_mensajes([sms.Mensaje(telefono, texto)])
+
+
+@enviar_sms.por_lote
+def enviar_sms_en_lote(argumentos):
+    """Los SMS que el trabajador toma juntos salen en pedidos de a SMS_LOTE, por la misma conexión."""
+    return sms.enviar_en_lotes([sms.Mensaje(*args, **kwargs) for args, kwargs in argumentos])
+
+
+# --- 2. MINIATURAS ---
+@tarea('miniaturas_anuncio', max_intentos=3)
+def miniaturas_anuncio(anuncio_id):
+    anuncio = Anuncio.objects.filter(pk=anuncio_id).only('pk', 'categoria_id', 'imagen_principal', 'imagen_miniaturas').first()
+    # Puede haberse borrado, o ya procesado por una tarea repetida
+    if anuncio is None or anuncio.imagen_miniaturas:
+        return
+    if miniaturas.generar_para(anuncio, 'imagen_principal'):
+        # generar_para usa update(): la tarjeta del listado no se entera por las señales
+        tarjetas.marcar_miniaturas(anuncio.pk)
+        cache_vistas.invalidar(f'anuncio:{anuncio.pk}', 'listado', cache_vistas.alcance_grilla(anuncio.categoria_id))
+
+
+@tarea('miniaturas_perfil', max_intentos=3)
+def miniaturas_perfil(perfil_id):
+    perfil = PerfilUsuario.objects.filter(pk=perfil_id).only('pk', 'usuario_id', 'imagen', 'imagen_miniaturas').first()
+    if perfil is None or perfil.imagen_miniaturas:
+        return
+    if miniaturas.generar_para(perfil, 'imagen'):
+        cache_vistas.invalidar(f'usuario:{perfil.usuario_id}')
+
+
+# --- 3. IMPORTACIÓN MASIVA (subida desde el admin) ---
+# Un solo intento: si falla a mitad de camino los lotes ya guardados no se repiten
+@tarea('importar_anuncios', max_intentos=1)
+def importar_anuncios(nombre_archivo, formato, usuario_id, tamano_lote, solicitante_id):
+    usuario = User.objects.get(pk=usuario_id)
+    solicitante = User.objects.filter(pk=solicitante_id).first()
+    almacenamiento = importacion.almacenamiento()
+    try:
+        with almacenamiento.open(nombre_archivo, 'rb') as binario:
+            with io.TextIOWrapper(binario, encoding='utf-8-sig', newline='') as archivo:
+                resultado = importacion.importar_anuncios(archivo, formato, usuario, tamano_lote=tamano_lote)
+    finally:
+        almacenamiento.delete(nombre_archivo)
+
+    if solicitante and solicitante.email:
+        errores = '\n'.join(f'Línea {linea}: {mensaje}' for linea, mensaje in resultado.errores)
+        if resultado.con_error > len(resultado.errores):
+            errores += f'\n... y {resultado.con_error - len(resultado.errores)} errores más.'
+        send_mail(
+            'Importación de anuncios terminada - Marketplace',
+            f'Se importaron {resultado.creados} anuncios para {usuario.username}; '
+            f'{resultado.con_error} filas fueron rechazadas.\n\n{errores}',
+            settings.EMAIL_HOST_USER,
+            [solicitante.email],
+            fail_silently=False,
+        )
+
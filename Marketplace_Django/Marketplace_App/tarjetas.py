@@ -0,0 +1,110 @@
+"""
+Tarjetas del listado (tabla TarjetaAnuncio): el modelo de lectura de home().
+
+Hay una fila por anuncio activo, con las columnas que muestra la grilla y las
+de filtro/orden. Cada alta, edición, baja o cambio de ``activo`` de un Anuncio
+(y cada renombre de Categoria) la actualiza desde signals.py; ``reconstruir``
+la arma de cero (comando reconstruir_tarjetas).
+"""
+from django.db import transaction
+
+from Marketplace_App.models import Anuncio, Categoria, TarjetaAnuncio
+
+# Campos que se copian tal cual del Anuncio
+CAMPOS = (
+    'categoria_id', 'titulo', 'precio', 'ubicacion', 'estado', 'fecha_publicacion',
+    'imagen_principal', 'imagen_miniaturas', 'cantidad_comentarios',
+)
+
+
+def _tarjeta(valores, nombres_categoria):
+    """TarjetaAnuncio a partir de un dict con ``id`` y ``CAMPOS``."""
+    return TarjetaAnuncio(
+        id=valores['id'],
+        categoria_nombre=nombres_categoria[valores['categoria_id']],
+        **{campo: valores[campo] for campo in CAMPOS},
+    )
+
+
+def _valores(anuncio):
+    valores = {'id': anuncio.pk, **{campo: getattr(anuncio, campo) for campo in CAMPOS}}
+    valores['imagen_principal'] = anuncio.imagen_principal.name
+    return valores
+
+
+def _nombres_categoria(ids, using):
+    return dict(Categoria.objects.using(using).filter(pk__in=set(ids)).values_list('pk', 'nombre'))
+
+
+def _guardar(tarjetas, using):
+    # Upsert: las que ya están se reemplazan enteras
+    with transaction.atomic(using=using):
+        TarjetaAnuncio.objects.using(using).filter(pk__in=[tarjeta.pk for tarjeta in tarjetas]).delete()
+        TarjetaAnuncio.objects.using(using).bulk_create(tarjetas, batch_size=500)
+
+
+def actualizar(anuncio, using='default'):
+    """Deja la tarjeta de ``anuncio`` como el anuncio (la borra si no está activo)."""
+    if not anuncio.activo:
+        quitar([anuncio.pk], using=using)
+        return
+    # Si la categoría ya está cargada en el anuncio no se consulta
+    if Anuncio.categoria.is_cached(anuncio) and anuncio.categoria.pk == anuncio.categoria_id:
+        nombres = {anuncio.categoria_id: anuncio.categoria.nombre}
+    else:
+        nombres = _nombres_categoria([anuncio.categoria_id], using)
+    # UPDATE y, si no existía la fila, INSERT
+    _tarjeta(_valores(anuncio), nombres).save(using=using)
+
+
+def agregar(anuncios, using='default'):
+    """Agrega (o reemplaza) las tarjetas de varios anuncios ya guardados; ignora los inactivos."""
+    activos = [anuncio for anuncio in anuncios if anuncio.activo]
+    if not activos:
+        return 0
+    nombres = _nombres_categoria([anuncio.categoria_id for anuncio in activos], using)
+    _guardar([_tarjeta(_valores(anuncio), nombres) for anuncio in activos], using)
+    return len(activos)
+
+
+def agregar_por_id(pks, using='default'):
+    """Como ``agregar`` pero leyendo los anuncios (activos) de la base."""
+    filas = list(Anuncio.objects.using(using).filter(pk__in=pks, activo=True).order_by().values('id', *CAMPOS))
+    if filas:
+        nombres = _nombres_categoria([fila['categoria_id'] for fila in filas], using)
+        _guardar([_tarjeta(fila, nombres) for fila in filas], using)
+    return len(filas)
+
+
+def quitar(pks, using='default'):
+    TarjetaAnuncio.objects.using(using).filter(pk__in=pks).delete()
+
+
+def renombrar_categoria(categoria, using='default'):
+    TarjetaAnuncio.objects.using(using).filter(categoria_id=categoria.pk).exclude(
+        categoria_nombre=categoria.nombre,
+    ).update(categoria_nombre=categoria.nombre)
+
+
+def marcar_miniaturas(pk, using='default'):
+    TarjetaAnuncio.objects.using(using).filter(pk=pk).update(imagen_miniaturas=True)
+
+
+def reconstruir(using='default', tamano_lote=2000):
+    """Borra la tabla y la vuelve a llenar con los anuncios activos (en lotes). Devuelve cuántas creó."""
+    nombres = dict(Categoria.objects.using(using).values_list('pk', 'nombre'))
+    filas = Anuncio.objects.using(using).filter(activo=True).order_by().values('id', *CAMPOS)
+    total = 0
+    with transaction.atomic(using=using):
+        TarjetaAnuncio.objects.using(using).all().delete()
+        lote = []
+        for fila in filas.iterator(chunk_size=tamano_lote):
+            lote.append(_tarjeta(fila, nombres))
+            if len(lote) >= tamano_lote:
+                TarjetaAnuncio.objects.using(using).bulk_create(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            TarjetaAnuncio.objects.using(using).bulk_create(lote)
+            total += len(lote)
+    return total
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsiva(miniaturas, alt='', clase='', sizes='100vw'):
+    """
+    Uso: {% imagen_responsiva anuncio.miniaturas alt=anuncio.titulo clase="w-full h-48" sizes="33vw" %}
+    Emite un <picture> con srcset WebP/JPEG; si aún no hay miniaturas, la imagen original.
+    """
+    if not miniaturas:
+        return ''
+    if not miniaturas.disponibles:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', miniaturas.original, alt, clase)
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        miniaturas.srcset('webp'), sizes,
+        miniaturas.mediana, miniaturas.srcset('jpg'), sizes, alt, clase,
+    )
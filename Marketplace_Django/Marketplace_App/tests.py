@@ -1,3 +1,1993 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import json
+import random
+import re
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Marketplace_App import (
+    busqueda, cache_vistas, checks, codigos, cola, dos_pasos, facetas, importacion, limites, metricas, miniaturas,
+    moderacion, paginacion, precios, rendimiento, replicas, sms, tareas,
+)
+from Marketplace_App.filtros import filtrar_anuncios
+from Marketplace_App.middleware import EstaticosMiddleware, VerificacionDosPasosMiddleware
+from Marketplace_App.models import (
+    Anuncio, Categoria, CodigoVerificacion, Comentario, CubetaPrecios, FacetaAnuncios, PerfilUsuario, Reporte, ResumenReportes,
+    TarjetaAnuncio, Tarea, TareaFallida,
+)
+
+
+def iniciar_sesion(client, usuario):
+    """force_login con la verificación en dos pasos ya hecha."""
+    client.force_login(usuario)
+    sesion = client.session
+    dos_pasos.marcar_verificado(sesion)
+    sesion.save()
+
+
+# --- 1. ÍNDICES DEL LISTADO DE ANUNCIOS ---
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es propio de SQLite')
+class IndicesAnuncioTests(TestCase):
+    """Cada combinación de filtros/orden de home() debe resolverse con un índice, nunca con un SCAN de la tabla."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user('vendedor', 'vendedor@example.com', 'clave-segura')
+        cls.categoria = Categoria.objects.create(nombre='Tecnología', slug='tecnologia')
+        for i in range(20):
+            Anuncio.objects.create(
+                usuario=usuario, categoria=cls.categoria, titulo=f'Producto {i}',
+                descripcion='Descripción', precio=i * 100, ubicacion=f'Ciudad {i % 3}',
+            )
+
+    def assertUsaIndice(self, queryset):
+        plan = queryset.explain()
+        tabla = queryset.model._meta.db_table
+        for linea in plan.splitlines():
+            if re.search(rf'\b(SCAN|SEARCH) {tabla}\b', linea):
+                self.assertRegex(linea, r'USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY)', plan)
+
+    def test_combinaciones_de_home_usan_indices(self):
+        combinaciones = itertools.product(
+            [None, 'categoria'],
+            [None, 'Ciudad 1'],
+            [None, 'precio_asc', 'precio_desc'],
+            [None, '24h', '7d', '30d'],
+            [None, 'producto'],
+            # El listado de home lee de las tarjetas; la API y los demás, de Anuncio
+            [Anuncio.objects.filter(activo=True), TarjetaAnuncio.objects.all()],
+        )
+        for categoria, ubicacion, orden, tiempo, busqueda, base in combinaciones:
+            with self.subTest(categoria=categoria, ubicacion=ubicacion, orden=orden, tiempo=tiempo, busqueda=busqueda, modelo=base.model.__name__):
+                queryset = filtrar_anuncios(
+                    base,
+                    categoria=self.categoria if categoria else None,
+                    ubicacion=ubicacion,
+                    busqueda=busqueda,
+                    orden=orden,
+                    tiempo=tiempo,
+                )
+                self.assertUsaIndice(queryset[:9])
+
+    def test_rango_de_precios_usa_indices(self):
+        # Con precio_min/precio_max y el orden por precio, el índice que empieza por los
+        # filtros de igualdad resuelve el rango y el orden (sin ordenar aparte)
+        combinaciones = itertools.product(
+            [None, 'categoria'],
+            [None, 'Ciudad 1'],
+            [(Decimal('300'), None), (None, Decimal('1500')), (Decimal('300'), Decimal('1500'))],
+            ['precio_asc', 'precio_desc'],
+            [Anuncio.objects.filter(activo=True), TarjetaAnuncio.objects.all()],
+        )
+        for categoria, ubicacion, (precio_min, precio_max), orden, base in combinaciones:
+            with self.subTest(categoria=categoria, ubicacion=ubicacion, precio_min=precio_min, precio_max=precio_max, orden=orden, modelo=base.model.__name__):
+                queryset = filtrar_anuncios(
+                    base,
+                    categoria=self.categoria if categoria else None,
+                    ubicacion=ubicacion,
+                    orden=orden,
+                    precio_min=precio_min,
+                    precio_max=precio_max,
+                )[:9]
+                self.assertUsaIndice(queryset)
+                plan = queryset.explain()
+                self.assertNotIn('TEMP B-TREE', plan)
+                if categoria and ubicacion:
+                    self.assertIn('_cat_ubi_precio_idx', plan)
+
+    def test_listado_de_ubicaciones_usa_indice(self):
+        ubicaciones = Anuncio.objects.filter(activo=True).values_list('ubicacion', flat=True).distinct().order_by('ubicacion')
+        self.assertUsaIndice(ubicaciones)
+
+
+# --- 2. CANTIDAD DE CONSULTAS POR VISTA (sin N+1) ---
+class ConsultasPorVistaTests(TestCase):
+    """La cantidad de consultas de cada página no debe crecer con la cantidad de anuncios."""
+
+    TAMANOS = (4, 12, 40)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('vendedor', 'vendedor@example.com', 'clave-segura')
+        PerfilUsuario.objects.create(usuario=cls.usuario, telefono_contacto='3811234567', telefono_verificado=True)
+        cls.categorias = [
+            Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def sembrar(self, cantidad):
+        """Completa la base hasta tener ``cantidad`` anuncios de varios vendedores."""
+        # Las invalidaciones de la caché corren al confirmar, que en un TestCase nunca llega
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(Anuncio.objects.count(), cantidad):
+                if i % 2:
+                    vendedor = self.usuario
+                else:
+                    vendedor = User.objects.create(username=f'otro{i}', email=f'otro{i}@example.com')
+                    PerfilUsuario.objects.create(usuario=vendedor)
+                Anuncio.objects.create(
+                    usuario=vendedor, categoria=self.categorias[i % 4], titulo=f'Teléfono {i}',
+                    descripcion='Descripción', precio=i * 10, ubicacion=f'Ciudad {i % 3}',
+                )
+
+    def assertConsultasConstantes(self, consultas, url, login=False):
+        for cantidad in self.TAMANOS:
+            self.sembrar(cantidad)
+            if login:
+                iniciar_sesion(self.client, self.usuario)
+            with self.subTest(url=url, anuncios=cantidad), self.assertNumQueries(consultas):
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+
+    def test_home(self):
+        # facetas + categorías + histograma de precios + COUNT + página
+        self.assertConsultasConstantes(5, reverse('home'))
+
+    def test_home_por_categoria(self):
+        self.assertConsultasConstantes(5, reverse('home_por_categoria', args=['categoria-1']))
+
+    def test_home_con_busqueda_y_filtros(self):
+        self.assertConsultasConstantes(
+            5, reverse('home') + '?q=telefono&ubicacion=Ciudad+1&orden=precio_asc&tiempo=7d&precio_min=10&precio_max=200',
+        )
+
+    def test_home_paginacion_por_cursor(self):
+        # Sin COUNT: facetas + categorías + histograma + página
+        self.assertConsultasConstantes(4, reverse('home') + '?cursor=')
+
+    def test_home_autenticado(self):
+        # + usuario y perfil (avatar del menú); la sesión sale de la caché
+        self.assertConsultasConstantes(7, reverse('home'), login=True)
+
+    def test_detalle_anuncio(self):
+        self.sembrar(2)
+        anuncio = Anuncio.objects.filter(usuario=self.usuario).first()
+        url = reverse('detalle_anuncio', args=[anuncio.pk])
+        # Anuncio + categoría + vendedor + perfil en una sola consulta
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        # Después sale de la caché, aunque se publiquen otros anuncios
+        self.sembrar(40)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_detalle_anuncio_se_invalida_al_editar(self):
+        self.sembrar(2)
+        anuncio = Anuncio.objects.filter(usuario=self.usuario).first()
+        url = reverse('detalle_anuncio', args=[anuncio.pk])
+        self.client.get(url)
+        anuncio.titulo = 'Título editado'
+        with self.captureOnCommitCallbacks(execute=True):
+            anuncio.save()
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(url), 'Título editado')
+        self.usuario.perfil.telefono_contacto = '3819999999'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.perfil.save()
+        self.assertContains(self.client.get(url), '3819999999')
+
+    def test_la_invalidacion_espera_a_la_confirmacion(self):
+        self.sembrar(2)
+        anuncio = Anuncio.objects.filter(usuario=self.usuario).first()
+        antes = cache_vistas.versiones(f'anuncio:{anuncio.pk}')
+        with self.captureOnCommitCallbacks() as pendientes:
+            anuncio.save()
+            # Otro request que leyera ahora cachearía los datos viejos con la versión nueva
+            self.assertEqual(cache_vistas.versiones(f'anuncio:{anuncio.pk}'), antes)
+        self.assertTrue(pendientes)
+        for invalidar in pendientes:
+            invalidar()
+        self.assertNotEqual(cache_vistas.versiones(f'anuncio:{anuncio.pk}'), antes)
+
+    def test_home_en_cache(self):
+        self.sembrar(12)
+        self.client.get(reverse('home'))
+        # Sólo la barra lateral: facetas + categorías + histograma
+        with self.assertNumQueries(3):
+            self.client.get(reverse('home'))
+
+    def test_mi_perfil(self):
+        # usuario + perfil + anuncios (con categoría) + opciones de categoría
+        self.assertConsultasConstantes(4, reverse('mi_perfil'), login=True)
+
+
+@override_settings(ROOT_URLCONF='Marketplace_Django.urls_asincronas')
+class ConsultasPorVistaAsincronasTests(ConsultasPorVistaTests):
+    """Las vistas async (views/asincronas.py) hacen las mismas consultas que las sync."""
+
+
+class TarjetasAnuncioTests(TestCase):
+    """La tabla de tarjetas sigue a Anuncio/Categoria y es lo único que lee la grilla de home."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='vendedor')
+        self.categoria = Categoria.objects.create(nombre='Tecnología', slug='tecnologia')
+
+    def crear(self, **campos):
+        return Anuncio.objects.create(**{
+            'usuario': self.usuario, 'categoria': self.categoria, 'titulo': 'Teléfono',
+            'descripcion': 'Descripción', 'precio': 100, 'ubicacion': 'Tucumán', **campos,
+        })
+
+    def assertIgualAAnuncios(self):
+        columnas = ['id', 'categoria_id', 'titulo', 'precio', 'ubicacion', 'estado', 'fecha_publicacion', 'imagen_principal']
+        self.assertEqual(
+            list(TarjetaAnuncio.objects.order_by('id').values_list(*columnas)),
+            list(Anuncio.objects.filter(activo=True).order_by('id').values_list(*columnas)),
+        )
+        for tarjeta in TarjetaAnuncio.objects.select_related('categoria'):
+            self.assertEqual(tarjeta.categoria_nombre, tarjeta.categoria.nombre)
+
+    def test_se_mantiene_con_cada_escritura(self):
+        anuncio = self.crear()
+        inactivo = self.crear(activo=False)
+        self.assertIgualAAnuncios()
+
+        anuncio.titulo, anuncio.precio = 'Teléfono usado', 80
+        anuncio.save()
+        otra = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        inactivo.categoria = otra
+        inactivo.activo = True
+        inactivo.save()
+        self.assertIgualAAnuncios()
+
+        otra.nombre = 'Casa y jardín'
+        otra.save()
+        Anuncio.objects.filter(pk=anuncio.pk).cambiar_activo(False)
+        self.assertIgualAAnuncios()
+        Anuncio.objects.all().cambiar_activo(True)
+        Anuncio.objects.crear_en_bloque([
+            Anuncio(usuario=self.usuario, categoria=otra, titulo=f'Silla {i}', descripcion='', precio=i, ubicacion='Salta')
+            for i in range(3)
+        ])
+        inactivo.delete()
+        self.assertIgualAAnuncios()
+        self.assertEqual(TarjetaAnuncio.objects.count(), 4)
+
+        # Reconstruir desde cero deja lo mismo
+        TarjetaAnuncio.objects.all().delete()
+        call_command('reconstruir_tarjetas', lote=2, stdout=io.StringIO())
+        self.assertIgualAAnuncios()
+
+    def test_home_no_lee_la_tabla_de_anuncios(self):
+        for i in range(12):
+            self.crear(titulo=f'Teléfono {i}', precio=i)
+        for url in [reverse('home'), reverse('home') + '?orden=precio_asc&ubicacion=Tucumán&cursor=']:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            self.assertContains(respuesta, 'Tecnología')
+            tabla = Anuncio._meta.db_table
+            self.assertFalse([c['sql'] for c in consultas if f'"{tabla}"' in c['sql']])
+        # Sin índice full-text, la búsqueda en la descripción sigue funcionando
+        self.crear(titulo='Mesa', descripcion='de algarrobo')
+        with mock.patch.dict(busqueda._indice_disponible, {'default': False}):
+            self.assertContains(self.client.get(reverse('home') + '?q=algarrobo'), 'Mesa')
+
+
+# --- 3. COLA DE TAREAS EN SEGUNDO PLANO ---
+@cola.tarea('prueba_falla', max_intentos=3)
+def tarea_que_falla():
+    raise ConnectionError('servidor caído')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', TAREAS_INMEDIATAS=False)
+class ColaTareasTests(TestCase):
+
+    def test_registro_no_envia_el_correo_en_el_request(self):
+        self.client.post(reverse('registro'), {
+            'username': 'nuevo', 'email': 'nuevo@example.com', 'password': 'clave-segura-123', 'password2': 'clave-segura-123',
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Tarea.objects.filter(nombre='enviar_correo').count(), 1)
+
+        self.assertEqual(cola.procesar_pendientes(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['nuevo@example.com'])
+        self.assertIn('código de activación', mail.outbox[0].body)
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_reporte_avisa_a_los_administradores(self):
+        User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        usuario = User.objects.create(username='comprador')
+        anuncio = Anuncio.objects.create(
+            usuario=usuario, categoria=Categoria.objects.create(nombre='Hogar', slug='hogar'),
+            titulo='Mesa', descripcion='Mesa de roble', precio=100, ubicacion='Córdoba',
+        )
+        iniciar_sesion(self.client, usuario)
+        self.client.post(reverse('reportar_anuncio', args=[anuncio.pk]), {'motivo': 'Estafa', 'descripcion_reporte': ''})
+        self.assertEqual(Reporte.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        cola.procesar_pendientes()
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+
+    def test_reintento_con_espera_exponencial(self):
+        cola.encolar('prueba_falla')
+        antes = timezone.now()
+        self.assertEqual(cola.procesar_pendientes(), (0, 1))
+
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.PENDIENTE, 1))
+        self.assertIn('servidor caído', tarea.ultimo_error)
+        self.assertGreaterEqual(tarea.disponible_desde, antes + timedelta(seconds=5))
+        # Todavía no venció la espera: nadie la toma
+        self.assertEqual(cola.procesar_pendientes(), (0, 0))
+        self.assertGreater(cola.espera_reintento(4), cola.espera_reintento(1))
+
+    @override_settings(TAREAS_ESPERA_BASE=0)
+    def test_pasa_a_fallidas_al_agotar_los_intentos_y_se_puede_reencolar(self):
+        cola.encolar('prueba_falla')
+        self.assertEqual(cola.procesar_pendientes(), (0, 3))
+        self.assertFalse(Tarea.objects.exists())
+        fallida = TareaFallida.objects.get()
+        self.assertEqual((fallida.nombre, fallida.intentos), ('prueba_falla', 3))
+
+        self.assertEqual(cola.reencolar(TareaFallida.objects.all()), 1)
+        self.assertEqual(Tarea.objects.get().intentos, 0)
+        self.assertFalse(TareaFallida.objects.exists())
+
+    def test_una_tarea_tomada_no_la_toma_otro_trabajador(self):
+        cola.encolar('enviar_correo', 'Hola', 'Mensaje', ['a@example.com'])
+        self.assertEqual(len(cola.tomar('trabajador-1')), 1)
+        self.assertEqual(cola.tomar('trabajador-2'), [])
+        # Si el primero muere, la tarea se libera al vencer el bloqueo
+        Tarea.objects.update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(cola.tomar('trabajador-2')), 1)
+
+
+# --- 4. IMPORTACIÓN / EXPORTACIÓN MASIVA ---
+class ImportacionAnunciosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username='mayorista')
+        cls.categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+
+    def setUp(self):
+        cache.clear()
+
+    def csv(self, *filas):
+        encabezado = ','.join(importacion.COLUMNAS)
+        return io.StringIO('\n'.join((encabezado,) + filas) + '\n')
+
+    def test_importa_en_lotes_y_reporta_filas_invalidas(self):
+        archivo = self.csv(
+            'Mesa de roble,Mesa grande,15000,Tucumán,USADO,hogar',
+            'Silla,Silla plegable,no-es-precio,Tucumán,USADO,hogar',
+            'Lámpara,Lámpara de pie,3000,Salta,NUEVO,no-existe',
+            'Sillón,Sillón de tres cuerpos,90000.50,Salta,REACONDICIONADO,hogar',
+            'Estante,Estante de pino,5000,Salta,ROTO,hogar',
+        )
+        rechazadas = []
+        resultado = importacion.importar_anuncios(
+            archivo, 'csv', self.usuario, tamano_lote=1, reporte=lambda *fila: rechazadas.append(fila),
+        )
+        self.assertEqual((resultado.creados, resultado.con_error), (2, 3))
+        self.assertEqual([linea for linea, _ in rechazadas], [3, 4, 6])
+        self.assertIn('precio', rechazadas[0][1])
+        self.assertIn('no-existe', rechazadas[1][1])
+        self.assertIn('estado', rechazadas[2][1])
+
+        # bulk_create no envía post_save: índice, facetas y caché se actualizan igual
+        self.assertEqual(Anuncio.objects.filter(usuario=self.usuario).count(), 2)
+        self.assertEqual(busqueda.filtrar_por_texto(Anuncio.objects.all(), 'roble').count(), 1)
+        self.assertEqual(FacetaAnuncios.objects.get(tipo='UBICACION', valor='Salta').cantidad, 1)
+        self.assertContains(self.client.get(reverse('home')), 'Sillón')
+
+    def test_consultas_no_dependen_de_la_cantidad_de_filas(self):
+        # Categorías en un mapa y un bulk_create por lote: nada se consulta por fila
+        consultas = []
+        # La primera vez además se crean las filas de facetas y de las cubetas de precios
+        # (siempre las mismas: precios de 0 a 9): se mide desde la segunda
+        for cantidad in (10, 20, 50):
+            filas = [f'Producto {i},Descripción,{i % 10},Jujuy,NUEVO,hogar' for i in range(cantidad)]
+            with CaptureQueriesContext(connection) as capturadas:
+                resultado = importacion.importar_anuncios(self.csv(*filas), 'csv', self.usuario, tamano_lote=100)
+            self.assertEqual(resultado.creados, cantidad)
+            consultas.append(len(capturadas))
+        self.assertEqual(consultas[1], consultas[2])
+
+    def test_valida_las_reglas_del_modelo(self):
+        def clean(anuncio):
+            if anuncio.precio == 0 and anuncio.estado == 'NUEVO':
+                raise ValidationError({'precio': 'Un artículo nuevo no puede ser gratis.'})
+
+        archivo = self.csv('Mesa,Mesa grande,0,Tucumán,NUEVO,hogar', 'Silla,Silla plegable,0,Tucumán,USADO,hogar')
+        rechazadas = []
+        with mock.patch.object(Anuncio, 'clean', clean):
+            resultado = importacion.importar_anuncios(
+                archivo, 'csv', self.usuario, reporte=lambda *fila: rechazadas.append(fila),
+            )
+        self.assertEqual((resultado.creados, resultado.con_error), (1, 1))
+        self.assertEqual(rechazadas, [(2, 'precio: Un artículo nuevo no puede ser gratis.')])
+
+    def test_faltan_columnas(self):
+        with self.assertRaises(importacion.ErrorDeArchivo):
+            importacion.importar_anuncios(io.StringIO('titulo,precio\nA,1\n'), 'csv', self.usuario)
+
+    def test_exportar_e_importar_ida_y_vuelta(self):
+        Anuncio.objects.create(
+            usuario=self.usuario, categoria=self.categoria, titulo='Mesa, "ratona"',
+            descripcion='Con\nsaltos de línea', precio='1200.50', ubicacion='Tucumán', estado='NUEVO',
+        )
+        for formato in importacion.FORMATOS:
+            with self.subTest(formato=formato):
+                contenido = ''.join(importacion.exportar_anuncios(Anuncio.objects.all(), formato))
+                if formato == 'jsonl':
+                    self.assertEqual(json.loads(contenido.splitlines()[0])['categoria'], 'hogar')
+                antes = Anuncio.objects.count()
+                resultado = importacion.importar_anuncios(io.StringIO(contenido, newline=''), formato, self.usuario)
+                self.assertEqual((resultado.creados, resultado.con_error), (antes, 0))
+                copia = Anuncio.objects.order_by('-pk').first()
+                self.assertEqual((copia.titulo, copia.descripcion, str(copia.precio)), ('Mesa, "ratona"', 'Con\nsaltos de línea', '1200.50'))
+
+
+# --- 5. API JSON ---
+class ApiAnunciosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username='vendedor')
+        cls.hogar = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        cls.deportes = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        for i in range(25):
+            Anuncio.objects.create(
+                usuario=cls.usuario, categoria=cls.hogar if i % 2 else cls.deportes,
+                titulo=f'Bicicleta {i}' if i % 5 == 0 else f'Mesa {i}', descripcion='Descripción',
+                precio=i * 100, ubicacion='Salta' if i % 3 else 'Jujuy',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_busqueda_con_filtros_y_cursor(self):
+        url = reverse('api_anuncios')
+        vistos = []
+        parametros = {'categoria': 'hogar', 'orden': 'precio_asc', 'limite': 5, 'campos': 'id,precio'}
+        while True:
+            datos = self.client.get(url, parametros).json()
+            self.assertTrue(all(set(fila) == {'id', 'precio'} for fila in datos['resultados']))
+            vistos += [fila['precio'] for fila in datos['resultados']]
+            if not datos['siguiente']:
+                break
+            parametros['cursor'] = datos['siguiente']
+        esperados = Anuncio.objects.filter(categoria=self.hogar).order_by('precio').values_list('precio', flat=True)
+        self.assertEqual(vistos, [str(precio) for precio in esperados])
+
+        datos = self.client.get(url, {'q': 'bicicleta'}).json()
+        self.assertEqual(len(datos['resultados']), 5)
+        self.assertEqual(self.client.get(url, {'campos': 'id,clave'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'categoria': 'no-existe'}).status_code, 404)
+
+    def test_etag_devuelve_304_sin_consultar_los_datos(self):
+        url = reverse('api_anuncios')
+        respuesta = self.client.get(url, {'categoria': 'hogar'})
+        etag = respuesta['ETag']
+        self.assertIn('Last-Modified', respuesta)
+        # Sólo el slug de la categoría: ni el listado ni la serialización
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(url, {'categoria': 'hogar'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        # Un cambio en otra categoría no invalida; uno en la misma, sí
+        with self.captureOnCommitCallbacks(execute=True):
+            Anuncio.objects.filter(categoria=self.deportes).first().save()
+        self.assertEqual(self.client.get(url, {'categoria': 'hogar'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Anuncio.objects.filter(categoria=self.hogar).first().save()
+        self.assertEqual(self.client.get(url, {'categoria': 'hogar'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detalle_condicional(self):
+        anuncio = Anuncio.objects.filter(categoria=self.hogar).first()
+        url = reverse('api_detalle_anuncio', args=[anuncio.pk])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.json()['categoria'], 'hogar')
+        self.assertEqual(respuesta.json()['vendedor'], 'vendedor')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+        # Renombrar la categoría cambia el contenido aunque el anuncio no se haya tocado
+        self.hogar.nombre = 'Casa'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hogar.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Anuncio.objects.filter(pk=anuncio.pk).cambiar_activo(False)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_detalle_desactivado_entre_consultas(self):
+        anuncio = Anuncio.objects.filter(categoria=self.hogar).first()
+        versiones = cache_vistas.versiones
+
+        def desactivar_y_leer(*nombres):
+            Anuncio.objects.filter(pk=anuncio.pk).cambiar_activo(False)
+            return versiones(*nombres)
+
+        with mock.patch('Marketplace_App.cache_vistas.versiones', side_effect=desactivar_y_leer):
+            respuesta = self.client.get(reverse('api_detalle_anuncio', args=[anuncio.pk]))
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_categorias_y_ubicaciones_con_conteos(self):
+        categorias = self.client.get(reverse('api_categorias')).json()['resultados']
+        self.assertEqual({c['slug']: c['cantidad'] for c in categorias}, {'hogar': 12, 'deportes': 13})
+        ubicaciones = self.client.get(reverse('api_ubicaciones')).json()['resultados']
+        self.assertEqual(ubicaciones, [{'nombre': 'Jujuy', 'cantidad': 9}, {'nombre': 'Salta', 'cantidad': 16}])
+
+
+# --- 6. MÉTRICAS POR VISTA ---
+@override_settings(METRICAS_MUESTREO=1.0, METRICAS_TOKEN='secreto')
+class MetricasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username='vendedor')
+        categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        cls.anuncio = Anuncio.objects.create(
+            usuario=cls.usuario, categoria=categoria, titulo='Mesa', descripcion='Mesa', precio=10, ubicacion='Salta',
+        )
+
+    def setUp(self):
+        cache.clear()
+        metricas.reiniciar()
+
+    def leer(self):
+        respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.content.decode()
+
+    def test_registra_por_vista(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.client.get(reverse('detalle_anuncio', args=[self.anuncio.pk]))
+        texto = self.leer()
+        self.assertIn('marketplace_request_duracion_segundos_count{vista="home"} 2', texto)
+        self.assertIn('marketplace_request_duracion_segundos_count{vista="detalle_anuncio"} 1', texto)
+        # El home sin caché hace 4 consultas (ver ConsultasPorVistaTests): cae en el bucket le="5"
+        self.assertIn('marketplace_request_consultas_bucket{vista="home",le="3"} 1', texto)
+        self.assertIn('marketplace_request_consultas_bucket{vista="home",le="5"} 2', texto)
+        self.assertRegex(texto, r'marketplace_request_templates_segundos_sum\{vista="home"\} 0\.0*[1-9]')
+        self.assertRegex(texto, r'marketplace_respuesta_bytes_sum\{vista="home"\} [1-9]')
+        self.assertNotIn('vista="metricas"', texto)
+
+    def test_detecta_consultas_repetidas(self):
+        with metricas.Medicion() as medicion:
+            for anuncio in Anuncio.objects.all()[:1]:
+                for _ in range(5):
+                    User.objects.filter(pk=anuncio.usuario_id).first()
+        self.assertEqual(medicion.consultas, 6)
+        self.assertEqual(len(medicion.repetidas(5)), 1)
+        self.assertEqual(medicion.repetidas(6), [])
+
+    def test_endpoint_protegido(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        iniciar_sesion(self.client, User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 200)
+
+    def test_suma_los_procesos(self):
+        self.client.get(reverse('home'))
+        # Lo que guardó otro worker en METRICAS_DIRECTORIO
+        otro = {
+            metricas.DURACION.nombre: {'home': [[1] + [0] * len(metricas.BUCKETS_SEGUNDOS), 0.5]},
+            metricas.CONSULTAS_REPETIDAS.nombre: {'home': 3},
+        }
+        directorio = Path(settings.METRICAS_DIRECTORIO)
+        directorio.mkdir(parents=True, exist_ok=True)
+        archivo = directorio / 'otro-proceso.json'
+        archivo.write_text(json.dumps(otro))
+        self.addCleanup(archivo.unlink)
+        texto = self.leer()
+        self.assertIn('marketplace_request_duracion_segundos_count{vista="home"} 2', texto)
+        self.assertIn('marketplace_consultas_repetidas_total{vista="home"} 3', texto)
+        # Y éste dejó el suyo para los demás
+        self.assertEqual(len(list(directorio.glob('*.json'))), 2)
+        with override_settings(METRICAS_DIRECTORIO=''):
+            self.assertIn('marketplace_request_duracion_segundos_count{vista="home"} 1', self.leer())
+
+    @override_settings(METRICAS_MUESTREO=0)
+    def test_sin_muestreo_no_mide(self):
+        self.client.get(reverse('home'))
+        self.assertNotIn('vista="home"', self.leer())
+
+
+class DatosSinteticosYRendimientoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def generar(self, **cantidades):
+        salida = io.StringIO()
+        call_command('generar_datos', stdout=salida, semilla=7, lote=40, **cantidades)
+        return salida.getvalue()
+
+    def test_generar_datos(self):
+        self.generar(usuarios=20, anuncios=150, comentarios=60, reportes=10)
+        self.assertEqual(User.objects.filter(username__startswith='sintetico_').count(), 21) # + el admin
+        self.assertEqual(PerfilUsuario.objects.count(), 20)
+        self.assertEqual(Anuncio.objects.count(), 150)
+        self.assertEqual(Comentario.objects.count(), 60)
+        self.assertEqual(Reporte.objects.count(), 10)
+        # Las fechas simuladas reemplazan a las de auto_now_add y las facetas quedan al día
+        self.assertLess(Anuncio.objects.earliest('fecha_publicacion').fecha_publicacion, timezone.now() - timedelta(days=1))
+        self.assertEqual(
+            FacetaAnuncios.objects.filter(tipo=facetas.CATEGORIA).aggregate(total=Sum('cantidad'))['total'],
+            Anuncio.objects.filter(activo=True).count(),
+        )
+        # Una segunda corrida agrega usuarios nuevos sin chocar con los existentes
+        self.generar(usuarios=5, anuncios=0, comentarios=0, reportes=0)
+        self.assertEqual(PerfilUsuario.objects.count(), 25)
+
+    def test_medir_y_comparar(self):
+        self.generar(usuarios=10, anuncios=60, comentarios=20, reportes=5)
+        administrador = User.objects.get(username='sintetico_admin')
+        peticiones = rendimiento.armar_peticiones(muestra_home=8, detalles=3, perfiles=2, administrador=administrador)
+        self.assertEqual(len(peticiones['home']), 8)
+        informe = rendimiento.informe(rendimiento.medir(peticiones))
+        json.dumps(informe) # Serializable tal cual
+
+        for escenario in rendimiento.ESCENARIOS:
+            datos = informe['escenarios'][escenario]
+            self.assertGreater(datos['requests'], 0, escenario)
+            self.assertEqual(datos['errores'], 0, escenario)
+            self.assertGreater(datos['consultas']['max'], 0, escenario)
+        self.assertEqual(informe['datos']['anuncios'], 60)
+        self.assertEqual(rendimiento.comparar(informe, informe), [])
+
+        # Una consulta más por request en home es una regresión, aunque la latencia no cambie
+        peor = json.loads(json.dumps(informe))
+        peor['escenarios']['home']['consultas']['max'] += 1
+        self.assertEqual(len(rendimiento.comparar(peor, informe)), 1)
+
+    def test_percentil(self):
+        valores = list(range(1, 101))
+        self.assertEqual(rendimiento.percentil(valores, 50), 50)
+        self.assertEqual(rendimiento.percentil(valores, 99), 99)
+        self.assertEqual(rendimiento.percentil([5], 95), 5)
+        self.assertIsNone(rendimiento.percentil([], 50))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', TAREAS_INMEDIATAS=False)
+class VerificacionDosPasosTests(TestCase):
+    def setUp(self):
+        cache.clear() # Los contadores de límites de frecuencia
+        self.usuario = User.objects.create(username='vendedor', email='vendedor@example.com')
+
+    def codigo_enviado(self):
+        cola.procesar_pendientes()
+        return re.search(r'\b(\d{6})\b', mail.outbox[-1].body).group(1)
+
+    def test_trafico_anonimo_y_estatico_no_toca_la_sesion(self):
+        middleware = VerificacionDosPasosMiddleware(lambda request: HttpResponse('ok'))
+        fabrica = RequestFactory()
+        # Sin request.session ni request.user: si el middleware los tocara, fallaría
+        with self.assertNumQueries(0):
+            self.assertEqual(middleware(fabrica.get('/perfil/')).status_code, 200)
+            fabrica.cookies['sessionid'] = 'cualquiera'
+            self.assertEqual(middleware(fabrica.get('/static/css/app.css')).status_code, 200)
+            self.assertEqual(middleware(fabrica.get('/media/anuncios/foto.jpg')).status_code, 200)
+            self.assertEqual(middleware(fabrica.get(reverse('login'))).status_code, 200)
+
+    def test_login_exige_el_codigo(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('mi_perfil'))
+        self.assertRedirects(respuesta, reverse('verificacion_2fa') + '?next=%2Fperfil%2F', fetch_redirect_response=False)
+
+        self.client.get(respuesta.url)
+        codigo = self.codigo_enviado()
+        self.assertEqual(mail.outbox[-1].to, ['vendedor@example.com'])
+        # Volver a entrar a la página no manda otro código mientras el actual siga vigente
+        self.client.get(respuesta.url)
+        self.assertEqual(cola.procesar_pendientes(), (0, 0))
+
+        incorrecto = '000000' if codigo != '000000' else '111111'
+        self.assertEqual(self.client.post(reverse('verificacion_2fa'), {'codigo': incorrecto}).status_code, 200)
+        respuesta = self.client.post(reverse('verificacion_2fa'), {'codigo': codigo, 'next': '/perfil/'})
+        self.assertRedirects(respuesta, reverse('mi_perfil'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 200)
+
+    def test_intentos_agotados_invalidan_el_codigo(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('verificacion_2fa'))
+        codigo = self.codigo_enviado()
+        incorrecto = '000000' if codigo != '000000' else '111111'
+        for _ in range(5):
+            self.client.post(reverse('verificacion_2fa'), {'codigo': incorrecto})
+        self.client.post(reverse('verificacion_2fa'), {'codigo': codigo})
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 302)
+        # Se mandó uno nuevo, y ése sí sirve
+        nuevo = self.codigo_enviado()
+        self.assertEqual(len(mail.outbox), 2)
+        self.client.post(reverse('verificacion_2fa'), {'codigo': nuevo})
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 200)
+
+    def test_superusuario_sin_correo_agrega_uno_antes_de_entrar(self):
+        User.objects.create_superuser('admin', '', 'clave-segura-123')
+        respuesta = self.client.post(reverse('login'), {'username': 'admin', 'password': 'clave-segura-123'})
+        self.assertEqual(respuesta.status_code, 302)
+        # Ni el admin ni el sitio sin el segundo paso
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 302)
+        self.assertContains(self.client.get(reverse('verificacion_2fa')), 'Agrega un correo a tu cuenta')
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Uno ajeno no sirve; el código va al nuevo y se guarda en la cuenta recién al validarlo
+        self.client.post(reverse('verificacion_2fa'), {'email': 'vendedor@example.com'})
+        self.assertEqual(Tarea.objects.filter(nombre='enviar_correo').count(), 0)
+        self.client.post(reverse('verificacion_2fa'), {'email': 'admin@example.com'})
+        codigo = self.codigo_enviado()
+        self.assertEqual(mail.outbox[-1].to, ['admin@example.com'])
+        self.assertEqual(User.objects.get(username='admin').email, '')
+        self.client.post(reverse('verificacion_2fa'), {'codigo': codigo})
+        self.assertEqual(User.objects.get(username='admin').email, 'admin@example.com')
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
+
+    def test_no_redirige_fuera_del_sitio(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('verificacion_2fa'))
+        respuesta = self.client.post(reverse('verificacion_2fa'), {'codigo': self.codigo_enviado(), 'next': 'https://otro.example.com/'})
+        self.assertRedirects(respuesta, reverse('home'), fetch_redirect_response=False)
+
+    def test_registro_con_verificacion_por_correo(self):
+        respuesta = self.client.post(reverse('registro'), {
+            'username': 'nuevo', 'email': 'nuevo@example.com', 'password': 'clave-segura-123', 'password2': 'clave-segura-123',
+        })
+        self.assertRedirects(respuesta, reverse('verificar_registro'))
+        self.assertFalse(User.objects.get(username='nuevo').is_active)
+        respuesta = self.client.post(reverse('verificar_registro'), {'codigo': self.codigo_enviado()})
+        self.assertRedirects(respuesta, reverse('login'))
+        self.assertTrue(User.objects.get(username='nuevo').is_active)
+
+
+@override_settings(
+    ROOT_URLCONF='Marketplace_Django.urls_asincronas', TAREAS_INMEDIATAS=False,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class VistasAsincronasTests(TestCase):
+    def setUp(self):
+        cache.clear() # Los contadores de límites de frecuencia
+        self.usuario = User.objects.create(username='vendedor', email='vendedor@example.com')
+
+    def test_verificacion_en_dos_pasos(self):
+        self.client.force_login(self.usuario)
+        self.assertRedirects(self.client.get(reverse('mi_perfil')), reverse('verificacion_2fa') + '?next=%2Fperfil%2F', fetch_redirect_response=False)
+        self.assertContains(self.client.get(reverse('verificacion_2fa')), 'Verifica que eres tú')
+        # El correo queda en la cola, no se manda en el request
+        self.assertEqual(len(mail.outbox), 0)
+        cola.procesar_pendientes()
+        codigo = re.search(r'\b(\d{6})\b', mail.outbox[-1].body).group(1)
+        respuesta = self.client.post(reverse('verificacion_2fa'), {'codigo': codigo, 'next': '/perfil/'})
+        self.assertRedirects(respuesta, reverse('mi_perfil'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 200)
+
+    def test_verificacion_en_dos_pasos_sin_correo(self):
+        admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        self.assertContains(self.client.get(reverse('verificacion_2fa')), 'Agrega un correo a tu cuenta')
+        self.client.post(reverse('verificacion_2fa'), {'email': 'admin@example.com'})
+        cola.procesar_pendientes()
+        self.assertEqual(mail.outbox[-1].to, ['admin@example.com'])
+        codigo = re.search(r'\b(\d{6})\b', mail.outbox[-1].body).group(1)
+        self.client.post(reverse('verificacion_2fa'), {'codigo': codigo})
+        self.assertEqual(User.objects.get(username='admin').email, 'admin@example.com')
+        self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 200)
+
+    def test_verificacion_de_telefono(self):
+        iniciar_sesion(self.client, self.usuario)
+        respuesta = self.client.post(reverse('verificar_telefono'), {'telefono': '3811234567'})
+        self.assertRedirects(respuesta, reverse('validar_codigo_telefono'), fetch_redirect_response=False)
+        sms = Tarea.objects.get(nombre='enviar_sms')
+        self.assertEqual(sms.argumentos['args'][0], '3811234567')
+        # El código sólo viaja en el SMS: no queda en la sesión
+        codigo = re.search(r'\d{6}', sms.argumentos['args'][1]).group()
+        self.assertNotIn('sms_codigo', self.client.session)
+
+        self.client.post(reverse('validar_codigo_telefono'), {'codigo': codigo})
+        self.assertTrue(PerfilUsuario.objects.get(usuario=self.usuario).telefono_verificado)
+
+
+class PruebaCargaTests(TransactionTestCase):
+    """Los handlers WSGI y ASGI reales, con requests concurrentes (datos confirmados: otros hilos los ven)."""
+
+    def test_prueba_carga(self):
+        usuario = User.objects.create(username='vendedor')
+        categoria = Categoria.objects.create(nombre='Tecnología', slug='tecnologia')
+        for i in range(12):
+            Anuncio.objects.create(
+                usuario=usuario, categoria=categoria, titulo=f'Producto {i}', descripcion='Descripción', precio=i * 100,
+            )
+        urls = rendimiento.peticiones_carga(random.Random(0), detalles=3)
+        carga = rendimiento.prueba_carga(urls, concurrencias=(1, 4), requests=24)
+        self.assertEqual(set(carga), set(rendimiento.MODOS_CARGA))
+        for modo, por_concurrencia in carga.items():
+            for concurrencia, datos in por_concurrencia.items():
+                self.assertEqual((datos['requests'], datos['errores']), (24, 0), f'{modo} x{concurrencia}')
+                self.assertGreater(datos['rps'], 0)
+
+        informe = {'escenarios': {}, 'carga': carga}
+        self.assertEqual(rendimiento.comparar(informe, informe), [])
+        peor = json.loads(json.dumps(informe))
+        peor['carga']['asgi']['4']['rps'] = carga['asgi']['4']['rps'] / 2
+        self.assertEqual(len(rendimiento.comparar(peor, informe)), 1)
+
+
+@override_settings(TAREAS_INMEDIATAS=False)
+class LimitesFrecuenciaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        limites.memoria.clear()
+
+    def test_login_por_usuario_con_retry_after(self):
+        # LoginView es de Django: lo limita el middleware por nombre de URL
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('login'), {'username': 'Ana', 'password': 'x'}).status_code, 200)
+        respuesta = self.client.post(reverse('login'), {'username': 'ana ', 'password': 'x'})
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertTrue(0 < int(respuesta['Retry-After']) <= 900)
+        # Otro usuario desde la misma IP sigue pudiendo, y mirar la página no cuenta
+        self.assertEqual(self.client.post(reverse('login'), {'username': 'beto', 'password': 'x'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    @override_settings(LIMITES={'registro': [('2/h', 'post:email')]})
+    def test_registro_no_manda_correos_de_mas(self):
+        for i in range(3):
+            respuesta = self.client.post(reverse('registro'), {
+                'username': f'nuevo{i}', 'email': 'nuevo@example.com', 'password': 'clave-segura-123', 'password2': 'clave-segura-123',
+            })
+        self.assertEqual(respuesta.status_code, 429)
+        # El primero registró y encoló el correo, el segundo chocó con el email repetido y el tercero ni llegó a la vista
+        self.assertEqual(Tarea.objects.filter(nombre='enviar_correo').count(), 1)
+        self.assertGreaterEqual(metricas.LIMITES_RECHAZOS._valores['registro:post:email'], 1)
+
+    def test_vista_async(self):
+        usuario = User.objects.create(username='vendedor')
+        iniciar_sesion(self.client, usuario)
+        with override_settings(ROOT_URLCONF='Marketplace_Django.urls_asincronas'):
+            estados = [
+                self.client.post(reverse('verificar_telefono'), {'telefono': '3811234567'}).status_code for _ in range(4)
+            ]
+        self.assertEqual(estados, [302, 302, 302, 429])
+        self.assertEqual(Tarea.objects.filter(nombre='enviar_sms').count(), 3)
+
+    def test_algoritmos(self):
+        inicio = 6000.0 # Justo al empezar una ventana de 60 s
+        cubeta = limites.Regla('prueba', '3/m', 'ip', limites.CUBETA)
+        self.assertEqual([limites.consumir(cubeta, 'a', inicio) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(limites.consumir(cubeta, 'a', inicio), 20) # Un token cada 20 s
+        self.assertEqual(limites.consumir(cubeta, 'a', inicio + 20), 0)
+        self.assertEqual(limites.consumir(cubeta, 'b', inicio), 0) # Cada clave por separado
+
+        ventana = limites.Regla('prueba', '3/m', 'ip')
+        self.assertEqual([limites.consumir(ventana, 'a', inicio + 10) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(limites.consumir(ventana, 'a', inicio + 10), 50) # Hasta la próxima ventana
+        # Media ventana después, la anterior (4 intentos, contando el rechazado) pesa la mitad
+        self.assertEqual(limites.consumir(ventana, 'a', inicio + 90), 0)
+        self.assertGreater(limites.consumir(ventana, 'a', inicio + 90), 0)
+
+        with self.assertRaises(ValueError):
+            limites.leer_tasa('5 por minuto')
+        self.assertEqual(limites.leer_tasa('3/15m'), (3, 900))
+
+    def test_sin_cache_sigue_limitando_en_memoria(self):
+        regla = limites.Regla('prueba', '2/m', 'ip')
+        with mock.patch.object(limites._Cache, 'sumar', side_effect=ConnectionError('caché caída')), \
+                self.assertLogs('Marketplace_App.limites', 'WARNING'):
+            self.assertEqual([bool(limites.consumir(regla, 'a')) for _ in range(3)], [False, False, True])
+        # La memoria está acotada: descarta las claves usadas hace más tiempo
+        memoria = limites.Memoria(maximo=2)
+        for clave in 'abc':
+            memoria.sumar(clave, 60)
+        self.assertEqual((memoria.get('a'), memoria.get('c')), (None, 1))
+
+
+@override_settings(MODERACION_UMBRAL_DESACTIVAR=3)
+class ModeracionTests(TestCase):
+    """Reportes agregados por entidad, desactivación automática y la cola del admin."""
+
+    def setUp(self):
+        cache.clear()
+        self.vendedor = User.objects.create(username='vendedor')
+        self.categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.anuncio = Anuncio.objects.create(
+            usuario=self.vendedor, categoria=self.categoria, titulo='Mesa',
+            descripcion='Mesa de roble', precio=100, ubicacion='Córdoba',
+        )
+
+    def reportar(self, usuario, anuncio=None):
+        iniciar_sesion(self.client, usuario)
+        self.client.post(
+            reverse('reportar_anuncio', args=[(anuncio or self.anuncio).pk]),
+            {'motivo': 'Estafa', 'descripcion_reporte': ''},
+        )
+
+    def resumen(self):
+        return ResumenReportes.objects.get(tipo_entidad=moderacion.ANUNCIO, identificador_entidad=self.anuncio.pk)
+
+    def test_cuenta_reportadores_distintos_y_desactiva_al_llegar_al_umbral(self):
+        uno, dos, tres = (User.objects.create(username=f'comprador{i}') for i in range(3))
+        self.reportar(uno)
+        self.reportar(uno) # El mismo usuario insistiendo no suma reportadores
+        self.reportar(dos)
+        resumen = self.resumen()
+        self.assertEqual((resumen.cantidad, resumen.reportadores, resumen.estado), (3, 2, ResumenReportes.PENDIENTE))
+        self.assertTrue(Anuncio.objects.get(pk=self.anuncio.pk).activo)
+
+        self.reportar(tres)
+        resumen = self.resumen()
+        self.assertEqual((resumen.estado, resumen.desactivado_automaticamente), (ResumenReportes.DESACTIVADO, True))
+        self.assertFalse(Anuncio.objects.get(pk=self.anuncio.pk).activo)
+        self.assertFalse(TarjetaAnuncio.objects.filter(pk=self.anuncio.pk).exists())
+        self.assertFalse(FacetaAnuncios.objects.filter(tipo='CATEGORIA', valor=str(self.categoria.pk)).exists())
+
+    def test_descartar_vuelve_a_publicar_y_solo_cuentan_los_reportes_nuevos(self):
+        usuarios = [User.objects.create(username=f'comprador{i}') for i in range(5)]
+        for usuario in usuarios[:3]:
+            self.reportar(usuario)
+        moderacion.descartar(self.resumen())
+        self.assertTrue(Anuncio.objects.get(pk=self.anuncio.pk).activo)
+        self.assertTrue(TarjetaAnuncio.objects.filter(pk=self.anuncio.pk).exists())
+
+        # Un reporte nuevo lo devuelve a la cola, pero no alcanza para volver a ocultarlo
+        self.reportar(usuarios[3])
+        resumen = self.resumen()
+        self.assertEqual((resumen.estado, resumen.reportadores, resumen.reportadores_nuevos), (ResumenReportes.PENDIENTE, 4, 1))
+        self.assertTrue(Anuncio.objects.get(pk=self.anuncio.pk).activo)
+
+    def test_borrar_reportes_descuenta_y_recalcular_da_lo_mismo(self):
+        uno, dos = (User.objects.create(username=f'comprador{i}') for i in range(2))
+        otro = Anuncio.objects.create(
+            usuario=self.vendedor, categoria=self.categoria, titulo='Silla',
+            descripcion='Silla', precio=50, ubicacion='Salta',
+        )
+        self.reportar(uno)
+        self.reportar(uno)
+        self.reportar(dos)
+        self.reportar(dos, otro)
+        Reporte.objects.filter(usuario_reportador=uno).first().delete()
+        self.assertEqual((self.resumen().cantidad, self.resumen().reportadores), (2, 2))
+        Reporte.objects.filter(identificador_entidad_reportada=otro.pk).delete()
+        self.assertFalse(ResumenReportes.objects.filter(identificador_entidad=otro.pk).exists())
+
+        columnas = ['tipo_entidad', 'identificador_entidad', 'cantidad', 'reportadores', 'primer_reporte', 'ultimo_reporte']
+        incremental = list(ResumenReportes.objects.order_by('id').values_list(*columnas))
+        call_command('recalcular_moderacion', stdout=io.StringIO())
+        self.assertEqual(list(ResumenReportes.objects.order_by('identificador_entidad').values_list(*columnas)), incremental)
+
+    def test_cola_del_admin_sin_n_mas_1(self):
+        admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        iniciar_sesion(self.client, admin)
+        url = reverse('admin:Marketplace_App_resumenreportes_changelist')
+
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.get(url)
+            self.assertContains(respuesta, 'Ver reportes')
+            return len(capturadas)
+
+        self.reportar(User.objects.create(username='comprador0'))
+        iniciar_sesion(self.client, admin)
+        antes = consultas()
+        for i in range(1, 6):
+            anuncio = Anuncio.objects.create(
+                usuario=self.vendedor, categoria=self.categoria, titulo=f'Silla {i}',
+                descripcion='', precio=i, ubicacion='Salta',
+            )
+            self.reportar(User.objects.create(username=f'comprador{i}'), anuncio)
+        iniciar_sesion(self.client, admin)
+        self.assertEqual(consultas(), antes)
+        # Por defecto muestra sólo lo pendiente
+        moderacion.descartar(self.resumen())
+        self.assertNotContains(self.client.get(url), f'Anuncio #{self.anuncio.pk}<')
+        self.assertContains(self.client.get(url + '?estado=TODOS'), f'Anuncio #{self.anuncio.pk}<')
+
+
+class AdminConsultasTests(TestCase):
+    """Los listados del admin hacen la misma cantidad de consultas con 2 o con 30 filas."""
+
+    # Usuario, COUNT, página y lo que pida cada listado (filtros, etc.); la sesión sale de la caché
+    CONSULTAS = {
+        'categoria': 4,
+        'anuncio': 5,
+        'perfilusuario': 4,
+        'reporte': 4,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(3)]
+        iniciar_sesion(self.client, self.admin)
+
+    def crear(self, cantidad, inicio=0):
+        for i in range(inicio, inicio + cantidad):
+            usuario = User.objects.create(username=f'vendedor{i}', email=f'vendedor{i}@example.com')
+            PerfilUsuario.objects.create(usuario=usuario)
+            anuncio = Anuncio.objects.create(
+                usuario=usuario, categoria=self.categorias[i % 3], titulo=f'Mesa {i}',
+                descripcion='Mesa de roble macizo', precio=i, ubicacion='Córdoba',
+            )
+            Reporte.objects.create(
+                usuario_reportador=usuario, motivo='Estafa',
+                tipo_entidad_reportada='ANUNCIO', identificador_entidad_reportada=anuncio.pk,
+            )
+
+    def test_cantidad_de_consultas_fija(self):
+        for cantidad, inicio in ((2, 0), (28, 2)):
+            self.crear(cantidad, inicio)
+            for modelo, consultas in self.CONSULTAS.items():
+                with self.subTest(modelo=modelo, filas=inicio + cantidad), self.assertNumQueries(consultas):
+                    self.assertEqual(self.client.get(reverse(f'admin:Marketplace_App_{modelo}_changelist')).status_code, 200)
+
+        respuesta = self.client.get(reverse('admin:Marketplace_App_categoria_changelist'))
+        self.assertEqual(
+            sorted(categoria.total_anuncios for categoria in respuesta.context['cl'].result_list), [10, 10, 10],
+        )
+
+    def test_busqueda_usa_el_indice_y_el_vendedor_exacto(self):
+        self.crear(3)
+        url = reverse('admin:Marketplace_App_anuncio_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, {'q': 'robles'})
+        self.assertEqual(respuesta.context['cl'].result_count, 3)
+        self.assertFalse([c['sql'] for c in consultas if '"descripcion" LIKE' in c['sql']])
+
+        respuesta = self.client.get(url, {'q': 'vendedor1@example.com'})
+        self.assertEqual([anuncio.titulo for anuncio in respuesta.context['cl'].result_list], ['Mesa 1'])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'La estimación se lee de sqlite_stat1')
+    @override_settings(ADMIN_CONTEO_MAXIMO=5)
+    def test_total_estimado_sin_filtros_y_acotado_con_filtros(self):
+        self.crear(8)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        url = reverse('admin:Marketplace_App_anuncio_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        # Sin filtros: la estimación del motor, sin ningún COUNT(*)
+        self.assertEqual(respuesta.context['cl'].result_count, 8)
+        self.assertFalse([c['sql'] for c in consultas if 'COUNT(' in c['sql'].upper()])
+
+        respuesta = self.client.get(url, {'categoria__id__exact': self.categorias[0].pk})
+        self.assertEqual(respuesta.context['cl'].result_count, 3)
+        respuesta = self.client.get(url, {'activo__exact': '1'})
+        self.assertEqual(respuesta.context['cl'].result_count, 5) # Acotado a ADMIN_CONTEO_MAXIMO
+
+
+class HistogramaPreciosTests(TestCase):
+    """Cubetas de precios mantenidas con cada escritura y el filtro por rango de home."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='vendedor')
+        self.hogar = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.autos = Categoria.objects.create(nombre='Autos', slug='autos')
+
+    def crear(self, precio, categoria=None, ubicacion='Tucumán', **campos):
+        return Anuncio.objects.create(
+            usuario=self.usuario, categoria=categoria or self.hogar, titulo=f'Producto {precio}',
+            descripcion='', precio=precio, ubicacion=ubicacion, **campos,
+        )
+
+    def cubetas(self):
+        return sorted(CubetaPrecios.objects.values_list('categoria_id', 'ubicacion', 'cubeta', 'cantidad'))
+
+    def test_cubetas_logaritmicas(self):
+        casos = {'0': 0, '1.99': 0, '2': 1, '4.99': 1, '5': 2, '10': 3, '19.99': 3, '1500': 9, '9999999.99': 20}
+        for precio, numero in casos.items():
+            self.assertEqual(precios.cubeta(Decimal(precio)), numero, precio)
+        self.assertEqual([precios.limite(n) for n in range(8)], [0, 2, 5, 10, 20, 50, 100, 200])
+
+    def test_se_mantiene_con_cada_escritura(self):
+        barato = self.crear(3)
+        caro = self.crear(1500, ubicacion='Salta')
+        self.crear(40, activo=False)
+        barato.precio = 4000
+        barato.save()
+        caro.categoria = self.autos
+        caro.save()
+        Anuncio.objects.filter(pk=barato.pk).cambiar_activo(False)
+        Anuncio.objects.all().cambiar_activo(True)
+        Anuncio.objects.crear_en_bloque([
+            Anuncio(usuario=self.usuario, categoria=self.autos, titulo=f'Auto {i}', descripcion='', precio=i * 700, ubicacion='Salta')
+            for i in range(1, 4)
+        ])
+        caro.delete()
+        incremental = self.cubetas()
+        call_command('recalcular_precios', stdout=io.StringIO())
+        self.assertEqual(self.cubetas(), incremental)
+        self.assertEqual(sum(fila[3] for fila in incremental), Anuncio.objects.filter(activo=True).count())
+
+    def test_filtro_por_rango_e_histograma_sin_leer_anuncios(self):
+        for precio in (1, 3, 7, 15, 150, 160, 1700):
+            self.crear(precio)
+        self.crear(40, categoria=self.autos, ubicacion='Salta')
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('home_por_categoria', args=['hogar']), {'precio_min': '10', 'precio_max': '200'})
+        self.assertContains(respuesta, 'Producto 150')
+        self.assertNotContains(respuesta, 'Producto 1700')
+        self.assertNotContains(respuesta, 'Producto 7<')
+        tabla = Anuncio._meta.db_table
+        self.assertFalse([c['sql'] for c in consultas if f'"{tabla}"' in c['sql']])
+
+        # De la cubeta 0 (0-2) a la 9 (1000-2000) de Hogar, con las vacías del medio
+        barras = [item['barra'] for item in respuesta.context['histograma']]
+        self.assertEqual((barras[0].desde, barras[-1].hasta, len(barras)), (0, 2000, 10))
+        self.assertEqual(sum(barra.cantidad for barra in barras), 7)
+        self.assertEqual(max(barra.altura for barra in barras), 100)
+        # Cada barra filtra exactamente su rango (precios con 2 decimales)
+        barra = next(item for item in respuesta.context['histograma'] if item['barra'].desde == 100)
+        self.assertIn('precio_min=100&precio_max=199.99', barra['url'])
+        self.assertTrue(barra['seleccionada'])
+
+        # Por ubicación suma todas las categorías; un precio inválido se ignora
+        respuesta = self.client.get(reverse('home'), {'ubicacion': 'Salta', 'precio_min': 'barato'})
+        self.assertEqual([item['barra'].cantidad for item in respuesta.context['histograma']], [1])
+        self.assertContains(respuesta, 'Producto 40')
+
+    def test_api_filtra_por_precio(self):
+        for precio in (5, 50, 500):
+            self.crear(precio)
+        respuesta = self.client.get(reverse('api_anuncios'), {'precio_min': '10', 'precio_max': '100', 'campos': 'precio'})
+        self.assertEqual([fila['precio'] for fila in respuesta.json()['resultados']], ['50.00'])
+        self.assertEqual(self.client.get(reverse('api_anuncios'), {'precio_max': '-1'}).status_code, 400)
+
+
+class ComentariosTests(TestCase):
+    """Hilo de comentarios paginado por cursor y contador desnormalizado."""
+
+    def setUp(self):
+        cache.clear()
+        self.vendedor = User.objects.create(username='vendedor')
+        self.comprador = User.objects.create(username='comprador')
+        PerfilUsuario.objects.create(usuario=self.comprador)
+        categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.anuncio = Anuncio.objects.create(
+            usuario=self.vendedor, categoria=categoria, titulo='Mesa', descripcion='', precio=10, ubicacion='Tucumán',
+        )
+        self.url = reverse('detalle_anuncio', args=[self.anuncio.pk])
+
+    def cantidades(self):
+        return (
+            Anuncio.objects.get(pk=self.anuncio.pk).cantidad_comentarios,
+            TarjetaAnuncio.objects.get(pk=self.anuncio.pk).cantidad_comentarios,
+        )
+
+    def comentar(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(cantidad):
+                Comentario.objects.create(anuncio=self.anuncio, usuario=self.comprador, contenido=f'Pregunta {i}')
+
+    def test_comentar_suma_y_borrar_resta(self):
+        url = reverse('comentar_anuncio', args=[self.anuncio.pk])
+        respuesta = self.client.post(url, {'contenido': '¿Sigue disponible?'})
+        self.assertRedirects(respuesta, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+        iniciar_sesion(self.client, self.comprador)
+        self.client.get(self.url) # Queda en caché con 0 comentarios
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, {'contenido': '¿Sigue disponible?'})
+        self.assertRedirects(respuesta, self.url + '#comentarios', fetch_redirect_response=False)
+        self.client.post(url, {'contenido': ''})
+        self.assertEqual(self.cantidades(), (1, 1))
+        # El alta invalida el detalle cacheado
+        self.assertContains(self.client.get(self.url), '¿Sigue disponible?')
+
+        Comentario.objects.get().delete()
+        self.assertEqual(self.cantidades(), (0, 0))
+
+    def test_detalle_sin_count_y_con_el_hilo_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.url)
+        self.assertIsNone(respuesta.context['comentarios'])
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.comentar(12)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comentario.objects.create(anuncio=self.anuncio, usuario=None, contenido='Anónima')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.url)
+        # Anuncio y primera página del hilo (con autor y perfil); ningún COUNT
+        self.assertEqual(len(consultas), 2)
+        self.assertFalse([c['sql'] for c in consultas if 'COUNT(' in c['sql'].upper()])
+        self.assertEqual(respuesta.context['cantidad_comentarios'], 13)
+        self.assertEqual([c.contenido for c in respuesta.context['comentarios']], [f'Pregunta {i}' for i in range(10)])
+
+        # Ya en caché: sólo el hilo, también en las páginas siguientes
+        cursor = respuesta.context['comentarios'].cursor_siguiente
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.url, {'comentarios': cursor})
+        self.assertContains(respuesta, 'Pregunta 11')
+        self.assertContains(respuesta, 'Usuario eliminado')
+        self.assertFalse(respuesta.context['comentarios'].has_next())
+
+    @override_settings(ROOT_URLCONF='Marketplace_Django.urls_asincronas')
+    def test_detalle_async(self):
+        self.comentar(3)
+        respuesta = self.client.get(self.url)
+        self.assertEqual(len(respuesta.context['comentarios']), 3)
+        self.assertContains(respuesta, 'Comentarios (3)')
+
+    def test_str_sin_consultas(self):
+        self.comentar(1)
+        comentario = Comentario.objects.get()
+        with self.assertNumQueries(0):
+            self.assertIn(f'#{self.anuncio.pk}', str(comentario))
+        comentario = Comentario.objects.select_related('usuario', 'anuncio').get()
+        with self.assertNumQueries(0):
+            self.assertIn('comprador', str(comentario))
+
+    def test_recalcular_da_lo_mismo(self):
+        self.comentar(4)
+        Comentario.objects.first().delete()
+        incremental = self.cantidades()
+        Anuncio.objects.update(cantidad_comentarios=0)
+        call_command('recalcular_comentarios', stdout=io.StringIO())
+        self.assertEqual(self.cantidades(), incremental)
+        self.assertEqual(incremental, (3, 3))
+
+    def test_editar_no_pisa_el_contador(self):
+        # Cargado (formulario de edición, admin) antes de que lleguen los comentarios
+        anuncio = Anuncio.objects.get(pk=self.anuncio.pk)
+        self.comentar(2)
+        anuncio.titulo = 'Mesa de roble'
+        with CaptureQueriesContext(connection) as consultas:
+            anuncio.save()
+        # Una sola lectura de la fila: los contadores y el estado anterior para las señales
+        lecturas = [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'FROM "Marketplace_App_anuncio"' in c['sql']]
+        self.assertEqual(len(lecturas), 1)
+        self.assertEqual(self.cantidades(), (2, 2))
+        self.assertEqual(anuncio.cantidad_comentarios, 2)
+        self.assertEqual(TarjetaAnuncio.objects.get(pk=anuncio.pk).titulo, 'Mesa de roble')
+
+
+class PerfilBaseDatosTests(TestCase):
+    """Perfil de SQLite (WAL, BEGIN IMMEDIATE) y la prueba de escrituras concurrentes."""
+
+    def test_perfil_por_defecto(self):
+        opciones = connection.settings_dict['OPTIONS']
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', opciones['init_command'])
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def test_prueba_escrituras(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            perfiles = rendimiento.perfiles_escrituras(directorio)
+            del perfiles['postgresql']
+            resultado = rendimiento.prueba_escrituras(perfiles, concurrencias=(1, 4), transacciones=40)
+
+        ajustes = resultado['sqlite']['ajustes']
+        self.assertEqual((ajustes['journal_mode'], ajustes['synchronous'], ajustes['transaction_mode']), ('wal', 1, 'IMMEDIATE'))
+        self.assertEqual(resultado['sqlite_sin_ajustes']['ajustes']['journal_mode'], 'delete')
+        # Con BEGIN IMMEDIATE y busy_timeout nadie falla con "database is locked"
+        for concurrencia, datos in resultado['sqlite']['concurrencias'].items():
+            self.assertEqual((datos['transacciones'], datos['errores']), (40, 0), concurrencia)
+            self.assertGreater(datos['tps'], 0)
+
+
+@override_settings(REPLICAS_LECTURA=['replica_prueba'])
+class ReplicasLecturaTests(TransactionTestCase):
+    """Router de réplicas con una segunda base SQLite que replicas.replicar mantiene al día."""
+
+    def setUp(self):
+        cache.clear()
+        # Una conexión creada a mano (no está en DATABASES): el runner no la bloquea ni le crea base de prueba
+        self.directorio = tempfile.TemporaryDirectory()
+        ajustes = connections.configure_settings({
+            'default': {'ENGINE': 'django.db.backends.sqlite3'},
+            'replica_prueba': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{self.directorio.name}/replica.sqlite3'},
+        })['replica_prueba']
+        setattr(connections._connections, 'replica_prueba', SQLiteDatabaseWrapper(ajustes, 'replica_prueba'))
+        self.vendedor = User.objects.create(username='vendedor')
+        self.categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.anuncio = self.crear('Mesa')
+        replicas.replicar()
+
+    def tearDown(self):
+        connections['replica_prueba'].close()
+        delattr(connections._connections, 'replica_prueba')
+        self.directorio.cleanup()
+
+    def crear(self, titulo):
+        return Anuncio.objects.create(
+            usuario=self.vendedor, categoria=self.categoria, titulo=titulo, descripcion='', precio=10, ubicacion='Tucumán',
+        )
+
+    def pedir(self, cliente, metodo, url, datos=None):
+        """(respuesta, consultas en la principal, consultas en la réplica)."""
+        with CaptureQueriesContext(connection) as principal, CaptureQueriesContext(connections['replica_prueba']) as replica:
+            respuesta = getattr(cliente, metodo)(url, datos)
+        return respuesta, len(principal), len(replica)
+
+    def test_lecturas_en_la_replica_y_el_que_escribe_lee_la_principal(self):
+        self.crear('Silla') # Todavía no llegó a la réplica
+        respuesta, en_principal, en_replica = self.pedir(self.client, 'get', reverse('home'))
+        self.assertEqual(en_principal, 0)
+        self.assertGreater(en_replica, 0)
+        self.assertContains(respuesta, 'Mesa')
+        self.assertNotContains(respuesta, 'Silla')
+
+        comprador = User.objects.create(username='comprador')
+        iniciar_sesion(self.client, comprador)
+        replicas.replicar() # La sesión y el comprador llegan a la réplica
+        respuesta, en_principal, en_replica = self.pedir(
+            self.client, 'post', reverse('comentar_anuncio', args=[self.anuncio.pk]), {'contenido': '¿Está firme?'},
+        )
+        self.assertEqual(en_replica, 0)
+        self.assertEqual(respuesta.cookies['primaria']['max-age'], 5)
+
+        # Con la cookie lee de la principal: ve su comentario aunque la réplica no lo tenga
+        url = reverse('detalle_anuncio', args=[self.anuncio.pk])
+        respuesta, en_principal, en_replica = self.pedir(self.client, 'get', url)
+        self.assertEqual(en_replica, 0)
+        self.assertContains(respuesta, '¿Está firme?')
+
+        # Otro usuario lee de la réplica (atrasada) hasta que se replica
+        anonimo = self.client_class()
+        cache.clear()
+        respuesta, en_principal, en_replica = self.pedir(anonimo, 'get', url)
+        self.assertEqual(en_principal, 0)
+        self.assertNotContains(respuesta, '¿Está firme?')
+        replicas.replicar()
+        cache.clear()
+        self.assertContains(anonimo.get(url), '¿Está firme?')
+
+    def test_router(self):
+        router = replicas.RouterLecturaEscritura()
+        self.assertIsNone(router.db_for_read(Anuncio)) # Fuera de un request: la principal
+        with replicas.Lectura() as lectura:
+            self.assertEqual(router.db_for_read(Anuncio), 'replica_prueba')
+            anuncio = Anuncio.objects.get(pk=self.anuncio.pk)
+            self.assertEqual(anuncio._state.db, 'replica_prueba')
+            # Sus relaciones salen de la misma base; dentro de atomic, todo de la principal
+            self.assertIsNone(router.db_for_read(Categoria, instance=anuncio))
+            with transaction.atomic():
+                self.assertIsNone(router.db_for_read(Anuncio))
+            # Un objeto de la réplica se guarda en la principal, y desde ahí se lee de la principal
+            Comentario.objects.create(anuncio=anuncio, usuario=self.vendedor, contenido='Hola')
+            self.assertTrue(lectura.escribio)
+            self.assertIsNone(router.db_for_read(Anuncio))
+        self.assertFalse(router.allow_migrate('replica_prueba', 'Marketplace_App'))
+
+
+def cache_de_proceso(nombre):
+    return {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': nombre}}
+
+
+# Dentro del proceso de los tests una LocMemCache hace de caché compartida (y deja mirar lo que guarda)
+@override_settings(CACHES=cache_de_proceso('compartida'))
+class CodigosVerificacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='vendedor', email='vendedor@example.com')
+
+    def test_de_un_solo_uso_y_sin_tocar_la_base(self):
+        with self.assertNumQueries(0):
+            codigo = codigos.generar(codigos.TELEFONO, self.usuario.pk)
+            self.assertTrue(codigos.hay_vigente(codigos.TELEFONO, self.usuario.pk))
+            self.assertEqual(codigos.validar(codigos.TELEFONO, self.usuario.pk, '1234567'), codigos.INCORRECTO)
+            # Es de otro dueño y de otro propósito
+            self.assertEqual(codigos.validar(codigos.TELEFONO, 'otro', codigo), codigos.VENCIDO)
+            self.assertEqual(codigos.validar(codigos.REGISTRO, self.usuario.pk, codigo), codigos.VENCIDO)
+            self.assertEqual(codigos.validar(codigos.TELEFONO, self.usuario.pk, f' {codigo} '), codigos.VALIDO)
+            self.assertEqual(codigos.validar(codigos.TELEFONO, self.usuario.pk, codigo), codigos.VENCIDO)
+        # En la caché no queda el código, sólo su HMAC
+        codigo = codigos.generar(codigos.TELEFONO, self.usuario.pk)
+        self.assertNotIn(codigo, repr(cache._cache))
+
+    def test_intentos_y_vencimiento(self):
+        codigo = codigos.generar(codigos.TELEFONO, self.usuario.pk)
+        incorrecto = '000000' if codigo != '000000' else '111111'
+        resultados = [codigos.validar(codigos.TELEFONO, self.usuario.pk, incorrecto) for _ in range(5)]
+        self.assertEqual(resultados, [codigos.INCORRECTO] * 4 + [codigos.AGOTADO])
+        self.assertEqual(codigos.validar(codigos.TELEFONO, self.usuario.pk, codigo), codigos.AGOTADO)
+        self.assertFalse(codigos.hay_vigente(codigos.TELEFONO, self.usuario.pk))
+
+        codigo = codigos.generar(codigos.TELEFONO, self.usuario.pk) # Uno nuevo vuelve a tener todos los intentos
+        with mock.patch('time.time', return_value=timezone.now().timestamp() + 601):
+            self.assertEqual(codigos.validar(codigos.TELEFONO, self.usuario.pk, codigo), codigos.VENCIDO)
+
+    @override_settings(CODIGOS_CACHE='no_existe')
+    def test_respaldo_en_la_base_si_falla_la_cache(self):
+        with self.assertLogs('Marketplace_App.codigos', 'WARNING'):
+            codigo = codigos.generar(codigos.REGISTRO, self.usuario.pk)
+            fila = CodigoVerificacion.objects.get()
+            self.assertNotIn(codigo, fila.digesto)
+            self.assertNotEqual(fila.dueno, str(self.usuario.pk))
+            incorrecto = '000000' if codigo != '000000' else '111111'
+            self.assertEqual(codigos.validar(codigos.REGISTRO, self.usuario.pk, incorrecto), codigos.INCORRECTO)
+            self.assertEqual(CodigoVerificacion.objects.get().intentos, 1)
+            self.assertEqual(codigos.validar(codigos.REGISTRO, self.usuario.pk, codigo), codigos.VALIDO)
+        self.assertFalse(CodigoVerificacion.objects.exists())
+
+    def test_verificar_telefono_no_escribe_la_sesion(self):
+        PerfilUsuario.objects.create(usuario=self.usuario)
+        iniciar_sesion(self.client, self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('verificar_telefono'), {'telefono': '3811234567'})
+            self.client.post(reverse('validar_codigo_telefono'), {'codigo': '1234567'})
+            self.client.get(reverse('verificacion_2fa'))
+        self.assertFalse([consulta for consulta in consultas if 'django_session' in consulta['sql']])
+
+        sms = Tarea.objects.get(nombre='enviar_sms')
+        codigo = re.search(r'\d{6}', sms.argumentos['args'][1]).group()
+        self.assertRedirects(
+            self.client.post(reverse('validar_codigo_telefono'), {'codigo': codigo}),
+            reverse('crear_anuncio'), fetch_redirect_response=False,
+        )
+        self.assertTrue(PerfilUsuario.objects.get(usuario=self.usuario).telefono_verificado)
+
+    def test_purgar_sesiones(self):
+        ahora = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'vencida{i}', session_data='', expire_date=ahora - timedelta(days=1))
+        Session.objects.create(session_key='vigente', session_data='', expire_date=ahora + timedelta(days=1))
+        CodigoVerificacion.objects.create(proposito='telefono', dueno='a', digesto='x', expira=ahora - timedelta(minutes=1))
+        CodigoVerificacion.objects.create(proposito='telefono', dueno='b', digesto='x', expira=ahora + timedelta(minutes=1))
+
+        salida = io.StringIO()
+        call_command('purgar_sesiones', lote=2, stdout=salida)
+        self.assertIn('Borradas 5 sesiones y 1 códigos', salida.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['vigente'])
+        self.assertEqual(list(CodigoVerificacion.objects.values_list('dueno', flat=True)), ['b'])
+
+
+def proceso(nombre):
+    """Lo que settings.py elige con CACHE_BACKEND=LocMemCache: sesiones en la cookie y códigos en la base."""
+    return override_settings(
+        CACHES=cache_de_proceso(nombre), SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        CODIGOS_CACHE=None,
+    )
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', TAREAS_INMEDIATAS=False)
+class CacheLocalPorProcesoTests(TestCase):
+    """Con CACHE_BACKEND=LocMemCache cada proceso tiene su caché: se simulan dos."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='vendedor', email='vendedor@example.com')
+
+    def test_sesion_y_segundo_paso_en_otro_proceso(self):
+        with proceso('a'):
+            self.client.force_login(self.usuario)
+            self.client.get(reverse('verificacion_2fa'))
+            cola.procesar_pendientes()
+        codigo = re.search(r'\b(\d{6})\b', mail.outbox[-1].body).group(1)
+        with proceso('b'):
+            self.client.post(reverse('verificacion_2fa'), {'codigo': codigo})
+        with proceso('a'):
+            self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 200)
+        with proceso('b'):
+            self.client.post(reverse('logout'))
+        with proceso('a'):
+            self.assertEqual(self.client.get(reverse('mi_perfil')).status_code, 302)
+
+    def test_los_intentos_no_se_multiplican(self):
+        with proceso('a'):
+            codigo = codigos.generar(codigos.TELEFONO, self.usuario.pk)
+        incorrecto = '000000' if codigo != '000000' else '111111'
+        resultados = []
+        for nombre in 'abcde':
+            with proceso(nombre):
+                resultados.append(codigos.validar(codigos.TELEFONO, self.usuario.pk, incorrecto))
+        self.assertEqual(resultados, [codigos.INCORRECTO] * 4 + [codigos.AGOTADO])
+
+    def test_check_deploy(self):
+        # La configuración por defecto (FileBasedCache) la comparten todos los procesos
+        self.assertEqual(checks.cache_compartida(None), [])
+        with proceso('a'):
+            self.assertEqual(
+                [error.id for error in checks.cache_compartida(None)], ['Marketplace_App.E003', 'Marketplace_App.E004'],
+            )
+            with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', CODIGOS_CACHE='default'):
+                errores = checks.cache_compartida(None)
+        self.assertEqual(
+            [error.id for error in errores],
+            ['Marketplace_App.E001', 'Marketplace_App.E002', 'Marketplace_App.E003', 'Marketplace_App.E004'],
+        )
+
+
+class SmsTests(TestCase):
+    def setUp(self):
+        sms.bandeja.clear()
+        self.addCleanup(sms.cerrar) # La conexión del hilo queda abierta entre envíos
+
+    def encolar(self, cantidad):
+        for i in range(cantidad):
+            tareas.enviar_sms.encolar(f'381000000{i}', f'CÓDIGO: 00000{i}')
+
+    @override_settings(SMS_BACKEND='Marketplace_App.sms.MemoriaBackend')
+    def test_la_cola_manda_los_sms_por_el_backend(self):
+        self.encolar(3)
+        self.assertEqual(cola.procesar_pendientes(), (3, 0))
+        self.assertEqual([mensaje.telefono for mensaje in sms.bandeja], ['3810000000', '3810000001', '3810000002'])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_consola_y_archivo(self):
+        salida = io.StringIO()
+        sms.ConsolaBackend(stream=salida).enviar_mensajes([sms.Mensaje('3811234567', 'CÓDIGO: 123456')])
+        self.assertIn('CÓDIGO: 123456', salida.getvalue())
+        with tempfile.TemporaryDirectory() as directorio:
+            with sms.obtener_conexion('Marketplace_App.sms.ArchivoBackend', ruta=directorio) as conexion:
+                self.assertEqual(conexion.enviar_mensajes([sms.Mensaje('3811234567', 'Hola'), sms.Mensaje('3817654321', 'Chau')]), 2)
+            archivo, = Path(directorio).iterdir()
+            self.assertIn('SMS a 3817654321\nChau', archivo.read_text(encoding='utf-8'))
+
+    def test_proveedor_http_en_lotes_y_con_la_misma_conexion(self):
+        with sms.ProveedorLocal(token='secreto') as proveedor, override_settings(
+            SMS_BACKEND='Marketplace_App.sms.HttpBackend', SMS_HTTP_URL=proveedor.url, SMS_HTTP_TOKEN='secreto', SMS_LOTE=2,
+        ):
+            self.encolar(5)
+            self.assertEqual(cola.procesar_pendientes(), (5, 0))
+            self.assertEqual([len(pedido) for pedido in proveedor.pedidos], [2, 2, 1])
+            self.encolar(1)
+            cola.procesar_pendientes()
+            self.assertEqual(len(proveedor.pedidos), 4)
+            self.assertEqual(proveedor.conexiones, 1)
+
+            # Error temporal del proveedor: se reintentan; rechazo: van directo a TareaFallida
+            proveedor.estado = 503
+            self.encolar(2)
+            self.assertEqual(cola.procesar_pendientes(), (0, 2))
+            self.assertEqual(Tarea.objects.filter(estado=Tarea.PENDIENTE).count(), 2)
+            self.assertIn('ErrorProveedor', Tarea.objects.first().ultimo_error)
+            proveedor.estado = 400
+            Tarea.objects.update(disponible_desde=timezone.now())
+            self.assertEqual(cola.procesar_pendientes(), (0, 2))
+            self.assertEqual(TareaFallida.objects.count(), 2)
+
+
+class EstaticosTests(TestCase):
+    def setUp(self):
+        self.origen = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.destino = self.enterContext(tempfile.TemporaryDirectory())
+        (self.origen / 'css').mkdir()
+        self.css = ('.tarjeta { color: #333; margin: 0 auto; }\n' * 40).encode()
+        (self.origen / 'css' / 'app.css').write_bytes(self.css)
+        (self.origen / 'robots.txt').write_bytes(b'User-agent: *\n')
+        self.enterContext(override_settings(
+            STATIC_ROOT=self.destino, STATICFILES_DIRS=[str(self.origen)],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.middleware = EstaticosMiddleware(lambda request: HttpResponse('vista'))
+
+    def test_collectstatic_con_hash_y_comprimidos(self):
+        url = staticfiles_storage.url('css/app.css')
+        self.assertRegex(url, r'^/static/css/app\.[0-9a-f]{12}\.css$')
+        comprimido = Path(self.destino, url.removeprefix('/static/') + '.gz').read_bytes()
+        self.assertEqual(gzip.decompress(comprimido), self.css)
+        # Muy chico para que valga la pena
+        self.assertFalse(Path(self.destino, 'robots.txt.gz').exists())
+
+    def test_servidor_negocia_la_codificacion(self):
+        fabrica = RequestFactory()
+        url = staticfiles_storage.url('css/app.css')
+        respuesta = self.middleware(fabrica.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip, deflate'))
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(respuesta['Vary'], 'Accept-Encoding')
+        self.assertTrue(respuesta['Content-Type'].startswith('text/css'))
+        self.assertEqual(gzip.decompress(b''.join(respuesta.streaming_content)), self.css)
+        respuesta.close()
+
+        sin_comprimir = self.middleware(fabrica.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0'))
+        self.assertNotIn('Content-Encoding', sin_comprimir)
+        self.assertEqual(int(sin_comprimir['Content-Length']), len(self.css))
+        sin_comprimir.close()
+        # Cada versión tiene su ETag: el navegador que la tiene recibe un 304
+        self.assertEqual(self.middleware(fabrica.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=respuesta['ETag'])).status_code, 304)
+        self.assertEqual(self.middleware(fabrica.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])).status_code, 200)
+
+        # Sin hash se cachea poco; lo que no está en STATIC_ROOT sigue a las vistas
+        self.assertEqual(self.middleware(fabrica.get('/static/css/app.css'))['Cache-Control'], 'public, max-age=300')
+        self.assertEqual(self.middleware(fabrica.get('/static/css/otro.css')).content, b'vista')
+        self.assertEqual(self.middleware(fabrica.post(url)).status_code, 405)
+
+    def test_sin_entrada_en_el_manifiesto(self):
+        self.assertEqual(staticfiles_storage.stored_name('css/no-existe.css'), 'css/no-existe.css')
+        with override_settings(ESTATICOS_MANIFIESTO_ESTRICTO=True), self.assertRaises(ValueError):
+            staticfiles_storage.stored_name('css/no-existe.css')
+
+    def test_las_paginas_usan_el_nombre_con_hash(self):
+        (self.origen / 'js').mkdir()
+        (self.origen / 'js' / 'base.js').write_text('function toggleUserMenu() {}\n')
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cache.clear()
+        self.assertRegex(self.client.get(reverse('home')).content.decode(), r'/static/js/base\.[0-9a-f]{12}\.js')
+
+
+class BusquedaTests(TestCase):
+    """Índice full-text (FTS5 en SQLite): normalización, relevancia y sincronización."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='vendedor')
+        self.categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+
+    def crear(self, titulo, descripcion=''):
+        return Anuncio.objects.create(
+            usuario=self.usuario, categoria=self.categoria, titulo=titulo, descripcion=descripcion,
+            precio=10, ubicacion='Salta',
+        )
+
+    def buscar(self, texto):
+        return list(
+            busqueda.filtrar_por_texto(Anuncio.objects.all(), texto).order_by('relevancia', 'pk')
+            .values_list('titulo', flat=True)
+        )
+
+    def test_terminos_sin_tildes_y_con_raiz(self):
+        self.assertEqual(busqueda.terminos('Teléfonos CAÑÓN, único!'), ['telefon', 'canon', 'unic'])
+        self.assertEqual(busqueda.raiz('bicicletas'), busqueda.raiz('bicicleta'))
+        self.assertEqual(busqueda.raiz('construcciones'), busqueda.raiz('construccion'))
+        # No recorta si la raíz quedaría demasiado corta
+        self.assertEqual(busqueda.raiz('sol'), 'sol')
+        self.assertEqual(busqueda.terminos(None), [])
+
+    def test_busca_por_raiz_y_ordena_por_relevancia(self):
+        self.crear('Mesa de jardín', 'Ideal para bicicletas')
+        self.crear('Bicicleta rodado 29', 'Casi nueva')
+        self.crear('Silla', 'De madera')
+        self.assertEqual(self.buscar('bicicletas'), ['Bicicleta rodado 29', 'Mesa de jardín'])
+        self.assertEqual(self.buscar('JARDIN'), ['Mesa de jardín'])
+        # Prefijo: sirve mientras se escribe
+        self.assertEqual(self.buscar('mad'), ['Silla'])
+
+    def test_indice_al_dia_al_guardar_y_borrar(self):
+        anuncio = self.crear('Heladera', 'Con freezer')
+        self.assertEqual(self.buscar('heladera'), ['Heladera'])
+        anuncio.titulo = 'Lavarropas'
+        anuncio.save()
+        self.assertEqual(self.buscar('heladera'), [])
+        self.assertEqual(self.buscar('lavarropas'), ['Lavarropas'])
+        anuncio.delete()
+        self.assertEqual(self.buscar('lavarropas'), [])
+
+    def test_sin_indice_usa_icontains(self):
+        self.crear('Mesa', 'de algarrobo')
+        with mock.patch.dict(busqueda._indice_disponible, {'default': False}):
+            resultado = busqueda.filtrar_por_texto(Anuncio.objects.all(), 'algarrobo')
+            self.assertEqual([anuncio.relevancia for anuncio in resultado], [0.0])
+            self.assertIn('LIKE', str(resultado.query))
+            # Sobre las tarjetas (sin descripción) se busca por el id en Anuncio
+            self.assertEqual(busqueda.filtrar_por_texto(TarjetaAnuncio.objects.all(), 'algarrobo').count(), 1)
+
+    def test_reconstruir_indice(self):
+        self.crear('Bicicleta', 'Playera')
+        self.crear('Mesa', 'Ratona')
+        Anuncio.objects.filter(titulo='Mesa').update(titulo='Escritorio') # update() no pasa por las señales
+        self.assertEqual(self.buscar('escritorio'), [])
+
+        salida = io.StringIO()
+        call_command('reconstruir_indice_busqueda', lote=1, stdout=salida)
+        self.assertIn('2 anuncios indexados', salida.getvalue())
+        self.assertEqual(self.buscar('escritorio'), ['Escritorio'])
+        self.assertEqual(self.buscar('mesa'), [])
+        self.assertEqual(self.buscar('bicicleta'), ['Bicicleta'])
+
+
+class PaginacionCursorTests(TestCase):
+    """Paginación keyset: recorrido en ambos sentidos, empates y cursores inválidos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create(username='vendedor')
+        categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        for i in range(23):
+            Anuncio.objects.create(
+                usuario=usuario, categoria=categoria, titulo=f'Producto {i:02d}', descripcion='', precio=(i % 3) * 100,
+                ubicacion='Salta' if i % 2 else 'Jujuy',
+            )
+        # Todos con la misma fecha: el orden lo decide el id
+        Anuncio.objects.update(fecha_publicacion=timezone.now())
+
+    def recorrer(self, orden, por_pagina=4):
+        """Las páginas hacia adelante y después, desde la última, hacia atrás."""
+        adelante, token = [], None
+        while True:
+            pagina = paginacion.paginar_por_cursor(Anuncio.objects.all(), orden, token, por_pagina=por_pagina)
+            adelante.append([anuncio.pk for anuncio in pagina])
+            if not pagina.has_next():
+                break
+            token = pagina.cursor_siguiente
+        atras = [adelante[-1]]
+        while pagina.has_previous():
+            pagina = paginacion.paginar_por_cursor(Anuncio.objects.all(), orden, pagina.cursor_anterior, por_pagina=por_pagina)
+            atras.insert(0, [anuncio.pk for anuncio in pagina])
+        return adelante, atras
+
+    def test_recorre_sin_repetir_ni_saltear_con_empates(self):
+        ordenes = {'': ('-fecha_publicacion', '-id'), 'precio_asc': ('precio', 'id'), 'precio_desc': ('-precio', '-id')}
+        for orden, campos in ordenes.items():
+            with self.subTest(orden=orden):
+                adelante, atras = self.recorrer(orden)
+                esperado = list(Anuncio.objects.order_by(*campos).values_list('pk', flat=True))
+                self.assertEqual(list(itertools.chain(*adelante)), esperado)
+                self.assertEqual([len(pagina) for pagina in adelante], [4] * 5 + [3])
+                self.assertEqual(atras, adelante)
+
+    def test_primera_pagina_sin_anterior(self):
+        pagina = paginacion.paginar_por_cursor(Anuncio.objects.all(), 'precio_asc', por_pagina=30)
+        self.assertEqual(len(pagina), 23)
+        self.assertFalse(pagina.has_other_pages())
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        primera = paginacion.paginar_por_cursor(Anuncio.objects.all(), 'precio_asc', por_pagina=4)
+        token = primera.cursor_siguiente
+        otro_orden = paginacion.paginar_por_cursor(Anuncio.objects.all(), '', por_pagina=4).cursor_siguiente
+        alterado = token[:-3] + ('AAA' if not token.endswith('AAA') else 'BBB')
+        # Firmado, pero con un precio que no es un número
+        mal_formado = signing.dumps({'o': 'precio_asc', 'v': ['x', 1], 'a': True}, salt=paginacion.SALT_CURSOR)
+        for invalido in (alterado, otro_orden, 'basura', mal_formado):
+            with self.subTest(token=invalido):
+                pagina = paginacion.paginar_por_cursor(Anuncio.objects.all(), 'precio_asc', invalido, por_pagina=4)
+                self.assertEqual(list(pagina), list(primera))
+                self.assertFalse(pagina.has_previous())
+
+    def test_enlaces_conservan_los_filtros(self):
+        cache.clear()
+        vistos = []
+        url = reverse('home') + '?ubicacion=Salta&orden=precio_asc&cursor='
+        while url:
+            html = self.client.get(url).content.decode()
+            vistos += re.findall(r'Producto (\d{2})', html)
+            siguiente = re.search(r'href="(\?[^"]*cursor=[^"]+)"[^>]*>\s*Siguiente', html)
+            url = reverse('home') + siguiente.group(1).replace('&amp;', '&') if siguiente else None
+            if url:
+                self.assertIn('?ubicacion=Salta&orden=precio_asc&cursor=', url)
+        esperados = Anuncio.objects.filter(ubicacion='Salta').order_by('precio', 'id').values_list('titulo', flat=True)
+        self.assertEqual(vistos, [titulo.split()[1] for titulo in esperados])
+
+    def test_la_grilla_cacheada_no_guarda_parametros_ajenos(self):
+        cache.clear()
+        for url in ('?orden=precio_asc&cursor=&utm_source=boletin', '?orden=precio_asc&cursor='):
+            html = self.client.get(reverse('home') + url).content.decode()
+            siguiente = re.search(r'href="(\?[^"]*cursor=[^"]+)"[^>]*>\s*Siguiente', html).group(1)
+            # La segunda sale de la caché: tampoco trae el parámetro del primer request
+            self.assertTrue(siguiente.startswith('?orden=precio_asc&cursor='), siguiente)
+
+
+class FacetasTests(TestCase):
+    """Los conteos incrementales de la barra lateral coinciden siempre con los de recalcular()."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='vendedor')
+        self.hogar = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.deportes = Categoria.objects.create(nombre='Deportes', slug='deportes')
+
+    def crear(self, categoria, ubicacion, **campos):
+        return Anuncio.objects.create(
+            usuario=self.usuario, categoria=categoria, titulo='Mesa', descripcion='', precio=10, ubicacion=ubicacion, **campos,
+        )
+
+    def conteos(self):
+        return dict(((faceta.tipo, faceta.valor), faceta.cantidad) for faceta in FacetaAnuncios.objects.all())
+
+    def assertConteos(self, esperados):
+        incrementales = self.conteos()
+        # Claves: una Categoria o el nombre de una ubicación
+        esperados = {
+            (facetas.CATEGORIA, str(clave.pk)) if isinstance(clave, Categoria) else (facetas.UBICACION, clave): cantidad
+            for clave, cantidad in esperados.items()
+        }
+        self.assertEqual(incrementales, esperados)
+        # Lo mismo que contando de cero
+        with transaction.atomic():
+            facetas.recalcular()
+            self.assertEqual(self.conteos(), incrementales)
+            transaction.set_rollback(True)
+
+    def test_alta_edicion_y_baja(self):
+        mesa = self.crear(self.hogar, 'Salta')
+        self.crear(self.hogar, 'Jujuy')
+        self.crear(self.deportes, 'Salta', activo=False)
+        self.assertConteos({self.hogar: 2, 'Salta': 1, 'Jujuy': 1})
+
+        mesa.titulo = 'Mesa de roble' # No cambia ninguna faceta
+        mesa.save()
+        self.assertConteos({self.hogar: 2, 'Salta': 1, 'Jujuy': 1})
+
+        mesa.categoria = self.deportes
+        mesa.save()
+        self.assertConteos({self.hogar: 1, self.deportes: 1, 'Salta': 1, 'Jujuy': 1})
+
+        mesa.ubicacion = 'Jujuy'
+        mesa.save()
+        # Salta quedó vacía: la fila se borra
+        self.assertConteos({self.hogar: 1, self.deportes: 1, 'Jujuy': 2})
+
+        mesa.activo = False
+        mesa.save()
+        self.assertConteos({self.hogar: 1, 'Jujuy': 1})
+
+        mesa.activo = True
+        mesa.save()
+        Anuncio.objects.filter(ubicacion='Jujuy', categoria=self.hogar).get().delete()
+        self.assertConteos({self.deportes: 1, 'Jujuy': 1})
+
+        # Un inactivo no descuenta al borrarse
+        Anuncio.objects.get(activo=False).delete()
+        self.assertConteos({self.deportes: 1, 'Jujuy': 1})
+
+    def test_alta_masiva_y_acciones_del_admin(self):
+        Anuncio.objects.crear_en_bloque([
+            Anuncio(usuario=self.usuario, categoria=self.hogar, titulo=f'Silla {i}', descripcion='', precio=i,
+                    ubicacion='Salta' if i % 2 else 'Jujuy')
+            for i in range(6)
+        ])
+        self.assertConteos({self.hogar: 6, 'Salta': 3, 'Jujuy': 3})
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        iniciar_sesion(self.client, admin)
+        url = reverse('admin:Marketplace_App_anuncio_changelist')
+        salta = list(Anuncio.objects.filter(ubicacion='Salta').values_list('pk', flat=True))
+        self.client.post(url, {'action': 'marcar_como_inactivo', '_selected_action': salta})
+        self.assertConteos({self.hogar: 3, 'Jujuy': 3})
+        # Los que ya estaban inactivos no se descuentan dos veces
+        self.client.post(url, {'action': 'marcar_como_inactivo', '_selected_action': salta})
+        self.assertConteos({self.hogar: 3, 'Jujuy': 3})
+
+        self.client.post(url, {'action': 'marcar_como_activo', '_selected_action': salta[:2]})
+        self.assertConteos({self.hogar: 5, 'Salta': 2, 'Jujuy': 3})
+
+    def test_comando_recalcular_arregla_desfases(self):
+        self.crear(self.hogar, 'Salta')
+        self.crear(self.deportes, 'Salta')
+        FacetaAnuncios.objects.filter(tipo=facetas.UBICACION).update(cantidad=7)
+        FacetaAnuncios.objects.create(tipo=facetas.UBICACION, valor='Fantasma', cantidad=1)
+        call_command('recalcular_facetas', stdout=io.StringIO())
+        self.assertConteos({self.hogar: 1, self.deportes: 1, 'Salta': 2})
+
+
+def imagen_de_prueba(nombre='foto.png', ancho=800, alto=600, color='red'):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (ancho, alto), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(TAREAS_INMEDIATAS=False)
+class MiniaturasTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.usuario = User.objects.create(username='vendedor')
+        self.categoria = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        self.anuncio = Anuncio.objects.create(
+            usuario=self.usuario, categoria=self.categoria, titulo='Mesa', descripcion='Mesa', precio=10,
+            ubicacion='Salta', imagen_principal=imagen_de_prueba(),
+        )
+
+    def existen(self, nombre):
+        storage = self.anuncio.imagen_principal.storage
+        return [storage.exists(miniatura) for miniatura in miniaturas.nombres_miniaturas(nombre)]
+
+    def test_anchos_y_formatos(self):
+        from PIL import Image
+        creados = miniaturas.generar(self.anuncio.imagen_principal)
+        self.assertEqual(len(creados), len(miniaturas.ANCHOS) * len(miniaturas.FORMATOS))
+        storage = self.anuncio.imagen_principal.storage
+        for ancho in miniaturas.ANCHOS:
+            for extension, formato in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with storage.open(miniaturas.nombre_miniatura(self.anuncio.imagen_principal.name, ancho, extension)) as archivo:
+                    imagen = Image.open(archivo)
+                    self.assertEqual((imagen.format, imagen.size), (formato, (ancho, ancho * 3 // 4)))
+
+        # Una imagen más chica que el ancho no se agranda
+        perfil = PerfilUsuario.objects.create(usuario=self.usuario, imagen=imagen_de_prueba('avatar.png', 200, 200))
+        miniaturas.generar(perfil.imagen)
+        with storage.open(miniaturas.nombre_miniatura(perfil.imagen.name, 640, 'jpg')) as archivo:
+            self.assertEqual(Image.open(archivo).size, (200, 200))
+
+    def test_srcset_del_template(self):
+        plantilla = Template('{% load imagenes %}{% imagen_responsiva anuncio.miniaturas alt=anuncio.titulo %}')
+        html = plantilla.render(Context({'anuncio': self.anuncio}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{self.anuncio.imagen_principal.url}"', html)
+
+        # La tarea encolada al crear el anuncio
+        self.assertEqual(cola.procesar_pendientes(), (1, 0))
+        self.anuncio.refresh_from_db()
+        self.assertTrue(self.anuncio.imagen_miniaturas)
+        html = plantilla.render(Context({'anuncio': self.anuncio}))
+        base = self.anuncio.imagen_principal.url.rsplit('.', 1)[0]
+        self.assertIn(f'{base}_160w.webp 160w, {base}_320w.webp 320w, {base}_640w.webp 640w', html)
+        self.assertIn(f'src="{base}_320w.jpg"', html)
+        self.assertIn(f'{base}_640w.jpg 640w', html)
+
+    def test_comando_completa_las_que_faltan(self):
+        PerfilUsuario.objects.create(usuario=self.usuario, imagen=imagen_de_prueba('avatar.png'))
+        Anuncio.objects.create(
+            usuario=self.usuario, categoria=self.categoria, titulo='Silla', descripcion='', precio=5, ubicacion='Salta',
+        )
+        salida = io.StringIO()
+        call_command('generar_miniaturas', stdout=salida)
+        self.assertIn('Anuncios: 1 generadas, 0 con error.', salida.getvalue())
+        self.assertIn('Perfiles de Usuario: 1 generadas, 0 con error.', salida.getvalue())
+        self.assertTrue(Anuncio.objects.get(pk=self.anuncio.pk).imagen_miniaturas)
+        self.assertTrue(PerfilUsuario.objects.get().imagen_miniaturas)
+        self.assertTrue(all(self.existen(self.anuncio.imagen_principal.name)))
+
+        # Ya generadas: sin --forzar no se vuelven a procesar
+        call_command('generar_miniaturas', stdout=salida)
+        self.assertIn('Anuncios: 0 generadas', salida.getvalue())
+
+    def test_cambiar_la_imagen_reinicia_y_borra_las_viejas(self):
+        anterior = self.anuncio.imagen_principal.name
+        # Cargado antes de que terminara el trabajador: editarlo no pisa la marca
+        editado = Anuncio.objects.get(pk=self.anuncio.pk)
+        cola.procesar_pendientes()
+        editado.titulo = 'Mesa de roble'
+        editado.save()
+        self.assertTrue(Anuncio.objects.get(pk=editado.pk).imagen_miniaturas)
+        self.assertEqual(Tarea.objects.count(), 0)
+
+        editado.imagen_principal = imagen_de_prueba('otra.png', color='blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            editado.save()
+        self.assertFalse(Anuncio.objects.get(pk=editado.pk).imagen_miniaturas)
+        self.assertFalse(any(self.existen(anterior)))
+        self.assertEqual(Tarea.objects.get().nombre, 'miniaturas_anuncio')
+
+        cola.procesar_pendientes()
+        self.assertTrue(all(self.existen(editado.imagen_principal.name)))
+        with self.captureOnCommitCallbacks(execute=True):
+            editado.delete()
+        self.assertFalse(any(self.existen(editado.imagen_principal.name)))
+
+    def test_imagen_cambiada_mientras_se_generaban(self):
+        anuncio = Anuncio.objects.get(pk=self.anuncio.pk)
+        anterior = anuncio.imagen_principal.name
+        # Otro request reemplaza la imagen entre la lectura del trabajador y el UPDATE
+        Anuncio.objects.filter(pk=anuncio.pk).update(imagen_principal='anuncios_imagenes/otra.png')
+        self.assertFalse(miniaturas.generar_para(anuncio, 'imagen_principal'))
+        self.assertFalse(Anuncio.objects.get(pk=anuncio.pk).imagen_miniaturas)
+        self.assertFalse(any(self.existen(anterior)))
@@ -1,28 +1,48 @@
+from django.conf import settings
 from django.urls import path
 from Marketplace_App import views
 from django.contrib.auth import views as auth_views
 
-urlpatterns = [
-    path('', views.home, name='home'),
-    path('categoria/<slug:categoria_slug>/', views.home, name='home_por_categoria'),
-    
-    # Rutas de Usuario
-    path('registro', views.registro, name='registro'),
-    path('login', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
-    path('logout', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
-    
-    # Rutas de Perfil y Anuncios
-    path('crear-anuncio', views.crear_anuncio, name='crear_anuncio'),
-    path('anuncio/<int:pk>/', views.detalle_anuncio, name='detalle_anuncio'),
-    path('perfil/', views.mi_perfil, name='mi_perfil'),
-    path('perfil/editar/', views.editar_perfil, name='editar_perfil'),
-    path('anuncio/editar/<int:pk>/', views.editar_anuncio, name='editar_anuncio'),
-    path('anuncio/eliminar/<int:pk>/', views.eliminar_anuncio, name='eliminar_anuncio'),
-
-    # --- RUTAS DE VERIFICACIÓN DE TELÉFONO (LAS NUEVAS) ---
-    path('verificar-telefono/', views.verificar_telefono, name='verificar_telefono'),
-    path('validar-sms/', views.validar_codigo_telefono, name='validar_codigo_telefono'),
-    
-    # --- RUTAS PARA REPORTAR ANUNCIOS---
-    path('anuncio/reportar/<int:pk>/', views.reportar_anuncio, name='reportar_anuncio'),
-]
\ No newline at end of file
+
+def rutas(asincronas=False):
+    """Las rutas de la app; con ``asincronas`` usa las vistas async donde las hay."""
+    v = views.asincronas if asincronas else views
+    return [
+        path('', v.home, name='home'),
+        path('categoria/<slug:categoria_slug>/', v.home, name='home_por_categoria'),
+
+        # Rutas de Usuario
+        path('registro', views.registro, name='registro'),
+        path('registro/verificar', v.verificar_registro, name='verificar_registro'),
+        path('verificacion', v.verificacion_2fa, name='verificacion_2fa'),
+        path('login', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
+        path('logout', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
+
+        # Rutas de Perfil y Anuncios
+        path('crear-anuncio', views.crear_anuncio, name='crear_anuncio'),
+        path('anuncio/<int:pk>/', v.detalle_anuncio, name='detalle_anuncio'),
+        path('anuncio/<int:pk>/comentar/', views.comentar_anuncio, name='comentar_anuncio'),
+        path('perfil/', views.mi_perfil, name='mi_perfil'),
+        path('perfil/editar/', views.editar_perfil, name='editar_perfil'),
+        path('anuncio/editar/<int:pk>/', views.editar_anuncio, name='editar_anuncio'),
+        path('anuncio/eliminar/<int:pk>/', views.eliminar_anuncio, name='eliminar_anuncio'),
+
+        # --- RUTAS DE VERIFICACIÓN DE TELÉFONO (LAS NUEVAS) ---
+        path('verificar-telefono/', v.verificar_telefono, name='verificar_telefono'),
+        path('validar-sms/', v.validar_codigo_telefono, name='validar_codigo_telefono'),
+
+        # --- RUTAS PARA REPORTAR ANUNCIOS---
+        path('anuncio/reportar/<int:pk>/', views.reportar_anuncio, name='reportar_anuncio'),
+
+        # --- API JSON DE SÓLO LECTURA (versión 1) ---
+        path('api/v1/anuncios/', views.api_anuncios, name='api_anuncios'),
+        path('api/v1/anuncios/<int:pk>/', views.api_detalle_anuncio, name='api_detalle_anuncio'),
+        path('api/v1/categorias/', views.api_categorias, name='api_categorias'),
+        path('api/v1/ubicaciones/', views.api_ubicaciones, name='api_ubicaciones'),
+
+        # --- MÉTRICAS DE RENDIMIENTO (Prometheus, sólo staff o con token) ---
+        path('metricas', views.metricas, name='metricas'),
+    ]
+
+
+urlpatterns = rutas(settings.VISTAS_ASINCRONAS)
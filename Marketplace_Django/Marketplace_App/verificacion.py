@@ -0,0 +1,76 @@
+"""
+Alta de cuenta (código por correo) y verificación del teléfono (por SMS).
+
+Lo que hacen las vistas sync (views/usuarios.py) y async (views/asincronas.py)
+con cada código, escrito una sola vez: las funciones que empiezan con "a" son
+las mismas en un hilo aparte, como en codigos.py (la caché de códigos, la
+base y la cola se usan de forma sync). El segundo paso al iniciar sesión está
+en dos_pasos.py.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+
+from Marketplace_App import codigos, tareas
+from Marketplace_App.models import PerfilUsuario
+
+# Usuario a medio registrar (lo usa también la regla 'sesion:registro_user_id' de LIMITES)
+SESION_REGISTRO = 'registro_user_id'
+
+# Además de los resultados de codigos.validar(): la cuenta se borró antes de activarla
+INEXISTENTE = 'inexistente'
+
+
+# --- 1. ALTA DE CUENTA ---
+def correo_registro(codigo):
+    """Asunto y mensaje del correo con el código de activación."""
+    return 'Verifica tu cuenta - Marketplace', f'Tu código de activación es: {codigo}'
+
+
+def enviar_codigo_registro(usuario):
+    """Genera un código nuevo (invalida el anterior) y lo manda al correo de ``usuario`` en segundo plano."""
+    tareas.enviar_correo.encolar(*correo_registro(codigos.generar(codigos.REGISTRO, usuario.pk)), [usuario.email])
+
+
+def validar_registro(session, codigo):
+    """Valida el código del usuario a medio registrar en ``session``: si es válido lo activa, y si venció
+    o se agotaron los intentos le manda otro. Devuelve el resultado de codigos.validar() o INEXISTENTE."""
+    user_id = session[SESION_REGISTRO]
+    resultado = codigos.validar(codigos.REGISTRO, user_id, codigo)
+    if resultado == codigos.VALIDO:
+        usuario = User.objects.filter(id=user_id).first()
+        if usuario is None:
+            return INEXISTENTE
+        usuario.is_active = True
+        usuario.save(update_fields=['is_active'])
+        PerfilUsuario.objects.get_or_create(usuario=usuario)
+        del session[SESION_REGISTRO]
+    elif resultado != codigos.INCORRECTO:
+        usuario = User.objects.filter(id=user_id, is_active=False).only('email').first()
+        if usuario is not None:
+            enviar_codigo_registro(usuario)
+    return resultado
+
+
+# --- 2. TELÉFONO ---
+def pedir_codigo_telefono(perfil, telefono):
+    """Guarda ``telefono`` en el perfil (sin verificar) y le manda un código por SMS en segundo plano."""
+    perfil.telefono_contacto = telefono
+    perfil.telefono_verificado = False
+    perfil.save()
+    codigo = codigos.generar(codigos.TELEFONO, perfil.usuario_id)
+    tareas.enviar_sms.encolar(telefono, f'CÓDIGO: {codigo}')
+
+
+def validar_telefono(usuario, codigo):
+    """Valida el código del SMS y, si es válido, marca el teléfono del perfil como verificado."""
+    resultado = codigos.validar(codigos.TELEFONO, usuario.pk, codigo)
+    if resultado == codigos.VALIDO:
+        perfil = usuario.perfil
+        perfil.telefono_verificado = True
+        perfil.save()
+    return resultado
+
+
+avalidar_registro = sync_to_async(validar_registro)
+apedir_codigo_telefono = sync_to_async(pedir_codigo_telefono)
+avalidar_telefono = sync_to_async(validar_telefono)
@@ -1,3 +1,12 @@
-from .anuncios import home, crear_anuncio, detalle_anuncio, editar_anuncio, eliminar_anuncio, reportar_anuncio
+from .anuncios import home, crear_anuncio, detalle_anuncio, comentar_anuncio, editar_anuncio, eliminar_anuncio, reportar_anuncio
 
-from .usuarios import registro, mi_perfil, editar_perfil, login_view, verificar_telefono, validar_codigo_telefono
\ No newline at end of file
+from .usuarios import (
+    registro, verificar_registro, mi_perfil, editar_perfil, verificar_telefono, validar_codigo_telefono,
+    verificacion_2fa,
+)
+
+from .api import api_anuncios, api_detalle_anuncio, api_categorias, api_ubicaciones
+
+from .metricas import metricas
+
+from . import asincronas
@@ -1,78 +1,148 @@
-from datetime import timedelta
-from django.utils import timezone
+from decimal import Decimal
+
+from django.http import Http404, QueryDict
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
+from django.template.loader import render_to_string
+from django.conf import settings
 from django.core.paginator import Paginator # Importante para la paginación
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 
 # Importamos los modelos desde el paquete superior
-from Marketplace_App.models import Anuncio, Categoria, Reporte
-from Marketplace_App.forms import AnuncioForm, ReporteForm
+from Marketplace_App.models import Anuncio, Reporte, TarjetaAnuncio
+from Marketplace_App.forms import AnuncioForm, ComentarioForm, ReporteForm
+from Marketplace_App import cache_vistas, comentarios, precios, tareas
+from Marketplace_App.facetas import barra_lateral
+from Marketplace_App.filtros import filtrar_anuncios, leer_precio
+from Marketplace_App.limites import limitar
+from Marketplace_App.paginacion import orden_para_cursor, paginar_por_cursor
 
-def home(request, categoria_slug=None):
-    # ... (lógica inicial de categorías, productos base y ubicaciones) ...
-    categorias = Categoria.objects.all()
-    productos = Anuncio.objects.filter(activo=True).order_by('-fecha_publicacion')
-    ubicaciones = Anuncio.objects.filter(activo=True).values_list('ubicacion', flat=True).distinct().order_by('ubicacion')
+POR_PAGINA = 9
+
+def contexto_grilla(request, page_obj, paginacion_cursor, orden, busqueda, rango_paginas=None):
+    """Contexto del template de la grilla para una página ya leída."""
+    # Sólo los parámetros de la clave de la caché (sin page/cursor): con cualquier otro,
+    # la grilla cacheada le mostraría a todos los enlaces armados para un solo request
+    parametros = QueryDict(mutable=True)
+    for nombre in cache_vistas.PARAMETROS_GRILLA:
+        if nombre not in ('page', 'cursor') and request.GET.get(nombre):
+            parametros[nombre] = request.GET[nombre]
+    return {
+        'productos': page_obj,
+        'busqueda': busqueda,
+        'ubicacion_actual': request.GET.get('ubicacion'),
+        'orden': orden,
+        'tiempo_actual': request.GET.get('tiempo'),
+        'precio_min': leer_precio(request.GET.get('precio_min')),
+        'precio_max': leer_precio(request.GET.get('precio_max')),
+        'paginacion_cursor': paginacion_cursor,
+        'rango_paginas': rango_paginas,
+        'parametros': parametros.urlencode(),
+    }
+
+def paginar_grilla(request, productos, paginacion_cursor, orden, busqueda):
+    """Pagina el listado y arma el contexto del template de la grilla."""
+    # Por cursor (opcional): sin COUNT ni OFFSET, sólo enlaces anterior/siguiente
+    if paginacion_cursor:
+        page_obj = paginar_por_cursor(productos, orden_para_cursor(orden, busqueda), request.GET.get('cursor'), por_pagina=POR_PAGINA)
+        return contexto_grilla(request, page_obj, paginacion_cursor, orden, busqueda)
+
+    paginator = Paginator(productos, POR_PAGINA) 
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    # Sólo algunas páginas alrededor de la actual, no todo el page_range
+    rango_paginas = paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1)
+    return contexto_grilla(request, page_obj, paginacion_cursor, orden, busqueda, rango_paginas)
+
+def filtrar_home(request, categorias, categoria_slug):
+    """Devuelve ``(productos, categoria_actual)`` según la URL y los filtros del GET (sin consultar la base)."""
+    # Modelo de lectura: sólo anuncios activos, con las columnas de la tarjeta (incluido
+    # el nombre de la categoría) y sin la descripción: filas chicas y sin joins
+    productos = TarjetaAnuncio.objects.all()
     
-    # ... (filtros de categoría, ubicación y búsqueda existentes) ...
+    # ... (filtros de categoría, ubicación, búsqueda, orden y tiempo) ...
     categoria_actual = None
     if categoria_slug:
-        categoria_actual = get_object_or_404(Categoria, slug=categoria_slug)
-        productos = productos.filter(categoria=categoria_actual)
+        # Las categorías ya están cargadas para la barra lateral: no hace falta consultar
+        categoria_actual = next((cat for cat in categorias if cat.slug == categoria_slug), None)
+        if categoria_actual is None:
+            raise Http404("Categoría inexistente")
 
-    ubicacion_actual = request.GET.get('ubicacion')
-    if ubicacion_actual:
-        productos = productos.filter(ubicacion=ubicacion_actual)
-        
-    busqueda = request.GET.get('q')
-    if busqueda:
-        productos = productos.filter(
-            Q(titulo__icontains=busqueda) | 
-            Q(descripcion__icontains=busqueda)
-        )
+    productos = filtrar_anuncios(
+        productos,
+        categoria=categoria_actual,
+        ubicacion=request.GET.get('ubicacion'),
+        busqueda=request.GET.get('q'),
+        orden=request.GET.get('orden'),
+        tiempo=request.GET.get('tiempo'),
+        precio_min=leer_precio(request.GET.get('precio_min')),
+        precio_max=leer_precio(request.GET.get('precio_max')),
+    )
+    return productos, categoria_actual
 
-    # 1. ORDENAMIENTO (Mantener si ya lo tenías)
-    orden = request.GET.get('orden')
-    if orden == 'precio_asc':
-        productos = productos.order_by('precio')
-    elif orden == 'precio_desc':
-        productos = productos.order_by('-precio')
-        
-    # --- 2. NUEVO FILTRO: TIEMPO DE PUBLICACIÓN ---
-    tiempo = request.GET.get('tiempo')
-    
-    if tiempo:
-        hoy = timezone.now()
-        fecha_limite = None
-        
-        if tiempo == '24h':
-            fecha_limite = hoy - timedelta(days=1)
-        elif tiempo == '7d':
-            fecha_limite = hoy - timedelta(days=7)
-        elif tiempo == '30d':
-            fecha_limite = hoy - timedelta(days=30)
-            
-        if fecha_limite:
-            # Filtramos los que sean MAYORES o IGUALES a la fecha límite
-            productos = productos.filter(fecha_publicacion__gte=fecha_limite)
+def _sin_precio(request):
+    parametros = request.GET.copy()
+    for nombre in ('page', 'cursor', 'precio_min', 'precio_max'):
+        parametros.pop(nombre, None)
+    return parametros
 
-    # --- Paginación ---
-    paginator = Paginator(productos, 9) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def barras_histograma(request, barras):
+    """Cada barra del histograma con el enlace que filtra por su rango (conservando los demás filtros)."""
+    precio_min = leer_precio(request.GET.get('precio_min'))
+    precio_max = leer_precio(request.GET.get('precio_max'))
+    filtrando = precio_min is not None or precio_max is not None
+    parametros = _sin_precio(request)
+    resultado = []
+    for barra in barras:
+        # Los precios tienen 2 decimales: "hasta" incluido sería el comienzo de la barra siguiente
+        parametros['precio_min'] = barra.desde
+        parametros['precio_max'] = Decimal(barra.hasta) - Decimal('0.01')
+        resultado.append({
+            'barra': barra,
+            'url': '?' + parametros.urlencode(),
+            'seleccionada': filtrando
+                and (precio_min is None or barra.hasta > precio_min)
+                and (precio_max is None or barra.desde <= precio_max),
+        })
+    return resultado
 
-    context = {
-        'productos': page_obj, 
+def contexto_home(request, grilla, categorias, categoria_actual, ubicaciones, histograma):
+    return {
+        'grilla': grilla,
         'categorias': categorias,
         'categoria_actual': categoria_actual,
         'ubicaciones': ubicaciones,
-        'ubicacion_actual': ubicacion_actual,
-        'busqueda': busqueda,
-        'orden': orden,
-        'tiempo_actual': tiempo, # <--- Enviamos esto para marcar el select
+        'ubicacion_actual': request.GET.get('ubicacion'),
+        'busqueda': request.GET.get('q'),
+        'orden': request.GET.get('orden'),
+        'tiempo_actual': request.GET.get('tiempo'), # <--- Enviamos esto para marcar el select
+        'precio_min': leer_precio(request.GET.get('precio_min')),
+        'precio_max': leer_precio(request.GET.get('precio_max')),
+        'histograma': barras_histograma(request, histograma),
+        'url_sin_precio': '?' + _sin_precio(request).urlencode(),
     }
+
+def home(request, categoria_slug=None):
+    # Barra lateral servida desde la tabla de facetas (con conteos)
+    categorias, ubicaciones = barra_lateral()
+    productos, categoria_actual = filtrar_home(request, categorias, categoria_slug)
+
+    # --- Grilla (cacheada por filtros + versión del listado) ---
+    paginacion_cursor = settings.PAGINACION_POR_CURSOR or 'cursor' in request.GET
+    clave_grilla = cache_vistas.clave_grilla(categoria_actual, request.GET, paginacion_cursor)
+    grilla = cache_vistas.obtener_grilla(clave_grilla)
+    if grilla is None:
+        grilla = render_to_string(
+            'Marketplace_App/anuncios/grilla_anuncios.html',
+            paginar_grilla(request, productos, paginacion_cursor, request.GET.get('orden'), request.GET.get('q')),
+        )
+        cache_vistas.guardar_grilla(clave_grilla, grilla)
+
+    # Histograma de precios desde las cubetas precalculadas (no lee la tabla de anuncios)
+    histograma = precios.histograma(categoria_actual.pk if categoria_actual else None, request.GET.get('ubicacion'))
+    context = contexto_home(request, grilla, categorias, categoria_actual, ubicaciones, histograma)
     return render(request, 'Marketplace_App/home.html', context)
 
 @login_required
@@ -105,11 +175,54 @@ def crear_anuncio(request):
     return render(request, 'Marketplace_App/anuncios/crear_anuncio.html', context)
 
 def detalle_anuncio(request, pk):
-    anuncio = get_object_or_404(Anuncio, pk=pk, activo=True)
-    context = {'anuncio': anuncio}
+    # El cuerpo de la página se cachea por anuncio (se invalida al editar el anuncio,
+    # su categoría o el perfil del vendedor)
+    en_cache = cache_vistas.obtener_detalle(pk)
+    if en_cache is not None:
+        titulo, contenido, cantidad_comentarios = en_cache
+    else:
+        # Categoría, vendedor y su perfil en una sola consulta (el template los usa varias veces)
+        anuncio = get_object_or_404(
+            Anuncio.objects.select_related('categoria', 'usuario__perfil'),
+            pk=pk, activo=True,
+        )
+        titulo = anuncio.titulo
+        cantidad_comentarios = anuncio.cantidad_comentarios
+        contenido = render_to_string('Marketplace_App/anuncios/detalle_anuncio_contenido.html', {'anuncio': anuncio})
+        cache_vistas.guardar_detalle(anuncio, contenido)
+    # Comentarios fuera de la caché (llevan el formulario); sin consultar si no hay ninguno
+    hilo = comentarios.pagina(pk, request.GET.get('comentarios')) if cantidad_comentarios else None
+    context = contexto_detalle(pk, titulo, contenido, cantidad_comentarios, hilo)
     # NOTA: Actualizamos la ruta al template
     return render(request, 'Marketplace_App/anuncios/detalle_anuncio.html', context)
 
+def contexto_detalle(pk, titulo, contenido, cantidad_comentarios, hilo):
+    return {
+        'titulo': titulo,
+        'contenido': contenido,
+        'anuncio_id': pk,
+        'cantidad_comentarios': cantidad_comentarios,
+        'comentarios': hilo,
+        'form_comentario': ComentarioForm(),
+    }
+
+@login_required
+@require_POST
+@limitar()
+def comentar_anuncio(request, pk):
+    # Sólo lo que usa la invalidación de caché (categoría): el resto del anuncio no hace falta
+    anuncio = get_object_or_404(Anuncio.objects.only('id', 'categoria_id'), pk=pk, activo=True)
+    form = ComentarioForm(request.POST)
+    if form.is_valid():
+        comentario = form.save(commit=False)
+        comentario.anuncio = anuncio
+        comentario.usuario = request.user
+        comentario.save()
+        messages.success(request, 'Comentario publicado.')
+    else:
+        messages.error(request, 'El comentario no puede estar vacío ni superar los 255 caracteres.')
+    return redirect(reverse('detalle_anuncio', args=[pk]) + '#comentarios')
+
 @login_required
 def editar_anuncio(request, pk):
     anuncio = get_object_or_404(Anuncio, pk=pk, usuario=request.user)
@@ -152,7 +265,8 @@ def reportar_anuncio(request, pk):
             reporte.tipo_entidad_reportada = 'ANUNCIO'
             reporte.identificador_entidad_reportada = anuncio.id
             reporte.save()
-            
+            tareas.notificar_reporte.encolar(reporte.pk)
+
             messages.success(request, "El reporte ha sido enviado a los administradores.")
             return redirect('detalle_anuncio', pk=pk)
     else:
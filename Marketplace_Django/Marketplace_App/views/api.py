@@ -0,0 +1,249 @@
+"""
+API JSON de sólo lectura (v1): búsqueda y detalle de anuncios, categorías y ubicaciones.
+
+Se serializa desde ``values()`` (sin instanciar modelos) y se puede pedir sólo
+algunos campos con ``?campos=id,titulo,precio``. Cada respuesta lleva ``ETag``
+(y ``Last-Modified`` cuando hay fechas). El ETag se arma ANTES de leer los
+datos, con las versiones de cache_vistas y la fecha de modificación del
+anuncio, así una petición condicional sin cambios recibe un 304 sin consultar
+ni serializar el recurso.
+"""
+import hashlib
+import time
+
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from Marketplace_App import cache_vistas
+from Marketplace_App.facetas import CATEGORIA, UBICACION
+from Marketplace_App.filtros import VENTANAS_TIEMPO, filtrar_anuncios, leer_precio
+from Marketplace_App.miniaturas import ANCHOS, nombre_miniatura
+from Marketplace_App.models import Anuncio, Categoria, FacetaAnuncios
+from Marketplace_App.paginacion import CLAVES_POR_ORDEN, orden_para_cursor, paginar_por_cursor
+
+# Campo público -> columnas de values() que necesita
+CAMPOS_ANUNCIO = {
+    'id': ('id',),
+    'titulo': ('titulo',),
+    'descripcion': ('descripcion',),
+    'precio': ('precio',),
+    'ubicacion': ('ubicacion',),
+    'estado': ('estado',),
+    'categoria': ('categoria__slug',),
+    'vendedor': ('usuario__username',),
+    'fecha_publicacion': ('fecha_publicacion',),
+    'fecha_modificacion': ('fecha_modificacion',),
+    'imagen': ('imagen_principal', 'imagen_miniaturas'),
+}
+CAMPOS_LISTADO = ('id', 'titulo', 'precio', 'ubicacion', 'estado', 'categoria', 'fecha_publicacion', 'imagen')
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+
+class ErrorApi(Exception):
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+# --- 1. AUXILIARES ---
+def _error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+
+def _campos(request, por_defecto):
+    pedido = request.GET.get('campos')
+    if not pedido:
+        return list(por_defecto)
+    campos = [campo.strip() for campo in pedido.split(',') if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in CAMPOS_ANUNCIO]
+    if desconocidos or not campos:
+        raise ErrorApi(f'Campos desconocidos: {", ".join(desconocidos) or "(ninguno)"}. '
+                       f'Disponibles: {", ".join(CAMPOS_ANUNCIO)}.')
+    return campos
+
+
+def _limite(request):
+    try:
+        limite = int(request.GET.get('limite', LIMITE_POR_DEFECTO))
+    except ValueError:
+        raise ErrorApi('"limite" tiene que ser un número.')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _precio(request, nombre):
+    texto = request.GET.get(nombre)
+    if not texto:
+        return None
+    precio = leer_precio(texto)
+    if precio is None:
+        raise ErrorApi(f'"{nombre}" tiene que ser un precio (número mayor o igual a 0).')
+    return precio
+
+
+def _columnas(campos, *extra):
+    columnas = {'fecha_modificacion', *extra}
+    for campo in campos:
+        columnas.update(CAMPOS_ANUNCIO[campo])
+    return sorted(columnas)
+
+
+def _imagen(fila):
+    nombre = fila['imagen_principal']
+    if not nombre:
+        return None
+    miniaturas = {}
+    if fila['imagen_miniaturas']:
+        miniaturas = {str(ancho): default_storage.url(nombre_miniatura(nombre, ancho, 'webp')) for ancho in ANCHOS}
+    return {'original': default_storage.url(nombre), 'miniaturas': miniaturas}
+
+
+def _serializar(fila, campos):
+    datos = {}
+    for campo in campos:
+        if campo == 'imagen':
+            datos[campo] = _imagen(fila)
+        else:
+            datos[campo] = fila[CAMPOS_ANUNCIO[campo][0]]
+    return datos
+
+
+def _etag(request, *partes):
+    # La URL completa (filtros, campos, cursor) más lo que indica si los datos cambiaron
+    contenido = '|'.join([request.get_full_path(), *map(str, partes)])
+    return quote_etag(hashlib.md5(contenido.encode()).hexdigest())
+
+
+def _condicional(request, etag, ultima_modificacion=None):
+    """Devuelve un 304 (o 412) si el cliente ya tiene esta versión, o ``None``."""
+    timestamp = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _respuesta(datos, etag, ultima_modificacion=None):
+    respuesta = JsonResponse(datos, json_dumps_params={'ensure_ascii': False})
+    respuesta['ETag'] = etag
+    if ultima_modificacion:
+        respuesta['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+    # Se puede guardar, pero siempre hay que revalidar (barato gracias al ETag)
+    patch_cache_control(respuesta, public=True, max_age=0, must_revalidate=True)
+    return respuesta
+
+
+# --- 2. ANUNCIOS ---
+@require_safe
+def api_anuncios(request):
+    """Búsqueda de anuncios con los mismos filtros que home() y paginación por cursor."""
+    try:
+        campos = _campos(request, CAMPOS_LISTADO)
+        limite = _limite(request)
+        precio_min, precio_max = _precio(request, 'precio_min'), _precio(request, 'precio_max')
+        categoria_id = None
+        if request.GET.get('categoria'):
+            categoria_id = Categoria.objects.filter(slug=request.GET['categoria']).values_list('pk', flat=True).first()
+            if categoria_id is None:
+                raise ErrorApi('Categoría inexistente.', status=404)
+    except ErrorApi as error:
+        return _error(error)
+
+    busqueda = request.GET.get('q')
+    orden = request.GET.get('orden')
+    tiempo = request.GET.get('tiempo')
+
+    alcance = cache_vistas.alcance_grilla(categoria_id)
+    partes = [cache_vistas.versiones(alcance)[alcance]]
+    if tiempo in VENTANAS_TIEMPO:
+        # Con ventana de tiempo el resultado cambia solo al pasar los minutos
+        partes.append(int(time.time() // 60))
+    etag = _etag(request, *partes)
+    no_modificado = _condicional(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    productos = filtrar_anuncios(
+        Anuncio.objects.filter(activo=True),
+        categoria=categoria_id,
+        ubicacion=request.GET.get('ubicacion'),
+        busqueda=busqueda,
+        orden=orden,
+        tiempo=tiempo,
+        precio_min=precio_min,
+        precio_max=precio_max,
+    )
+    orden_cursor = orden_para_cursor(orden, busqueda)
+    claves = [campo for campo, _ in CLAVES_POR_ORDEN[orden_cursor]]
+    pagina = paginar_por_cursor(
+        productos.values(*_columnas(campos, *claves)), orden_cursor, request.GET.get('cursor'), por_pagina=limite,
+    )
+
+    ultima_modificacion = max((fila['fecha_modificacion'] for fila in pagina), default=None)
+    datos = {
+        'resultados': [_serializar(fila, campos) for fila in pagina],
+        'siguiente': pagina.cursor_siguiente,
+        'anterior': pagina.cursor_anterior,
+    }
+    return _respuesta(datos, etag, ultima_modificacion)
+
+
+@require_safe
+def api_detalle_anuncio(request, pk):
+    try:
+        campos = _campos(request, CAMPOS_ANUNCIO)
+    except ErrorApi as error:
+        return _error(error)
+
+    # Lo mínimo para el ETag: fecha de modificación y de qué depende el anuncio
+    estado = Anuncio.objects.filter(pk=pk, activo=True).values('fecha_modificacion', 'categoria_id', 'usuario_id').first()
+    if estado is None:
+        return _error(ErrorApi('Anuncio inexistente.', status=404))
+    dependencias = cache_vistas.dependencias_detalle(
+        Anuncio(pk=pk, categoria_id=estado['categoria_id'], usuario_id=estado['usuario_id'])
+    )
+    versiones = cache_vistas.versiones(*dependencias)
+    etag = _etag(request, estado['fecha_modificacion'].isoformat(), *(versiones[nombre] for nombre in dependencias))
+    no_modificado = _condicional(request, etag, estado['fecha_modificacion'])
+    if no_modificado:
+        return no_modificado
+
+    # Se pudo desactivar entre las dos consultas
+    fila = Anuncio.objects.filter(pk=pk, activo=True).values(*_columnas(campos)).first()
+    if fila is None:
+        return _error(ErrorApi('Anuncio inexistente.', status=404))
+    return _respuesta(_serializar(fila, campos), etag, fila['fecha_modificacion'])
+
+
+# --- 3. CATEGORÍAS Y UBICACIONES (desde la tabla de facetas) ---
+def _version_listado(request):
+    return _etag(request, cache_vistas.versiones('listado')['listado'])
+
+
+@require_safe
+def api_categorias(request):
+    etag = _version_listado(request)
+    no_modificado = _condicional(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    conteos = dict(FacetaAnuncios.objects.filter(tipo=CATEGORIA).values_list('valor', 'cantidad'))
+    categorias = [
+        {'slug': fila['slug'], 'nombre': fila['nombre'], 'cantidad': conteos.get(str(fila['id']), 0)}
+        for fila in Categoria.objects.values('id', 'slug', 'nombre')
+    ]
+    return _respuesta({'resultados': categorias}, etag)
+
+
+@require_safe
+def api_ubicaciones(request):
+    etag = _version_listado(request)
+    no_modificado = _condicional(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    ubicaciones = [
+        {'nombre': valor, 'cantidad': cantidad}
+        for valor, cantidad in FacetaAnuncios.objects.filter(tipo=UBICACION, cantidad__gt=0).values_list('valor', 'cantidad')
+    ]
+    return _respuesta({'resultados': ubicaciones}, etag)
@@ -0,0 +1,174 @@
+"""
+Versiones async de home, detalle_anuncio (con su hilo de comentarios) y los flujos de verificación.
+
+Hacen lo mismo que las vistas sync (comparten filtros, contexto y templates)
+pero con el ORM async, la API async de la caché y de la sesión, y encolando
+correos y SMS sin bloquear el event loop. Bajo un servidor ASGI así no ocupan
+un hilo por request. Las URLs las usan cuando VISTAS_ASINCRONAS está activo
+(ver urls.py y asgi.py).
+
+En un contexto async no se puede consultar la base de forma sync, y el
+template base usa ``user`` y ``user.perfil``: por eso cada vista empieza con
+``_cargar_usuario`` y los templates se renderizan con todo ya leído.
+"""
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.template.loader import render_to_string
+
+from Marketplace_App import cache_vistas, comentarios, dos_pasos, precios, verificacion
+from Marketplace_App.facetas import abarra_lateral
+from Marketplace_App.limites import limitar
+from Marketplace_App.models import Anuncio, PerfilUsuario
+from Marketplace_App.paginacion import apaginar_numerado, apaginar_por_cursor, orden_para_cursor
+from Marketplace_App.views.anuncios import POR_PAGINA, contexto_detalle, contexto_grilla, contexto_home, filtrar_home
+from Marketplace_App.views.usuarios import (
+    avisar_codigo, avisar_correo, contexto_2fa, correo_ingresado, destino_verificacion, respuesta_codigo_telefono,
+)
+
+_RELACION_PERFIL = User._meta.get_field('perfil')
+
+
+async def _cargar_usuario(request):
+    """Resuelve ``request.user`` (y su perfil, o ``None``) con consultas async."""
+    usuario = await request.auser()
+    if usuario.is_authenticated:
+        perfil = await PerfilUsuario.objects.filter(usuario_id=usuario.pk).afirst()
+        # Queda en la caché de la relación: user.perfil ya no consulta (si es None, lanza DoesNotExist)
+        _RELACION_PERFIL.set_cached_value(usuario, perfil)
+    request.user = usuario
+    return usuario
+
+
+async def _perfil(usuario):
+    perfil = _RELACION_PERFIL.get_cached_value(usuario, default=None)
+    if perfil is None:
+        perfil, _ = await PerfilUsuario.objects.aget_or_create(usuario=usuario)
+        _RELACION_PERFIL.set_cached_value(usuario, perfil)
+    return perfil
+
+
+# --- 1. ANUNCIOS ---
+async def _apaginar_grilla(request, productos, paginacion_cursor, orden, busqueda):
+    if paginacion_cursor:
+        page_obj = await apaginar_por_cursor(
+            productos, orden_para_cursor(orden, busqueda), request.GET.get('cursor'), por_pagina=POR_PAGINA,
+        )
+        return contexto_grilla(request, page_obj, paginacion_cursor, orden, busqueda)
+
+    page_obj = await apaginar_numerado(productos, request.GET.get('page'), POR_PAGINA)
+    rango_paginas = page_obj.paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1)
+    return contexto_grilla(request, page_obj, paginacion_cursor, orden, busqueda, rango_paginas)
+
+
+async def home(request, categoria_slug=None):
+    await _cargar_usuario(request)
+    categorias, ubicaciones = await abarra_lateral()
+    productos, categoria_actual = filtrar_home(request, categorias, categoria_slug)
+
+    paginacion_cursor = settings.PAGINACION_POR_CURSOR or 'cursor' in request.GET
+    clave_grilla = await cache_vistas.aclave_grilla(categoria_actual, request.GET, paginacion_cursor)
+    grilla = await cache_vistas.aobtener_grilla(clave_grilla)
+    if grilla is None:
+        grilla = render_to_string(
+            'Marketplace_App/anuncios/grilla_anuncios.html',
+            await _apaginar_grilla(request, productos, paginacion_cursor, request.GET.get('orden'), request.GET.get('q')),
+        )
+        await cache_vistas.aguardar_grilla(clave_grilla, grilla)
+
+    histograma = await precios.ahistograma(categoria_actual.pk if categoria_actual else None, request.GET.get('ubicacion'))
+    context = contexto_home(request, grilla, categorias, categoria_actual, ubicaciones, histograma)
+    return render(request, 'Marketplace_App/home.html', context)
+
+
+async def detalle_anuncio(request, pk):
+    await _cargar_usuario(request)
+    en_cache = await cache_vistas.aobtener_detalle(pk)
+    if en_cache is not None:
+        titulo, contenido, cantidad_comentarios = en_cache
+    else:
+        anuncio = await aget_object_or_404(
+            Anuncio.objects.select_related('categoria', 'usuario__perfil'),
+            pk=pk, activo=True,
+        )
+        titulo = anuncio.titulo
+        cantidad_comentarios = anuncio.cantidad_comentarios
+        contenido = render_to_string('Marketplace_App/anuncios/detalle_anuncio_contenido.html', {'anuncio': anuncio})
+        await cache_vistas.aguardar_detalle(anuncio, contenido)
+    hilo = await comentarios.apagina(pk, request.GET.get('comentarios')) if cantidad_comentarios else None
+    context = contexto_detalle(pk, titulo, contenido, cantidad_comentarios, hilo)
+    return render(request, 'Marketplace_App/anuncios/detalle_anuncio.html', context)
+
+
+# --- 2. VERIFICACIÓN DE REGISTRO (código por correo) ---
+@limitar()
+async def verificar_registro(request):
+    await _cargar_usuario(request)
+    if await request.session.aget(verificacion.SESION_REGISTRO) is None:
+        return redirect('home')
+
+    if request.method == 'POST':
+        resultado = await verificacion.avalidar_registro(request.session, request.POST.get('codigo', ''))
+        if avisar_codigo(request, resultado, '¡Cuenta verificada exitosamente! Ahora puedes iniciar sesión.'):
+            return redirect('login')
+
+    return render(request, 'Marketplace_App/formularios/verificacion_2fa.html')
+
+
+# --- 3. VERIFICACIÓN EN DOS PASOS (al iniciar sesión) ---
+@login_required
+@limitar()
+async def verificacion_2fa(request):
+    usuario = await _cargar_usuario(request)
+    siguiente, destino = destino_verificacion(request)
+    if not await dos_pasos.apendiente(request.session):
+        return redirect(destino)
+
+    correo = await dos_pasos.adestinatario(request.session, usuario)
+    if request.method == 'POST' and 'email' in request.POST and not usuario.email:
+        nuevo = correo_ingresado(request)
+        if nuevo and avisar_correo(request, nuevo, await dos_pasos.apedir_correo(request.session, usuario, nuevo)):
+            correo = nuevo
+    elif not correo:
+        pass
+    elif request.method == 'POST' and 'reenviar' not in request.POST:
+        resultado = await dos_pasos.avalidar(request.session, usuario, request.POST.get('codigo', ''))
+        if avisar_codigo(request, resultado, f'¡Bienvenido de nuevo, {usuario.username}!'):
+            return redirect(destino)
+    elif request.method == 'POST' or not await dos_pasos.ahay_codigo_vigente(request.session):
+        await dos_pasos.aenviar_codigo(request.session, usuario)
+        messages.info(request, f'Te enviamos un código de acceso a {correo}.')
+
+    return render(request, 'Marketplace_App/formularios/verificacion_2fa.html', contexto_2fa(correo, siguiente))
+
+
+# --- 4. VERIFICACIÓN DE TELÉFONO (código por SMS) ---
+@login_required
+@limitar()
+async def verificar_telefono(request):
+    perfil = await _perfil(await _cargar_usuario(request))
+
+    if request.method == 'POST':
+        telefono = request.POST.get('telefono')
+        if telefono:
+            await verificacion.apedir_codigo_telefono(perfil, telefono)
+            messages.info(request, f"Te enviamos un código de verificación al {telefono}.")
+            return redirect('validar_codigo_telefono')
+        messages.error(request, "Por favor ingresa un número válido.")
+
+    return render(request, 'Marketplace_App/formularios/verificar_telefono.html', {'perfil': perfil})
+
+
+@login_required
+@limitar()
+async def validar_codigo_telefono(request):
+    usuario = await _cargar_usuario(request)
+    if request.method == 'POST':
+        resultado = await verificacion.avalidar_telefono(usuario, request.POST.get('codigo', ''))
+        respuesta = respuesta_codigo_telefono(request, resultado)
+        if respuesta is not None:
+            return respuesta
+
+    return render(request, 'Marketplace_App/formularios/validar_codigo_telefono.html')
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+from Marketplace_App import metricas as registro_metricas
+
+
+def _autorizado(request):
+    # Staff con sesión, o el scraper de Prometheus con "Authorization: Bearer <METRICAS_TOKEN>"
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICAS_TOKEN
+    encabezado = request.headers.get('Authorization', '')
+    return bool(token) and constant_time_compare(encabezado, f'Bearer {token}')
+
+
+@never_cache
+@require_safe
+def metricas(request):
+    """Métricas de rendimiento por vista en formato de texto de Prometheus."""
+    if not _autorizado(request):
+        return HttpResponse('No autorizado.', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(registro_metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,44 +1,16 @@
-import random
+from django.conf import settings
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, authenticate
-from django.contrib.auth.forms import AuthenticationForm
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib.auth.models import User
-from Marketplace_App.forms import RegisterForm, PerfilUsuarioForm, AnuncioForm
+from Marketplace_App import codigos, dos_pasos, verificacion
+from Marketplace_App.limites import limitar
+from Marketplace_App.forms import RegisterForm, PerfilUsuarioForm, AnuncioForm, CorreoForm
 from Marketplace_App.models import PerfilUsuario, Anuncio
 from django.contrib.auth.decorators import login_required
 
-# --- 1. LOGIN PERSONALIZADO (Con "Recordarme") ---
-def login_view(request):
-    if request.user.is_authenticated:
-        return redirect('home')
-
-    if request.method == 'POST':
-        form = AuthenticationForm(request, data=request.POST)
-        if form.is_valid():
-            user = form.get_user()
-            login(request, user)
-            
-            # Lógica de "Recordarme"
-            if request.POST.get('remember_me'):
-                # La sesión dura 30 días (en segundos)
-                request.session.set_expiry(30 * 24 * 60 * 60) 
-            else:
-                # La sesión expira al cerrar el navegador
-                request.session.set_expiry(0) 
-                
-            messages.success(request, f'¡Bienvenido de nuevo, {user.username}!')
-            return redirect('home')
-        else:
-            messages.error(request, "Usuario o contraseña incorrectos.")
-    else:
-        form = AuthenticationForm()
-
-    return render(request, 'registration/login.html', {'form': form})
-
-# --- 2. REGISTRO (Paso 1: Datos + Envio de Código) ---
+# --- 1. REGISTRO (Paso 1: Datos + Envio de Código) ---
+@limitar()
 def registro(request):
     if request.method == 'POST':
         formulario_registro = RegisterForm(request.POST)
@@ -60,21 +32,11 @@ def registro(request):
                     user.is_active = False 
                     user.save()
                     
-                    # Generamos código de verificación
-                    codigo = random.randint(100000, 999999)
-                    
-                    # Guardamos datos en la sesión temporalmente para el siguiente paso
-                    request.session['registro_user_id'] = user.id
-                    request.session['registro_codigo'] = codigo
+                    # El usuario a medio registrar queda en la sesión; el código, en codigos.py
+                    request.session[verificacion.SESION_REGISTRO] = user.id
                     
-                    # Enviar correo
-                    send_mail(
-                        'Verifica tu cuenta - Marketplace',
-                        f'Tu código de activación es: {codigo}',
-                        settings.EMAIL_HOST_USER,
-                        [email],
-                        fail_silently=False,
-                    )
+                    # Enviar correo (en segundo plano: el request no espera al servidor SMTP)
+                    verificacion.enviar_codigo_registro(user)
                     
                     messages.info(request, f'Te hemos enviado un código a {email}. Ingrésalo para activar tu cuenta.')
                     return redirect('verificar_registro') # Vamos al paso 2
@@ -88,43 +50,36 @@ def registro(request):
     
     return render(request, 'Marketplace_App/usuarios/registro.html', {'formulario_registro': formulario_registro})
 
-# --- 3. VERIFICACIÓN DE REGISTRO (Paso 2: Ingresar Código) ---
+# --- 2. VERIFICACIÓN DE REGISTRO (Paso 2: Ingresar Código) ---
+def avisar_codigo(request, resultado, exito, vencido='El código ya no es válido. Te enviamos uno nuevo a tu correo.'):
+    """Mensaje para el resultado de validar un código (compartido con las vistas async). True si fue válido."""
+    if resultado == codigos.VALIDO:
+        messages.success(request, exito)
+        return True
+    if resultado == codigos.INCORRECTO:
+        messages.error(request, 'Código incorrecto. Inténtalo de nuevo.')
+    elif resultado == verificacion.INEXISTENTE:
+        messages.error(request, 'Error al encontrar el usuario.')
+    else:
+        messages.error(request, vencido)
+    return False
+
+@limitar()
 def verificar_registro(request):
     # Si no hay un proceso de registro en curso, mandar al home
-    if 'registro_user_id' not in request.session:
+    if request.session.get(verificacion.SESION_REGISTRO) is None:
         return redirect('home')
         
     if request.method == 'POST':
-        codigo_ingresado = request.POST.get('codigo')
-        codigo_generado = request.session.get('registro_codigo')
-        user_id = request.session.get('registro_user_id')
-        
-        if str(codigo_ingresado) == str(codigo_generado):
-            try:
-                # Activar el usuario
-                user = User.objects.get(id=user_id)
-                user.is_active = True
-                user.save()
-                
-                # Crear perfil si no existe (buena práctica)
-                PerfilUsuario.objects.get_or_create(usuario=user)
-                
-                # Limpiar sesión temporal
-                del request.session['registro_user_id']
-                del request.session['registro_codigo']
-                
-                messages.success(request, '¡Cuenta verificada exitosamente! Ahora puedes iniciar sesión.')
-                return redirect('login')
-                
-            except User.DoesNotExist:
-                messages.error(request, 'Error al encontrar el usuario.')
-        else:
-            messages.error(request, 'Código incorrecto. Inténtalo de nuevo.')
+        resultado = verificacion.validar_registro(request.session, request.POST.get('codigo', ''))
+        if avisar_codigo(request, resultado, '¡Cuenta verificada exitosamente! Ahora puedes iniciar sesión.'):
+            return redirect('login')
 
     # Reutilizamos tu template verificacion_2fa.html
     return render(request, 'Marketplace_App/formularios/verificacion_2fa.html')
 
 @login_required
+@limitar()
 def verificar_telefono(request):
     # Obtenemos o creamos el perfil del usuario actual
     perfil, created = PerfilUsuario.objects.get_or_create(usuario=request.user)
@@ -133,23 +88,8 @@ def verificar_telefono(request):
         telefono = request.POST.get('telefono')
         
         if telefono:
-            # 1. Guardamos el número en el perfil (marcado como NO verificado aún)
-            perfil.telefono_contacto = telefono
-            perfil.telefono_verificado = False 
-            perfil.save()
-            
-            # 2. Generamos código aleatorio de 6 dígitos
-            codigo = random.randint(100000, 999999)
-            
-            # 3. Guardamos el código en la sesión (memoria temporal)
-            request.session['sms_codigo'] = codigo
-            
-            # 4. SIMULACIÓN: Imprimir en la consola negra (Terminal)
-            print(f"\n{'='*40}")
-            print(f" >>> SIMULACIÓN SMS A {telefono} <<<")
-            print(f" >>> CÓDIGO: {codigo} <<<")
-            print(f"{'='*40}\n")
-            
+            # El número queda sin verificar y el SMS sale en segundo plano (ver verificacion.py)
+            verificacion.pedir_codigo_telefono(perfil, telefono)
             messages.info(request, f"Te enviamos un código de verificación al {telefono}.")
             return redirect('validar_codigo_telefono')
         else:
@@ -157,48 +97,45 @@ def verificar_telefono(request):
             
     return render(request, 'Marketplace_App/formularios/verificar_telefono.html', {'perfil': perfil})
 
+def respuesta_codigo_telefono(request, resultado):
+    """Adónde ir después de validar el código del SMS (None: se vuelve a mostrar el formulario)."""
+    vencido = 'El código venció o superaste los intentos. Pide uno nuevo.'
+    if avisar_codigo(request, resultado, '¡Teléfono verificado correctamente!', vencido):
+        return redirect('crear_anuncio')
+    if resultado != codigos.INCORRECTO:
+        return redirect('verificar_telefono')
+    return None
+
 @login_required
+@limitar()
 def validar_codigo_telefono(request):
     if request.method == 'POST':
-        codigo_ingresado = request.POST.get('codigo')
-        codigo_real = request.session.get('sms_codigo')
-        
-        # --- INICIO DEPURACIÓN (Míralo en tu consola negra) ---
-        print(f"--- DEBUG VERIFICACIÓN ---")
-        print(f"Código en Sesión (Real): {codigo_real} (Tipo: {type(codigo_real)})")
-        print(f"Código Ingresado (User): {codigo_ingresado} (Tipo: {type(codigo_ingresado)})")
-        # ----------------------------------------------------
-
-        # CORRECCIÓN: Convertir ambos a string y usar .strip() para quitar espacios
-        if codigo_real and str(codigo_ingresado).strip() == str(codigo_real):
-            
-            # ¡ÉXITO!
-            perfil = request.user.perfil
-            perfil.telefono_verificado = True
-            perfil.save()
-            
-            # Limpiamos sesión
-            if 'sms_codigo' in request.session:
-                del request.session['sms_codigo']
-            
-            messages.success(request, "¡Teléfono verificado correctamente!")
-            return redirect('crear_anuncio') 
-        else:
-            messages.error(request, "Código incorrecto. Inténtalo de nuevo.")
+        resultado = verificacion.validar_telefono(request.user, request.POST.get('codigo', ''))
+        respuesta = respuesta_codigo_telefono(request, resultado)
+        if respuesta is not None:
+            return respuesta
             
     return render(request, 'Marketplace_App/formularios/validar_codigo_telefono.html')
 
-# --- 4. PERFIL DE USUARIO ---
+# --- 3. PERFIL DE USUARIO ---
 @login_required
 def mi_perfil(request):
     perfil, created = PerfilUsuario.objects.get_or_create(usuario=request.user)
+    # Dejamos el perfil en caché del usuario: el template usa user.perfil varias veces
+    request.user.perfil = perfil
     form_perfil = PerfilUsuarioForm(instance=perfil)
 
-    mis_anuncios_qs = Anuncio.objects.filter(usuario=request.user).order_by('-fecha_publicacion')
+    mis_anuncios_qs = Anuncio.objects.filter(usuario=request.user).select_related('categoria').order_by('-fecha_publicacion')
     anuncios_con_forms = []
+    # Las opciones de categoría se consultan una sola vez y se comparten entre todos los formularios
+    opciones_categoria = None
     
     for anuncio in mis_anuncios_qs:
         form = AnuncioForm(instance=anuncio)
+        if opciones_categoria is None:
+            # (comprensión y no list(): list() llamaría a len() y haría un COUNT extra)
+            opciones_categoria = [opcion for opcion in form.fields['categoria'].choices]
+        form.fields['categoria'].choices = opciones_categoria
         anuncios_con_forms.append((anuncio, form))
 
     context = {
@@ -239,4 +176,76 @@ def editar_perfil(request):
         else:
             messages.error(request, 'Error al actualizar el perfil.')
             
-    return redirect('mi_perfil')
\ No newline at end of file
+    return redirect('mi_perfil')
+
+# --- 4. VERIFICACIÓN EN DOS PASOS (al iniciar sesión, ver dos_pasos.py) ---
+def destino_verificacion(request):
+    """Devuelve ``(siguiente, destino)``: el ?next= si es de este sitio (o None), y adónde ir al terminar."""
+    siguiente = request.POST.get('next') or request.GET.get('next')
+    if not url_has_allowed_host_and_scheme(siguiente, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        siguiente = None
+    return siguiente, siguiente or settings.LOGIN_REDIRECT_URL
+
+@login_required
+@limitar()
+def verificacion_2fa(request):
+    siguiente, destino = destino_verificacion(request)
+
+    if not dos_pasos.pendiente(request.session):
+        return redirect(destino)
+
+    correo = dos_pasos.destinatario(request.session, request.user)
+    if request.method == 'POST' and 'email' in request.POST and not request.user.email:
+        # Cuenta sin correo (createsuperuser lo deja vacío): el código va al que ingrese
+        nuevo = correo_ingresado(request)
+        if nuevo and avisar_correo(request, nuevo, dos_pasos.pedir_correo(request.session, request.user, nuevo)):
+            correo = nuevo
+    elif not correo:
+        pass # Todavía no hay a dónde mandar el código: se pide el correo
+    elif request.method == 'POST' and 'reenviar' not in request.POST:
+        # Vencido o demasiados intentos: dos_pasos.validar ya mandó otro
+        resultado = dos_pasos.validar(request.session, request.user, request.POST.get('codigo', ''))
+        if avisar_codigo(request, resultado, f'¡Bienvenido de nuevo, {request.user.username}!'):
+            return redirect(destino)
+    elif request.method == 'POST' or not dos_pasos.hay_codigo_vigente(request.session):
+        dos_pasos.enviar_codigo(request.session, request.user)
+        messages.info(request, f'Te enviamos un código de acceso a {correo}.')
+
+    return render(request, 'Marketplace_App/formularios/verificacion_2fa.html', contexto_2fa(correo, siguiente))
+
+
+def correo_ingresado(request):
+    """El correo del POST si es válido; si no, None (con el mensaje de error)."""
+    form = CorreoForm(request.POST)
+    if form.is_valid():
+        return form.cleaned_data['email']
+    messages.error(request, 'Ingresa un correo válido.')
+    return None
+
+def avisar_correo(request, correo, enviado):
+    """Mensaje tras pedir el código en ``correo`` (``enviado`` es lo que devolvió dos_pasos.pedir_correo)."""
+    if enviado:
+        messages.info(request, f'Te enviamos un código de acceso a {correo}.')
+    else:
+        messages.error(request, 'Ese correo ya está en uso.')
+    return enviado
+
+def contexto_2fa(correo, siguiente):
+    """Contexto del template: el código si ya hay a dónde mandarlo, si no el formulario del correo."""
+    if not correo:
+        return {
+            'titulo': 'Verificación en dos pasos',
+            'encabezado': 'Agrega un correo a tu cuenta',
+            'descripcion': 'Tu cuenta no tiene un correo. Ingresa uno para recibir el código y terminar de iniciar sesión.',
+            'boton': 'Enviar código',
+            'pedir_correo': True,
+            'next': siguiente,
+        }
+    return {
+        'titulo': 'Verificación en dos pasos',
+        'encabezado': 'Verifica que eres tú',
+        'descripcion': 'Ingresa el código de 6 dígitos que te enviamos por correo para terminar de iniciar sesión.',
+        'boton': 'Verificar',
+        'reenviar': True,
+        'next': siguiente,
+    }
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Marketplace_Django.settings')
+# Bajo ASGI se usan las vistas async (VISTAS_ASINCRONAS=0 para volver a las sync)
+os.environ.setdefault('VISTAS_ASINCRONAS', '1')
+# Sin conexiones persistentes: cada request corre en otro hilo (ver DB_CONN_MAX_AGE en settings.py)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
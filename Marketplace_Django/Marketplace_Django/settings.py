@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv # Importar librería
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Cargar las variables del archivo .env (antes de leerlas: la base de datos también se configura por .env)
+load_dotenv()
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -41,6 +48,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Archivos estáticos de STATIC_ROOT (antes que todo: no pasan por sesión, métricas ni URLs)
+    'Marketplace_App.middleware.EstaticosMiddleware',
+    # Métricas por vista (para medir el request completo)
+    'Marketplace_App.middleware.InstrumentacionMiddleware',
+    # Lecturas en réplicas (antes de SessionMiddleware: guardar la sesión es una escritura)
+    'Marketplace_App.middleware.LecturaEnReplicasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,9 +61,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+    # Límites de frecuencia (429) de las URLs en LIMITES sin @limitar
+    'Marketplace_App.middleware.LimiteFrecuenciaMiddleware',
     
-    # NUESTRO MIDDLEWARE DE SEGURIDAD
-    #'Marketplace_App.middleware.VerificacionDosPasosMiddleware',
+    # NUESTRO MIDDLEWARE DE SEGURIDAD (verificación en dos pasos)
+    'Marketplace_App.middleware.VerificacionDosPasosMiddleware',
 ]
 
 ROOT_URLCONF = 'Marketplace_Django.urls'
@@ -72,17 +88,96 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Marketplace_Django.wsgi.application'
 
+# Los tests usan una carpeta de caché temporal (ver Marketplace_App/pruebas.py)
+TEST_RUNNER = 'Marketplace_App.pruebas.EjecutorPruebas'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_MOTOR elige el perfil: 'sqlite' (por defecto) o 'postgresql' (DB_NOMBRE,
+# DB_USUARIO, DB_CLAVE, DB_HOST, DB_PUERTO). El comando medir_escrituras compara
+# la concurrencia de escrituras de cada perfil.
+DB_MOTOR = os.getenv('DB_MOTOR', 'sqlite')
+# Segundos que se reusa una conexión entre requests (0 = una por request). Bajo
+# ASGI cada request corre en otro hilo y las conexiones persistentes se acumulan:
+# asgi.py lo pone en 0 (con PostgreSQL, usar DB_POOL=1 en su lugar).
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+# Se aplican al abrir cada conexión SQLite
+SQLITE_PRAGMAS = '; '.join([
+    # Los lectores no bloquean al que escribe ni al revés
+    'PRAGMA journal_mode=WAL',
+    # Con WAL es seguro: ante un corte de luz se pierden las últimas transacciones, no se corrompe
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456', # 256 MiB leídos por mmap, sin copiar al caché de páginas
+    'PRAGMA cache_size=-65536', # 64 MiB de caché de páginas por conexión
+    'PRAGMA temp_store=MEMORY',
+])
+
+PERFILES_BASE_DATOS = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # busy_timeout: espera hasta 20 s a que se libere el lock en vez de
+            # fallar enseguida con "database is locked"
+            'timeout': 20,
+            # BEGIN IMMEDIATE: la transacción toma el lock de escritura al empezar.
+            # Con BEGIN a secas, una transacción que leyó y después quiere escribir
+            # falla sin esperar el timeout si otra escribió mientras tanto
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': SQLITE_PRAGMAS,
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NOMBRE', 'marketplace'),
+        'USER': os.getenv('DB_USUARIO', 'marketplace'),
+        'PASSWORD': os.getenv('DB_CLAVE', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PUERTO', '5432'),
+        # Con el pool de psycopg las conexiones las maneja el pool (CONN_MAX_AGE tiene que ser 0)
+        'CONN_MAX_AGE': 0 if os.getenv('DB_POOL') == '1' else DB_CONN_MAX_AGE,
+        # Antes de reusar una conexión persistente se comprueba que siga viva
+        'CONN_HEALTH_CHECKS': True,
+        # .iterator() usa cursores del servidor (trae de a chunk_size filas). Detrás de
+        # PgBouncer en modo transacción no funcionan: DB_PGBOUNCER=1 los desactiva
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER') == '1',
+        'OPTIONS': {
+            'connect_timeout': 5,
+            'pool': {'min_size': 2, 'max_size': 20, 'timeout': 10} if os.getenv('DB_POOL') == '1' else False,
+        },
+    },
 }
 
+if DB_MOTOR not in PERFILES_BASE_DATOS:
+    raise ImproperlyConfigured(f'DB_MOTOR={DB_MOTOR!r}: los perfiles son {", ".join(PERFILES_BASE_DATOS)}.')
+
+# Copia: los tests (y Django) modifican el dict de la conexión
+DATABASES = {
+    'default': dict(PERFILES_BASE_DATOS[DB_MOTOR]),
+}
+
+# RÉPLICAS DE LECTURA (ver Marketplace_App/replicas.py)
+# DB_REPLICAS: lista separada por comas. Con SQLite son archivos que mantiene
+# al día el comando replicar_sqlite (sólo para desarrollo); con PostgreSQL,
+# hosts de réplicas del servidor principal.
+for numero, destino in enumerate(filter(None, map(str.strip, os.getenv('DB_REPLICAS', '').split(','))), 1):
+    DATABASES[f'replica{numero}'] = {
+        **DATABASES['default'],
+        'NAME' if DB_MOTOR == 'sqlite' else 'HOST': destino,
+        # En los tests la réplica es la misma base de prueba
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICAS_LECTURA = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['Marketplace_App.replicas.RouterLecturaEscritura']
+# Segundos que un usuario lee de la principal después de escribir (más que el atraso de las réplicas)
+REPLICAS_FIJAR_PRIMARIA = int(os.getenv('REPLICAS_FIJAR_PRIMARIA', '5'))
+REPLICAS_COOKIE = 'primaria'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,12 +215,28 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
-import os
-
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'Marketplace_App/static'),
 ]
 
+# Destino de collectstatic: nombres con hash y versiones .gz (ver Marketplace_App/estaticos.py)
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'Marketplace_App.estaticos.AlmacenamientoEstaticos'},
+}
+
+# EstaticosMiddleware sirve STATIC_ROOT desde Django (sin proxy delante). Apagarlo
+# si los sirve nginx o un CDN. Los archivos con hash se cachean un año (immutable);
+# el resto (los que se piden sin {% static %}), ESTATICOS_MAX_AGE segundos.
+ESTATICOS_SERVIR = os.getenv('ESTATICOS_SERVIR', '1') == '1'
+ESTATICOS_MAX_AGE = 300
+# Un {% static %} sin entrada en el manifiesto de collectstatic es un error (como
+# en ManifestStaticFilesStorage). Sólo con DEBUG (y en los tests, que cargan estos
+# settings con DEBUG) se usa la URL sin hash, para no tener que correr collectstatic.
+ESTATICOS_MANIFIESTO_ESTRICTO = not DEBUG
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -135,22 +246,165 @@ LOGIN_REDIRECT_URL = 'home'
 
 LOGIN_URL = 'login'
 
+# Paginación del listado por cursor (keyset) en lugar de páginas numeradas.
+# Aunque esté en False, cualquier pedido con ?cursor= usa este modo.
+PAGINACION_POR_CURSOR = False
+
+# Changelists grandes del admin (paginacion.PaginadorEstimado): sin filtros, si
+# el motor estima más filas que esto se muestra la estimación en vez de un
+# COUNT(*); con filtros se cuenta como mucho hasta acá.
+ADMIN_CONTEO_MAXIMO = 10000
+
+# Usar las versiones async de home, detalle y verificaciones (views/asincronas.py).
+# asgi.py lo activa por defecto; bajo WSGI conviene dejar las sync.
+VISTAS_ASINCRONAS = os.getenv('VISTAS_ASINCRONAS') == '1'
+
 # URL base para servir archivos multimedia
 MEDIA_URL = '/media/'
 
 # Ruta en el sistema de archivos donde se guardarán
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-from dotenv import load_dotenv # Importar librería
-
-# Cargar las variables del archivo .env
-load_dotenv()
+# Archivos de importación masiva subidos desde el admin (no se sirven por /media/)
+IMPORTACIONES_ROOT = os.path.join(BASE_DIR, 'importaciones')
 
 # CONFIGURACIÓN DE EMAIL (GMAIL SMTP)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# En desarrollo se puede usar EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 # Leemos los valores del archivo .env
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
-EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
\ No newline at end of file
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+# Los correos salen desde el trabajador de la cola; sin tope un SMTP colgado lo frena
+EMAIL_TIMEOUT = 20
+
+# SMS (ver Marketplace_App/sms.py). Los manda el trabajador de la cola, nunca el request.
+# Backends: ConsolaBackend (desarrollo), ArchivoBackend (en SMS_ARCHIVO_RUTA),
+# MemoriaBackend (tests) y HttpBackend (proveedor en SMS_HTTP_URL, con SMS_HTTP_TOKEN).
+SMS_BACKEND = os.getenv('SMS_BACKEND', 'Marketplace_App.sms.ConsolaBackend')
+SMS_ARCHIVO_RUTA = os.getenv('SMS_ARCHIVO_RUTA', str(BASE_DIR / 'sms_enviados'))
+SMS_HTTP_URL = os.getenv('SMS_HTTP_URL', '')
+SMS_HTTP_TOKEN = os.getenv('SMS_HTTP_TOKEN', '')
+SMS_HTTP_TIMEOUT = 10
+SMS_LOTE = 50 # Mensajes por pedido al proveedor
+
+# CACHÉ
+# Por defecto en archivos (la carpeta cache/ del proyecto, o CACHE_LOCATION):
+# la comparten todos los procesos del servidor (gunicorn, el trabajador de la
+# cola), así que las sesiones, los códigos, los límites y la caché de vistas
+# se ven igual desde cualquiera. Con varios servidores, o para que los
+# contadores de los límites sean exactos (el incr de FileBasedCache no es
+# atómico), usar Redis o Memcached con CACHE_BACKEND y CACHE_LOCATION.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'TIMEOUT': 300,
+    }
+}
+# Backends que guardan todo en la memoria de cada proceso (CACHE_BACKEND=
+# django.core.cache.backends.locmem.LocMemCache): con varios procesos
+# (gunicorn, el trabajador de la cola) cada uno ve una caché distinta. Con ellos
+# las sesiones van en la cookie (ver SESSION_ENGINE), los códigos de
+# verificación a la base, y
+# `manage.py check --deploy` avisa de lo que sigue dependiendo de ella.
+CACHES_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_COMPARTIDA = CACHES['default']['BACKEND'] not in CACHES_LOCALES
+
+# Caché de fragmentos de home() y detalle_anuncio() (ver Marketplace_App/cache_vistas.py).
+# Tiene que ser compartida: el trabajador de la cola (procesar_tareas) la
+# invalida al terminar las miniaturas, y con una caché local a cada proceso
+# los servidores web no se enteran hasta que vence CACHE_VISTAS_TIMEOUT.
+CACHE_VISTAS_ALIAS = 'default'
+CACHE_VISTAS_TIMEOUT = 300
+
+# LÍMITES DE FRECUENCIA (ver Marketplace_App/limites.py)
+# Nombre de la vista (@limitar) o de la URL (LimiteFrecuenciaMiddleware) -> reglas
+# (tasa, clave[, algoritmo]). Claves: 'ip', 'usuario', 'post:<campo>', 'sesion:<clave>'.
+LIMITES_ACTIVOS = os.getenv('LIMITES_ACTIVOS', '1') == '1'
+# Tiene que ser compartida entre procesos. Con una caché local a cada proceso
+# (CACHE_BACKEND=LocMemCache, ver CACHE_COMPARTIDA) cada uno cuenta por su lado
+# y cada tasa de abajo se multiplica por la cantidad de procesos: con 4
+# trabajadores de gunicorn, '5/15m' deja pasar hasta 20 intentos cada 15 minutos.
+LIMITES_CACHE = 'default'
+LIMITES_METODOS = ('POST',) # Sólo los envíos de formularios: mirar la página no cuenta
+LIMITES_PROXIES = 0 # Proxies propios delante de Django (para leer X-Forwarded-For)
+LIMITES = {
+    'login': [('20/m', 'ip', 'cubeta'), ('5/15m', 'post:username')],
+    # Cada registro manda un correo
+    'registro': [('5/h', 'ip'), ('3/h', 'post:email')],
+    # Códigos de 6 dígitos: pocos intentos por usuario a medio registrar
+    'verificar_registro': [('20/10m', 'ip'), ('5/10m', 'sesion:registro_user_id')],
+    'verificacion_2fa': [('30/10m', 'ip'), ('10/10m', 'usuario')],
+    # Cada pedido manda un SMS
+    'verificar_telefono': [('10/h', 'ip'), ('5/h', 'usuario'), ('3/h', 'post:telefono')],
+    'validar_codigo_telefono': [('20/10m', 'ip'), ('5/10m', 'usuario')],
+    'comentar_anuncio': [('10/m', 'usuario'), ('200/d', 'usuario')],
+}
+
+# MODERACIÓN (ver Marketplace_App/moderacion.py)
+# Usuarios distintos que tienen que reportar un anuncio (desde la última revisión)
+# para que se oculte solo hasta que lo revise un moderador. 0 = nunca.
+MODERACION_UMBRAL_DESACTIVAR = int(os.getenv('MODERACION_UMBRAL_DESACTIVAR', '5'))
+
+# COLA DE TAREAS EN SEGUNDO PLANO (ver Marketplace_App/cola.py)
+# Los trabajadores se inician con: python manage.py procesar_tareas
+# TAREAS_INMEDIATAS=1 ejecuta cada tarea al confirmar la transacción (sin trabajador).
+TAREAS_INMEDIATAS = os.getenv('TAREAS_INMEDIATAS') == '1'
+TAREAS_TIEMPO_BLOQUEO = 300 # Segundos antes de liberar una tarea de un trabajador caído
+TAREAS_ESPERA_BASE = 10 # Primer reintento a los ~10 s, luego 20, 40, ...
+TAREAS_ESPERA_MAXIMA = 3600
+
+# MÉTRICAS DE RENDIMIENTO (ver Marketplace_App/metricas.py, se leen en /metricas)
+# Fracción de requests que se miden (0 apaga la medición, 1 mide todos)
+METRICAS_MUESTREO = float(os.getenv('METRICAS_MUESTREO', '1.0' if DEBUG else '0.1'))
+# A partir de cuántas repeticiones de la misma consulta se avisa de un posible N+1
+METRICAS_UMBRAL_REPETIDAS = 5
+# Token para que Prometheus lea /metricas sin sesión (Authorization: Bearer <token>)
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+# Cada proceso guarda acá lo que lleva (un archivo por proceso) y /metricas suma
+# todos: si no, cada scrape vería sólo al worker que lo atendió. Vaciarla al
+# reiniciar el servicio. '' = cada proceso exporta sólo lo suyo.
+METRICAS_DIRECTORIO = os.getenv('METRICAS_DIRECTORIO', str(BASE_DIR / 'metricas'))
+METRICAS_INTERVALO = 10 # Segundos entre escrituras del archivo de cada proceso
+
+# VERIFICACIÓN EN DOS PASOS (ver Marketplace_App/dos_pasos.py)
+DOS_PASOS_VIGENCIA = 600 # Segundos que vale cada código
+DOS_PASOS_MAX_INTENTOS = 5 # Códigos incorrectos antes de tener que pedir otro
+# Nombres de URL que se pueden usar sin el segundo paso (además de la propia verificación)
+DOS_PASOS_RUTAS_EXCLUIDAS = ['login', 'logout', 'registro', 'verificar_registro', 'admin:logout']
+# Prefijos de ruta excluidos (STATIC_URL y MEDIA_URL ya lo están). La API es pública y de sólo lectura.
+DOS_PASOS_PREFIJOS_EXCLUIDOS = ['/api/']
+
+# CÓDIGOS DE VERIFICACIÓN (ver Marketplace_App/codigos.py)
+# Caché compartida entre procesos; si falla, se usa la tabla CodigoVerificacion.
+# None: siempre la tabla (lo que se usa si la caché es local a cada proceso).
+CODIGOS_CACHE = 'default' if CACHE_COMPARTIDA else None
+# Propósito -> (segundos que vale cada código, intentos incorrectos antes de tener que pedir otro)
+CODIGOS = {
+    'registro': (3600, 5),
+    'telefono': (600, 5),
+    '2fa': (DOS_PASOS_VIGENCIA, DOS_PASOS_MAX_INTENTOS),
+}
+
+# SESIONES
+# cached_db: se leen de la caché (sin consultar la base en cada request) y sólo
+# se escriben, en la caché y en la base, cuando cambian. Las vencidas de la
+# tabla las borra el comando purgar_sesiones (programarlo en cron).
+# Con una caché local a cada proceso, signed_cookies: la sesión viaja firmada
+# (con SECRET_KEY) en la cookie, así que todos los procesos ven el login, el
+# segundo paso y el logout sin caché ni consultas a la base. A cambio, cerrar
+# sesión sólo borra la cookie del navegador: una copia robada sigue valiendo
+# hasta SESSION_COOKIE_AGE, y lo que se guarda en la sesión tiene que entrar
+# en una cookie (~4 KB). Si eso no sirve, SESSION_ENGINE=
+# django.contrib.sessions.backends.db (una consulta por request).
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if CACHE_COMPARTIDA
+    else 'django.contrib.sessions.backends.signed_cookies',
+)
@@ -0,0 +1,12 @@
+# Marketplace_Django/urls_asincronas.py
+# Como urls.py pero siempre con las vistas async (lo use o no VISTAS_ASINCRONAS).
+# Lo usan la prueba de carga de rendimiento.py y los tests.
+from django.contrib import admin
+from django.urls import path, include
+
+from Marketplace_App.urls import rutas
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include(rutas(asincronas=True))),
+]